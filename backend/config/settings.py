@@ -8,6 +8,7 @@ Django 프로젝트 전역 설정 파일.
 """
 
 from pathlib import Path
+from corsheaders.defaults import default_headers
 
 # BASE_DIR: 프로젝트 루트 경로 (config/ 상위 디렉터리)
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -119,6 +120,12 @@ STATIC_URL = '/static/'
 # 운영 환경에서는 필요한 도메인만 허용하도록 변경하는 것이 안전하다.
 CORS_ALLOW_ALL_ORIGINS = True
 
+# 프론트가 ETag로 재검증(floors/<k>/)하거나 저장 전 리비전을 확인(PUT If-Match)할 수 있도록
+#  - 요청: If-None-Match / If-Match / X-Chunk-SHA256(청크 업로드) 헤더 허용 (기본 목록에 없음)
+#  - 응답: ETag, X-Next-Cursor(프로젝트 목록 다음 페이지) 헤더를 JS에서 읽을 수 있게 노출
+CORS_ALLOW_HEADERS = (*default_headers, "if-none-match", "if-match", "x-chunk-sha256")
+CORS_EXPOSE_HEADERS = ["ETag", "X-Next-Cursor"]
+
 # ───────────── 미디어 파일 설정 ─────────────
 
 # 업로드된 파일이 서비스 상에서 접근될 때의 URL prefix
@@ -127,4 +134,31 @@ MEDIA_URL = '/media/'
 
 # 실제 파일이 저장될 서버 내부 경로
 # 예: <프로젝트루트>/media/floor_images/...
-MEDIA_ROOT = BASE_DIR / 'media'
\ No newline at end of file
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# 청크 업로드 중인 파일 (maps/uploads.py)
+# MEDIA_ROOT 밖에 두어야 다 올라가기 전 파일이 /media/로 노출되지 않는다.
+# 같은 파일시스템이면 finalize 때 복사 없이 blobs/로 옮겨진다.
+MAPS_UPLOAD_DIR = BASE_DIR / 'upload_sessions'
+
+# 한 파일 최대 크기 (바이트)
+MAPS_UPLOAD_MAX_BYTES = 1024 * 1024 * 1024
+
+# 미디어 파일 전송을 프록시 웹 서버에 넘기기 (maps/media.py)
+# - ""         : Django가 직접 보낸다. (Range / 304 지원, 개발 서버 기본값)
+# - "nginx"    : X-Accel-Redirect 헤더만 돌려주고 전송은 nginx가 한다.
+#                nginx 설정 예) location /_media/ { internal; alias /path/to/media/; }
+# - "sendfile" : X-Sendfile 헤더 (Apache mod_xsendfile, lighttpd)
+MAPS_MEDIA_ACCEL = ""
+MAPS_MEDIA_ACCEL_PREFIX = '/_media/'
+
+# ───────────── 프로젝트 캐시 설정 ─────────────
+
+# 워커 프로세스별 프로젝트 캐시(컴파일된 그래프, 직렬화된 응답 등) 메모리 예산 (바이트)
+# 예산을 넘으면 가장 오래 안 쓴 항목부터 버린다. (maps/cache.py 참고)
+MAPS_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# ───────────── 백그라운드 작업 설정 ─────────────
+
+# 층 이미지 타일 생성 등 백그라운드 작업용 스레드 수 (웹 워커 프로세스마다, maps/tasks.py 참고)
+MAPS_TASK_WORKERS = 2
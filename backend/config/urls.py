@@ -4,13 +4,16 @@
 - 여기서 각 앱(maps 등)의 URL 구성을 include 시킨다.
 - /admin/ : Django 기본 관리자 페이지
 - /api/   : maps 앱에서 제공하는 API 엔드포인트(prefix: /api/)
-- DEBUG 모드일 때만 media 파일을 개발용으로 서빙한다.
+- /media/ : 업로드 이미지/타일/export ZIP (maps/media.py, DEBUG와 상관없이)
 """
 
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from maps.media import serve_media
 
 
 # 최상위 URL 패턴 리스트
@@ -23,8 +26,12 @@ urlpatterns = [
     path('api/', include('maps.urls')),
 ]
 
-# 개발 환경(DEBUG=True)일 때만,
-# MEDIA_URL(/media/)로 들어오는 요청을 Django가 직접 파일로 서빙해 준다.
-# 운영 환경에서는 nginx 등의 웹 서버가 /media/ 경로를 처리하는 것이 일반적이다.
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+# MEDIA_URL(/media/) 아래 파일 서빙
+# - 캐시 헤더(내용 해시 이름은 immutable) / ETag, Last-Modified 304 / Range 지원
+# - 운영에서 nginx 등 프록시 뒤라면 settings.MAPS_MEDIA_ACCEL 로 파일 전송을 웹 서버에 넘긴다.
+#   (웹 서버가 /media/ 를 직접 처리하게 설정했다면 이 경로로는 요청이 오지 않는다)
+# MEDIA_URL이 다른 도메인(CDN 등)이면 연결하지 않는다.
+if settings.MEDIA_URL.startswith("/"):
+    urlpatterns += [
+        re_path(rf"^{re.escape(settings.MEDIA_URL.lstrip('/'))}(?P<path>.*)$", serve_media),
+    ]
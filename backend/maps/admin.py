@@ -17,8 +17,8 @@ class ProjectAdmin(admin.ModelAdmin):
     - ordering     : 기본 정렬 기준 (최근 수정된 프로젝트가 위로 오도록 -updated_at)
     """
     
-    # 목록에 보일 컬럼 (ID, 이름, 마지막 수정일)
-    list_display = ("id", "name", "updated_at")
+    # 목록에 보일 컬럼 (ID, 이름, 노드/층 개수, 마지막 수정일)
+    list_display = ("id", "name", "node_count", "floor_count", "updated_at")
     
     # 이름으로 검색 가능
     search_fields = ("name",)
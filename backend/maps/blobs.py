@@ -0,0 +1,247 @@
+# maps/blobs.py
+"""
+내용 주소(content-addressed) 미디어 저장소.
+
+업로드된 파일은 내용의 SHA-256 해시를 이름으로 딱 한 번만 저장한다.
+
+    MEDIA_ROOT/blobs/<sha 앞 2자리>/<sha>.<ext>        ← 파일 (URL도 같은 경로)
+    MEDIA_ROOT/blobs/<sha 앞 2자리>/tiles/...          ← 타일 (maps/tiles.py)
+
+- 같은 도면을 다시 올리거나, 여러 프로젝트가 같은 도면을 써도 디스크에는 하나뿐이다.
+- 업로드는 청크 단위로 읽으면서 해시를 계산하고 임시 파일에 쓴 뒤 제자리로 옮긴다.
+  (파일 전체를 메모리에 올리지 않음)
+- 어떤 프로젝트/층이 어떤 파일을 쓰는지는 MediaBlobRef 행으로 관리한다.
+  Project.save() 때 data.images로부터 동기화된다. (maps/relational.py)
+- 참조가 하나도 없는 파일은 collect_garbage()가 지운다.
+  (프로젝트 삭제 시 + manage.py gc_media_blobs)
+  남아 있는 리비전 기록이 가리키는 파일(RevisionBlobRef)도 지우지 않는다.
+  → 지난 리비전을 되살려도 층 이미지가 깨지지 않는다. (maps/history.py)
+"""
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+from datetime import timedelta
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import MediaBlob
+
+logger = logging.getLogger(__name__)
+
+BLOB_DIR_NAME = "blobs"
+
+# 업로드 파일을 읽어서 해시/저장할 때 한 번에 처리할 크기
+CHUNK_SIZE = 1024 * 1024
+
+# 이 시간 안에 업로드된 파일은 참조가 없어도 지우지 않는다.
+# (업로드 직후 data.images에 반영되기 전의 파일을 보호)
+GC_GRACE = timedelta(minutes=10)
+
+_BLOB_URL_RE = re.compile(rf"^{BLOB_DIR_NAME}/([0-9a-f]{{2}})/([0-9a-f]{{64}})(?:\.[a-z0-9]+)?$")
+
+
+def blobs_root():
+    return settings.MEDIA_ROOT / BLOB_DIR_NAME
+
+
+def _rel_path(sha: str, ext: str) -> str:
+    name = f"{sha}.{ext}" if ext else sha
+    return f"{BLOB_DIR_NAME}/{sha[:2]}/{name}"
+
+
+def blob_path(blob: MediaBlob):
+    return settings.MEDIA_ROOT / _rel_path(blob.sha256, blob.ext)
+
+
+def blob_url(blob: MediaBlob) -> str:
+    """/media/blobs/ab/abcd....png"""
+    return settings.MEDIA_URL + _rel_path(blob.sha256, blob.ext)
+
+
+def sha_from_url(url) -> str:
+    """blob URL(상대/절대) → sha256. blob URL이 아니면 빈 문자열."""
+    if not isinstance(url, str) or not url:
+        return ""
+    path = urlparse(url).path
+    if not path.startswith(settings.MEDIA_URL):
+        return ""
+    m = _BLOB_URL_RE.match(path[len(settings.MEDIA_URL):])
+    return m.group(2) if m else ""
+
+
+def _clean_ext(filename: str) -> str:
+    ext = os.path.splitext(filename or "")[1].lstrip(".").lower()
+    return ext if ext.isalnum() and len(ext) <= 16 else ""
+
+
+def _place(tmp, sha: str, size: int, filename: str, content_type: str) -> MediaBlob:
+    """
+    다 쓴 임시 파일 tmp를 sha 자리로 옮기고 MediaBlob을 돌려준다.
+    이미 같은 내용이 있으면 tmp는 지우고 기존 blob의 last_used만 갱신한다.
+    """
+    # GC와 엇갈리지 않도록 행을 잠근 상태에서 last_used 갱신 + 파일 배치
+    with transaction.atomic():
+        blob, created = MediaBlob.objects.select_for_update().get_or_create(
+            sha256=sha,
+            defaults={
+                "ext": _clean_ext(filename),
+                "size": size,
+                "content_type": (content_type or "")[:100],
+            },
+        )
+        if not created:
+            blob.last_used = timezone.now()
+            blob.save(update_fields=["last_used"])
+
+        final = blob_path(blob)
+        if final.exists():
+            os.unlink(tmp)
+        else:
+            final.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                os.replace(tmp, final)
+            except OSError:
+                # 다른 파일시스템(청크 업로드 폴더 등)이면 복사 후 삭제
+                shutil.move(str(tmp), str(final))
+    return blob
+
+
+def store_upload(file) -> MediaBlob:
+    """
+    업로드 파일(UploadedFile)을 저장소에 넣고 MediaBlob을 돌려준다.
+
+    - 같은 내용이 이미 있으면 파일을 새로 쓰지 않고 기존 MediaBlob을 돌려준다.
+    - 확장자는 처음 올라온 파일의 것을 계속 쓴다. (URL이 내용마다 하나로 고정되도록)
+    """
+    root = blobs_root()
+    root.mkdir(parents=True, exist_ok=True)
+
+    h = hashlib.sha256()
+    size = 0
+    fd, tmp = tempfile.mkstemp(prefix=".upload-", suffix=".tmp", dir=root)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in file.chunks(CHUNK_SIZE):
+                h.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        return _place(tmp, h.hexdigest(), size, file.name,
+                      getattr(file, "content_type", "") or "")
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def store_file(path, sha: str, filename: str, content_type: str = "") -> MediaBlob:
+    """
+    이미 디스크에 다 쓴 파일(청크 업로드 결과 등)을 저장소로 옮긴다. (복사하지 않음)
+
+    - sha: 호출하는 쪽에서 검증한 파일 내용의 SHA-256
+    - path는 옮겨지거나(새 내용) 지워진다(이미 있는 내용).
+    """
+    return _place(path, sha, os.path.getsize(path), filename, content_type)
+
+
+def find_blob(sha: str):
+    """sha 내용의 blob이 이미 있으면 last_used를 갱신해서 돌려준다. 없으면 None"""
+    with transaction.atomic():
+        blob = MediaBlob.objects.select_for_update().filter(sha256=sha).first()
+        if blob is None or not blob_path(blob).exists():
+            return None
+        blob.last_used = timezone.now()
+        blob.save(update_fields=["last_used"])
+    return blob
+
+
+def blob_refs_for(data: dict) -> dict:
+    """
+    data.images에서 blob을 가리키는 층만 골라 {층: {"blob_id": id}} 를 만든다.
+    (relational.sync_project_rows가 MediaBlobRef 동기화에 사용)
+    """
+    images = data.get("images") if isinstance(data, dict) else None
+    if isinstance(images, list):
+        items = enumerate(images)
+    elif isinstance(images, dict):
+        items = []
+        for k, v in images.items():
+            try:
+                items.append((int(k), v))
+            except (TypeError, ValueError):
+                pass
+    else:
+        return {}
+
+    shas = {}
+    for floor, url in items:
+        sha = sha_from_url(url)
+        if sha:
+            shas[floor] = sha
+    if not shas:
+        return {}
+
+    ids = dict(MediaBlob.objects.filter(sha256__in=set(shas.values())).values_list("sha256", "id"))
+    return {floor: {"blob_id": ids[sha]} for floor, sha in shas.items() if sha in ids}
+
+
+def _remove_blob_files(blob: MediaBlob):
+    """blob 파일 + 타일 매니페스트 + 타일 폴더 삭제"""
+    from .tiles import TILES_DIR_NAME, manifest_path
+
+    path = blob_path(blob)
+    tiles_dir = path.parent / TILES_DIR_NAME / blob.sha256[:16]
+    for p in (path, manifest_path(str(path))):
+        try:
+            os.unlink(p)
+        except FileNotFoundError:
+            pass
+    shutil.rmtree(tiles_dir, ignore_errors=True)
+
+
+def unreferenced_blobs(blob_ids=None, grace=GC_GRACE) -> list:
+    """
+    지워도 되는 blob id 목록.
+
+    - 참조(MediaBlobRef)가 없고, 남아 있는 리비전도 가리키지 않는(RevisionBlobRef) blob
+      옛 리비전만 쓰던 이미지는 prune_revisions()가 그 기록을 지운 뒤의 GC에서 지워진다.
+    - blob_ids: 검사할 blob id 목록 (None이면 전체)
+    - grace: 마지막 업로드 후 이 시간이 지나지 않은 blob은 건너뛴다.
+    """
+    qs = MediaBlob.objects.filter(refs__isnull=True, revision_refs__isnull=True,
+                                  last_used__lt=timezone.now() - grace)
+    if blob_ids is not None:
+        qs = qs.filter(pk__in=list(blob_ids))
+    return list(qs.values_list("pk", flat=True))
+
+
+def collect_garbage(blob_ids=None, grace=GC_GRACE) -> int:
+    """
+    unreferenced_blobs()에 해당하는 blob을 행과 파일 모두 지운다.
+
+    - 반환값: 지운 blob 수
+    """
+    removed = 0
+    for pk in unreferenced_blobs(blob_ids, grace):
+        with transaction.atomic():
+            # 잠근 뒤 다시 확인 (그 사이 업로드/참조가 생겼을 수 있음)
+            blob = (MediaBlob.objects.select_for_update()
+                    .filter(pk=pk, last_used__lt=timezone.now() - grace)
+                    .first())
+            if blob is None or blob.refs.exists() or blob.revision_refs.exists():
+                continue
+            try:
+                _remove_blob_files(blob)
+            except OSError as e:
+                logger.warning("failed to remove blob %s: %s", blob.sha256, e)
+                continue
+            blob.delete()
+            removed += 1
+    return removed
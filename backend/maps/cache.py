@@ -0,0 +1,155 @@
+# maps/cache.py
+"""
+프로젝트 리비전 단위의 프로세스 내(in-process) 캐시.
+
+- 키: (pk, updated_at, kind)
+    - kind 예: "graph"(컴파일된 길찾기 그래프), "response"(직렬화된 응답 bytes)
+    - 프로젝트가 저장되면 updated_at이 바뀌므로, 다른 워커 프로세스에서
+      저장이 일어나도 오래된 엔트리가 응답에 쓰이는 일은 없다.
+- 메모리 예산(settings.MAPS_CACHE_MAX_BYTES)을 넘으면 가장 오래 안 쓴 것부터(LRU) 버린다.
+- Project.save() / 프로젝트 삭제 시 invalidate(pk)로 해당 프로젝트 엔트리를 즉시 비운다.
+- hit/miss/eviction 카운터를 stats()로 확인할 수 있다. (/api/cache/stats/)
+"""
+import sys
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+# settings에 값이 없을 때 사용하는 기본 메모리 예산 (256MB)
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def _sizeof(value) -> int:
+    """
+    엔트리 크기(바이트) 추정.
+
+    - bytes 류는 길이 그대로
+    - nbytes 속성을 가진 객체(CompiledGraph 등)는 그 값을 사용
+    - 그 외에는 sys.getsizeof 로 대략 계산
+    """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    nb = getattr(value, "nbytes", None)
+    if isinstance(nb, int):
+        return nb
+    return sys.getsizeof(value)
+
+
+class ProjectCache:
+    """
+    (pk, updated_at, kind) → 값 을 보관하는 LRU 캐시.
+
+    여러 스레드(runserver, gunicorn --threads 등)에서 동시에 접근해도
+    안전하도록 내부적으로 Lock을 사용한다.
+    """
+
+    def __init__(self, max_bytes=None):
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key → (value, size)
+        self._entries = OrderedDict()
+        # pk → {key, ...}  (invalidate(pk)용 역인덱스)
+        self._by_pk = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def max_bytes(self) -> int:
+        if self._max_bytes is not None:
+            return self._max_bytes
+        return int(getattr(settings, "MAPS_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+
+    def get(self, pk, updated_at, kind, default=None):
+        key = (pk, updated_at, kind)
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return hit[0]
+
+    def set(self, pk, updated_at, kind, value, size=None):
+        """
+        값을 저장한다.
+
+        - size를 주지 않으면 _sizeof()로 추정
+        - 혼자서 예산을 넘는 값은 저장하지 않는다.
+        """
+        size = _sizeof(value) if size is None else int(size)
+        limit = self.max_bytes
+        if size > limit:
+            return value
+
+        key = (pk, updated_at, kind)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._by_pk.setdefault(pk, set()).add(key)
+            self._bytes += size
+
+            # 예산 초과 시 LRU 순서대로 제거
+            while self._bytes > limit and self._entries:
+                old_key, (_, old_size) = self._entries.popitem(last=False)
+                self._bytes -= old_size
+                self._forget_key(old_key)
+                self.evictions += 1
+        return value
+
+    def get_or_build(self, project, kind, builder):
+        """
+        project(Project 인스턴스)의 현재 리비전에 해당하는 값을 꺼내고,
+        없으면 builder()를 호출해서 만든 뒤 저장한다.
+        """
+        missing = object()
+        value = self.get(project.pk, project.updated_at, kind, missing)
+        if value is missing:
+            value = builder()
+            self.set(project.pk, project.updated_at, kind, value)
+        return value
+
+    def invalidate(self, pk):
+        """pk 프로젝트의 모든 리비전 엔트리를 제거한다."""
+        with self._lock:
+            for key in self._by_pk.pop(pk, ()):
+                hit = self._entries.pop(key, None)
+                if hit is not None:
+                    self._bytes -= hit[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_pk.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "projects": len(self._by_pk),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+
+    def _forget_key(self, key):
+        # lock을 잡은 상태에서만 호출
+        keys = self._by_pk.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_pk[key[0]]
+
+
+# 프로세스 전역에서 공유하는 캐시 인스턴스
+project_cache = ProjectCache()
@@ -0,0 +1,458 @@
+# maps/canonical.py
+"""
+프로젝트 그래프의 '정규(canonical)' 표현과 파생 뷰(derived views) 변환 모듈.
+
+에디터의 serializeToDataFormat()은 같은 정보를 여러 군데에 중복해서 저장한다.
+  - nodes / floors[k].nodes
+  - connections / floors[k].connections
+  - special_points / floors[k].special_points
+  - floors[k].polygons / _editor.shapes.polygons (+ points)
+  - _editor.node_meta, _editor.links
+
+여기서는 이를 중복 없는 세 개의 리스트로 다룬다.
+
+    {
+      "nodes":    [{"id", "x", "y", "floor", "name", "special_id", "nseq"}, ...],
+      "links":    [{"id", "a", "b", "floor", "lseq", "distance"}, ...],
+      "polygons": [{"id", "floor", "name", "pseq", "nodes": [노드 id, ...]}, ...],
+      "floors":   [0, 1, 2, ...],
+    }
+
+- canonical_from_data(): 저장된 data(dict) → 정규 표현
+- canonical_from_payload(): 클라이언트가 보낸 정규 표현 검사/정리 (전체 저장 시)
+- check_lengths()     : id/이름이 테이블 컬럼 길이를 넘지 않는지 검사
+- derive_views()      : 정규 표현 → serializeToDataFormat()과 같은 모양의 파생 뷰
+"""
+from math import hypot, isfinite
+
+from .routing import node_floor_map
+
+
+def _num(v):
+    """정수로 떨어지는 float는 int로 (JSON 크기/모양을 프론트 출력과 맞추기 위함)."""
+    if isinstance(v, float) and v.is_integer():
+        return int(v)
+    return v
+
+
+def _to_int(v, default=0):
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return default
+
+
+def _to_float(v, default=0.0):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return default
+
+
+def floor_indexes(data: dict) -> list:
+    """
+    data에서 층 번호 목록을 만든다.
+
+    - floors 버킷의 키
+    - _editor.floors (층 개수)가 있으면 0 ~ floors-1
+    """
+    out = set()
+    floors = data.get("floors")
+    if isinstance(floors, dict):
+        for key in floors:
+            try:
+                out.add(int(key))
+            except (TypeError, ValueError):
+                pass
+    editor = data.get("_editor")
+    if isinstance(editor, dict) and isinstance(editor.get("floors"), int):
+        out.update(range(max(0, editor["floors"])))
+    return sorted(out)
+
+
+def canonical_from_data(data: dict) -> dict:
+    """
+    저장된 data(dict)를 정규 표현으로 바꾼다.
+
+    - 링크: _editor.links가 있으면 그것을 사용하고 (에디터가 저장한 id/lseq 유지),
+            없으면 connections에서 무방향 링크를 뽑아 "a|b" 형태의 id를 붙인다.
+    - 폴리곤: _editor.shapes.polygons → 없으면 floors[k].polygons
+    - nodes에 없는 노드를 가리키는 링크는 버린다. (applyFromDataFormat과 동일)
+    """
+    data = data if isinstance(data, dict) else {}
+    nodes_raw = data.get("nodes") if isinstance(data.get("nodes"), dict) else {}
+    conn = data.get("connections") if isinstance(data.get("connections"), dict) else {}
+    editor = data.get("_editor") if isinstance(data.get("_editor"), dict) else {}
+    node_meta = editor.get("node_meta") if isinstance(editor.get("node_meta"), dict) else {}
+
+    floor_of = node_floor_map(data)
+
+    nodes = [
+        node_entry(nid, v, node_meta.get(nid), floor_of.get(nid, 0))
+        for nid, v in nodes_raw.items()
+    ]
+
+    def _distance(a, b):
+        row = conn.get(a)
+        if isinstance(row, dict) and b in row:
+            return _to_float(row[b], None)
+        return None
+
+    links = []
+    editor_links = editor.get("links")
+    if isinstance(editor_links, list) and editor_links:
+        for i, l in enumerate(editor_links):
+            if not isinstance(l, dict):
+                continue
+            a, b = l.get("a"), l.get("b")
+            if a not in nodes_raw or b not in nodes_raw:
+                continue
+            links.append(editor_link_entry(l, i, floor_of.get(a, 0), _distance(a, b)))
+    else:
+        for a, row in conn.items():
+            if a not in nodes_raw or not isinstance(row, dict):
+                continue
+            for b, w in row.items():
+                if b not in nodes_raw:
+                    continue
+                back = conn.get(b)
+                # 양방향이면 a < b 쪽 한 번만
+                if not (a < b or not (isinstance(back, dict) and a in back)):
+                    continue
+                links.append({
+                    "id": f"{a}|{b}",
+                    "a": a,
+                    "b": b,
+                    "floor": floor_of.get(a, 0),
+                    "lseq": 0,
+                    "distance": _to_float(w, None),
+                })
+
+    polygons = []
+    shapes = editor.get("shapes") if isinstance(editor.get("shapes"), dict) else {}
+    poly_src = shapes.get("polygons")
+    if not isinstance(poly_src, list):
+        poly_src = []
+        floors = data.get("floors") if isinstance(data.get("floors"), dict) else {}
+        for key, bucket in floors.items():
+            if isinstance(bucket, dict) and isinstance(bucket.get("polygons"), list):
+                for p in bucket["polygons"]:
+                    if isinstance(p, dict):
+                        poly_src.append({**p, "floor": _to_int(key)})
+    for i, p in enumerate(poly_src):
+        if not isinstance(p, dict):
+            continue
+        polygons.append(shape_entry(p, i))
+
+    return {
+        "nodes": nodes,
+        "links": links,
+        "polygons": polygons,
+        "floors": floor_indexes(data),
+    }
+
+
+# ----- 항목 하나 단위 변환 -----
+# canonical_from_data / derive_views와 delta.py의 부분 갱신이 같이 써서 결과가 같게 유지된다.
+
+def node_entry(nid, value, meta, floor) -> dict:
+    """data.nodes[nid] 값과 _editor.node_meta[nid] → 정규 표현 노드 항목"""
+    value = value if isinstance(value, dict) else {}
+    meta = meta if isinstance(meta, dict) else {}
+    return {
+        "id": nid,
+        "x": _to_float(value.get("x")),
+        "y": _to_float(value.get("y")),
+        "floor": floor,
+        "name": value.get("name") or "",
+        "special_id": value.get("special_id") or "",
+        "nseq": _to_int(meta.get("nseq")),
+    }
+
+
+def editor_link_entry(l: dict, i: int, default_floor, distance) -> dict:
+    """_editor.links[i] → 정규 표현 링크 항목 (distance: connections에 저장된 거리)"""
+    return {
+        "id": l.get("id") or f"lk_{i + 1}",
+        "a": l.get("a"),
+        "b": l.get("b"),
+        "floor": _to_int(l.get("floor"), default_floor),
+        "lseq": _to_int(l.get("lseq")),
+        "distance": distance,
+    }
+
+
+def shape_entry(p: dict, i: int) -> dict:
+    """_editor.shapes.polygons[i] (또는 floors[k].polygons 항목) → 정규 표현 폴리곤 항목"""
+    return {
+        "id": p.get("id") or f"pg_{i + 1}",
+        "floor": _to_int(p.get("floor")),
+        "name": p.get("name") or "",
+        "pseq": _to_int(p.get("pseq")),
+        "nodes": [nid for nid in (p.get("nodes") or []) if isinstance(nid, str)],
+    }
+
+
+def empty_floor_bucket() -> dict:
+    """floors[k] 버킷 하나의 빈 모양"""
+    return {"nodes": {}, "connections": {}, "special_points": {}, "polygons": []}
+
+
+def node_views(n: dict) -> tuple:
+    """정규 표현 노드 → (nodes[id] 값, _editor.node_meta[id] 값)"""
+    item = {"x": _num(_to_float(n.get("x"))), "y": _num(_to_float(n.get("y")))}
+    if n.get("name"):
+        item["name"] = n["name"]
+    if n.get("special_id"):
+        item["special_id"] = n["special_id"]
+    return item, {"floor": _to_int(n.get("floor")), "nseq": _to_int(n.get("nseq"))}
+
+
+def link_distance(l: dict, a_xy, b_xy):
+    """링크 거리: distance가 주어지면 그 값, 없으면 양 끝 좌표의 픽셀 거리(소수 2자리)"""
+    dist = l.get("distance")
+    if dist is None:
+        dist = round(hypot(a_xy[0] - b_xy[0], a_xy[1] - b_xy[1]), 2)
+    return _num(dist)
+
+
+def editor_link_view(l: dict) -> dict:
+    """정규 표현 링크 → _editor.links 항목"""
+    return {
+        "id": l.get("id"),
+        "a": l.get("a"),
+        "b": l.get("b"),
+        "floor": _to_int(l.get("floor")),
+        "lseq": _to_int(l.get("lseq")),
+    }
+
+
+def polygon_views(p: dict, coords) -> tuple:
+    """
+    정규 표현 폴리곤 → (floors[k].polygons 항목, _editor.shapes.polygons 항목)
+
+    coords: 노드 id → (x, y, ...) (꼭짓점 좌표 points 계산용)
+    """
+    ring = list(p.get("nodes") or [])
+    bucket_item = {
+        "id": p.get("id"),
+        "name": p.get("name") or "",
+        "nodes": list(ring),
+        "pseq": _to_int(p.get("pseq")),
+    }
+    shape = {
+        "id": p.get("id"),
+        "floor": _to_int(p.get("floor")),
+        "pseq": _to_int(p.get("pseq")),
+        "name": p.get("name") or "",
+        "nodes": list(ring),
+        "points": [
+            [round(coords[nid][0]), round(coords[nid][1])]
+            for nid in ring if nid in coords
+        ],
+    }
+    return bucket_item, shape
+
+
+def canonical_from_payload(raw, data: dict) -> dict:
+    """
+    클라이언트가 보낸 정규 표현(payload["canonical"])을 검사/정리한다.
+
+        {"nodes": [...], "links": [...], "polygons": [...], "floors": [0, 1, ...]}
+
+    - 각 항목의 필드는 모듈 docstring의 정규 표현과 같다. (링크 distance는 보통 생략 → 좌표로 계산)
+    - 형식이 잘못된 항목(id 없는 노드, 양 끝이 없는 링크 등)은 버린다.
+    - 노드 좌표가 NaN / inf 이면 ValueError (delta 저장의 좌표 검사와 같다.
+      그대로 두면 길찾기 휴리스틱과 공간 격자가 망가진다)
+    - 같은 id가 여러 번 오면 마지막 것을 쓴다.
+    - 층 목록은 floors + 노드/폴리곤의 층 + data의 _editor.floors 개수를 합친다.
+    """
+    raw = raw if isinstance(raw, dict) else {}
+
+    def _items(key):
+        v = raw.get(key)
+        return [x for x in v if isinstance(x, dict)] if isinstance(v, list) else []
+
+    nodes = {}
+    for n in _items("nodes"):
+        nid = n.get("id")
+        if not isinstance(nid, str) or not nid:
+            continue
+        x, y = _to_float(n.get("x")), _to_float(n.get("y"))
+        if not (isfinite(x) and isfinite(y)):
+            raise ValueError(f"nodes.{nid[:32]} x/y must be finite numbers")
+        nodes[nid] = {
+            "id": nid,
+            "x": x,
+            "y": y,
+            "floor": _to_int(n.get("floor")),
+            "name": n.get("name") if isinstance(n.get("name"), str) else "",
+            "special_id": n.get("special_id") if isinstance(n.get("special_id"), str) else "",
+            "nseq": _to_int(n.get("nseq")),
+        }
+
+    links = {}
+    for i, l in enumerate(_items("links")):
+        a, b = l.get("a"), l.get("b")
+        if a not in nodes or b not in nodes or a == b:
+            continue
+        lid = l.get("id") if isinstance(l.get("id"), str) and l.get("id") else f"lk_{i + 1}"
+        dist = _to_float(l.get("distance"), None)
+        links[lid] = {
+            "id": lid,
+            "a": a,
+            "b": b,
+            "floor": _to_int(l.get("floor"), nodes[a]["floor"]),
+            "lseq": _to_int(l.get("lseq")),
+            "distance": dist if dist is not None and isfinite(dist) and dist >= 0 else None,
+        }
+
+    polygons = {}
+    for i, p in enumerate(_items("polygons")):
+        pid = p.get("id") if isinstance(p.get("id"), str) and p.get("id") else f"pg_{i + 1}"
+        ring = p.get("nodes") if isinstance(p.get("nodes"), list) else []
+        polygons[pid] = {
+            "id": pid,
+            "floor": _to_int(p.get("floor")),
+            "name": p.get("name") if isinstance(p.get("name"), str) else "",
+            "pseq": _to_int(p.get("pseq")),
+            "nodes": [nid for nid in ring if nid in nodes],
+        }
+
+    floors = set(floor_indexes({"_editor": data.get("_editor")}))
+    raw_floors = raw.get("floors") if isinstance(raw.get("floors"), list) else []
+    floors.update(_to_int(f) for f in raw_floors if _num_like(f))
+    floors.update(n["floor"] for n in nodes.values())
+    floors.update(p["floor"] for p in polygons.values())
+    return {
+        "nodes": list(nodes.values()),
+        "links": list(links.values()),
+        "polygons": list(polygons.values()),
+        "floors": sorted(floors),
+    }
+
+
+# 정규 표현 문자열 필드 → 테이블 컬럼 길이 (models.Node/Link/Polygon의 max_length와 같게 유지)
+MAX_LENGTHS = {
+    "nodes": {"id": 64, "name": 255, "special_id": 100},
+    "links": {"id": 150, "a": 64, "b": 64},
+    "polygons": {"id": 64, "name": 255},
+}
+
+
+def check_lengths(canonical: dict):
+    """
+    정규 표현의 id/이름이 테이블 컬럼 길이(MAX_LENGTHS)를 넘지 않는지 검사한다.
+
+    - 넘으면 ValueError. (MySQL strict 모드에서는 행 동기화가 DataError → 500이 되므로
+      저장하기 전에 400으로 거절하기 위함)
+    """
+    for kind, limits in MAX_LENGTHS.items():
+        for item in canonical.get(kind) or ():
+            for key, limit in limits.items():
+                value = item.get(key)
+                if isinstance(value, str) and len(value) > limit:
+                    raise ValueError(f"{kind} {key} is too long (max {limit}): {value[:32]!r}")
+
+
+def _num_like(v) -> bool:
+    return not isinstance(v, bool) and _to_int(v, None) is not None
+
+
+def derive_views(canonical: dict) -> dict:
+    """
+    정규 표현으로부터 serializeToDataFormat()과 같은 모양의 파생 뷰를 만든다.
+
+    반환값 (data에 그대로 덮어쓰면 되는 키들):
+        {
+          "nodes": {...}, "connections": {...}, "special_points": {...},
+          "floors": {"0": {"nodes", "connections", "special_points", "polygons"}, ...},
+          "_editor": {"node_meta": {...}, "links": [...], "shapes": {"polygons": [...]}},
+        }
+
+    - 링크 거리: distance가 주어지면 그 값을, 없으면 노드 좌표의 픽셀 거리(소수 2자리)
+    - 양 끝 노드가 같은 층인 링크만 floors[k].connections 에 들어간다.
+    """
+    nodes = canonical.get("nodes") or []
+    links = canonical.get("links") or []
+    polygons = canonical.get("polygons") or []
+
+    buckets = {}
+
+    def bucket(f):
+        key = str(f)
+        b = buckets.get(key)
+        if b is None:
+            b = buckets[key] = empty_floor_bucket()
+        return b
+
+    for f in canonical.get("floors") or []:
+        bucket(f)
+
+    nodes_obj = {}
+    special = {}
+    node_meta = {}
+    coords = {}
+    for n in nodes:
+        nid = n["id"]
+        item, meta = node_views(n)
+        floor = meta["floor"]
+        nodes_obj[nid] = item
+        coords[nid] = (_to_float(n.get("x")), _to_float(n.get("y")), floor)
+        node_meta[nid] = meta
+
+        b = bucket(floor)
+        b["nodes"][nid] = dict(item)
+        if item.get("special_id"):
+            special[nid] = item["special_id"]
+            b["special_points"][nid] = item["special_id"]
+
+    conn = {}
+    editor_links = []
+    for l in links:
+        a, b = l.get("a"), l.get("b")
+        A, B = coords.get(a), coords.get(b)
+        if A is None or B is None:
+            continue
+        dist = link_distance(l, A, B)
+        conn.setdefault(a, {})[b] = dist
+        conn.setdefault(b, {})[a] = dist
+        if A[2] == B[2]:
+            fc = bucket(A[2])["connections"]
+            fc.setdefault(a, {})[b] = dist
+            fc.setdefault(b, {})[a] = dist
+        editor_links.append(editor_link_view(l))
+
+    shapes = []
+    for p in polygons:
+        bucket_item, shape = polygon_views(p, coords)
+        bucket(shape["floor"])["polygons"].append(bucket_item)
+        shapes.append(shape)
+
+    return {
+        "nodes": nodes_obj,
+        "connections": conn,
+        "special_points": special,
+        "floors": dict(sorted(buckets.items(), key=lambda kv: _to_int(kv[0]))),
+        "_editor": {
+            "node_meta": node_meta,
+            "links": editor_links,
+            "shapes": {"polygons": shapes},
+        },
+    }
+
+
+def apply_views(data: dict, views: dict) -> dict:
+    """
+    derive_views() 결과를 data(dict)에 덮어쓴다.
+
+    - _editor 는 통째로 바꾸지 않고 node_meta / links / shapes 만 교체한다.
+      (floors, floorNames, imageSizes 같은 에디터 메타는 유지)
+    """
+    for key in ("nodes", "connections", "special_points", "floors"):
+        data[key] = views[key]
+    editor = data.get("_editor")
+    editor = dict(editor) if isinstance(editor, dict) else {}
+    editor.update(views["_editor"])
+    data["_editor"] = editor
+    return data
@@ -0,0 +1,763 @@
+# maps/delta.py
+"""
+부분 저장(delta save) 처리 모듈.
+
+PATCH /api/projects/<pid>/delta/ 로 들어오는 두 가지 형식을 data(dict)에 적용한다.
+
+1) RFC 6902 JSON Patch
+    {"base": 12, "ops": [{"op": "replace", "path": "/nodes/N_1/x", "value": 120}, ...]}
+
+2) 노드/링크/폴리곤 diff (에디터가 보내는 형식)
+    {
+      "base": 12,
+      "nodes":    {"N_1": {"x": 120, "y": 40, "floor": 0, ...}, "N_7": null},
+      "links":    {"lk_3": {"a": "N_1", "b": "N_2", "floor": 0, "lseq": 3}},
+      "polygons": {"pg_1": null},
+      "set":      {"scale": 0.33, "meta": {...}},      # 그래프 외 최상위 키 교체
+      "editor":   {"currentFloor": 1, ...}             # _editor 메타 병합
+    }
+    - 값이 null 이면 삭제, dict 이면 추가/수정(주어진 필드만 덮어씀)
+    - 필드 값은 canonical_from_payload와 같은 규칙으로 정리하고,
+      숫자가 아닌 좌표/층 번호, 음수 거리 등은 PatchError(→ 400)로 거절한다.
+    - nodes / connections / floors / special_points / _editor 의 파생 뷰는
+      서버가 바뀐 항목에 걸린 칸만 고쳐서 항상 서로 일관되게 유지한다.
+      (그 변경은 JSON Patch로도 남겨서 리비전 기록에 그대로 쓴다)
+
+base(리비전)가 현재 Project.revision과 다르면 뷰에서 409로 거절한다.
+"""
+from copy import deepcopy
+from math import isfinite
+
+from .canonical import (
+    MAX_LENGTHS, _to_float, _to_int, apply_views, canonical_from_data, derive_views,
+    editor_link_entry, editor_link_view, empty_floor_bucket, link_distance, node_entry,
+    node_views, polygon_views, shape_entry,
+)
+
+
+class PatchError(ValueError):
+    """patch/diff 형식이 잘못되었거나 적용할 수 없을 때 발생."""
+
+
+# ----- RFC 6902 JSON Patch -----
+
+def _parse_pointer(path):
+    """JSON Pointer("/a/b~1c") → ["a", "b/c"]"""
+    if not isinstance(path, str) or (path and not path.startswith("/")):
+        raise PatchError(f"invalid path: {path!r}")
+    if path == "":
+        return []
+    return [p.replace("~1", "/").replace("~0", "~") for p in path[1:].split("/")]
+
+
+def _list_index(container, token, allow_end=False):
+    if allow_end and token == "-":
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token.startswith("0")):
+        raise PatchError(f"invalid array index: {token!r}")
+    i = int(token)
+    limit = len(container) + (1 if allow_end else 0)
+    if i >= limit:
+        raise PatchError(f"array index out of range: {token}")
+    return i
+
+
+def _resolve(doc, tokens):
+    """tokens 경로의 값을 꺼낸다. 없으면 PatchError."""
+    cur = doc
+    for t in tokens:
+        if isinstance(cur, dict):
+            if t not in cur:
+                raise PatchError(f"path not found: /{'/'.join(tokens)}")
+            cur = cur[t]
+        elif isinstance(cur, list):
+            cur = cur[_list_index(cur, t)]
+        else:
+            raise PatchError(f"path not found: /{'/'.join(tokens)}")
+    return cur
+
+
+def _add(doc, tokens, value):
+    if not tokens:
+        return value
+    parent = _resolve(doc, tokens[:-1])
+    last = tokens[-1]
+    if isinstance(parent, dict):
+        parent[last] = value
+    elif isinstance(parent, list):
+        parent.insert(_list_index(parent, last, allow_end=True), value)
+    else:
+        raise PatchError(f"cannot add to /{'/'.join(tokens)}")
+    return doc
+
+
+def _remove(doc, tokens):
+    if not tokens:
+        raise PatchError("cannot remove the document root")
+    parent = _resolve(doc, tokens[:-1])
+    last = tokens[-1]
+    if isinstance(parent, dict):
+        if last not in parent:
+            raise PatchError(f"path not found: /{'/'.join(tokens)}")
+        return parent.pop(last)
+    if isinstance(parent, list):
+        return parent.pop(_list_index(parent, last))
+    raise PatchError(f"path not found: /{'/'.join(tokens)}")
+
+
+def apply_json_patch(doc, ops):
+    """
+    RFC 6902 연산 목록을 doc에 순서대로 적용하고 결과를 돌려준다.
+
+    - 지원: add / remove / replace / move / copy / test
+    - doc은 제자리(in-place)에서 수정된다. 중간에 실패하면 PatchError가 나므로
+      호출하는 쪽에서는 그 doc을 저장하지 않고 버려야 한다.
+    """
+    if not isinstance(ops, list):
+        raise PatchError("ops must be a list")
+
+    for op in ops:
+        if not isinstance(op, dict):
+            raise PatchError("each op must be an object")
+        kind = op.get("op")
+        tokens = _parse_pointer(op.get("path"))
+
+        if kind == "add":
+            if "value" not in op:
+                raise PatchError("add requires value")
+            doc = _add(doc, tokens, op["value"])
+        elif kind == "remove":
+            _remove(doc, tokens)
+        elif kind == "replace":
+            if "value" not in op:
+                raise PatchError("replace requires value")
+            if not tokens:
+                doc = op["value"]
+            else:
+                _resolve(doc, tokens)  # 존재해야 함
+                _remove(doc, tokens)
+                doc = _add(doc, tokens, op["value"])
+        elif kind in ("move", "copy"):
+            src = _parse_pointer(op.get("from"))
+            if kind == "move":
+                if tokens[:len(src)] == src and tokens != src:
+                    raise PatchError("cannot move a value into one of its children")
+                value = _remove(doc, src)
+            else:
+                value = deepcopy(_resolve(doc, src))
+            doc = _add(doc, tokens, value)
+        elif kind == "test":
+            if _resolve(doc, tokens) != op.get("value"):
+                raise PatchError(f"test failed: {op.get('path')}")
+        else:
+            raise PatchError(f"unsupported op: {kind!r}")
+    return doc
+
+
+def _pointer(tokens) -> str:
+    """["a", "b/c"] → "/a/b~1c" """
+    return "".join("/" + str(t).replace("~", "~0").replace("/", "~1") for t in tokens)
+
+
+def diff_json(old, new, tokens=()) -> list:
+    """
+    old → new 로 바꾸는 RFC 6902 연산 목록을 만든다. (apply_json_patch의 반대)
+
+    - dict는 키 단위로 재귀 (추가 add / 삭제 remove / 바뀐 값은 더 들어가서 비교)
+    - 길이가 같은 list는 원소 단위로 재귀, 길이가 다르면 통째로 replace
+    - 스칼라는 타입까지 같아야 같은 값으로 본다. (True와 1, 1과 1.0 구분)
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for k in old:
+            if k not in new:
+                ops.append({"op": "remove", "path": _pointer((*tokens, k))})
+        for k, v in new.items():
+            if k not in old:
+                ops.append({"op": "add", "path": _pointer((*tokens, k)), "value": v})
+            else:
+                ops.extend(diff_json(old[k], v, (*tokens, k)))
+        return ops
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        ops = []
+        for i, (a, b) in enumerate(zip(old, new)):
+            ops.extend(diff_json(a, b, (*tokens, i)))
+        return ops
+    if type(old) is type(new) and not isinstance(old, (dict, list)) and old == new:
+        return []
+    return [{"op": "replace", "path": _pointer(tokens), "value": new}]
+
+
+# ----- 노드/링크/폴리곤 diff -----
+
+NODE_KEYS = ("x", "y", "floor", "name", "special_id", "nseq")
+LINK_KEYS = ("a", "b", "floor", "lseq", "distance")
+POLYGON_KEYS = ("floor", "name", "pseq", "nodes")
+
+# "set"으로 바꿀 수 없는 키 (서버가 파생 뷰로 다시 만드는 키)
+# (canonical은 저장할 때 그래프 전체를 다시 만드는 키라 부분 저장으로는 받지 않는다)
+DERIVED_KEYS = ("nodes", "connections", "special_points", "floors", "_editor", "id", "slug",
+                "canonical")
+# "editor"로 병합할 수 없는 _editor 키
+DERIVED_EDITOR_KEYS = ("node_meta", "links", "shapes")
+# 그래프 파생 뷰가 들어 있는 최상위 키 (_editor는 DERIVED_EDITOR_KEYS만)
+GRAPH_VIEW_KEYS = ("nodes", "connections", "special_points", "floors", "_editor")
+
+
+# 필드별 값 형식 (_coerce_field)
+INT_FIELDS = ("floor", "nseq", "lseq", "pseq")
+FLOAT_FIELDS = ("x", "y")
+STR_FIELDS = ("name", "special_id")
+NODE_REF_FIELDS = ("a", "b")
+
+
+def _check_length(kind, key, value, where):
+    """테이블 컬럼 길이(canonical.MAX_LENGTHS)를 넘는 문자열이면 PatchError"""
+    limit = MAX_LENGTHS.get(kind, {}).get(key)
+    if limit is not None and len(value) > limit:
+        raise PatchError(f"{where} is too long (max {limit})")
+    return value
+
+
+def _coerce_field(kind, item_id, key, value):
+    """diff로 들어온 필드 값 하나를 정리한다. 쓸 수 없는 값이면 PatchError"""
+    where = f"{kind}.{item_id}.{key}"
+    if key in INT_FIELDS:
+        out = None if isinstance(value, bool) else _to_int(value, None)
+        if out is None:
+            raise PatchError(f"{where} must be an integer")
+        return out
+    if key in FLOAT_FIELDS:
+        out = None if isinstance(value, bool) else _to_float(value, None)
+        if out is None or not isfinite(out):
+            raise PatchError(f"{where} must be a finite number")
+        return out
+    if key == "distance":
+        if value is None:
+            return None
+        out = None if isinstance(value, bool) else _to_float(value, None)
+        if out is None or not isfinite(out) or out < 0:
+            raise PatchError(f"{where} must be a non-negative number or null")
+        return out
+    if key in STR_FIELDS:
+        if value is None:
+            return ""
+        if not isinstance(value, str):
+            raise PatchError(f"{where} must be a string")
+        return _check_length(kind, key, value, where)
+    if key in NODE_REF_FIELDS:
+        if not isinstance(value, str) or not value:
+            raise PatchError(f"{where} must be a node id")
+        return _check_length(kind, key, value, where)
+    if key == "nodes":
+        if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+            raise PatchError(f"{where} must be a list of node ids")
+        return list(value)
+    return value
+
+
+def _merge_items(items: dict, changes, keys, kind) -> set:
+    """
+    id → item dict에 변경분을 적용하고, 바뀌거나 지워진 id 집합을 돌려준다.
+    """
+    if changes is None:
+        return set()
+    if not isinstance(changes, dict):
+        raise PatchError(f"{kind} must be an object")
+    touched = set()
+    for item_id, change in changes.items():
+        if change is None:
+            if items.pop(item_id, None) is not None:
+                touched.add(item_id)
+            continue
+        if not isinstance(change, dict):
+            raise PatchError(f"{kind}.{item_id} must be an object or null")
+        _check_length(kind, "id", item_id, f"{kind} id {item_id[:32]!r}")
+        item = items.get(item_id)
+        if item is None:
+            item = items[item_id] = {"id": item_id}
+        for k in keys:
+            if k in change:
+                item[k] = _coerce_field(kind, item_id, k, change[k])
+        touched.add(item_id)
+    return touched
+
+
+class GraphChanges:
+    """
+    apply_graph_diff() 결과.
+
+    - affected: 영향을 받은 노드 id 집합 (바뀐 노드 + 바뀐 링크의 양 끝 노드)
+    - rows    : {"nodes": {id: 정규 표현 항목 또는 None(삭제)}, "links": ..., "polygons": ...}
+                바뀐 항목만 담는다. (relational.sync_project_rows가 이 행들만 고침)
+    - ops     : 그래프 파생 뷰에 한 변경을 그대로 적은 JSON Patch (리비전 기록용)
+
+    옛 형식 data라 파생 뷰 전체를 다시 만든 경우 rows / ops는 None이다.
+    """
+
+    __slots__ = ("affected", "rows", "ops")
+
+    def __init__(self, affected, rows=None, ops=None):
+        self.affected = affected
+        self.rows = rows
+        self.ops = ops
+
+
+def apply_graph_diff(data: dict, diff: dict) -> GraphChanges:
+    """
+    노드/링크/폴리곤 diff를 data에 적용한다. (data는 제자리에서 수정)
+
+    - 노드가 지워지면 그 노드를 쓰는 링크도 지우고, 폴리곤 꼭짓점에서도 뺀다.
+    - 노드가 움직였거나 링크가 바뀌면 해당 링크 거리는 좌표로 다시 계산한다.
+    - data가 이미 파생 뷰를 다 갖고 있으면(지난 저장이 만든 모양) 바뀐 항목에 걸린 칸만
+      고친다. 그렇지 않은 옛 형식이면 정규 표현 전체에서 파생 뷰를 다시 만든다.
+    """
+    if not isinstance(diff, dict):
+        raise PatchError("diff must be an object")
+
+    if _has_views(data):
+        changes = _apply_to_views(data, diff)
+    else:
+        changes = GraphChanges(_rebuild_views(data, diff))
+
+    # 그래프 외 최상위 키 / _editor 메타
+    sets = diff.get("set")
+    if sets is not None:
+        if not isinstance(sets, dict):
+            raise PatchError("set must be an object")
+        for k, v in sets.items():
+            if k in DERIVED_KEYS:
+                raise PatchError(f"cannot set derived key: {k}")
+            data[k] = v
+    editor = diff.get("editor")
+    if editor is not None:
+        if not isinstance(editor, dict):
+            raise PatchError("editor must be an object")
+        for k, v in editor.items():
+            if k in DERIVED_EDITOR_KEYS:
+                raise PatchError(f"cannot set derived editor key: {k}")
+            data["_editor"][k] = v
+
+    return changes
+
+
+def outside_graph(data: dict) -> dict:
+    """
+    data에서 그래프 파생 뷰를 뺀 나머지(meta, scale, images, _editor 메타 …)의 복사본.
+
+    delta 저장 전후의 이 값을 diff_json으로 비교하면 set / editor / normalize가 바꾼 부분의
+    JSON Patch가 된다. (GraphChanges.ops와 합쳐서 리비전 기록에 씀. 크기가 작다)
+    """
+    out = {k: deepcopy(v) for k, v in data.items() if k not in GRAPH_VIEW_KEYS}
+    editor = data.get("_editor")
+    if isinstance(editor, dict):
+        out["_editor"] = {
+            k: deepcopy(v) for k, v in editor.items() if k not in DERIVED_EDITOR_KEYS
+        }
+    return out
+
+
+def _rebuild_views(data: dict, diff: dict) -> set:
+    """옛 형식 data: 정규 표현 전체에 diff를 적용하고 파생 뷰를 다시 만든다. 반환값: affected"""
+    canonical = canonical_from_data(data)
+    nodes = {n["id"]: n for n in canonical["nodes"]}
+    links = {l["id"]: l for l in canonical["links"]}
+    polygons = {p["id"]: p for p in canonical["polygons"]}
+
+    affected = set()
+    link_changes = diff.get("links")
+    if isinstance(link_changes, dict):
+        # 지워질 링크의 양 끝 노드는 지우기 전에 기록
+        for lid, change in link_changes.items():
+            if change is None and lid in links:
+                affected.update((links[lid].get("a"), links[lid].get("b")))
+
+    touched_nodes = _merge_items(nodes, diff.get("nodes"), NODE_KEYS, "nodes")
+    touched_links = _merge_items(links, link_changes, LINK_KEYS, "links")
+    _merge_items(polygons, diff.get("polygons"), POLYGON_KEYS, "polygons")
+
+    affected.update(touched_nodes)
+    for lid, link in list(links.items()):
+        a, b = link.get("a"), link.get("b")
+        if a == b and lid in touched_links:
+            # canonical_from_payload와 같이 자기 자신으로 가는 링크는 받지 않는다.
+            raise PatchError(f"links.{lid} must connect two different nodes")
+        if a not in nodes or b not in nodes:
+            # 없는 노드를 가리키는 링크는 제거
+            links.pop(lid)
+            affected.update((a, b))
+            continue
+        if lid in touched_links or a in touched_nodes or b in touched_nodes:
+            # 클라이언트가 거리를 직접 주지 않았다면 좌표로 다시 계산
+            change = (link_changes or {}).get(lid) or {}
+            if "distance" not in change:
+                link["distance"] = None
+            affected.update((a, b))
+
+    for p in polygons.values():
+        ring = p.get("nodes") if isinstance(p.get("nodes"), list) else []
+        p["nodes"] = [nid for nid in ring if nid in nodes]
+
+    floors = set(canonical["floors"])
+    floors.update(_to_int(n.get("floor")) for n in nodes.values())
+    canonical = {
+        "nodes": list(nodes.values()),
+        "links": list(links.values()),
+        "polygons": list(polygons.values()),
+        "floors": sorted(floors),
+    }
+    apply_views(data, derive_views(canonical))
+    return affected
+
+
+# ----- 파생 뷰 부분 갱신 -----
+
+def _has_views(data: dict) -> bool:
+    """data가 derive_views()가 만든 모양을 다 갖추고 있는지 (부분 갱신 가능 여부)"""
+    editor = data.get("_editor")
+    if not isinstance(editor, dict):
+        return False
+    links, shapes = editor.get("links"), editor.get("shapes")
+    if not (isinstance(data.get("nodes"), dict)
+            and isinstance(data.get("connections"), dict)
+            and isinstance(data.get("special_points"), dict)
+            and isinstance(data.get("floors"), dict)
+            and isinstance(editor.get("node_meta"), dict)
+            and isinstance(links, list)
+            # 링크 목록이 비어 있는데 connections가 있으면 connections가 원본인 옛 형식
+            and (links or not data["connections"])
+            and isinstance(shapes, dict) and isinstance(shapes.get("polygons"), list)):
+        return False
+    for b in data["floors"].values():
+        if not (isinstance(b, dict) and isinstance(b.get("nodes"), dict)
+                and isinstance(b.get("connections"), dict)
+                and isinstance(b.get("special_points"), dict)
+                and isinstance(b.get("polygons"), list)):
+            return False
+    return (all(isinstance(l, dict) and l.get("id") for l in links)
+            and all(isinstance(p, dict) and p.get("id") for p in shapes["polygons"]))
+
+
+_MISSING = object()
+
+
+def _parent(doc, tokens):
+    for t in tokens[:-1]:
+        doc = doc[t]
+    return doc
+
+
+def _put(doc, ops, tokens, value):
+    """tokens 위치(dict 키 또는 list 칸)를 value로 바꾸고 ops에 적는다. 이미 같으면 그대로 둔다."""
+    parent, last = _parent(doc, tokens), tokens[-1]
+    if isinstance(parent, list):
+        if parent[last] == value:
+            return
+        parent[last] = value
+        op = "replace"
+    else:
+        if parent.get(last, _MISSING) == value:
+            return
+        parent[last] = value
+        op = "add"
+    ops.append({"op": op, "path": _pointer(tokens), "value": deepcopy(value)})
+
+
+def _insert(doc, ops, tokens, value):
+    """list의 tokens[-1] 번째 칸에 value를 끼워 넣는다."""
+    _parent(doc, tokens).insert(tokens[-1], value)
+    ops.append({"op": "add", "path": _pointer(tokens), "value": deepcopy(value)})
+
+
+def _drop(doc, ops, tokens):
+    """tokens 위치를 지운다. (dict 키가 없으면 아무것도 하지 않음)"""
+    parent, last = _parent(doc, tokens), tokens[-1]
+    if isinstance(parent, dict) and last not in parent:
+        return
+    parent.pop(last)
+    ops.append({"op": "remove", "path": _pointer(tokens)})
+
+
+def _apply_to_views(data: dict, diff: dict) -> GraphChanges:
+    """
+    파생 뷰를 갖춘 data에 diff를 적용하면서, 바뀐 항목에 걸린 칸만 고친다.
+
+    결과는 정규 표현 전체에서 derive_views()로 다시 만든 것과 같다. (dict 키 순서만 다를 수 있음)
+    전체를 도는 것은 링크/폴리곤 목록에서 id를 찾는 가벼운 훑기뿐이다.
+    """
+    nodes_view, conn = data["nodes"], data["connections"]
+    special, buckets = data["special_points"], data["floors"]
+    editor = data["_editor"]
+    node_meta, elinks = editor["node_meta"], editor["links"]
+    shapes = editor["shapes"]["polygons"]
+    ops = []
+
+    def floor_now(nid):
+        # routing.node_floor_map과 같은 우선순위 (node_meta → 층 버킷 → 0층)
+        m = node_meta.get(nid)
+        if isinstance(m, dict) and m.get("floor") is not None:
+            f = _to_int(m["floor"], None)
+            if f is not None:
+                return f
+        for key, b in buckets.items():
+            if nid in b["nodes"] and _to_int(key, None) is not None:
+                return int(key)
+        return 0
+
+    def stored_distance(a, b):
+        row = conn.get(a)
+        if isinstance(row, dict) and b in row:
+            return _to_float(row[b], None)
+        return None
+
+    def bucket(f):
+        key = str(f)
+        if key not in buckets:
+            _put(data, ops, ("floors", key), empty_floor_bucket())
+        return key
+
+    # ----- 노드 -----
+    node_changes = diff.get("nodes")
+    old_nodes = {}
+    if isinstance(node_changes, dict):
+        for nid in node_changes:
+            if nid in nodes_view:
+                old_nodes[nid] = node_entry(nid, nodes_view[nid], node_meta.get(nid), floor_now(nid))
+    new_nodes = {nid: dict(n) for nid, n in old_nodes.items()}
+    touched_nodes = _merge_items(new_nodes, node_changes, NODE_KEYS, "nodes")
+
+    def alive(nid):
+        return nid in new_nodes if nid in touched_nodes else nid in nodes_view
+
+    coords = {}
+
+    def xy(nid):
+        # 바뀐 뒤 좌표 (x, y, 층)
+        c = coords.get(nid)
+        if c is None:
+            n = new_nodes.get(nid) if nid in touched_nodes else None
+            if n is None:
+                v = nodes_view.get(nid) if isinstance(nodes_view.get(nid), dict) else {}
+                n = {"x": v.get("x"), "y": v.get("y"), "floor": floor_now(nid)}
+            c = coords[nid] = (_to_float(n.get("x")), _to_float(n.get("y")), _to_int(n.get("floor")))
+        return c
+
+    def old_floor(nid):
+        return old_nodes[nid]["floor"] if nid in old_nodes else floor_now(nid)
+
+    # ----- 링크 -----
+    link_changes = diff.get("links")
+    lindex = {}
+    examined = set(link_changes) if isinstance(link_changes, dict) else set()
+    for i, l in enumerate(elinks):
+        lindex[l["id"]] = i
+        if l.get("a") in touched_nodes or l.get("b") in touched_nodes:
+            examined.add(l["id"])
+
+    def link_now(lid):
+        l = elinks[lindex[lid]]
+        a = l.get("a")
+        return editor_link_entry(l, lindex[lid], floor_now(a), stored_distance(a, l.get("b")))
+
+    old_links = {lid: link_now(lid)
+                 for lid in sorted((lid for lid in examined if lid in lindex), key=lindex.get)}
+    affected = set()
+    if isinstance(link_changes, dict):
+        # 지워질 링크의 양 끝 노드는 지우기 전에 기록
+        for lid, change in link_changes.items():
+            if change is None and lid in old_links:
+                affected.update((old_links[lid]["a"], old_links[lid]["b"]))
+    new_links = {lid: dict(l) for lid, l in old_links.items()}
+    touched_links = _merge_items(new_links, link_changes, LINK_KEYS, "links")
+
+    affected.update(touched_nodes)
+    for lid, link in list(new_links.items()):
+        a, b = link.get("a"), link.get("b")
+        if a == b and lid in touched_links:
+            # canonical_from_payload와 같이 자기 자신으로 가는 링크는 받지 않는다.
+            raise PatchError(f"links.{lid} must connect two different nodes")
+        if not alive(a) or not alive(b):
+            # 없는 노드를 가리키는 링크는 제거
+            new_links.pop(lid)
+            affected.update((a, b))
+            continue
+        if lid in touched_links or a in touched_nodes or b in touched_nodes:
+            # 클라이언트가 거리를 직접 주지 않았다면 좌표로 다시 계산
+            change = (link_changes or {}).get(lid) or {}
+            if "distance" not in change:
+                link["distance"] = None
+            affected.update((a, b))
+
+    # ----- 폴리곤 -----
+    poly_changes = diff.get("polygons")
+    pindex = {}
+    examined = set(poly_changes) if isinstance(poly_changes, dict) else set()
+    for i, p in enumerate(shapes):
+        pindex[p["id"]] = i
+        if any(isinstance(nid, str) and nid in touched_nodes for nid in p.get("nodes") or ()):
+            examined.add(p["id"])
+    old_polys = {pid: shape_entry(shapes[pindex[pid]], pindex[pid])
+                 for pid in sorted((pid for pid in examined if pid in pindex), key=pindex.get)}
+    new_polys = {pid: dict(p) for pid, p in old_polys.items()}
+    _merge_items(new_polys, poly_changes, POLYGON_KEYS, "polygons")
+    for p in new_polys.values():
+        ring = p.get("nodes") if isinstance(p.get("nodes"), list) else []
+        p["nodes"] = [nid for nid in ring if alive(nid)]
+
+    # ----- 노드 뷰 쓰기 -----
+    if isinstance(editor.get("floors"), int):
+        for f in range(max(0, editor["floors"])):
+            bucket(f)
+    touched_order = [nid for nid in node_changes if nid in touched_nodes] if touched_nodes else []
+    for nid in touched_order:
+        old, new = old_nodes.get(nid), new_nodes.get(nid)
+        if old is not None and (new is None or _to_int(new.get("floor")) != old["floor"]):
+            key = str(old["floor"])
+            if key in buckets:
+                _drop(data, ops, ("floors", key, "nodes", nid))
+                _drop(data, ops, ("floors", key, "special_points", nid))
+        if new is None:
+            _drop(data, ops, ("nodes", nid))
+            _drop(data, ops, ("_editor", "node_meta", nid))
+            _drop(data, ops, ("special_points", nid))
+            continue
+        item, meta = node_views(new)
+        key = bucket(meta["floor"])
+        _put(data, ops, ("nodes", nid), item)
+        _put(data, ops, ("_editor", "node_meta", nid), meta)
+        _put(data, ops, ("floors", key, "nodes", nid), dict(item))
+        if item.get("special_id"):
+            _put(data, ops, ("special_points", nid), item["special_id"])
+            _put(data, ops, ("floors", key, "special_points", nid), item["special_id"])
+        else:
+            _drop(data, ops, ("special_points", nid))
+            _drop(data, ops, ("floors", key, "special_points", nid))
+
+    # ----- 링크 뷰 쓰기 -----
+    # connections는 노드 쌍마다 한 칸이라, 같은 쌍을 잇는 링크가 여럿이면 목록에서 마지막
+    # 링크의 거리가 남는다. (derive_views와 같음) 그래서 바뀐 링크가 걸친 쌍은 그 쌍의
+    # 링크를 모두 모아서 다시 쓴다.
+    def pair(a, b):
+        return (a, b) if a <= b else (b, a)
+
+    pairs = {pair(l["a"], l["b"]): [] for l in (*old_links.values(), *new_links.values())
+             if isinstance(l.get("a"), str) and isinstance(l.get("b"), str)}
+    if pairs:
+        for i, l in enumerate(elinks):
+            lid = l["id"]
+            if lid in old_links:
+                l = new_links.get(lid)
+                if l is None:
+                    continue
+            elif not (isinstance(l.get("a"), str) and isinstance(l.get("b"), str)):
+                continue
+            p = pair(l["a"], l["b"])
+            if p in pairs:
+                pairs[p].append(lid if lid in new_links else link_now(lid))
+        for lid, l in new_links.items():
+            if lid not in lindex:
+                pairs[pair(l["a"], l["b"])].append(lid)
+
+    link_rows = {}
+    for (u, v), members in pairs.items():
+        members = [new_links[m] if isinstance(m, str) else m for m in members]
+        dist = None
+        if members:
+            last = members[-1]
+            dist = link_distance(last, xy(last["a"]), xy(last["b"]))
+        # 예전 층 버킷 칸
+        fu, fv = old_floor(u), old_floor(v)
+        if fu == fv and str(fu) in buckets and (dist is None or xy(u)[2] != fu or xy(v)[2] != fu):
+            for a, b in ((u, v), (v, u)):
+                _drop_pair(data, ops, ("floors", str(fu), "connections"), a, b)
+        for a, b in ((u, v), (v, u)):
+            if dist is None:
+                _drop_pair(data, ops, ("connections",), a, b)
+            else:
+                if a not in conn:
+                    _put(data, ops, ("connections", a), {})
+                _put(data, ops, ("connections", a, b), dist)
+        if dist is not None and xy(u)[2] == xy(v)[2]:
+            key = bucket(xy(u)[2])
+            fc = buckets[key]["connections"]
+            for a, b in ((u, v), (v, u)):
+                if a not in fc:
+                    _put(data, ops, ("floors", key, "connections", a), {})
+                _put(data, ops, ("floors", key, "connections", a, b), dist)
+        for l in members:
+            # 행 값은 canonical_from_data가 쓴 뷰에서 읽는 값과 같게
+            link_rows[l["id"]] = editor_link_entry(editor_link_view(l), 0, 0,
+                                                   _to_float(dist, None))
+
+    # _editor.links: 바뀐 칸 교체 → 지운 칸 (뒤에서부터) → 새 링크는 끝에
+    for lid, l in new_links.items():
+        if lid in lindex:
+            _put(data, ops, ("_editor", "links", lindex[lid]), editor_link_view(l))
+    for i in sorted((lindex[lid] for lid in old_links if lid not in new_links), reverse=True):
+        _drop(data, ops, ("_editor", "links", i))
+    for lid, l in new_links.items():
+        if lid not in lindex:
+            _insert(data, ops, ("_editor", "links", len(elinks)), editor_link_view(l))
+    for lid in old_links:
+        if lid not in new_links:
+            link_rows[lid] = None
+
+    # ----- 폴리곤 뷰 쓰기 -----
+    shape_views = {}
+    for pid, p in new_polys.items():
+        ring_xy = {nid: xy(nid) for nid in p["nodes"]}
+        shape_views[pid] = polygon_views(p, ring_xy)
+    for pid, (_, shape) in shape_views.items():
+        if pid in pindex:
+            _put(data, ops, ("_editor", "shapes", "polygons", pindex[pid]), shape)
+    for i in sorted((pindex[pid] for pid in old_polys if pid not in new_polys), reverse=True):
+        _drop(data, ops, ("_editor", "shapes", "polygons", i))
+    for pid, (_, shape) in shape_views.items():
+        if pid not in pindex:
+            _insert(data, ops, ("_editor", "shapes", "polygons", len(shapes)), shape)
+
+    # floors[k].polygons: 층 안에서는 _editor.shapes.polygons 순서를 따른다.
+    order = {p["id"]: i for i, p in enumerate(shapes)} if new_polys or old_polys else {}
+    for pid, old in old_polys.items():
+        new = new_polys.get(pid)
+        if new is None or _to_int(new.get("floor")) != old["floor"]:
+            key = str(old["floor"])
+            if key in buckets:
+                for j, q in enumerate(buckets[key]["polygons"]):
+                    if isinstance(q, dict) and q.get("id") == pid:
+                        _drop(data, ops, ("floors", key, "polygons", j))
+                        break
+    for pid, (bucket_item, shape) in shape_views.items():
+        key = bucket(shape["floor"])
+        plist = buckets[key]["polygons"]
+        at = next((j for j, q in enumerate(plist)
+                   if isinstance(q, dict) and q.get("id") == pid), None)
+        if at is not None:
+            _put(data, ops, ("floors", key, "polygons", at), bucket_item)
+            continue
+        at = sum(1 for q in plist
+                 if isinstance(q, dict) and order.get(q.get("id"), len(order)) < order[pid])
+        _insert(data, ops, ("floors", key, "polygons", at), bucket_item)
+
+    rows = {
+        # 병합한 항목에는 준 필드만 있을 수 있으므로 node_entry로 기본값을 채운다.
+        "nodes": {nid: node_entry(nid, new_nodes[nid], new_nodes[nid],
+                                  _to_int(new_nodes[nid].get("floor")))
+                  if nid in new_nodes else None
+                  for nid in touched_order},
+        "links": link_rows,
+        "polygons": {pid: shape_entry(shape_views[pid][1], 0) if pid in shape_views else None
+                     for pid in {**old_polys, **new_polys}},
+    }
+    return GraphChanges(affected, rows, ops)
+
+
+def _drop_pair(data, ops, tokens, a, b):
+    """tokens 아래 connections 모양 dict에서 a → b 칸을 지우고, a 줄이 비면 그 줄도 지운다."""
+    table = _parent(data, (*tokens, None))
+    row = table.get(a)
+    if not isinstance(row, dict) or b not in row:
+        return
+    _drop(data, ops, (*tokens, a, b))
+    if not row:
+        _drop(data, ops, (*tokens, a))
@@ -0,0 +1,66 @@
+# maps/encoding.py
+"""
+응답 본문 압축(Content-Encoding) 헬퍼.
+
+- brotli 패키지가 설치되어 있으면 br, 없으면 gzip만 쓴다. (brotli는 선택 의존성)
+- 압축 결과는 호출하는 쪽이 리비전별로 캐시한다. (Project.to_response_bytes)
+"""
+import gzip
+
+try:
+    import brotli
+except ImportError:  # 선택 의존성
+    brotli = None
+
+# 서버가 우선하는 순서
+SUPPORTED = ("br", "gzip") if brotli is not None else ("gzip",)
+
+# 이보다 작은 본문은 압축하지 않는다. (헤더/CPU 비용이 더 큼)
+MIN_COMPRESS_BYTES = 1024
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def _accepted(header: str) -> dict:
+    """Accept-Encoding 헤더 → {코딩: q값}"""
+    out = {}
+    for part in (header or "").split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        for p in params.split(";"):
+            k, _, v = p.strip().partition("=")
+            if k.strip() == "q":
+                try:
+                    q = float(v)
+                except ValueError:
+                    q = 0.0
+        out[token] = q
+    return out
+
+
+def pick_encoding(accept_encoding: str, size: int) -> str:
+    """
+    클라이언트가 받을 수 있는 압축 방식 중 서버가 우선하는 것.
+    없거나 본문이 작으면 "identity".
+    """
+    if size < MIN_COMPRESS_BYTES:
+        return "identity"
+    accepted = _accepted(accept_encoding)
+    for coding in SUPPORTED:
+        q = accepted.get(coding, accepted.get("*", 0.0))
+        if q > 0:
+            return coding
+    return "identity"
+
+
+def compress(body: bytes, coding: str) -> bytes:
+    if coding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if coding == "gzip":
+        # mtime=0: 같은 본문이면 항상 같은 bytes
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    return body
@@ -3,33 +3,275 @@
 프로젝트를 TXT 포맷(node.txt, link.txt, arrow.txt, polygon.txt, core.txt)으로
 내보내기(export) 하기 위한 모듈.
 
-- 현재는 골격만 있고, 실제 로직은 아직 구현되지 않은 상태.
-- 나중에 요구사항에 맞춰 프로젝트 데이터를 가공해서
-  여러 개의 텍스트 파일을 만들고, zip으로 묶어 반환하도록 구현하면 된다.
+- 각 파일은 탭(\t)으로 구분된 텍스트이며, 첫 줄은 '#'으로 시작하는 헤더다.
+- 다섯 파일을 ZIP 하나로 묶되, 파일 내용을 한 번에 만들지 않고
+  nodes / connections / floors[*].polygons 를 한 줄씩 읽어서 바로 ZIP에 쓴다.
+- export_project_to_txt()는 ZIP bytes 조각을 내보내는 generator라서
+  StreamingHttpResponse에 그대로 넘기면 만들어지는 대로 전송된다.
+  (10만 노드짜리 캠퍼스도 메모리 사용량이 거의 일정하고, 첫 바이트가 바로 나간다)
+
+파일 형식
+---------
+node.txt    : node_id, floor, x, y, name, special_id
+link.txt    : link_id, from, to, from_floor, to_floor, distance_px, distance_m
+arrow.txt   : from, to, distance_px, bearing_deg   (방향별 한 줄, 방위각은 북쪽 0° 시계방향)
+polygon.txt : polygon_id, floor, name, node_ids(쉼표 구분), points("x y" 세미콜론 구분)
+core.txt    : key, value   (프로젝트 이름, scale, 층 수, north_reference 등)
 """
+import zipfile
+from math import atan2, degrees, isfinite
+
+from .routing import node_floor_map, project_scale
+
+# ZIP에 쓸 파일 이름 (순서대로 기록됨)
+EXPORT_FILES = ("node.txt", "link.txt", "arrow.txt", "polygon.txt", "core.txt")
+
+# 이 크기만큼 쌓이면 응답으로 내보낸다. (bytes)
+CHUNK_SIZE = 16 * 1024
+
+# 몇 줄씩 묶어서 ZIP 엔트리에 쓸지 (write 호출 횟수 줄이기)
+LINES_PER_WRITE = 512
+
+
+# 문자열 값 안의 탭/줄바꿈은 공백으로 바꾼다. (행/열 구분이 깨지지 않도록)
+_CLEAN = str.maketrans({"\t": " ", "\r": " ", "\n": " "})
+
+
+def _fmt(v) -> str:
+    """숫자는 소수 2자리까지, 정수로 떨어지면 정수로. 문자열의 탭/줄바꿈은 공백으로."""
+    t = type(v)
+    if t is str:
+        return v.translate(_CLEAN)
+    if t is int:
+        return str(v)
+    if t is float:
+        if not isfinite(v):
+            return ""
+        v = round(v, 2)
+        return str(int(v)) if v.is_integer() else str(v)
+    if v is None:
+        return ""
+    return str(v).translate(_CLEAN)
+
+
+def _row(*cols) -> str:
+    return "\t".join(_fmt(c) for c in cols) + "\n"
+
+
+def _as_dict(v):
+    return v if isinstance(v, dict) else {}
+
+
+def _xy(node):
+    try:
+        return float(node.get("x") or 0), float(node.get("y") or 0)
+    except (TypeError, ValueError, AttributeError):
+        return 0.0, 0.0
+
+
+# ----- 파일별 행 generator -----
+
+def iter_node_rows(project: dict, floor_of: dict):
+    yield "# node_id\tfloor\tx\ty\tname\tspecial_id\n"
+    for nid, v in _as_dict(project.get("nodes")).items():
+        v = _as_dict(v)
+        x, y = _xy(v)
+        yield _row(nid, floor_of.get(nid, 0), x, y, v.get("name") or "", v.get("special_id") or "")
+
+
+def _iter_links(project: dict):
+    """connections에서 무방향 링크 (a, b, 거리)를 하나씩 꺼낸다. (양방향이면 한 번만)"""
+    nodes = _as_dict(project.get("nodes"))
+    conn = _as_dict(project.get("connections"))
+    for a, row in conn.items():
+        if a not in nodes or not isinstance(row, dict):
+            continue
+        for b, w in row.items():
+            if b not in nodes:
+                continue
+            back = conn.get(b)
+            if a < b or not (isinstance(back, dict) and a in back):
+                yield a, b, w
+
+
+def iter_link_rows(project: dict, floor_of: dict):
+    scale = project_scale(project)
+    yield "# link_id\tfrom\tto\tfrom_floor\tto_floor\tdistance_px\tdistance_m\n"
+    for i, (a, b, w) in enumerate(_iter_links(project), start=1):
+        try:
+            w = float(w)
+        except (TypeError, ValueError):
+            w = None
+        meters = w * scale if (w is not None and scale) else None
+        yield _row(f"L_{i}", a, b, floor_of.get(a, 0), floor_of.get(b, 0), w, meters)
+
+
+def _north_offset(project: dict) -> float:
+    """
+    이미지 좌표계의 각도를 실제 방위각으로 바꾸기 위한 보정값(도).
+
+    north_reference = {from_node, to_node, azimuth} 는
+    'from → to 방향이 방위각 azimuth 도'라는 뜻이다.
+    없으면 이미지 위쪽을 북쪽(0°)으로 본다.
+    """
+    nr = _as_dict(project.get("north_reference"))
+    nodes = _as_dict(project.get("nodes"))
+    a, b = nodes.get(nr.get("from_node")), nodes.get(nr.get("to_node"))
+    try:
+        azimuth = float(nr.get("azimuth") or 0)
+    except (TypeError, ValueError):
+        azimuth = 0.0
+    if not isinstance(a, dict) or not isinstance(b, dict):
+        return azimuth
+    (ax, ay), (bx, by) = _xy(a), _xy(b)
+    if ax == bx and ay == by:
+        return azimuth
+    return azimuth - _image_bearing(ax, ay, bx, by)
+
+
+def _image_bearing(ax, ay, bx, by) -> float:
+    """이미지 좌표(y가 아래로 증가)에서 위쪽 기준 시계방향 각도(도)."""
+    return degrees(atan2(bx - ax, ay - by)) % 360.0
+
+
+def iter_arrow_rows(project: dict, floor_of: dict):
+    nodes = _as_dict(project.get("nodes"))
+    conn = _as_dict(project.get("connections"))
+    offset = _north_offset(project)
+    yield "# from\tto\tdistance_px\tbearing_deg\n"
+    for a, row in conn.items():
+        if a not in nodes or not isinstance(row, dict):
+            continue
+        ax, ay = _xy(_as_dict(nodes[a]))
+        for b, w in row.items():
+            if b not in nodes:
+                continue
+            bx, by = _xy(_as_dict(nodes[b]))
+            # 같은 위치(엘리베이터 등 층간 이동)는 방향이 없으므로 비워 둔다.
+            bearing = None
+            if ax != bx or ay != by:
+                bearing = (_image_bearing(ax, ay, bx, by) + offset) % 360.0
+            try:
+                w = float(w)
+            except (TypeError, ValueError):
+                w = None
+            yield _row(a, b, w, bearing)
+
+
+def iter_polygon_rows(project: dict, floor_of: dict):
+    nodes = _as_dict(project.get("nodes"))
+    yield "# polygon_id\tfloor\tname\tnode_ids\tpoints\n"
+    for key, bucket in _as_dict(project.get("floors")).items():
+        polys = _as_dict(bucket).get("polygons")
+        if not isinstance(polys, list):
+            continue
+        for p in polys:
+            p = _as_dict(p)
+            ring = [nid for nid in (p.get("nodes") or []) if isinstance(nid, str)]
+            pts = []
+            for nid in ring:
+                if nid in nodes:
+                    x, y = _xy(_as_dict(nodes[nid]))
+                    pts.append(f"{_fmt(x)} {_fmt(y)}")
+            yield _row(p.get("id") or "", key, p.get("name") or "",
+                       ",".join(ring), ";".join(pts))
+
+
+def iter_core_rows(project: dict, floor_of: dict):
+    meta = _as_dict(project.get("meta"))
+    editor = _as_dict(project.get("_editor"))
+    nr = _as_dict(project.get("north_reference"))
+    floors = _as_dict(project.get("floors"))
+    yield "# key\tvalue\n"
+    yield _row("project_name", meta.get("projectName") or "")
+    yield _row("project_author", meta.get("projectAuthor") or "")
+    yield _row("scale_m_per_px", project_scale(project))
+    yield _row("floors", editor.get("floors") if isinstance(editor.get("floors"), int) else len(floors))
+    yield _row("start_floor", editor.get("startFloor") if editor.get("startFloor") is not None else project.get("startFloor"))
+    yield _row("north_from_node", nr.get("from_node") or "")
+    yield _row("north_to_node", nr.get("to_node") or "")
+    yield _row("north_azimuth", nr.get("azimuth"))
+    yield _row("node_count", len(_as_dict(project.get("nodes"))))
+
+
+ROW_WRITERS = {
+    "node.txt": iter_node_rows,
+    "link.txt": iter_link_rows,
+    "arrow.txt": iter_arrow_rows,
+    "polygon.txt": iter_polygon_rows,
+    "core.txt": iter_core_rows,
+}
+
+
+def iter_export_files(project: dict):
+    """(파일 이름, 줄 generator) 쌍을 EXPORT_FILES 순서대로 내보낸다."""
+    project = _as_dict(project)
+    floor_of = node_floor_map(project)
+    for name in EXPORT_FILES:
+        yield name, ROW_WRITERS[name](project, floor_of)
+
+
+class _ChunkSink:
+    """
+    ZipFile이 쓰는 bytes를 모아두는 쓰기 전용 파일 객체.
+
+    tell()/seek()를 제공하지 않으므로 zipfile은 '스트리밍 모드'(data descriptor 사용)로
+    동작하고, 이미 쓴 부분을 되돌아가서 고치지 않는다.
+    """
+
+    def __init__(self):
+        self._parts = []
+        self.size = 0
+
+    def write(self, b):
+        self._parts.append(bytes(b))
+        self.size += len(b)
+        return len(b)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        out = b"".join(self._parts)
+        self._parts.clear()
+        self.size = 0
+        return out
 
 
 def export_project_to_txt(project: dict):
     """
-    주어진 프로젝트(dict)를 TXT 파일 포맷들로 변환하는 함수 (미구현).
+    주어진 프로젝트(dict)를 TXT 파일 5개가 든 ZIP으로 변환하는 generator.
 
     파라미터
     --------
     project : dict
         DB에 저장된 Project.data (이미 JSON → dict로 로드된 상태)
 
-    예상 동작 (TODO)
-    ---------------
-    1) project 안의 nodes / connections / polygons / north_reference 등을 읽는다.
-    2) 각각을 요구 포맷에 맞게 문자열로 변환:
-       - node.txt
-       - link.txt
-       - arrow.txt
-       - polygon.txt
-       - core.txt
-    3) 텍스트 파일 5개를 zip에 담아서 반환하거나,
-       Django HttpResponse로 넘길 수 있는 형태(bytes 등)로 만들어준다.
-
-    현재는 아직 스펙이 확정되지 않았으므로 NotImplementedError만 발생시킨다.
+    반환값
+    ------
+    ZIP 파일 bytes 조각들을 순서대로 내보내는 generator.
+    이어 붙이면 완전한 ZIP 파일이 된다.
+
+        resp = StreamingHttpResponse(export_project_to_txt(obj.data),
+                                     content_type="application/zip")
     """
-    raise NotImplementedError("export_project_to_txt() is not implemented yet.")
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, lines in iter_export_files(project):
+            with zf.open(name, mode="w") as fh:
+                batch = []
+                for line in lines:
+                    batch.append(line)
+                    if len(batch) >= LINES_PER_WRITE:
+                        fh.write("".join(batch).encode("utf-8"))
+                        batch.clear()
+                        if sink.size >= CHUNK_SIZE:
+                            yield sink.drain()
+                if batch:
+                    fh.write("".join(batch).encode("utf-8"))
+            if sink.size:
+                yield sink.drain()
+    # 중앙 디렉터리(central directory)
+    tail = sink.drain()
+    if tail:
+        yield tail
@@ -0,0 +1,140 @@
+# maps/floors.py
+"""
+층 단위 지연 로딩용 분할.
+
+30층짜리 건물도 GET /api/projects/<pid>/ 는 모든 층을 한 번에 내려준다.
+에디터/뷰어는 한 번에 한 층(state.currentFloor)만 보여 주므로, 층마다 따로 받을 수 있도록
+리비전마다 한 번 층별 문서로 나눠서 project_cache에 "floors"로 보관한다.
+
+- 매니페스트 (floors/)
+    {"id", "slug", "revision", "scale", "north_reference", "meta", "editor",
+     "floors": [{"floor", "name", "image", "width", "height",
+                 "nodes", "links", "polygons", "stubs", "bytes", "etag", "url"}, ...]}
+    editor: _editor 중 그래프 파생 키(node_meta / links / shapes)를 뺀 나머지 (floorNames 등)
+- 층 문서 (floors/<k>/)
+    {"floor", "name", "image", "width", "height",
+     "nodes": {...}, "connections": {...}, "special_points": {...},   # floors[k] 버킷과 같은 모양
+     "node_meta": {...}, "links": [...],                               # _editor 중 이 층 것만
+     "polygons": [...],                                                # _editor.shapes.polygons 모양
+     "stubs": [{"link", "node", "to", "to_floor", "distance"}, ...]}  # 다른 층으로 가는 링크
+- 층 문서의 ETag는 내용 해시라서 다른 층만 바뀐 저장 뒤에도 그대로다.
+  (클라이언트는 매니페스트의 etag가 바뀐 층만 다시 받으면 된다)
+"""
+import hashlib
+import json
+
+from .cache import project_cache
+from .canonical import canonical_from_data, derive_views
+from .delta import DERIVED_EDITOR_KEYS
+from .relational import floor_rows
+
+
+class FloorSplit:
+    """한 리비전의 층별 문서 bytes와 매니페스트 항목"""
+
+    __slots__ = ("floors", "bodies", "etags")
+
+    def __init__(self, floors, bodies, etags):
+        self.floors = floors      # 매니페스트 "floors" 항목 목록 (url 제외)
+        self.bodies = bodies      # 층 번호 → JSON bytes
+        self.etags = etags        # 층 번호 → ETag
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(b) for b in self.bodies.values()) + 512 * len(self.floors) + 256
+
+
+def _to_int(v):
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return 0
+
+
+def split_floors(data: dict, pid=0) -> FloorSplit:
+    """data를 층별 문서로 나눈다. O(문서 크기)"""
+    canonical = canonical_from_data(data)
+    views = derive_views(canonical)
+    floor_of = {n["id"]: _to_int(n.get("floor")) for n in canonical["nodes"]}
+    node_meta = views["_editor"]["node_meta"]
+    connections = views["connections"]
+
+    docs = {}
+    for key, bucket in views["floors"].items():
+        f = _to_int(key)
+        docs[f] = {
+            "floor": f,
+            **bucket,
+            "node_meta": {nid: node_meta[nid] for nid in bucket["nodes"] if nid in node_meta},
+            "links": [],
+            "polygons": [],
+            "stubs": [],
+        }
+
+    for link in views["_editor"]["links"]:
+        a, b = link["a"], link["b"]
+        fa, fb = floor_of[a], floor_of[b]
+        if fa == fb:
+            docs[fa]["links"].append(link)
+            continue
+        # 층을 건너는 링크(계단/엘리베이터)는 양쪽 층에 끝이 하나뿐인 stub으로 넣는다.
+        dist = connections.get(a, {}).get(b)
+        docs[fa]["stubs"].append({"link": link["id"], "node": a, "to": b, "to_floor": fb,
+                                  "distance": dist})
+        docs[fb]["stubs"].append({"link": link["id"], "node": b, "to": a, "to_floor": fa,
+                                  "distance": dist})
+
+    for shape in views["_editor"]["shapes"]["polygons"]:
+        docs[shape["floor"]]["polygons"].append(shape)
+
+    info = floor_rows(data, sorted(docs))
+    floors, bodies, etags = [], {}, {}
+    for f in sorted(docs):
+        doc = docs[f]
+        meta = info.get(f, {})
+        # 층 정보는 본문 앞쪽에 오도록
+        doc = {"floor": f, **meta, **{k: v for k, v in doc.items() if k != "floor"}}
+        body = json.dumps(doc, ensure_ascii=False).encode("utf-8")
+        etag = f'"{pid}-f{f}-{hashlib.sha1(body).hexdigest()[:20]}"'
+        bodies[f] = body
+        etags[f] = etag
+        floors.append({
+            "floor": f,
+            **meta,
+            "nodes": len(doc["nodes"]),
+            "links": len(doc["links"]),
+            "polygons": len(doc["polygons"]),
+            "stubs": len(doc["stubs"]),
+            "bytes": len(body),
+            "etag": etag,
+        })
+    return FloorSplit(floors, bodies, etags)
+
+
+def get_floor_split(project) -> FloorSplit:
+    """현재 리비전의 층 분할 (project_cache "floors")"""
+    return project_cache.get_or_build(
+        project,
+        "floors",
+        lambda: split_floors(project.data if isinstance(project.data, dict) else {}, project.pk),
+    )
+
+
+def floor_manifest(project) -> dict:
+    """floors/ 응답"""
+    data = project.data if isinstance(project.data, dict) else {}
+    editor = data.get("_editor") if isinstance(data.get("_editor"), dict) else {}
+    split = get_floor_split(project)
+    return {
+        "id": project.pk,
+        "slug": project.slug,
+        "revision": project.revision,
+        "scale": data.get("scale"),
+        "north_reference": data.get("north_reference"),
+        "meta": data.get("meta") or {},
+        "editor": {k: v for k, v in editor.items() if k not in DERIVED_EDITOR_KEYS},
+        "floors": [
+            {**item, "url": f"/api/projects/{project.pk}/floors/{item['floor']}/"}
+            for item in split.floors
+        ],
+    }
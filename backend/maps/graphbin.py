@@ -0,0 +1,289 @@
+# maps/graphbin.py
+"""
+모바일/임베디드 클라이언트용 바이너리 그래프 형식 (graph.bin).
+
+JSON의 nodes / connections 는 "N_12" 같은 문자열 키 dict라서 저사양 기기에서
+앱을 켤 때마다 파싱하는 비용과 메모리가 크다. graph.bin은 타입이 정해진
+배열들을 8바이트 경계에 맞춰 이어 붙인 파일이라 mmap 후 그대로(zero-copy) 쓸 수 있다.
+
+파일 구조 (리틀 엔디언)
+----------------------
+    header  : magic "IMGB", version(uint16), 예약(uint16), revision(uint64),
+              scale(float64, m/pixel, 없으면 0), 섹션 수(uint32), 예약(uint32)      32바이트
+    섹션 표 : 섹션마다 tag(4바이트), 타입 코드(1바이트, 'I' 'i' 'f' 'B'), 예약(3바이트),
+              offset(uint64, 파일 처음부터), count(uint64, 원소 개수)                24바이트
+    섹션    : 각 섹션은 8바이트 경계에서 시작 (사이는 0으로 채움)
+
+섹션 (타입: I=uint32, i=int32, f=float32, B=uint8)
+--------------------------------------------------
+    STRO I  문자열 표 offset (문자열 수 + 1)   문자열 k = STRB[STRO[k]:STRO[k+1]] (UTF-8)
+    STRB B  문자열 표 본문                     0번 문자열은 항상 ""
+    NID_ I  노드 id (문자열 번호)              ┐
+    NNAM I  노드 이름 (문자열 번호)             │ 노드는 층 순으로 정렬되어 있다.
+    NSPC I  노드 special_id (문자열 번호)       │ (같은 층 안에서는 data.nodes 순서)
+    NX__ f  노드 x (픽셀)                       │
+    NY__ f  노드 y (픽셀)                       │
+    NFLR i  노드 층                             ┘
+    ADJO I  CSR offset (노드 수 + 1)           노드 i의 이웃 = ADJT[ADJO[i]:ADJO[i+1]]
+    ADJT I  이웃 노드 번호
+    ADJW f  간선 가중치 (픽셀 거리)
+    FLRS i  층 번호 (오름차순)
+    FLRN I  층별 노드 범위 (층 수 + 1)         FLRS[k]층 노드 = FLRN[k] ~ FLRN[k+1]-1
+    FLRP I  층별 폴리곤 범위 (층 수 + 1)
+    PID_ I  폴리곤 id (문자열 번호)            폴리곤도 층 순으로 정렬되어 있다.
+    PNAM I  폴리곤 이름 (문자열 번호)
+    PRGO I  폴리곤 꼭짓점 범위 (폴리곤 수 + 1)
+    PRGI I  꼭짓점 노드 번호
+
+- 모르는 tag의 섹션은 읽는 쪽에서 건너뛰면 된다. (섹션 추가는 하위 호환)
+- 기존 섹션의 의미가 바뀌면 version을 올린다.
+- read_graph_bin()은 테스트/검증용 파이썬 리더다.
+"""
+import struct
+import sys
+from array import array
+from itertools import accumulate
+
+from .cache import project_cache
+from .canonical import canonical_from_data
+from .routing import get_compiled_graph
+
+MAGIC = b"IMGB"
+FORMAT_VERSION = 1
+
+_HEADER = struct.Struct("<4sHHQdII")
+_SECTION = struct.Struct("<4sc3xQQ")
+
+CONTENT_TYPE = "application/octet-stream"
+
+
+class GraphBinError(ValueError):
+    """graph.bin 형식이 잘못되었을 때 발생."""
+
+
+class _Strings:
+    """문자열 → 번호 (중복 제거, 0번은 "")"""
+
+    def __init__(self):
+        self.index = {"": 0}
+        self.items = [""]
+
+    def __call__(self, s) -> int:
+        s = s or ""
+        k = self.index.get(s)
+        if k is None:
+            k = self.index[s] = len(self.items)
+            self.items.append(s)
+        return k
+
+
+def encode_graph_bin(data: dict, graph, revision=0) -> bytes:
+    """
+    data(정규 표현의 원본)와 그 CompiledGraph로 graph.bin bytes를 만든다.
+
+    - 노드/간선은 CompiledGraph 기준 (길찾기와 같은 노드 집합, 같은 가중치)
+    - 이름/special_id/폴리곤은 정규 표현에서 가져온다.
+    """
+    canonical = canonical_from_data(data)
+    info = {n["id"]: n for n in canonical["nodes"]}
+    n = len(graph)
+
+    # 층 순으로 정렬 (같은 층 안에서는 원래 순서 유지)
+    order = sorted(range(n), key=graph.floors.__getitem__)
+    new_of = array("l", [0]) * n
+    for new, old in enumerate(order):
+        new_of[old] = new
+
+    strings = _Strings()
+    nid = array("I", (strings(graph.ids[i]) for i in order))
+    nnam = array("I", (strings(info.get(graph.ids[i], {}).get("name")) for i in order))
+    nspc = array("I", (strings(info.get(graph.ids[i], {}).get("special_id")) for i in order))
+    nx = array("f", (graph.xs[i] for i in order))
+    ny = array("f", (graph.ys[i] for i in order))
+    nflr = array("i", (graph.floors[i] for i in order))
+
+    adjo = array("I", [0])
+    adjt = array("I")
+    adjw = array("f")
+    for old in order:
+        for k in range(graph.offsets[old], graph.offsets[old + 1]):
+            adjt.append(new_of[graph.targets[k]])
+            adjw.append(graph.weights[k])
+        adjo.append(len(adjt))
+
+    # 폴리곤: 꼭짓점 중 그래프에 있는 노드만, 3개 미만이면 제외
+    polys = []
+    for p in canonical["polygons"]:
+        ring = [new_of[graph.index[v]] for v in p["nodes"] if v in graph.index]
+        if len(ring) >= 3:
+            polys.append((p["floor"], p["id"], p["name"], ring))
+    polys.sort(key=lambda p: p[0])
+
+    floors = sorted(set(nflr) | {p[0] for p in polys})
+    node_counts = {f: 0 for f in floors}
+    for f in nflr:
+        node_counts[f] += 1
+    poly_counts = {f: 0 for f in floors}
+    for p in polys:
+        poly_counts[p[0]] += 1
+
+    sections = [
+        ("NID_", nid), ("NNAM", nnam), ("NSPC", nspc),
+        ("NX__", nx), ("NY__", ny), ("NFLR", nflr),
+        ("ADJO", adjo), ("ADJT", adjt), ("ADJW", adjw),
+        ("FLRS", array("i", floors)),
+        ("FLRN", array("I", [0, *accumulate(node_counts[f] for f in floors)])),
+        ("FLRP", array("I", [0, *accumulate(poly_counts[f] for f in floors)])),
+        ("PID_", array("I", (strings(p[1]) for p in polys))),
+        ("PNAM", array("I", (strings(p[2]) for p in polys))),
+        ("PRGO", array("I", [0, *accumulate(len(p[3]) for p in polys)])),
+        ("PRGI", array("I", (v for p in polys for v in p[3]))),
+    ]
+    # 문자열 표는 모든 문자열을 모은 뒤에 만든다.
+    blobs = [s.encode("utf-8") for s in strings.items]
+    sections[:0] = [
+        ("STRO", array("I", [0, *accumulate(len(b) for b in blobs)])),
+        ("STRB", b"".join(blobs)),
+    ]
+
+    if sys.byteorder != "little":
+        raise RuntimeError("graph.bin is little-endian only")
+
+    offset = _HEADER.size + _SECTION.size * len(sections)
+    table, chunks = [], []
+    for tag, arr in sections:
+        pad = -offset % 8
+        chunks.append(b"\0" * pad)
+        offset += pad
+        raw = arr if isinstance(arr, bytes) else arr.tobytes()
+        code = "B" if isinstance(arr, bytes) else arr.typecode
+        table.append(_SECTION.pack(tag.encode("ascii"), code.encode("ascii"), offset,
+                                   len(arr)))
+        chunks.append(raw)
+        offset += len(raw)
+
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, 0, int(revision), float(graph.scale),
+                          len(sections), 0)
+    return b"".join([header, *table, *chunks])
+
+
+class GraphBin:
+    """
+    read_graph_bin() 결과. 섹션은 원본 버퍼를 가리키는 memoryview (복사 없음).
+
+    - sections: tag → memoryview (타입 코드대로 cast됨)
+    """
+
+    def __init__(self, version, revision, scale, sections):
+        self.version = version
+        self.revision = revision
+        self.scale = scale
+        self.sections = sections
+
+    def __getitem__(self, tag):
+        return self.sections[tag]
+
+    def string(self, k) -> str:
+        o = self.sections["STRO"]
+        return bytes(self.sections["STRB"][o[k]:o[k + 1]]).decode("utf-8")
+
+    def to_dict(self) -> dict:
+        """
+        검증용: JSON과 비교하기 쉬운 모양으로 풀어 놓는다.
+
+            {"scale", "revision",
+             "nodes": {id: {"x", "y", "floor", "name", "special_id"}},
+             "connections": {id: {id: 거리}},
+             "polygons": [{"id", "name", "floor", "nodes": [id, ...]}]}
+        """
+        s = self.sections
+        ids = [self.string(k) for k in s["NID_"]]
+        nodes = {}
+        for i, nid in enumerate(ids):
+            nodes[nid] = {
+                "x": s["NX__"][i],
+                "y": s["NY__"][i],
+                "floor": s["NFLR"][i],
+                "name": self.string(s["NNAM"][i]),
+                "special_id": self.string(s["NSPC"][i]),
+            }
+        adjo, adjt, adjw = s["ADJO"], s["ADJT"], s["ADJW"]
+        connections = {}
+        for i, nid in enumerate(ids):
+            row = {ids[adjt[k]]: adjw[k] for k in range(adjo[i], adjo[i + 1])}
+            if row:
+                connections[nid] = row
+
+        polygons = []
+        floors, flrp = s["FLRS"], s["FLRP"]
+        prgo, prgi = s["PRGO"], s["PRGI"]
+        for k, f in enumerate(floors):
+            for p in range(flrp[k], flrp[k + 1]):
+                polygons.append({
+                    "id": self.string(s["PID_"][p]),
+                    "name": self.string(s["PNAM"][p]),
+                    "floor": f,
+                    "nodes": [ids[v] for v in prgi[prgo[p]:prgo[p + 1]]],
+                })
+        return {
+            "scale": self.scale,
+            "revision": self.revision,
+            "nodes": nodes,
+            "connections": connections,
+            "polygons": polygons,
+        }
+
+
+def read_graph_bin(buf) -> GraphBin:
+    """
+    graph.bin bytes(또는 mmap 등 버퍼)를 읽는다. 형식이 맞지 않으면 GraphBinError.
+    """
+    view = memoryview(buf)
+    try:
+        magic, version, _, revision, scale, count, _ = _HEADER.unpack_from(view)
+    except struct.error:
+        raise GraphBinError("truncated header")
+    if magic != MAGIC:
+        raise GraphBinError("not a graph.bin file")
+    if version != FORMAT_VERSION:
+        raise GraphBinError(f"unsupported version: {version}")
+    if sys.byteorder != "little":
+        raise GraphBinError("graph.bin reader is little-endian only")
+
+    sections = {}
+    for k in range(count):
+        try:
+            tag, code, offset, n = _SECTION.unpack_from(view, _HEADER.size + k * _SECTION.size)
+        except struct.error:
+            raise GraphBinError("truncated section table")
+        code = code.decode("ascii")
+        size = struct.calcsize(code) * n
+        if offset % 8 or offset + size > len(view):
+            raise GraphBinError(f"bad section: {tag!r}")
+        sections[tag.decode("ascii")] = view[offset:offset + size].cast(code)
+    return GraphBin(version, revision, scale, sections)
+
+
+def graph_bin_etag(project) -> str:
+    """프로젝트 ETag + 형식 버전 (형식이 바뀌면 예전 ETag로 304가 나가지 않도록)"""
+    return f'{project.etag[:-1]}-g{FORMAT_VERSION}"'
+
+
+def get_graph_bin(project, coding="identity") -> bytes:
+    """
+    프로젝트 현재 리비전의 graph.bin bytes (project_cache에 "graphbin"으로 보관).
+    coding이 "gzip" / "br" 이면 압축본 (역시 리비전별로 한 번만 압축)
+    """
+    body = project_cache.get_or_build(
+        project,
+        "graphbin",
+        lambda: encode_graph_bin(
+            project.data if isinstance(project.data, dict) else {},
+            get_compiled_graph(project),
+            project.revision,
+        ),
+    )
+    if coding == "identity":
+        return body
+    from .encoding import compress
+    return project_cache.get_or_build(project, f"graphbin.{coding}", lambda: compress(body, coding))
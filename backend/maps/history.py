@@ -0,0 +1,198 @@
+# maps/history.py
+"""
+프로젝트 리비전 기록 (스냅샷 + delta).
+
+PUT / delta 저장은 Project.data를 제자리에서 덮어쓰므로, 지난 리비전을 되살릴 수 있도록
+저장할 때마다 ProjectRevision 행을 하나 남긴다.
+
+- snapshot: data 전체 JSON을 zlib으로 압축
+- delta   : 직전 리비전 → 이 리비전 JSON Patch(RFC 6902, maps/delta.diff_json)를 zlib으로 압축
+
+리비전 n 복원: n 이하에서 가장 가까운 스냅샷을 풀고, 그 뒤 delta를 n까지 차례로 적용한다.
+delta 사슬은 MAX_CHAIN개를 넘지 않고, 사슬의 delta 크기 합이 스냅샷보다 커지면
+그 전에 새 스냅샷을 찍는다. 그래서 복원 비용은 O(MAX_CHAIN)개 patch,
+저장 공간은 (문서 크기 × 저장 횟수)가 아니라 수정한 양에 비례한다.
+
+보관 정책: 최근 MAPS_REVISION_KEEP개(기본 KEEP_REVISIONS) 리비전을 복원할 수 있도록
+그 사슬이 시작되는 스냅샷부터 남기고, 더 오래된 행은 지운다.
+
+리비전마다 그때 쓰던 층 이미지(MediaBlobRef)를 RevisionBlobRef로 옮겨 적어 둔다.
+→ 남아 있는 리비전이 가리키는 이미지는 GC가 지우지 않는다. (payload를 풀어 보지 않아도 됨)
+"""
+import json
+import zlib
+
+from django.conf import settings
+
+from .delta import PatchError, apply_json_patch, diff_json
+from .models import MediaBlobRef, ProjectRevision, RevisionBlobRef
+
+# 스냅샷 사이 delta 최대 개수 (복원할 때 적용하는 patch 수 상한)
+MAX_CHAIN = 32
+
+# 복원할 수 있게 남겨 둘 최근 리비전 수 (settings.MAPS_REVISION_KEEP 로 바꿀 수 있음)
+KEEP_REVISIONS = 200
+
+ZLIB_LEVEL = 6
+
+
+def _pack(value) -> bytes:
+    return zlib.compress(
+        json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+        ZLIB_LEVEL,
+    )
+
+
+def _unpack(payload):
+    return json.loads(zlib.decompress(bytes(payload)).decode("utf-8"))
+
+
+def keep_revisions() -> int:
+    return max(1, int(getattr(settings, "MAPS_REVISION_KEEP", KEEP_REVISIONS)))
+
+
+def _delta_row(project, previous_revision, payload: bytes):
+    """
+    직전 리비전 행에 이어 붙일 delta 행. 사슬이 너무 길거나 기준 스냅샷보다 커지면 None
+    """
+    prev = (ProjectRevision.objects
+            .filter(project=project, number=previous_revision)
+            .values("chain", "chain_bytes", "kind", "size")
+            .first())
+    if prev is None or prev["chain"] >= MAX_CHAIN:
+        return None
+    chain_bytes = prev["chain_bytes"] + len(payload)
+    # 사슬이 시작된 스냅샷 크기
+    if prev["kind"] == ProjectRevision.KIND_SNAPSHOT:
+        base_size = prev["size"]
+    else:
+        base_size = (ProjectRevision.objects
+                     .filter(project=project, number=previous_revision - prev["chain"])
+                     .values_list("size", flat=True)
+                     .first()) or 0
+    if chain_bytes > base_size:
+        return None
+    return ProjectRevision(
+        project=project,
+        number=project.revision,
+        kind=ProjectRevision.KIND_DELTA,
+        payload=payload,
+        size=len(payload),
+        chain=prev["chain"] + 1,
+        chain_bytes=chain_bytes,
+    )
+
+
+def _store(project, row):
+    # 같은 번호가 남아 있으면(리비전 기록 전 데이터 등) 새로 쓴다.
+    ProjectRevision.objects.filter(project=project, number=row.number).delete()
+    row.save()
+    # 저장하는 쪽(Project.save / set_floor_image)이 MediaBlobRef를 먼저 맞춰 두므로
+    # 지금의 참조가 곧 이 리비전의 data.images가 쓰는 이미지다.
+    blob_ids = set(MediaBlobRef.objects.filter(project=project).values_list("blob_id", flat=True))
+    RevisionBlobRef.objects.bulk_create([RevisionBlobRef(revision=row, blob_id=b) for b in blob_ids])
+    prune_revisions(project)
+    return row
+
+
+def _snapshot_row(project, data):
+    payload = _pack(data)
+    return ProjectRevision(
+        project=project,
+        number=project.revision,
+        kind=ProjectRevision.KIND_SNAPSHOT,
+        payload=payload,
+        size=len(payload),
+    )
+
+
+def record_revision(project, previous=None, previous_revision=None):
+    """
+    project의 현재 리비전(project.revision, project.data)을 기록한다.
+    Project.save()가 같은 트랜잭션 안에서 호출한다.
+
+    - previous: 저장 직전 DB에 있던 data, previous_revision: 그 리비전 번호
+      둘 다 있고 그 리비전 행이 남아 있으면 delta로, 아니면 스냅샷으로 남긴다.
+    """
+    data = project.data if isinstance(project.data, dict) else {}
+    row = None
+    if previous is not None and previous_revision is not None:
+        row = _delta_row(project, previous_revision, _pack(diff_json(previous, data)))
+    return _store(project, row or _snapshot_row(project, data))
+
+
+def record_ops(project, ops, load_data):
+    """
+    data 일부만 고친 저장(maps/images.py 등)을 JSON Patch ops로 기록한다.
+    (project.revision은 이미 올라간 값, 직전 리비전은 project.revision - 1)
+
+    - delta로 이어 붙일 수 없으면 load_data()로 현재 data 전체를 읽어서 스냅샷을 남긴다.
+    """
+    row = _delta_row(project, project.revision - 1, _pack(ops))
+    return _store(project, row or _snapshot_row(project, load_data()))
+
+
+def prune_revisions(project, keep=None):
+    """
+    최근 keep개 리비전을 복원하는 데 필요 없는 행을 지운다.
+
+    반환값: 지운 행 수
+    """
+    keep = keep or keep_revisions()
+    oldest = project.revision - keep + 1
+    if oldest <= 1:
+        return 0
+    # oldest 리비전의 사슬이 시작되는 스냅샷 (없으면 아무것도 지우지 않는다)
+    base = (ProjectRevision.objects
+            .filter(project=project, kind=ProjectRevision.KIND_SNAPSHOT, number__lte=oldest)
+            .order_by("-number")
+            .values_list("number", flat=True)
+            .first())
+    if base is None:
+        return 0
+    deleted, _ = ProjectRevision.objects.filter(project=project, number__lt=base).delete()
+    return deleted
+
+
+def load_revision(project, number):
+    """
+    리비전 number의 data(dict)를 복원한다. 기록이 없거나(보관 기간 지남) 사슬이 끊겼으면 None.
+    """
+    base = (ProjectRevision.objects
+            .filter(project=project, kind=ProjectRevision.KIND_SNAPSHOT, number__lte=number)
+            .order_by("-number")
+            .values_list("number", flat=True)
+            .first())
+    if base is None:
+        return None
+    rows = list(ProjectRevision.objects
+                .filter(project=project, number__gte=base, number__lte=number)
+                .order_by("number")
+                .values_list("number", "kind", "payload"))
+    if [r[0] for r in rows] != list(range(base, number + 1)):
+        return None
+
+    data = _unpack(rows[0][2])
+    try:
+        for _, _, payload in rows[1:]:
+            data = apply_json_patch(data, _unpack(payload))
+    except PatchError:
+        return None
+    return data
+
+
+def list_revisions(project) -> list:
+    """revisions/ 응답용 목록 (최신순)"""
+    rows = (ProjectRevision.objects
+            .filter(project=project)
+            .order_by("-number")
+            .values("number", "kind", "size", "created_at"))
+    return [
+        {
+            "revision": r["number"],
+            "kind": r["kind"],
+            "size": r["size"],
+            "created_at": r["created_at"].isoformat() if r["created_at"] else None,
+        }
+        for r in rows
+    ]
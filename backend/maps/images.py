@@ -0,0 +1,134 @@
+# maps/images.py
+"""
+층 배경 이미지 URL(data.images[floor]) 갱신.
+
+이미지 업로드는 data에서 images 한 칸만 바꾸는데, Project.save()로 저장하면
+data(수 MB) 전체를 읽고 다시 쓴다. 층 20개를 동시에 올리면 서로의 images[floor]를
+덮어써서 일부가 사라지기도 한다. (각 요청이 읽은 시점의 images로 통째로 저장하므로)
+
+그래서 여기서는
+  1) 프로젝트 행을 select_for_update로 잠그고 (data는 읽지 않음)
+  2) images 값만 꺼내서 한 칸을 바꾼 뒤
+  3) MySQL이면 JSON_SET으로 images 키만 갱신한다.
+     (다른 DB(개발용 sqlite 등)에서는 잠근 상태에서 data를 읽어 고친 뒤 저장)
+
+같은 프로젝트의 동시 업로드는 행 잠금으로 줄을 서지만 잠금 구간이 짧고,
+data 전체를 주고받지 않는다. 목록용 썸네일, Floor 행, MediaBlobRef, 리비전 기록도
+바뀐 만큼만 고친다. 그래프는 바뀌지 않으므로 무결성 분석 결과와 ALT / POI 테이블은
+새 리비전으로 옮긴다.
+"""
+import json
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .blobs import blob_refs_for
+from .cache import project_cache
+from .landmarks import carry_sidecar
+from .models import Floor, MediaBlobRef, Project, first_image_url
+from .poi_routes import carry_table
+from .tasks import note_graph_changes
+from .tiles import preview_url_for
+
+
+def _set_image(images, floor: int, url):
+    """images(list 또는 {"0": url} dict)의 floor 칸을 url로 바꾼 새 값"""
+    if isinstance(images, dict):
+        out = dict(images)
+        out[str(floor)] = url
+        return out
+    out = list(images) if isinstance(images, list) else []
+    if floor >= len(out):
+        out.extend([None] * (floor + 1 - len(out)))
+    out[floor] = url
+    return out
+
+
+def _write_images(pid: int, images, fields: dict):
+    """data.images와 fields(일반 컬럼)를 한 번의 UPDATE로 쓴다."""
+    if connection.vendor == "mysql":
+        qn = connection.ops.quote_name
+        table = qn(Project._meta.db_table)
+        data_col = qn(Project._meta.get_field("data").column)
+        sets, params = [], [json.dumps(images, ensure_ascii=False)]
+        for name, value in fields.items():
+            field = Project._meta.get_field(name)
+            sets.append(f"{qn(field.column)} = %s")
+            params.append(field.get_db_prep_save(value, connection))
+        params.append(pid)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET {data_col} = JSON_SET({data_col}, '$.images', "
+                f"JSON_EXTRACT(%s, '$')), {', '.join(sets)} WHERE id = %s",
+                params,
+            )
+        return
+    # JSON_SET이 없는 DB: 이미 행을 잠갔으므로 읽고 고쳐 써도 다른 저장과 섞이지 않는다.
+    data = Project.objects.filter(pk=pid).values_list("data", flat=True).first()
+    data = data if isinstance(data, dict) else {}
+    data["images"] = images
+    Project.objects.filter(pk=pid).update(data=data, **fields)
+
+
+def set_floor_image(pid: int, floor: int, url, base=None):
+    """
+    프로젝트 pid의 floor층 이미지 URL을 url로 바꾼다. (None이면 지움)
+
+    - base: 주면 현재 리비전이 base일 때만 바꾼다. (낙관적 동시성 검사)
+    - 반환값: (새 revision, None)
+              base가 맞지 않으면 (None, 현재 revision), 프로젝트가 없으면 (None, None)
+    """
+    from .history import record_ops
+
+    with transaction.atomic():
+        row = (Project.objects.select_for_update()
+               .filter(pk=pid)
+               .values("revision", "updated_at", "thumbnail")
+               .first())
+        if row is None:
+            return None, None
+        if base is not None and row["revision"] != base:
+            return None, row["revision"]
+
+        # images 키만 읽는다. (DB에서 JSON 경로로 꺼내므로 data 전체를 받지 않음)
+        images = Project.objects.filter(pk=pid).values_list("data__images", flat=True).first()
+        images = _set_image(images, floor, url)
+
+        first = first_image_url(images)
+        revision = row["revision"] + 1
+        now = timezone.now()
+        fields = {
+            "revision": revision,
+            "updated_at": now,
+            "thumbnail": (preview_url_for(first) or first)[:500],
+        }
+        _write_images(pid, images, fields)
+
+        # 정규화 테이블도 이 층만 (아직 Floor 행이 없는 층이면 만든다)
+        Floor.objects.update_or_create(project_id=pid, index=floor,
+                                       defaults={"image": str(url or "")[:500]})
+        ref = blob_refs_for({"images": {str(floor): url}}).get(floor)
+        if ref is None:
+            MediaBlobRef.objects.filter(project_id=pid, floor=floor).delete()
+        else:
+            MediaBlobRef.objects.update_or_create(project_id=pid, floor=floor, defaults=ref)
+
+        project = Project.objects.defer("data").get(pk=pid)
+        record_ops(
+            project,
+            [{"op": "add", "path": "/images", "value": images}],
+            lambda: Project.objects.filter(pk=pid).values_list("data", flat=True).first(),
+        )
+
+    # 그래프는 그대로이므로 무결성 분석 결과와 리비전별 길찾기 파일(ALT / POI 테이블)은
+    # 새 리비전으로 옮겨 둔다. (다시 만들 때까지 길찾기가 느린 경로로 떨어지지 않도록)
+    integrity = project_cache.get(pid, row["updated_at"], "integrity")
+    project_cache.invalidate(pid)
+    if integrity is not None:
+        integrity.revision = project.revision
+        project_cache.set(pid, project.updated_at, "integrity", integrity)
+    carry_sidecar(pid, row["revision"], project.revision)
+    carry_table(pid, row["revision"], project.revision)
+    # 바뀐 노드 없음 → 다음 POI 테이블 작업이 이 리비전을 건너서도 부분 갱신할 수 있다.
+    note_graph_changes(pid, project.revision, ())
+    return project.revision, None
@@ -0,0 +1,306 @@
+# maps/integrity.py
+"""
+그래프 무결성 검사.
+
+에디터가 남기는 문제를 저장할 때 바로 찾아 둔다. (기기에서 길찾기가 실패해서야 알게 되지 않도록)
+
+- 끊어진 링크(orphan): connections가 nodes에 없는 노드를 가리킴
+- 비대칭 링크: a→b는 있는데 b→a가 없거나 거리가 다름
+- 연결 요소(component): 링크로 이어진 노드 묶음. 층별로 몇 개의 묶음이 있는지
+- 도달 불가 맵핑 포인트: 주 연결 요소(맵핑 포인트가 가장 많은 묶음) 밖의 special_points
+
+전체 분석은 O(V + E)다. delta 저장에서는 바뀐 노드(affected)만 보고 갱신한다.
+  - 링크/노드 추가: union-find 식으로 두 묶음을 합친다. (작은 쪽 라벨을 큰 쪽으로)
+  - 링크/노드 삭제: 삭제에 걸린 묶음만 BFS로 다시 나눈다.
+  - 끊어진/비대칭 링크: 바뀐 노드의 connections 행만 다시 본다.
+
+결과 객체(GraphIntegrity)는 리비전별로 project_cache에 "integrity"로 보관하고,
+개수는 Project의 목록용 컬럼(*_count)에 저장한다.
+"""
+import threading
+from collections import Counter, deque
+
+from .routing import node_floor_map
+
+# 보고서에 담을 항목 수 상한 (개수는 counts에 전부 센다)
+MAX_REPORT_ITEMS = 200
+
+# 보고서에 담을 연결 요소 수 (큰 것부터)
+MAX_REPORT_COMPONENTS = 50
+
+# 비대칭 판정 시 거리 차이 허용값 (소수 2자리 반올림 오차)
+WEIGHT_TOLERANCE = 0.011
+
+
+def _row(conn, nid) -> dict:
+    row = conn.get(nid)
+    return row if isinstance(row, dict) else {}
+
+
+def _weight(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+class GraphIntegrity:
+    """
+    한 리비전 그래프의 연결 요소 라벨과 문제 목록.
+
+    - label[nid]          : 노드의 연결 요소 번호
+    - members[c]          : 연결 요소 c의 노드 집합
+    - adj[nid]            : 무방향 이웃 집합 (양 끝이 모두 nodes에 있는 링크만)
+    - orphans             : {(a, b)} nodes에 없는 노드가 낀 connections 항목
+    - asymmetric          : {(a, b)} (a < b) 한쪽 방향만 있거나 거리가 다른 링크
+    """
+
+    def __init__(self):
+        self.revision = 0
+        self.floor_of = {}
+        self.special = {}
+        self.adj = {}
+        self.label = {}
+        self.members = {}
+        self.orphans = set()
+        self.asymmetric = {}
+        self._next_label = 0
+        self._lock = threading.Lock()
+
+    # ----- 만들기 -----
+
+    @classmethod
+    def build(cls, data: dict, revision=0) -> "GraphIntegrity":
+        """data 전체를 분석한다. O(V + E)"""
+        self = cls()
+        self.revision = revision
+        nodes = data.get("nodes") if isinstance(data.get("nodes"), dict) else {}
+        conn = data.get("connections") if isinstance(data.get("connections"), dict) else {}
+        self.floor_of = {nid: f for nid, f in node_floor_map(data).items() if nid in nodes}
+        for nid in nodes:
+            self.floor_of.setdefault(nid, 0)
+            self.adj[nid] = set()
+        self._load_special(data, nodes)
+
+        for a, row in conn.items():
+            if not isinstance(row, dict):
+                continue
+            for b in row:
+                self._check_pair(conn, nodes, a, b)
+
+        for nid in nodes:
+            if nid not in self.label:
+                self._flood(nid, None)
+        return self
+
+    def _load_special(self, data, nodes):
+        sp = data.get("special_points")
+        sp = sp if isinstance(sp, dict) else {}
+        self.special = {nid: v for nid, v in sp.items() if nid in nodes}
+
+    def _check_pair(self, conn, nodes, a, b):
+        """connections의 a→b 항목 하나를 분류한다."""
+        if a not in nodes or b not in nodes:
+            self.orphans.add((a, b))
+            return
+        if a == b:
+            return
+        self.adj[a].add(b)
+        self.adj[b].add(a)
+        back = _row(conn, b)
+        w_ab = _weight(_row(conn, a).get(b))
+        w_ba = _weight(back.get(a)) if a in back else None
+        key = (a, b) if a < b else (b, a)
+        if a not in back or w_ab is None or w_ba is None or abs(w_ab - w_ba) > WEIGHT_TOLERANCE:
+            self.asymmetric[key] = (w_ab, w_ba) if key[0] == a else (w_ba, w_ab)
+        else:
+            self.asymmetric.pop(key, None)
+
+    def _new_label(self) -> int:
+        self._next_label += 1
+        return self._next_label
+
+    def _flood(self, start, allowed):
+        """start에서 BFS로 새 연결 요소 라벨을 붙인다. allowed가 있으면 그 안에서만."""
+        c = self._new_label()
+        seen = {start}
+        queue = deque([start])
+        while queue:
+            u = queue.popleft()
+            self.label[u] = c
+            for v in self.adj[u]:
+                if v not in seen and (allowed is None or v in allowed):
+                    seen.add(v)
+                    queue.append(v)
+        self.members[c] = seen
+        return c
+
+    # ----- delta 갱신 -----
+
+    def update(self, data: dict, affected, revision=0):
+        """
+        바뀐 노드 id 집합 affected로 제자리 갱신한다.
+        (affected: maps/delta.apply_graph_diff 결과의 affected. 바뀐 링크의 양 끝 노드를 모두 포함)
+        """
+        nodes = data.get("nodes") if isinstance(data.get("nodes"), dict) else {}
+        conn = data.get("connections") if isinstance(data.get("connections"), dict) else {}
+        floor_of = node_floor_map(data)
+        affected = set(affected)
+
+        with self._lock:
+            self.revision = revision
+            dirty = set()      # 다시 나눌 연결 요소 라벨
+            added = []         # 새로 생긴 이웃 쌍
+
+            # 1) 바뀐 노드의 이웃 집합을 새로 만든다.
+            for a in affected:
+                old = self.adj.get(a, set())
+                if a not in nodes:
+                    # 삭제된 노드
+                    for b in old:
+                        if b in self.adj:
+                            self.adj[b].discard(a)
+                    if a in self.label:
+                        dirty.add(self.label.pop(a))
+                    self.adj.pop(a, None)
+                    self.floor_of.pop(a, None)
+                    continue
+
+                new = {b for b in _row(conn, a) if b in nodes and b != a}
+                new |= {b for b in old if a in _row(conn, b)}
+                new |= {b for b in affected if b in nodes and a in _row(conn, b)}
+                self.adj[a] = new
+                self.floor_of[a] = floor_of.get(a, 0)
+                for b in old - new:
+                    if b in self.adj:
+                        self.adj[b].discard(a)
+                    if a in self.label:
+                        dirty.add(self.label[a])
+                for b in new - old:
+                    self.adj.setdefault(b, set()).add(a)
+                    added.append((a, b))
+                if a not in self.label:
+                    c = self._new_label()
+                    self.label[a] = c
+                    self.members[c] = {a}
+
+            # 2) 삭제에 걸린 연결 요소만 BFS로 다시 나눈다.
+            for c in dirty:
+                group = {nid for nid in self.members.pop(c, ()) if nid in nodes}
+                for nid in group:
+                    self.label.pop(nid, None)
+                for nid in group:
+                    if nid not in self.label:
+                        self._flood(nid, group)
+
+            # 3) 추가된 링크는 두 묶음을 합친다. (작은 쪽을 큰 쪽으로)
+            for a, b in added:
+                ca, cb = self.label[a], self.label[b]
+                if ca == cb:
+                    continue
+                if len(self.members[ca]) < len(self.members[cb]):
+                    ca, cb = cb, ca
+                moved = self.members.pop(cb)
+                for nid in moved:
+                    self.label[nid] = ca
+                self.members[ca] |= moved
+
+            # 4) 끊어진/비대칭 링크는 바뀐 노드가 낀 항목만 다시 본다.
+            self.orphans = {(a, b) for a, b in self.orphans
+                            if a not in affected and b not in affected}
+            for key in [k for k in self.asymmetric if k[0] in affected or k[1] in affected]:
+                del self.asymmetric[key]
+            for a in affected:
+                for b in _row(conn, a):
+                    self._check_pair(conn, nodes, a, b)
+                for b in self.adj.get(a, ()):
+                    if b not in affected and a in _row(conn, b):
+                        self._check_pair(conn, nodes, b, a)
+
+            self._load_special(data, nodes)
+        return self
+
+    # ----- 결과 -----
+
+    def _main_component(self):
+        """
+        맵핑 포인트가 가장 많은(같으면 노드가 많은, 그것도 같으면 가장 작은 노드 id를 가진) 연결 요소
+
+        라벨 번호는 build()/update() 이력에 따라 달라지므로 마지막 기준은 노드 id로 정한다.
+        """
+        if not self.members:
+            return None
+        poi = Counter(self.label[nid] for nid in self.special if nid in self.label)
+        return min(self.members, key=lambda c: (-poi.get(c, 0), -len(self.members[c]),
+                                                min(self.members[c])))
+
+    def _unreachable_pois(self):
+        main = self._main_component()
+        return [nid for nid in self.special if self.label.get(nid) != main]
+
+    def _floor_components(self) -> dict:
+        out = {}
+        for c, group in self.members.items():
+            for f in {self.floor_of.get(nid, 0) for nid in group}:
+                out[f] = out.get(f, 0) + 1
+        return out
+
+    def counts(self) -> dict:
+        """목록용 컬럼 값"""
+        with self._lock:
+            return {
+                "component_count": len(self.members),
+                "orphan_link_count": len(self.orphans),
+                "asymmetric_link_count": len(self.asymmetric),
+                "unreachable_poi_count": len(self._unreachable_pois()),
+            }
+
+    def report(self) -> dict:
+        """integrity/ 엔드포인트 응답 (목록은 MAX_REPORT_ITEMS개까지)"""
+        with self._lock:
+            floor_nodes = Counter(self.floor_of.values())
+            floor_comps = self._floor_components()
+            unreachable = self._unreachable_pois()
+            comps = sorted(self.members.items(), key=lambda kv: (-len(kv[1]), min(kv[1])))
+            main = self._main_component()
+            limit = MAX_REPORT_ITEMS
+            return {
+                "revision": self.revision,
+                "ok": not (self.orphans or self.asymmetric or unreachable),
+                "counts": {
+                    "nodes": len(self.label),
+                    "links": sum(len(v) for v in self.adj.values()) // 2,
+                    "components": len(self.members),
+                    "isolated_nodes": sum(1 for v in self.adj.values() if not v),
+                    "orphan_links": len(self.orphans),
+                    "asymmetric_links": len(self.asymmetric),
+                    "unreachable_pois": len(unreachable),
+                },
+                "floors": {
+                    str(f): {"nodes": floor_nodes.get(f, 0), "components": floor_comps.get(f, 0)}
+                    for f in sorted(set(floor_nodes) | set(floor_comps))
+                },
+                "components": [
+                    {
+                        "size": len(group),
+                        "main": c == main,
+                        "floors": sorted({self.floor_of.get(nid, 0) for nid in group}),
+                        "example": min(group),
+                    }
+                    for c, group in comps[:MAX_REPORT_COMPONENTS]
+                ],
+                "orphan_links": [list(p) for p in sorted(self.orphans)[:limit]],
+                "asymmetric_links": [
+                    {"a": a, "b": b, "ab": w[0], "ba": w[1]}
+                    for (a, b), w in sorted(self.asymmetric.items())[:limit]
+                ],
+                "unreachable_pois": [
+                    {"id": nid, "special_id": self.special[nid], "floor": self.floor_of.get(nid, 0)}
+                    for nid in sorted(unreachable)[:limit]
+                ],
+            }
+
+    @property
+    def nbytes(self) -> int:
+        # 노드마다 라벨/이웃 집합/층 항목 대략치
+        return 300 * len(self.label) + 100 * (len(self.orphans) + len(self.asymmetric)) + 1024
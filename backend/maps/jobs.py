@@ -0,0 +1,216 @@
+# maps/jobs.py
+"""
+여러 프로젝트를 한꺼번에 TXT/ZIP으로 내보내는 일괄(bulk) export 작업.
+
+- 프로젝트 하나를 워커 프로세스 하나가 맡는다. (ProcessPoolExecutor)
+  → CPU 코어 수만큼 동시에 내보내므로 수백 개 건물도 코어 수에 비례해 빨라진다.
+- 결과 ZIP은 MEDIA_ROOT/exports/<project_id>.zip 에 쓴다.
+  임시 파일에 다 쓴 뒤 os.replace로 바꿔치기하므로, 내려받는 쪽은
+  항상 완성된 이전 파일 또는 완성된 새 파일만 보게 된다. (원자적 교체)
+- 사용처
+    - manage.py export_all        (야간 일괄 재생성)
+    - POST /api/exports/          (비동기 작업 시작, GET /api/exports/<job_id>/ 로 진행률 확인)
+      한 서버 프로세스에서 API 작업은 한 번에 하나만 돈다. (실행 중이면 ExportJobRunning)
+- 워커 수는 CPU 코어 수를 넘지 않는다.
+"""
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.db import connections
+
+# 결과 ZIP을 저장할 MEDIA_ROOT 하위 폴더 이름
+EXPORT_DIR_NAME = "exports"
+
+
+def export_dir():
+    return settings.MEDIA_ROOT / EXPORT_DIR_NAME
+
+
+def _init_worker(db_names=None):
+    """
+    워커 프로세스 초기화.
+
+    - spawn 방식으로 새로 뜬 프로세스라 Django 설정을 다시 로드해야 한다.
+      (DJANGO_SETTINGS_MODULE 환경변수는 부모에게서 물려받는다)
+    - db_names: 부모가 실제로 쓰는 DB 이름 {alias: NAME}
+      (테스트 DB처럼 설정 파일과 이름이 다를 때도 같은 DB를 보도록)
+    """
+    import django
+    django.setup()
+    for alias, name in (db_names or {}).items():
+        settings.DATABASES[alias]["NAME"] = name
+
+
+class ExportJobRunning(Exception):
+    """이미 일괄 export 작업이 실행 중 (job_id: 그 작업)"""
+
+    def __init__(self, job_id):
+        super().__init__("export job already running")
+        self.job_id = job_id
+
+
+def export_project_to_file(pid: int, dest_dir=None) -> dict:
+    """
+    프로젝트 하나를 ZIP 파일로 내보낸다. (워커 프로세스에서 실행)
+
+    반환값: {"id", "name", "path", "url", "bytes", "seconds"}
+    """
+    from .export import export_project_to_txt
+    from .models import Project
+
+    started = time.perf_counter()
+    dest_dir = os.fspath(dest_dir or export_dir())
+    os.makedirs(dest_dir, exist_ok=True)
+
+    try:
+        obj = Project.objects.get(pk=pid)
+        data = obj.data if isinstance(obj.data, dict) else {}
+
+        final_path = os.path.join(dest_dir, f"{pid}.zip")
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{pid}-", suffix=".zip.tmp", dir=dest_dir)
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                for chunk in export_project_to_txt(data):
+                    fh.write(chunk)
+                    size += len(chunk)
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp_path, final_path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+    finally:
+        # 워커는 오래 살아 있으므로 DB 연결을 붙잡고 있지 않는다.
+        connections.close_all()
+
+    return {
+        "id": pid,
+        "name": obj.name,
+        "path": final_path,
+        "url": f"{settings.MEDIA_URL}{EXPORT_DIR_NAME}/{pid}.zip",
+        "bytes": size,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def run_bulk_export(pids, dest_dir=None, workers=None, progress=None) -> list:
+    """
+    pids 프로젝트들을 프로세스 풀로 나눠서 내보낸다.
+
+    - workers: 워커 프로세스 수 (None이면 CPU 코어 수, 코어 수보다 크게 줄 수 없음)
+    - progress(done, total, result): 프로젝트 하나가 끝날 때마다 호출
+        result 는 성공 시 export_project_to_file()의 반환값,
+        실패 시 {"id", "error"}
+    - 반환값: 끝난 순서대로 모은 result 목록
+    """
+    pids = list(pids)
+    total = len(pids)
+    results = []
+    if not total:
+        return results
+
+    # 부모의 DB 연결이 자식에게 섞이지 않도록 풀을 만들기 전에 닫아 둔다.
+    connections.close_all()
+
+    # fork 대신 spawn: 스레드가 도는 웹 서버 프로세스 안에서도 안전하게 시작하기 위함
+    ctx = multiprocessing.get_context("spawn")
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(workers or cpus, cpus, total))
+    db_names = {alias: connections[alias].settings_dict["NAME"] for alias in connections}
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                             initializer=_init_worker, initargs=(db_names,)) as pool:
+        futures = {pool.submit(export_project_to_file, pid, dest_dir): pid for pid in pids}
+        for done, fut in enumerate(as_completed(futures), start=1):
+            pid = futures[fut]
+            try:
+                result = fut.result()
+            except Exception as e:
+                result = {"id": pid, "error": f"{type(e).__name__}: {e}"}
+            results.append(result)
+            if progress:
+                progress(done, total, result)
+    return results
+
+
+# ----- 비동기 작업 (API용) -----
+
+# job_id → 작업 상태 dict  (프로세스 메모리에만 보관, 서버 재시작 시 사라짐)
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+# 완료된 작업 상태를 몇 개까지 보관할지
+MAX_KEPT_JOBS = 50
+
+
+def start_export_job(pids, workers=None) -> dict:
+    """
+    일괄 export를 백그라운드 스레드에서 시작하고, 작업 상태(dict)를 돌려준다.
+
+    - 이 프로세스에서 다른 작업이 아직 실행 중이면 ExportJobRunning
+      (요청마다 프로세스 풀을 새로 띄우지 않도록 한 번에 하나만)
+
+    상태 dict:
+        {"id", "status": "running"|"done", "total", "done", "failed",
+         "started_at", "finished_at", "results": [...]}
+    """
+    pids = list(pids)
+    job = {
+        "id": uuid.uuid4().hex,
+        "status": "running",
+        "total": len(pids),
+        "done": 0,
+        "failed": 0,
+        "started_at": time.time(),
+        "finished_at": None,
+        "results": [],
+    }
+
+    def _progress(done, total, result):
+        with _jobs_lock:
+            job["done"] = done
+            job["results"].append(result)
+            if "error" in result:
+                job["failed"] += 1
+
+    def _run():
+        try:
+            run_bulk_export(pids, workers=workers, progress=_progress)
+        except Exception as e:
+            with _jobs_lock:
+                job["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            with _jobs_lock:
+                job["status"] = "done"
+                job["finished_at"] = time.time()
+
+    with _jobs_lock:
+        for other in _jobs.values():
+            if other["status"] == "running":
+                raise ExportJobRunning(other["id"])
+        _jobs[job["id"]] = job
+        # 오래된 완료 작업 정리
+        finished = [j for j in _jobs.values() if j["status"] == "done"]
+        for old in sorted(finished, key=lambda j: j["started_at"])[:-MAX_KEPT_JOBS]:
+            _jobs.pop(old["id"], None)
+
+    threading.Thread(target=_run, name=f"export-job-{job['id'][:8]}", daemon=True).start()
+    return get_export_job(job["id"])
+
+
+def get_export_job(job_id: str):
+    """작업 상태의 복사본을 돌려준다. 없으면 None."""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        return {**job, "results": list(job["results"])}
@@ -0,0 +1,281 @@
+# maps/landmarks.py
+"""
+ALT(A*, Landmarks, Triangle inequality) 전처리 테이블.
+
+캠퍼스 단위의 큰 그래프에서는 직선거리 휴리스틱만으로는 A*가 너무 넓게 퍼진다.
+(층을 오가는 경로는 직선거리가 실제 거리보다 훨씬 짧음)
+그래서 몇 개의 랜드마크 노드 L을 골라 모든 노드와의 거리를 미리 계산해 두고,
+
+    d(v, t) >= d(L, t) - d(L, v)
+    d(v, t) >= d(v, L) - d(t, L)
+
+로 더 센 하한(휴리스틱)을 만든다. 둘 다 일관된(consistent) 휴리스틱이라
+A*는 여전히 최단 경로를 보장한다.
+
+저장 형식 (MEDIA_ROOT/graph_cache/<pid>/<revision>.alt, 리틀 엔디언)
+------------------------------------------------------------------
+    header : magic "ALT1", n(uint32), L(uint32), 예약(uint32), revision(int64)
+    indices: 랜드마크 노드 인덱스 int32 × L  (8바이트 경계까지 0으로 채움)
+    dist   : float64 × n × 2L   노드 v마다 [d(L_0,v) … d(L_{L-1},v), d(v,L_0) … d(v,L_{L-1})]
+             도달 불가는 inf
+
+- 노드 인덱스는 CompiledGraph(maps/routing.py)의 순서 그대로다. (같은 리비전이면 같음)
+- 질의할 때는 파일을 mmap으로 열어서 필요한 노드의 값만 읽는다.
+- 프로젝트가 저장될 때마다(노드 수가 MIN_NODES 이상이면) 백그라운드에서 다시 만든다.
+  (manage.py build_route_landmarks 로 직접 만들 수도 있다)
+"""
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+from math import inf
+
+from django.conf import settings
+
+from .cache import project_cache
+from .routing import get_compiled_graph, reverse_csr, shortest_distances
+
+GRAPH_CACHE_DIR_NAME = "graph_cache"
+
+MAGIC = b"ALT1"
+_HEADER = struct.Struct("<4sIIIq")
+
+# 랜드마크 개수 (많을수록 휴리스틱이 세지지만 파일과 질의당 계산이 커진다)
+LANDMARK_COUNT = 8
+
+# 질의 하나에서 실제로 쓰는 랜드마크 항 수 (출발점에서 하한이 가장 큰 것들)
+ACTIVE_TERMS = 3
+
+# 이보다 작은 그래프는 직선거리 A*로 충분하므로 전처리하지 않는다.
+MIN_NODES = 2000
+
+
+def sidecar_dir(pid):
+    return settings.MEDIA_ROOT / GRAPH_CACHE_DIR_NAME / str(pid)
+
+
+def sidecar_path(pid, revision):
+    return sidecar_dir(pid) / f"{revision}.alt"
+
+
+def remove_sidecars(pid):
+    """프로젝트 삭제 시 전처리 파일 폴더 제거"""
+    shutil.rmtree(sidecar_dir(pid), ignore_errors=True)
+
+
+class Landmarks:
+    """mmap으로 연 랜드마크 거리 테이블."""
+
+    __slots__ = ("indices", "count", "dist", "_mm")
+
+    def __init__(self, indices, dist, mm=None):
+        self.indices = indices
+        self.count = len(indices)
+        self.dist = dist
+        self._mm = mm
+
+    @property
+    def nbytes(self) -> int:
+        # 거리 테이블은 mmap(페이지 캐시)이라 프로세스 캐시 예산에는 넣지 않는다.
+        return 64 + 8 * self.count
+
+    def potential(self, src: int, dst: int, active=ACTIVE_TERMS):
+        """
+        src → dst 질의용 휴리스틱 함수 h(v)를 만든다.
+
+        - 랜드마크 L개 × 2방향 항 중에서 src에서 하한이 가장 큰 active개만 쓴다.
+          (노드마다 계산하는 항 수를 줄여서 탐색 노드가 줄어든 만큼 실제로 빨라지도록)
+        - 랜드마크와의 거리가 inf인 항은 하한을 줄 수 없으므로 뺀다.
+        """
+        L, d = self.count, self.dist
+        base = dst * 2 * L
+        sb = src * 2 * L
+        terms = []
+        for i in range(L):
+            dt = d[base + i]                 # d(L_i, dst)
+            if dt != inf and d[sb + i] != inf:
+                terms.append((dt - d[sb + i], i, dt, 1.0))
+            dt = d[base + L + i]             # d(dst, L_i)
+            if dt != inf and d[sb + L + i] != inf:
+                terms.append((d[sb + L + i] - dt, L + i, -dt, -1.0))
+        terms.sort(reverse=True)
+        # (오프셋, 상수, 부호): 항 값 = 상수 - 부호 * d[v*2L + 오프셋]
+        #   정방향: d(L,t) - d(L,v)   /  역방향: d(v,L) - d(t,L)
+        picked = [(off, c, sign) for _, off, c, sign in terms[:active]]
+
+        def h(v):
+            b = v * 2 * L
+            best = 0.0
+            for off, c, sign in picked:
+                dv = d[b + off]
+                if dv == inf:
+                    continue
+                x = c - sign * dv
+                if x > best:
+                    best = x
+            return best
+
+        return h
+
+
+# ----- 전처리 -----
+
+def select_landmarks(graph, count=LANDMARK_COUNT):
+    """
+    가장 먼 점(farthest-point) 방식으로 랜드마크를 고른다.
+
+    - 지금까지 고른 랜드마크들과의 최소 거리가 가장 큰 노드를 다음 랜드마크로.
+    - 아직 어떤 랜드마크에서도 닿지 않는 노드(다른 연결 요소)가 있으면 그쪽을 먼저.
+
+    반환값: (랜드마크 인덱스 목록, 랜드마크별 정방향 거리 array 목록)
+    """
+    n = len(graph)
+    count = min(count, n)
+    offsets, targets, weights = graph.offsets, graph.targets, graph.weights
+
+    # 시작점: 0번 노드에서 가장 먼 노드
+    d0 = shortest_distances(n, offsets, targets, weights, 0) if n else array("d")
+    nearest = array("d", [inf]) * n
+    chosen, fwd = [], []
+    cand = max(range(n), key=lambda v: d0[v] if d0[v] != inf else -1.0) if n else None
+    while len(chosen) < count and cand is not None:
+        dist = shortest_distances(n, offsets, targets, weights, cand)
+        chosen.append(cand)
+        fwd.append(dist)
+        best_v, best_key = None, None
+        for v in range(n):
+            dv = dist[v]
+            if dv < nearest[v]:
+                nearest[v] = dv
+            m = nearest[v]
+            # (닿지 않음, 거리) 순으로 비교 → 닿지 않는 노드가 우선
+            key = (1, 0.0) if m == inf else (0, m)
+            if best_key is None or key > best_key:
+                best_v, best_key = v, key
+        if best_v is None or best_key == (0, 0.0) or best_v in chosen:
+            break
+        cand = best_v
+    return chosen, fwd
+
+
+def build_landmarks(graph, count=LANDMARK_COUNT) -> bytes:
+    """CompiledGraph로 ALT 테이블(파일 내용 bytes)을 만든다. revision은 0으로 채운다."""
+    n = len(graph)
+    chosen, fwd = select_landmarks(graph, count)
+    L = len(chosen)
+    r_offsets, r_targets, r_weights = reverse_csr(graph)
+    bwd = [shortest_distances(n, r_offsets, r_targets, r_weights, lm) for lm in chosen]
+
+    table = array("d", [inf]) * (n * 2 * L)
+    for i in range(L):
+        f, b = fwd[i], bwd[i]
+        for v in range(n):
+            base = v * 2 * L
+            table[base + i] = f[v]
+            table[base + L + i] = b[v]
+
+    indices = array("i", chosen).tobytes()
+    pad = b"\0" * (-(_HEADER.size + len(indices)) % 8)
+    if sys.byteorder != "little":
+        raise RuntimeError("ALT sidecar is little-endian only")
+    return _HEADER.pack(MAGIC, n, L, 0, 0) + indices + pad + table.tobytes()
+
+
+def write_sidecar(pid, revision, payload: bytes):
+    """
+    payload의 revision 칸을 채워서 원자적으로 저장하고, 다른 리비전 파일은 지운다.
+    """
+    folder = sidecar_dir(pid)
+    folder.mkdir(parents=True, exist_ok=True)
+    magic, n, L, reserved, _ = _HEADER.unpack_from(payload)
+    header = _HEADER.pack(magic, n, L, reserved, int(revision))
+
+    path = sidecar_path(pid, revision)
+    fd, tmp = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=folder)
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(header)
+            fh.write(memoryview(payload)[_HEADER.size:])
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+    for name in os.listdir(folder):
+        if name.endswith(".alt") and name != path.name:
+            try:
+                os.unlink(folder / name)
+            except OSError:
+                pass
+    return path
+
+
+def carry_sidecar(pid, old_revision, revision):
+    """
+    그래프가 바뀌지 않은 저장(층 이미지 교체 등)에서 old_revision 파일을 revision으로 옮긴다.
+    (내용은 같고 헤더의 revision 칸만 바뀜) 옮길 파일이 없으면 None
+    """
+    try:
+        payload = sidecar_path(pid, old_revision).read_bytes()
+    except OSError:
+        return None
+    if len(payload) < _HEADER.size or payload[:4] != MAGIC:
+        return None
+    return write_sidecar(pid, revision, payload)
+
+
+def load_sidecar(pid, revision, node_count):
+    """
+    리비전 파일을 mmap으로 연다. 없거나 그래프와 맞지 않으면 None.
+    """
+    path = sidecar_path(pid, revision)
+    try:
+        with open(path, "rb") as fh:
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        magic, n, L, _, rev = _HEADER.unpack_from(mm)
+    except struct.error:
+        return None
+    offset = _HEADER.size + 4 * L
+    offset += -offset % 8
+    if (magic != MAGIC or n != node_count or rev != revision or L == 0
+            or len(mm) != offset + 8 * n * 2 * L or sys.byteorder != "little"):
+        return None
+    indices = list(memoryview(mm)[_HEADER.size:_HEADER.size + 4 * L].cast("i"))
+    dist = memoryview(mm)[offset:].cast("d")
+    return Landmarks(indices, dist, mm)
+
+
+def build_for_project(project, count=LANDMARK_COUNT):
+    """
+    project의 현재 리비전용 파일을 만든다.
+
+    반환값: 저장한 파일 경로
+    """
+    graph = get_compiled_graph(project)
+    payload = build_landmarks(graph, count)
+    return write_sidecar(project.pk, project.revision, payload)
+
+
+def get_landmarks(project, graph):
+    """
+    프로젝트 현재 리비전의 Landmarks. 파일이 (아직) 없으면 None.
+
+    - 열어 둔 mmap은 project_cache에 "alt"로 보관한다.
+    - 없을 때는 캐시하지 않는다. (다른 프로세스가 백그라운드에서 만들 수 있으므로
+      다음 질의 때 다시 열어 본다. 실패한 open 한 번이라 비용은 작다)
+    """
+    value = project_cache.get(project.pk, project.updated_at, "alt")
+    if value is None:
+        value = load_sidecar(project.pk, project.revision, len(graph))
+        if value is not None:
+            project_cache.set(project.pk, project.updated_at, "alt", value)
+    return value
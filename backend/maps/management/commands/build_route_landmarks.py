@@ -0,0 +1,50 @@
+# maps/management/commands/build_route_landmarks.py
+"""
+길찾기용 ALT 랜드마크 테이블(MEDIA_ROOT/graph_cache/<pid>/<revision>.alt)을 만드는 관리 명령.
+
+- 프로젝트 저장 시에도 백그라운드에서 자동으로 만들어지지만 (노드 수가 MIN_NODES 이상일 때),
+  배포 직후나 서버 재시작으로 작업이 유실된 경우 이 명령으로 한꺼번에 만들 수 있다.
+- 이미 현재 리비전 파일이 있으면 건너뛴다. (--force 로 다시 만들기)
+
+사용 예:
+    python manage.py build_route_landmarks
+    python manage.py build_route_landmarks --project 3 --landmarks 16 --force
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from maps.landmarks import LANDMARK_COUNT, MIN_NODES, build_for_project, sidecar_path
+from maps.models import Project
+
+
+class Command(BaseCommand):
+    help = "Precompute ALT landmark tables used to speed up long routes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--project", type=int, action="append", dest="projects",
+                            help="project id (repeatable, default: all large enough projects)")
+        parser.add_argument("--landmarks", type=int, default=LANDMARK_COUNT,
+                            help=f"landmark count (default: {LANDMARK_COUNT})")
+        parser.add_argument("--force", action="store_true",
+                            help="rebuild even if the current revision already has a table")
+
+    def handle(self, *args, **options):
+        qs = Project.objects.defer("data").order_by("id")
+        if options["projects"]:
+            qs = qs.filter(pk__in=options["projects"])
+        else:
+            qs = qs.filter(node_count__gte=MIN_NODES)
+
+        built = 0
+        for obj in qs:
+            if not options["force"] and sidecar_path(obj.pk, obj.revision).exists():
+                continue
+            started = time.perf_counter()
+            path = build_for_project(obj, max(1, options["landmarks"]))
+            built += 1
+            self.stdout.write(
+                f"#{obj.pk} {obj.name}: {obj.node_count} nodes, "
+                f"{path.stat().st_size / 1024:.0f}KB in {time.perf_counter() - started:.2f}s"
+            )
+        self.stdout.write(self.style.SUCCESS(f"built {built} table(s)"))
@@ -0,0 +1,62 @@
+# maps/management/commands/export_all.py
+"""
+모든(또는 지정한) 프로젝트의 장치용 TXT/ZIP 번들을 다시 만드는 관리 명령.
+
+- 프로젝트 하나를 워커 프로세스 하나가 맡아서 병렬로 내보낸다. (maps/jobs.py)
+- 결과: MEDIA_ROOT/exports/<project_id>.zip  (원자적 교체)
+
+사용 예:
+    python manage.py export_all
+    python manage.py export_all --workers 8
+    python manage.py export_all --project 3 --project 7 --output /srv/bundles
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from maps.jobs import run_bulk_export
+from maps.models import Project
+
+
+class Command(BaseCommand):
+    help = "Export every project to node/link/arrow/polygon/core.txt ZIPs using a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None,
+                            help="worker process count (default: CPU count)")
+        parser.add_argument("--project", type=int, action="append", dest="projects",
+                            help="project id to export (repeatable, default: all)")
+        parser.add_argument("--output", default=None,
+                            help="output directory (default: MEDIA_ROOT/exports)")
+
+    def handle(self, *args, **options):
+        pids = options["projects"] or list(
+            Project.objects.order_by("id").values_list("id", flat=True)
+        )
+        if not pids:
+            self.stdout.write("no projects to export")
+            return
+
+        started = time.perf_counter()
+
+        def progress(done, total, result):
+            if "error" in result:
+                self.stderr.write(f"[{done}/{total}] #{result['id']} FAILED {result['error']}")
+            else:
+                self.stdout.write(
+                    f"[{done}/{total}] #{result['id']} {result['name']} "
+                    f"{result['seconds']:.2f}s {result['bytes'] / 1024:.1f}KB"
+                )
+
+        results = run_bulk_export(pids, dest_dir=options["output"],
+                                  workers=options["workers"], progress=progress)
+
+        failed = [r for r in results if "error" in r]
+        elapsed = time.perf_counter() - started
+        busy = sum(r.get("seconds", 0) for r in results)
+        self.stdout.write(
+            f"exported {len(results) - len(failed)}/{len(results)} project(s) "
+            f"in {elapsed:.2f}s (sum of per-project time {busy:.2f}s)"
+        )
+        if failed:
+            raise CommandError(f"{len(failed)} project(s) failed")
@@ -0,0 +1,38 @@
+# maps/management/commands/gc_media_blobs.py
+"""
+어떤 프로젝트도 참조하지 않는 업로드 이미지(blob)를 지우는 관리 명령.
+
+- 층 이미지를 다른 파일로 바꾸거나, 프로젝트 없이 업로드만 한 경우
+  예전 파일은 참조가 없는 채로 남는다. 주기적으로(cron 등) 실행하면 된다.
+- 최근에 업로드된 파일은 아직 data.images에 반영되기 전일 수 있으므로
+  --grace-minutes 동안은 지우지 않는다. (기본 10분)
+- 남아 있는 리비전 기록이 가리키는 파일도 지우지 않는다. (maps/blobs.py)
+
+사용 예:
+    python manage.py gc_media_blobs
+    python manage.py gc_media_blobs --dry-run
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from maps.blobs import GC_GRACE, collect_garbage, unreferenced_blobs
+
+
+class Command(BaseCommand):
+    help = "Delete uploaded media blobs that no project references anymore."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--grace-minutes", type=int,
+                            default=int(GC_GRACE.total_seconds() // 60),
+                            help="skip blobs uploaded within this many minutes")
+        parser.add_argument("--dry-run", action="store_true",
+                            help="only count unreferenced blobs")
+
+    def handle(self, *args, **options):
+        grace = timedelta(minutes=max(0, options["grace_minutes"]))
+        if options["dry_run"]:
+            self.stdout.write(f"{len(unreferenced_blobs(grace=grace))} unreferenced blob(s)")
+            return
+        removed = collect_garbage(grace=grace)
+        self.stdout.write(self.style.SUCCESS(f"removed {removed} blob(s)"))
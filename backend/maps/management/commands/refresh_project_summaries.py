@@ -0,0 +1,29 @@
+# maps/management/commands/refresh_project_summaries.py
+"""
+목록 화면용 비정규화 컬럼(thumbnail, node_count, link_count, floor_count,
+그래프 무결성 개수 component_count 등)을
+기존 프로젝트 전체에 대해 다시 계산하는 관리 명령.
+
+- 컬럼이 추가되기 전에 저장된 프로젝트는 값이 비어 있으므로,
+  migrate 직후 한 번 실행해 주면 된다.
+- updated_at은 건드리지 않도록 queryset.update()로 컬럼만 갱신한다.
+
+사용 예:
+    python manage.py refresh_project_summaries
+"""
+from django.core.management.base import BaseCommand
+
+from maps.models import Project
+
+
+class Command(BaseCommand):
+    help = "Recompute denormalized list columns (thumbnail, counts, integrity) for every project."
+
+    def handle(self, *args, **options):
+        count = 0
+        # 프로젝트 하나씩 data를 읽어서 처리 (전체를 한 번에 메모리에 올리지 않음)
+        for pk in Project.objects.values_list("pk", flat=True).iterator():
+            obj = Project.objects.get(pk=pk)
+            Project.objects.filter(pk=pk).update(**obj.summarize())
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"refreshed {count} project(s)"))
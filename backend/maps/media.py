@@ -0,0 +1,210 @@
+# maps/media.py
+"""
+미디어 파일(/media/...) 서빙.
+
+예전에는 DEBUG일 때만 django.conf.urls.static.static으로 서빙해서 운영에서는 쓸 수 없고,
+캐시 헤더 / Range / 304가 없어 큰 도면을 볼 때마다 처음부터 끝까지 다시 받았다.
+
+- 내용 주소 이름(blobs/<xx>/<sha256>.<ext>, .../tiles/<version>/...)은 URL이 바뀌지 않는 한
+  내용도 바뀌지 않으므로 1년짜리 immutable 캐시. 나머지(floor_images/, exports/ 등)는 매번 재검증.
+- ETag(mtime+크기) / Last-Modified → If-None-Match, If-Modified-Since 에 304
+- 프록시 뒤라면 파일 전송을 웹 서버에 넘긴다. (settings.MAPS_MEDIA_ACCEL)
+    "nginx"    : X-Accel-Redirect: <MAPS_MEDIA_ACCEL_PREFIX><경로>
+                 nginx 쪽에 internal location 필요
+                     location /_media/ { internal; alias <MEDIA_ROOT>/; }
+    "sendfile" : X-Sendfile: <절대 경로> (Apache mod_xsendfile, lighttpd)
+  이 경우 Python 워커는 헤더만 만들고 바로 돌아가며, Range 등은 웹 서버가 처리한다.
+- 넘길 곳이 없으면 FileResponse로 직접 보내고, Range(한 구간)를 지원한다. (206 / 416)
+  전체 전송은 WSGI 서버의 wsgi.file_wrapper(sendfile)를 탄다.
+
+점(.)으로 시작하는 파일(업로드 중 임시 파일)과 PRIVATE_DIRS(서버 내부 캐시)는 내주지 않는다.
+"""
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotAllowed, HttpResponseNotFound
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+
+# 내용이 바뀌면 URL이 바뀌는 파일용 캐시 헤더
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# 같은 URL의 내용이 바뀔 수 있는 파일 (예전 floor_images/, exports/ ZIP 등)
+REVALIDATE_CACHE_CONTROL = "public, max-age=0, must-revalidate"
+
+# MEDIA_ROOT 아래지만 밖으로 내주지 않는 폴더 (ALT 랜드마크 / POI 테이블 캐시)
+PRIVATE_DIRS = ("graph_cache",)
+
+# blobs/<xx>/<sha256>.<ext> 또는 .../tiles/<version 16자리>/... (maps/blobs.py, maps/tiles.py)
+_IMMUTABLE_RE = re.compile(
+    r"^(?:blobs/[0-9a-f]{2}/[0-9a-f]{64}(?:\.[a-z0-9]+)?"
+    r"|(?:.+/)?tiles/[0-9a-f]{16}/.+)$"
+)
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def media_file(rel: str):
+    """MEDIA_URL 아래 상대 경로 → 내줄 수 있는 실제 파일 경로. 아니면 None"""
+    parts = rel.split("/")
+    if not rel or any(not p or p.startswith(".") for p in parts) or parts[0] in PRIVATE_DIRS:
+        return None
+    root = os.path.realpath(settings.MEDIA_ROOT)
+    path = os.path.realpath(os.path.join(root, *parts))
+    if not path.startswith(root + os.sep):
+        return None
+    return path
+
+
+def is_immutable(rel: str) -> bool:
+    return bool(_IMMUTABLE_RE.match(rel))
+
+
+class _RangeFile:
+    """열린 파일의 [start, start + length) 구간만 읽히는 file-like (FileResponse용)"""
+
+    def __init__(self, fh, start: int, length: int):
+        fh.seek(start)
+        self.fh = fh
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b""
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.fh.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.fh.close()
+
+
+def _byte_range(header: str, size: int):
+    """
+    Range 헤더 → (start, end) (end 포함). 헤더가 없거나 여러 구간이면 None (전체 전송).
+    만족할 수 없는 구간이면 ValueError.
+    """
+    m = _RANGE_RE.match((header or "").strip())
+    if m is None:
+        return None
+    first, last = m.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-N : 끝에서 N바이트
+        n = int(last)
+        if n == 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - n), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError("unsatisfiable range")
+    return start, end
+
+
+def _if_range_ok(request, etag: str, mtime: int) -> bool:
+    """If-Range가 없거나 현재 파일과 맞으면 True (아니면 Range를 무시하고 전체를 보낸다)"""
+    value = request.headers.get("If-Range")
+    if not value:
+        return True
+    if value.startswith(('"', 'W/')):
+        return etag in parse_etags(value)
+    since = parse_http_date_safe(value)
+    return since is not None and mtime <= since
+
+
+def _accel_path(path: str):
+    """웹 서버에 넘길 MEDIA_ROOT 기준 상대 경로. MEDIA_ROOT 밖이면 None (직접 보냄)"""
+    root = os.path.realpath(settings.MEDIA_ROOT)
+    path = os.path.realpath(path)
+    if not path.startswith(root + os.sep):
+        return None
+    return os.path.relpath(path, root).replace(os.sep, "/")
+
+
+def serve_file(request, path: str, content_type=None, immutable=False):
+    """
+    path 파일을 캐시 헤더 / 304 / Range를 붙여 돌려준다. 파일이 없으면 404.
+
+    - immutable: URL이 내용 해시라서 내용이 바뀌지 않는 파일이면 True
+    """
+    if request.method not in ("GET", "HEAD"):
+        return HttpResponseNotAllowed(["GET", "HEAD"])
+    try:
+        st = os.stat(path)
+    except OSError:
+        return HttpResponseNotFound()
+    if not stat.S_ISREG(st.st_mode):
+        return HttpResponseNotFound()
+
+    size = st.st_size
+    mtime = int(st.st_mtime)
+    etag = f'"{st.st_mtime_ns:x}-{size:x}"'
+    last_modified = http_date(mtime)
+    if content_type is None:
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+    def finish(resp):
+        resp["ETag"] = etag
+        resp["Last-Modified"] = last_modified
+        resp["Cache-Control"] = IMMUTABLE_CACHE_CONTROL if immutable else REVALIDATE_CACHE_CONTROL
+        # 업로드 파일을 확장자와 다른 형식(HTML 등)으로 해석하지 않도록
+        resp["X-Content-Type-Options"] = "nosniff"
+        return resp
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=mtime)
+    if not_modified is not None:
+        return finish(not_modified)
+
+    accel = getattr(settings, "MAPS_MEDIA_ACCEL", "")
+    accel_path = _accel_path(path) if accel else None
+    if accel_path is not None:
+        resp = HttpResponse(content_type=content_type)
+        if accel == "nginx":
+            prefix = getattr(settings, "MAPS_MEDIA_ACCEL_PREFIX", "/_media/")
+            resp["X-Accel-Redirect"] = prefix + accel_path
+        else:
+            resp["X-Sendfile"] = path
+        return finish(resp)
+
+    byte_range = None
+    if request.headers.get("Range") and _if_range_ok(request, etag, mtime):
+        try:
+            byte_range = _byte_range(request.headers["Range"], size)
+        except ValueError:
+            resp = HttpResponse(status=416)
+            resp["Content-Range"] = f"bytes */{size}"
+            resp["Accept-Ranges"] = "bytes"
+            return finish(resp)
+
+    if request.method == "HEAD":
+        resp = HttpResponse(content_type=content_type)
+        resp["Content-Length"] = str(size)
+    elif byte_range is None:
+        resp = FileResponse(open(path, "rb"), content_type=content_type)
+    else:
+        start, end = byte_range
+        resp = FileResponse(_RangeFile(open(path, "rb"), start, end - start + 1),
+                            content_type=content_type, status=206)
+        resp["Content-Length"] = str(end - start + 1)
+        resp["Content-Range"] = f"bytes {start}-{end}/{size}"
+    resp["Accept-Ranges"] = "bytes"
+    return finish(resp)
+
+
+def serve_media(request, path: str):
+    """
+    MEDIA_URL 아래 파일 (config/urls.py에서 DEBUG와 상관없이 연결)
+
+    예: /media/blobs/ab/ab12....png → MEDIA_ROOT/blobs/ab/ab12....png
+    """
+    real = media_file(path)
+    if real is None:
+        return HttpResponseNotFound()
+    return serve_file(request, real, immutable=is_immutable(path))
@@ -1,6 +1,60 @@
 # maps/models.py
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils.text import slugify
-from django.db import models
+from django.db import models, transaction
+
+from .cache import project_cache
+from .integrity import GraphIntegrity
+from .tiles import preview_url_for
+
+
+# 목록 화면용 비정규화 컬럼 (save()에서 data로부터 채운다)
+SUMMARY_FIELDS = (
+    "thumbnail", "node_count", "link_count", "floor_count",
+    "component_count", "orphan_link_count", "asymmetric_link_count", "unreachable_poi_count",
+)
+
+
+def first_image_url(images) -> str:
+    """
+    data.images 에서 썸네일로 쓸 첫 번째 이미지 URL을 꺼낸다.
+
+    - dict 지원 (예: {"1": "/media/.../1.png", "2": "..."} 형태)
+      → 키를 문자열 기준으로 정렬해서 가장 앞의 값을 사용
+    - list 지원 (예: ["/media/.../1f.png", "/media/.../2f.png", ...])
+      → None이 아닌 첫 번째 URL 사용
+    """
+    if isinstance(images, dict) and images:
+        first_key = sorted(images.keys(), key=str)[0]
+        return images[first_key] or ""
+    if isinstance(images, list):
+        for u in images:
+            if u:
+                return u
+    return ""
+
+
+def count_links(connections) -> int:
+    """
+    양방향 connections dict에서 (무방향) 링크 개수를 센다.
+
+    - a→b, b→a 가 모두 있으면 1개로 센다.
+    - 한쪽 방향만 있는 연결도 1개로 센다.
+    """
+    if not isinstance(connections, dict):
+        return 0
+    count = 0
+    for a, row in connections.items():
+        if not isinstance(row, dict):
+            continue
+        for b in row:
+            back = connections.get(b)
+            if a < b or not (isinstance(back, dict) and a in back):
+                count += 1
+    return count
+
 
 class Project(models.Model):
     """
@@ -19,9 +73,28 @@ class Project(models.Model):
     `slug` varchar(150) NOT NULL,
     `created_at` datetime(6) NOT NULL,
     `updated_at` datetime(6) NOT NULL,
+    `revision` int unsigned NOT NULL,
+    `thumbnail` varchar(500) NOT NULL,
+    `node_count` int unsigned NOT NULL,
+    `link_count` int unsigned NOT NULL,
+    `floor_count` int unsigned NOT NULL,
+    `component_count` int unsigned NOT NULL,
+    `orphan_link_count` int unsigned NOT NULL,
+    `asymmetric_link_count` int unsigned NOT NULL,
+    `unreachable_poi_count` int unsigned NOT NULL,
     PRIMARY KEY (`id`),
     UNIQUE KEY `slug` (`slug`),
-    KEY `maps_project_name_9d345dd5` (`name`)
+    KEY `maps_project_name_9d345dd5` (`name`),
+    KEY `maps_project_updated_at_b7da8892` (`updated_at`),
+    KEY `maps_project_upd_id_idx` (`updated_at`,`id`),
+    CONSTRAINT `maps_project_chk_1` CHECK ((`revision` >= 0)),
+    CONSTRAINT `maps_project_chk_2` CHECK ((`node_count` >= 0)),
+    CONSTRAINT `maps_project_chk_3` CHECK ((`link_count` >= 0)),
+    CONSTRAINT `maps_project_chk_4` CHECK ((`floor_count` >= 0)),
+    CONSTRAINT `maps_project_chk_5` CHECK ((`component_count` >= 0)),
+    CONSTRAINT `maps_project_chk_6` CHECK ((`orphan_link_count` >= 0)),
+    CONSTRAINT `maps_project_chk_7` CHECK ((`asymmetric_link_count` >= 0)),
+    CONSTRAINT `maps_project_chk_8` CHECK ((`unreachable_poi_count` >= 0))
     ) ENGINE=InnoDB AUTO_INCREMENT=3 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci
     """
 
@@ -43,9 +116,36 @@ class Project(models.Model):
     slug = models.SlugField(max_length=150, unique=True, blank=True)
     
     # 생성/수정 시각 자동 저장
+    #  - updated_at은 목록 정렬/키셋 페이지네이션 기준이라 인덱스를 건다.
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
-   
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    # data 리비전 번호 (data가 저장될 때마다 1씩 증가)
+    #  - 부분 저장(delta) 시 클라이언트가 보낸 base 리비전과 비교해서
+    #    그 사이 다른 저장이 있었으면 409로 거절하는 데 사용
+    revision = models.PositiveIntegerField(default=0)
+
+    # ----- 목록 화면용 비정규화 컬럼 -----
+    # 목록 API가 data(JSON, 수 MB)를 읽지 않아도 되도록 save()에서 채워 둔다.
+    #  - thumbnail  : data.images 중 첫 번째 이미지의 미리보기 URL (없으면 원본 URL)
+    #  - node_count : data.nodes 개수
+    #  - link_count : data.connections 의 무방향 링크 개수
+    #  - floor_count: 층 개수
+    thumbnail = models.CharField(max_length=500, blank=True, default="")
+    node_count = models.PositiveIntegerField(default=0)
+    link_count = models.PositiveIntegerField(default=0)
+    floor_count = models.PositiveIntegerField(default=0)
+
+    # ----- 그래프 무결성 (maps/integrity.py, 목록에서 문제 있는 프로젝트 표시용) -----
+    #  - component_count       : 연결 요소 개수 (1이 정상)
+    #  - orphan_link_count     : 없는 노드를 가리키는 connections 항목 수
+    #  - asymmetric_link_count : 한쪽 방향만 있거나 양방향 거리가 다른 링크 수
+    #  - unreachable_poi_count : 주 연결 요소에서 갈 수 없는 맵핑 포인트 수
+    component_count = models.PositiveIntegerField(default=0)
+    orphan_link_count = models.PositiveIntegerField(default=0)
+    asymmetric_link_count = models.PositiveIntegerField(default=0)
+    unreachable_poi_count = models.PositiveIntegerField(default=0)
+
 
     def _make_unique_slug(self, base):
         """
@@ -69,6 +169,42 @@ class Project(models.Model):
             i += 1
         return cand
 
+    def summarize(self, integrity=None) -> dict:
+        """
+        data로부터 목록 화면용 비정규화 컬럼 값을 계산한다.
+
+        - integrity: 이미 만들어 둔 GraphIntegrity (없으면 data 전체를 분석)
+
+        반환값: {"thumbnail": ..., "node_count": ..., "link_count": ..., "floor_count": ...,
+                 "component_count": ..., "orphan_link_count": ..., ...}
+        """
+        data = self.data if isinstance(self.data, dict) else {}
+
+        nodes = data.get("nodes")
+        floors = data.get("floors")
+        editor = data.get("_editor") if isinstance(data.get("_editor"), dict) else {}
+
+        # 층 개수: floors 버킷 → _editor.floors → images 길이 순으로 판단
+        if isinstance(floors, dict) and floors:
+            floor_count = len(floors)
+        elif isinstance(editor.get("floors"), int):
+            floor_count = max(0, editor["floors"])
+        else:
+            images = data.get("images")
+            floor_count = len(images) if isinstance(images, (list, dict)) else 0
+
+        # 썸네일: 첫 층 이미지의 미리보기(타일 생성 후) → 없으면 원본 이미지
+        first = first_image_url(data.get("images"))
+        thumbnail = preview_url_for(first) or first
+
+        return {
+            "thumbnail": thumbnail[:500],
+            "node_count": len(nodes) if isinstance(nodes, dict) else 0,
+            "link_count": count_links(data.get("connections")),
+            "floor_count": floor_count,
+            **(integrity or GraphIntegrity.build(data)).counts(),
+        }
+
     def save(self, *args, **kwargs):
         """
         저장 시 name과 slug를 적절히 보정한다.
@@ -77,7 +213,17 @@ class Project(models.Model):
           (단, '새 프로젝트', 'Untitled' 같은 기본 이름은 무시)
         - name이 비어 있을 경우 최종 fallback으로 meta.projectName 또는 'Untitled' 사용
         - slug가 비어 있을 경우 name 기반으로 유니크 slug 생성
+        - data가 저장될 때는 revision을 1 올리고,
+          목록용 비정규화 컬럼(thumbnail, *_count)도 함께 갱신
+        - data가 저장될 때는 Node/Link/Polygon/Floor 행도 같은 트랜잭션에서 동기화
+        - data가 저장될 때는 리비전 기록(ProjectRevision, maps/history.py)도 같은 트랜잭션에서 남김
+        - changes: delta 저장의 apply_graph_diff() 결과(maps/delta.GraphChanges).
+          주면 직전 리비전의 무결성 분석 결과를 바뀐 노드만 보고 갱신하고(없으면 전체 분석),
+          changes.ops가 있으면 Node/Link/Polygon도 바뀐 행만 고치고 리비전 기록도
+          그 ops를 그대로 남긴다. (직전 data를 다시 읽어서 비교하지 않음)
         """
+        changes = kwargs.pop("changes", None)
+        affected_nodes = changes.affected if changes is not None else None
         meta = {}
         if isinstance(self.data, dict):
             meta = self.data.get("meta") or {}
@@ -96,29 +242,321 @@ class Project(models.Model):
         # slug가 아직 없으면 name 기반으로 생성
         if not self.slug:
             self.slug = self._make_unique_slug(self.name)
-        
-        # 실제 DB 저장
-        super().save(*args, **kwargs)
 
-    def to_response(self) -> dict:
+        # data를 저장하는 경우에만 비정규화 컬럼을 다시 계산
+        # (update_fields로 data를 빼고 저장하면 data를 읽을 필요가 없다)
+        update_fields = kwargs.get("update_fields")
+        data_changed = update_fields is None or "data" in update_fields
+        integrity = None
+        if data_changed:
+            self.revision = (self.revision or 0) + 1
+            data = self.data if isinstance(self.data, dict) else {}
+            if affected_nodes is not None and self.pk and self.updated_at:
+                # 직전 리비전 분석 결과가 캐시에 있으면 바뀐 노드만 반영
+                # (제자리에서 고치므로 저장이 실패해도 이전 리비전 키로 남지 않게 먼저 비운다)
+                integrity = project_cache.get(self.pk, self.updated_at, "integrity")
+                if integrity is not None:
+                    project_cache.invalidate(self.pk)
+                    integrity.update(data, affected_nodes, self.revision)
+            if integrity is None:
+                integrity = GraphIntegrity.build(data, self.revision)
+            for field, value in self.summarize(integrity).items():
+                setattr(self, field, value)
+            if update_fields is not None:
+                kwargs["update_fields"] = list(
+                    dict.fromkeys([*update_fields, "revision", *SUMMARY_FIELDS])
+                )
+
+        # 실제 DB 저장 (+ 정규화 테이블 동기화)
+        with transaction.atomic():
+            incremental = data_changed and changes is not None and changes.ops is not None
+            # 리비전 기록(delta)용으로 덮어쓰기 직전의 data
+            previous = None
+            if data_changed and self.pk and not incremental:
+                previous = Project.objects.filter(pk=self.pk).values_list("data", "revision").first()
+            super().save(*args, **kwargs)
+            if data_changed:
+                # relational / history 모듈이 models를 import하므로 여기서 지연 import
+                from .relational import sync_project_rows
+                from .history import record_ops, record_revision
+                if incremental:
+                    sync_project_rows(self, changes.rows)
+                    record_ops(self, changes.ops, lambda: data)
+                else:
+                    sync_project_rows(self)
+                    record_revision(self, *(previous or (None, None)))
+
+        # 이 프로젝트로 만들어 둔 캐시(그래프, 응답 bytes 등)는 모두 무효화
+        project_cache.invalidate(self.pk)
+        if integrity is not None:
+            # 다음 delta 저장과 integrity/ 조회가 쓰도록 새 리비전으로 보관
+            project_cache.set(self.pk, self.updated_at, "integrity", integrity)
+
+        # 길찾기 전처리는 백그라운드에서 다시 만든다.
+        #  - 큰 그래프: ALT 랜드마크 테이블 (maps/landmarks.py)
+        #  - 맵핑 포인트가 2개 이상: 맵핑 포인트 간 경로 테이블 (maps/poi_routes.py)
+        if data_changed:
+            from .landmarks import MIN_NODES
+            from . import tasks
+            pk = self.pk
+            if self.node_count >= MIN_NODES:
+                transaction.on_commit(lambda: tasks.schedule_landmarks(pk))
+            special = self.data.get("special_points") if isinstance(self.data, dict) else None
+            if isinstance(special, dict) and len(special) >= 2:
+                transaction.on_commit(lambda: tasks.schedule_poi_routes(pk))
+
+    def to_response(self, from_rows=False) -> dict:
         """
         API 응답용 헬퍼.
 
-        - DB에 저장된 data(JSON)에 id, slug를 덧붙여서 반환한다.
+        - DB에 저장된 data(JSON)에 id, slug, revision을 덧붙여서 반환한다.
         - 프론트에서 하나의 JSON으로 받기 편하도록 묶어주는 용도.
+        - from_rows=True 이면 nodes / connections / floors 등 그래프 부분을
+          Node/Link/Polygon/Floor 테이블에서 다시 만들어서 채운다.
+          (meta, scale, images 같은 나머지 값은 data에서 가져온다)
         """
         obj = dict(self.data) if isinstance(self.data, dict) else {}
+        if from_rows:
+            from .relational import views_from_rows
+            from .canonical import apply_views
+            apply_views(obj, views_from_rows(self))
         obj["id"] = self.id
         obj["slug"] = self.slug
+        obj["revision"] = self.revision
         return obj
+
+    def to_response_bytes(self, coding="identity") -> bytes:
+        """
+        to_response()를 JSON bytes로 직렬화한 결과.
+
+        - 리비전(pk, updated_at)별로 한 번만 만들어서 project_cache에 보관한다.
+        - data 필드를 defer()로 미뤄둔 인스턴스라면 캐시 hit일 때
+          data JSON을 DB에서 읽지도, 파싱하지도 않는다.
+        - coding이 "gzip" / "br" 이면 압축한 bytes (이것도 리비전별로 한 번만 압축)
+        """
+        body = project_cache.get_or_build(
+            self,
+            "response",
+            lambda: json.dumps(self.to_response(), cls=DjangoJSONEncoder).encode("utf-8"),
+        )
+        if coding == "identity":
+            return body
+        from .encoding import compress
+        return project_cache.get_or_build(self, f"response.{coding}", lambda: compress(body, coding))
+
+    @property
+    def etag(self) -> str:
+        """
+        "{pk}-{revision}-{updated_at(µs, 16진수)}" 형태의 강한(strong) ETag.
+
+        revision은 data가 바뀔 때마다, updated_at은 data 외의 필드만 저장해도 바뀌므로
+        응답 내용이 바뀌면 항상 달라진다.
+        """
+        stamp = int(self.updated_at.timestamp() * 1_000_000) if self.updated_at else 0
+        return f'"{self.pk}-{self.revision}-{stamp:x}"'
     
     class Meta:
         # 필요하다면 기존 테이블에 맞추기 위해 managed/db_table 옵션을 열어둘 수 있음
         # (현재는 Django 기본 동작 그대로 사용)
         # managed = False
         # db_table = "project"
-        pass
+
+        # 목록 API의 키셋 페이지네이션 (updated_at, id) 순서용 인덱스
+        indexes = [
+            models.Index(fields=["updated_at", "id"], name="maps_project_upd_id_idx"),
+        ]
         
     def __str__(self):
         # admin 등에서 객체를 문자열로 표시할 때 사용
         return f"{self.id}: {self.name}"
+
+
+
+# ----- 정규화(관계형) 그래프 테이블 -----
+# Project.data(JSON)와 같은 내용을 행 단위로 보관한다.
+#  - 노드 하나, 링크 하나 단위로 조회/수정할 수 있도록
+#  - Project.save() 때 maps/relational.py 의 sync_project_rows()가
+#    바뀐 행만 bulk_create / bulk_update / delete 한다.
+
+class Floor(models.Model):
+    """프로젝트의 층 하나 (이름, 배경 이미지, 이미지 크기)."""
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="floor_rows")
+    # 층 번호 (floors 버킷의 키, 0 기반)
+    index = models.IntegerField()
+    name = models.CharField(max_length=255, blank=True, default="")
+    image = models.CharField(max_length=500, blank=True, default="")
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["project", "index"], name="maps_floor_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.project_id}:{self.index}"
+
+
+class Node(models.Model):
+    """그래프 노드 (data.nodes 의 한 항목 + _editor.node_meta)."""
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="node_rows")
+    # 에디터의 노드 id (예: "N_12")
+    node_id = models.CharField(max_length=64, db_index=True)
+    floor = models.IntegerField(default=0)
+    x = models.FloatField(default=0)
+    y = models.FloatField(default=0)
+    name = models.CharField(max_length=255, blank=True, default="")
+    # 맵핑 포인트 종류 (엘리베이터, 출입구 등). 일반 노드는 빈 문자열
+    special_id = models.CharField(max_length=100, blank=True, default="")
+    nseq = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["project", "node_id"], name="maps_node_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["project", "floor"], name="maps_node_proj_floor_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.project_id}:{self.node_id}"
+
+
+class Link(models.Model):
+    """두 노드를 잇는 무방향 링크 (_editor.links 의 한 항목 + 거리)."""
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="link_rows")
+    link_id = models.CharField(max_length=150, db_index=True)
+    a = models.CharField(max_length=64)
+    b = models.CharField(max_length=64)
+    floor = models.IntegerField(default=0)
+    lseq = models.IntegerField(default=0)
+    # 픽셀 거리 (connections 값). 없으면 좌표로 계산
+    distance = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["project", "link_id"], name="maps_link_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["project", "floor"], name="maps_link_proj_floor_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.project_id}:{self.link_id}"
+
+
+class Polygon(models.Model):
+    """층 위의 폴리곤(방/구역). nodes는 꼭짓점 노드 id 목록."""
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="polygon_rows")
+    polygon_id = models.CharField(max_length=64, db_index=True)
+    floor = models.IntegerField(default=0)
+    name = models.CharField(max_length=255, blank=True, default="")
+    pseq = models.IntegerField(default=0)
+    nodes = models.JSONField(default=list)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["project", "polygon_id"], name="maps_polygon_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["project", "floor"], name="maps_polygon_proj_floor_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.project_id}:{self.polygon_id}"
+
+
+# ----- 내용 주소(content-addressed) 미디어 저장소 -----
+# 업로드 파일은 SHA-256 해시를 이름으로 한 번만 저장하고 (maps/blobs.py)
+# 어떤 프로젝트의 몇 층이 그 파일을 쓰는지는 MediaBlobRef로 센다.
+
+class MediaBlob(models.Model):
+    """MEDIA_ROOT/blobs/<sha256 앞 2자리>/<sha256>.<ext> 에 저장된 파일 하나."""
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    # 처음 업로드된 파일의 확장자 (소문자, 점 제외. 예: "png")
+    ext = models.CharField(max_length=16, blank=True, default="")
+    size = models.BigIntegerField(default=0)
+    content_type = models.CharField(max_length=100, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    # 마지막으로 업로드(중복 포함)된 시각. 방금 올라온 파일은 GC 대상에서 뺀다.
+    last_used = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]}.{self.ext}"
+
+
+class MediaBlobRef(models.Model):
+    """프로젝트의 한 층(data.images[floor])이 MediaBlob을 참조하고 있음을 나타낸다."""
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="blob_refs")
+    blob = models.ForeignKey(MediaBlob, on_delete=models.CASCADE, related_name="refs")
+    floor = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["project", "floor"], name="maps_blobref_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.project_id}:{self.floor} → {self.blob_id}"
+
+
+# ----- 리비전 기록 -----
+# data를 저장할 때마다 이전 내용을 덮어쓰므로, 잘못 저장한 것을 되돌릴 수 있도록
+# 리비전별 기록을 남긴다. (maps/history.py)
+#  - 주기적으로 전체 스냅샷, 그 사이에는 직전 리비전과의 JSON Patch만 zlib으로 압축해서 보관
+#  - 저장 공간은 (문서 크기 × 저장 횟수)가 아니라 수정한 양에 비례해서 늘어난다.
+
+class ProjectRevision(models.Model):
+    """프로젝트 data의 리비전 하나 (스냅샷 또는 직전 리비전과의 차이)."""
+
+    KIND_SNAPSHOT = "snapshot"
+    KIND_DELTA = "delta"
+    KIND_CHOICES = ((KIND_SNAPSHOT, "snapshot"), (KIND_DELTA, "delta"))
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="revision_rows")
+    # Project.revision 값
+    number = models.PositiveIntegerField()
+    kind = models.CharField(max_length=8, choices=KIND_CHOICES)
+    # snapshot: zlib(data JSON) / delta: zlib(직전 리비전 → 이 리비전 JSON Patch)
+    payload = models.BinaryField()
+    # payload 길이 (압축 후 bytes)
+    size = models.PositiveIntegerField(default=0)
+    # 직전 스냅샷 이후 delta 개수와 그 payload 크기 합 (스냅샷이면 0)
+    chain = models.PositiveIntegerField(default=0)
+    chain_bytes = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["project", "number"], name="maps_revision_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.project_id}@{self.number} ({self.kind})"
+
+
+class RevisionBlobRef(models.Model):
+    """
+    리비전 하나를 되살렸을 때 쓰일 이미지(MediaBlob)를 나타낸다.
+
+    - 리비전 행을 쓸 때 그 시점의 MediaBlobRef(= data.images)를 그대로 옮겨 적는다.
+    - 이 행이 남아 있는 blob은 GC가 지우지 않는다. (maps/blobs.py)
+      리비전 행이 보관 기간을 넘겨 지워지면 CASCADE로 함께 지워진다.
+    """
+
+    revision = models.ForeignKey(ProjectRevision, on_delete=models.CASCADE, related_name="blob_refs")
+    blob = models.ForeignKey(MediaBlob, on_delete=models.CASCADE, related_name="revision_refs")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["revision", "blob"], name="maps_revblobref_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.revision_id} → {self.blob_id}"
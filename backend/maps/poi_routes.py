@@ -0,0 +1,392 @@
+# maps/poi_routes.py
+"""
+맵핑 포인트(special_points: 출입구, 엘리베이터, 안내데스크 등) 사이의 경로 테이블.
+
+실제 길찾기 질의는 대부분 맵핑 포인트 ↔ 맵핑 포인트이고 같은 쌍이 반복된다.
+그래서 프로젝트가 저장되면 백그라운드에서 모든 쌍의 최단 거리와 경로를 미리 계산해
+리비전별 파일로 저장해 두고, route/ 질의는 파일에서 바로 꺼내 쓴다.
+
+저장 형식 (MEDIA_ROOT/graph_cache/<pid>/<revision>.poi, 리틀 엔디언)
+------------------------------------------------------------------
+    header : magic "POI1", P(uint32), V(uint32), 경로 항목 수(uint32),
+             이름 블록 길이(uint32), revision(int64), scale(float64)
+    names  : UTF-8, "\\n"으로 이은 맵핑 포인트 노드 id P개 + 경로 노드 id V개 (8바이트 경계까지 0)
+    dist   : float64 × P × P          dist[i*P + j] = i → j 거리(픽셀), 도달 불가 inf
+    offsets: uint32 × (P × P + 1)     i → j 경로 = items[offsets[i*P+j]:offsets[i*P+j+1]]
+    floors : int32 × V                경로 노드의 층
+    items  : uint32 × 항목 수          경로 노드 (V개 경로 노드 id 목록의 인덱스)
+
+- 경로 노드 id를 파일에 같이 넣으므로 그래프 인덱스(CompiledGraph)가 바뀌어도
+  이전 리비전 테이블을 읽어서 부분 갱신에 쓸 수 있다.
+- delta 저장 뒤에는 바뀐 노드/링크에 걸린 쌍만 다시 계산한다. (update_table 참고)
+- 맵핑 포인트가 MAX_POIS개를 넘으면 테이블을 만들지 않는다. (일반 A*로 처리)
+"""
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from heapq import heappush, heappop
+from math import inf
+
+from .cache import project_cache
+from .landmarks import sidecar_dir
+from .routing import get_compiled_graph, reverse_csr, shortest_distances
+
+MAGIC = b"POI1"
+_HEADER = struct.Struct("<4sIIIIqd")
+
+# 테이블 크기는 P² 에 비례하므로 맵핑 포인트 수에 상한을 둔다.
+MAX_POIS = 300
+
+# delta 저장으로 바뀐 노드가 이보다 많으면 부분 갱신 대신 전체를 다시 만든다.
+# (바뀐 노드마다 Dijkstra를 두 번 돌리므로, 많으면 전체 계산이 더 싸다)
+MAX_INCREMENTAL_NODES = 64
+
+# 부분 갱신에서 "더 짧은 경로가 생겼는지" 비교할 때의 여유
+_EPS = 1e-9
+
+
+def table_path(pid, revision):
+    return sidecar_dir(pid) / f"{revision}.poi"
+
+
+def latest_table_path(pid):
+    """파일이 있는 가장 최근 리비전의 테이블 경로. 없으면 None."""
+    folder = sidecar_dir(pid)
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return None
+    revs = []
+    for name in names:
+        stem, ext = os.path.splitext(name)
+        if ext == ".poi" and stem.isdigit():
+            revs.append(int(stem))
+    return folder / f"{max(revs)}.poi" if revs else None
+
+
+class PoiTable:
+    """mmap으로 연 맵핑 포인트 경로 테이블."""
+
+    __slots__ = ("revision", "scale", "pois", "index", "vocab",
+                 "dist", "offsets", "floors", "items", "_mm")
+
+    def __init__(self, revision, scale, pois, vocab, dist, offsets, floors, items, mm=None):
+        self.revision = revision
+        self.scale = scale
+        self.pois = pois
+        self.index = {nid: i for i, nid in enumerate(pois)}
+        self.vocab = vocab
+        self.dist = dist
+        self.offsets = offsets
+        self.floors = floors
+        self.items = items
+        self._mm = mm
+
+    def __len__(self):
+        return len(self.pois)
+
+    @property
+    def nbytes(self) -> int:
+        # 배열은 mmap(페이지 캐시)이라 id 문자열만 센다.
+        return sum(len(nid) + 100 for nid in self.pois) + sum(len(nid) + 60 for nid in self.vocab)
+
+    def path_items(self, i, j):
+        k = i * len(self.pois) + j
+        return self.items[self.offsets[k]:self.offsets[k + 1]]
+
+    def lookup(self, from_id: str, to_id: str):
+        """
+        두 맵핑 포인트 사이의 경로.
+
+        - 둘 중 하나라도 맵핑 포인트가 아니면 None (일반 길찾기로 처리)
+        - 경로가 없으면 (inf, [], [])
+        - 있으면 (거리(픽셀), [노드 id ...], [층 ...])
+        """
+        i = self.index.get(from_id)
+        j = self.index.get(to_id)
+        if i is None or j is None:
+            return None
+        d = self.dist[i * len(self.pois) + j]
+        if d == inf:
+            return inf, [], []
+        items = self.path_items(i, j)
+        return d, [self.vocab[v] for v in items], [self.floors[v] for v in items]
+
+
+# ----- 계산 -----
+
+def _paths_to_targets(graph, src, targets):
+    """
+    src에서 targets(노드 인덱스 집합)까지의 최단 거리와 경로. 목표를 모두 찾으면 멈춘다.
+
+    반환값: {목표 인덱스: (거리, [노드 인덱스 ...])}  (도달 불가면 (inf, []))
+    """
+    n = len(graph)
+    offsets, targets_arr, weights = graph.offsets, graph.targets, graph.weights
+
+    remaining = set(targets)
+    dist = array("d", [inf]) * n
+    prev = array("l", [-1]) * n
+    closed = bytearray(n)
+    dist[src] = 0.0
+    heap = [(0.0, src)]
+    while heap and remaining:
+        g, u = heappop(heap)
+        if closed[u]:
+            continue
+        closed[u] = 1
+        remaining.discard(u)
+        for k in range(offsets[u], offsets[u + 1]):
+            v = targets_arr[k]
+            if closed[v]:
+                continue
+            nd = g + weights[k]
+            if nd < dist[v]:
+                dist[v] = nd
+                prev[v] = u
+                heappush(heap, (nd, v))
+
+    out = {}
+    for t in targets:
+        if not closed[t]:
+            out[t] = (inf, [])
+            continue
+        path = [t]
+        while path[-1] != src:
+            path.append(prev[path[-1]])
+        path.reverse()
+        out[t] = (dist[t], path)
+    return out
+
+
+def _encode(pois, routes, graph, revision):
+    """
+    routes: {(i, j): (거리, [노드 id ...])}  (i, j: pois 인덱스, 모든 쌍)
+    → 파일 내용 bytes
+    """
+    P = len(pois)
+    vocab, vocab_index = [], {}
+    dist = array("d", [inf]) * (P * P)
+    offsets = array("I", [0])
+    items = array("I")
+    for i in range(P):
+        for j in range(P):
+            d, path = routes[i, j]
+            dist[i * P + j] = d
+            for nid in path:
+                v = vocab_index.get(nid)
+                if v is None:
+                    v = vocab_index[nid] = len(vocab)
+                    vocab.append(nid)
+                items.append(v)
+            offsets.append(len(items))
+    floors = array("i", (graph.floors[graph.index[nid]] for nid in vocab))
+
+    names = "\n".join(pois + vocab).encode("utf-8")
+    header = _HEADER.pack(MAGIC, P, len(vocab), len(items), len(names), int(revision), graph.scale)
+    pad = b"\0" * (-(len(header) + len(names)) % 8)
+    if sys.byteorder != "little":
+        raise RuntimeError("POI route table is little-endian only")
+    return b"".join((header, names, pad, dist.tobytes(), offsets.tobytes(),
+                     floors.tobytes(), items.tobytes()))
+
+
+def poi_ids(graph, special_ids) -> list:
+    """맵핑 포인트 노드 id 중 그래프에 있는 것 (정렬)"""
+    return sorted(nid for nid in set(special_ids) if nid in graph.index)
+
+
+def build_table(graph, pois, revision) -> bytes:
+    """모든 쌍을 새로 계산한 테이블 bytes"""
+    idx = [graph.index[nid] for nid in pois]
+    routes = {}
+    for i, s in enumerate(idx):
+        found = _paths_to_targets(graph, s, set(idx))
+        for j, t in enumerate(idx):
+            d, path = found[t]
+            routes[i, j] = (d, [graph.ids[v] for v in path])
+    return _encode(pois, routes, graph, revision)
+
+
+def update_table(graph, pois, revision, old: PoiTable, affected) -> bytes:
+    """
+    이전 리비전 테이블 old와 그 사이 바뀐 노드 id 집합 affected로 테이블을 갱신한다.
+
+    쌍 (s, t)를 다시 계산하는 조건:
+      1) s나 t가 새로 생긴 맵핑 포인트
+      2) 예전 경로가 affected 노드를 지남 (링크가 지워졌거나 길어졌을 수 있음)
+      3) 어떤 affected 노드 a에 대해 새 그래프에서 d(s, a) + d(a, t) < 예전 거리
+         (새 링크/짧아진 링크로 더 짧은 경로가 생겼을 수 있음)
+    바뀐 링크는 양 끝이 모두 affected에 들어가므로 이 외의 쌍은 예전 경로가
+    그대로 남아 있고 더 짧은 경로도 생길 수 없다.
+    """
+    P = len(pois)
+    idx = [graph.index[nid] for nid in pois]
+    n = len(graph)
+
+    # 조건 3 검사용: affected 노드에서 정방향/역방향 거리
+    hubs = [graph.index[a] for a in affected if a in graph.index]
+    finite = [old.dist[k] for k in range(len(old.dist)) if old.dist[k] != inf]
+    budget = max(finite) if len(finite) == len(old.dist) and finite else inf
+    r_offsets, r_targets, r_weights = reverse_csr(graph) if hubs else (None, None, None)
+    fwd = [shortest_distances(n, graph.offsets, graph.targets, graph.weights, a, budget)
+           for a in hubs]
+    bwd = [shortest_distances(n, r_offsets, r_targets, r_weights, a, budget) for a in hubs]
+
+    affected_vocab = {v for v, nid in enumerate(old.vocab) if nid in affected}
+
+    routes = {}
+    for i, s in enumerate(pois):
+        oi = old.index.get(s)
+        redo = set()
+        for j, t in enumerate(pois):
+            oj = old.index.get(t)
+            if oi is None or oj is None:
+                redo.add(j)
+                continue
+            d = old.dist[oi * len(old) + oj]
+            items = old.path_items(oi, oj)
+            if any(v in affected_vocab for v in items):
+                redo.add(j)
+                continue
+            si, ti = idx[i], idx[j]
+            if any(b[si] + f[ti] < d - _EPS for f, b in zip(fwd, bwd)):
+                redo.add(j)
+                continue
+            routes[i, j] = (d, [old.vocab[v] for v in items])
+        if redo:
+            found = _paths_to_targets(graph, idx[i], {idx[j] for j in redo})
+            for j in redo:
+                d, path = found[idx[j]]
+                routes[i, j] = (d, [graph.ids[v] for v in path])
+    return _encode(pois, routes, graph, revision)
+
+
+# ----- 파일 -----
+
+def write_table(pid, revision, payload: bytes):
+    """원자적으로 저장하고 다른 리비전 테이블은 지운다."""
+    folder = sidecar_dir(pid)
+    folder.mkdir(parents=True, exist_ok=True)
+    path = table_path(pid, revision)
+    fd, tmp = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=folder)
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(payload)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    remove_tables(pid, keep=path.name)
+    return path
+
+
+def carry_table(pid, old_revision, revision):
+    """
+    그래프가 바뀌지 않은 저장(층 이미지 교체 등)에서 old_revision 테이블을 revision으로 옮긴다.
+    (헤더의 revision 칸만 고쳐 쓴다) 옮길 테이블이 없으면 None
+    """
+    try:
+        payload = bytearray(table_path(pid, old_revision).read_bytes())
+        magic, P, V, count, names_len, _, scale = _HEADER.unpack_from(payload)
+    except (OSError, struct.error):
+        return None
+    if magic != MAGIC:
+        return None
+    _HEADER.pack_into(payload, 0, magic, P, V, count, names_len, int(revision), scale)
+    return write_table(pid, revision, bytes(payload))
+
+
+def remove_tables(pid, keep=None):
+    folder = sidecar_dir(pid)
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return
+    for name in names:
+        if name.endswith(".poi") and name != keep:
+            try:
+                os.unlink(folder / name)
+            except OSError:
+                pass
+
+
+def load_table(path):
+    """테이블 파일을 mmap으로 연다. 없거나 형식이 맞지 않으면 None."""
+    try:
+        with open(path, "rb") as fh:
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        magic, P, V, count, names_len, revision, scale = _HEADER.unpack_from(mm)
+    except struct.error:
+        return None
+    offset = _HEADER.size + names_len
+    offset += -offset % 8
+    sizes = (8 * P * P, 4 * (P * P + 1), 4 * V, 4 * count)
+    if (magic != MAGIC or len(mm) != offset + sum(sizes) or sys.byteorder != "little"):
+        return None
+    names = bytes(mm[_HEADER.size:_HEADER.size + names_len]).decode("utf-8")
+    names = names.split("\n") if names else []
+    if len(names) != P + V:
+        return None
+
+    view = memoryview(mm)
+    parts = []
+    for size, code in zip(sizes, ("d", "I", "i", "I")):
+        parts.append(view[offset:offset + size].cast(code))
+        offset += size
+    dist, offsets, floors, items = parts
+    return PoiTable(revision, scale, names[:P], names[P:], dist, offsets, floors, items, mm)
+
+
+def build_for_project(project, affected=None):
+    """
+    project 현재 리비전의 테이블을 만든다.
+
+    - affected(이전 테이블 이후 바뀐 노드 id 집합)가 주어지고 이전 테이블이 있으면 부분 갱신
+    - 맵핑 포인트가 2개 미만이거나 MAX_POIS개를 넘으면 테이블을 지우고 None
+
+    반환값: 저장한 파일 경로 또는 None
+    """
+    from .models import Node
+
+    graph = get_compiled_graph(project)
+    special = (Node.objects.filter(project_id=project.pk).exclude(special_id="")
+               .values_list("node_id", flat=True))
+    pois = poi_ids(graph, special)
+    if not 2 <= len(pois) <= MAX_POIS:
+        remove_tables(project.pk)
+        return None
+
+    old = None
+    if affected is not None and len(affected) <= MAX_INCREMENTAL_NODES:
+        path = latest_table_path(project.pk)
+        old = load_table(path) if path is not None else None
+    if old is not None and old.revision < project.revision:
+        payload = update_table(graph, pois, project.revision, old, set(affected))
+    else:
+        payload = build_table(graph, pois, project.revision)
+    return write_table(project.pk, project.revision, payload)
+
+
+def get_poi_table(project):
+    """
+    프로젝트 현재 리비전의 PoiTable. 파일이 (아직) 없으면 None.
+    (캐시 정책은 landmarks.get_landmarks와 같다)
+    """
+    value = project_cache.get(project.pk, project.updated_at, "poi")
+    if value is None:
+        value = load_table(table_path(project.pk, project.revision))
+        if value is not None and value.revision == project.revision:
+            project_cache.set(project.pk, project.updated_at, "poi", value)
+        else:
+            value = None
+    return value
@@ -0,0 +1,165 @@
+# maps/relational.py
+"""
+Project.data(JSON) ↔ Node/Link/Polygon/Floor 테이블 동기화 모듈.
+
+- sync_project_rows(project): data를 정규 표현으로 바꾼 뒤, 기존 행과 비교해서
+    - 새로 생긴 것 → bulk_create
+    - 값이 바뀐 것 → bulk_update (바뀐 행만)
+    - 사라진 것   → delete
+  를 수행한다. 큰 건물에서 노드 몇 개만 고친 저장이면 그만큼의 행만 쓴다.
+  delta 저장은 바뀐 항목(delta.GraphChanges.rows)을 넘겨서 그 행들만 읽고 고친다.
+- views_from_rows(project): 테이블 행으로부터 data와 같은 모양의
+  nodes / connections / floors / _editor 뷰를 다시 만든다.
+"""
+from .blobs import blob_refs_for
+from .canonical import canonical_from_data, derive_views, floor_indexes
+from .models import Floor, Node, Link, Polygon, MediaBlobRef
+
+# bulk_create / bulk_update 한 번에 보낼 행 수
+BATCH_SIZE = 1000
+
+NODE_FIELDS = ("floor", "x", "y", "name", "special_id", "nseq")
+LINK_FIELDS = ("a", "b", "floor", "lseq", "distance")
+POLYGON_FIELDS = ("floor", "name", "pseq", "nodes")
+FLOOR_FIELDS = ("name", "image", "width", "height")
+BLOB_REF_FIELDS = ("blob_id",)
+
+
+def floor_rows(data: dict, indexes) -> dict:
+    """
+    층 번호 → {name, image, width, height}
+
+    - 이름: _editor.floorNames → meta.floorNames
+    - 이미지: data.images (list 또는 {"0": url} dict)
+    - 크기: _editor.imageSizes
+    """
+    editor = data.get("_editor") if isinstance(data.get("_editor"), dict) else {}
+    meta = data.get("meta") if isinstance(data.get("meta"), dict) else {}
+    names = editor.get("floorNames") or meta.get("floorNames") or []
+    sizes = editor.get("imageSizes") or []
+    images = data.get("images")
+
+    def _at(seq, i):
+        if isinstance(seq, list):
+            return seq[i] if 0 <= i < len(seq) else None
+        if isinstance(seq, dict):
+            return seq.get(str(i))
+        return None
+
+    out = {}
+    for i in indexes:
+        size = _at(sizes, i)
+        size = size if isinstance(size, dict) else {}
+        out[i] = {
+            "name": str(_at(names, i) or "")[:255],
+            "image": str(_at(images, i) or "")[:500],
+            "width": int(size["width"]) if size.get("width") else None,
+            "height": int(size["height"]) if size.get("height") else None,
+        }
+    return out
+
+
+def _sync(model, project, key_field, wanted: dict, fields, keys=None) -> tuple:
+    """
+    model 테이블의 project 행들을 wanted(키 → 필드 값 dict)와 같게 맞춘다.
+
+    - keys: 주면 그 키의 행만 읽어서 맞춘다. (wanted에 없는 키의 행은 삭제)
+
+    반환값: (생성 수, 수정 수, 삭제 수)
+    """
+    rows = model.objects.filter(project=project)
+    if keys is not None:
+        rows = rows.filter(**{f"{key_field}__in": list(keys)})
+    existing = {getattr(o, key_field): o for o in rows}
+
+    to_create, to_update = [], []
+    for key, values in wanted.items():
+        obj = existing.pop(key, None)
+        if obj is None:
+            to_create.append(model(project=project, **{key_field: key}, **values))
+            continue
+        changed = False
+        for f, v in values.items():
+            if getattr(obj, f) != v:
+                setattr(obj, f, v)
+                changed = True
+        if changed:
+            to_update.append(obj)
+
+    if to_create:
+        model.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+    if to_update:
+        model.objects.bulk_update(to_update, fields, batch_size=BATCH_SIZE)
+    if existing:
+        model.objects.filter(pk__in=[o.pk for o in existing.values()]).delete()
+    return len(to_create), len(to_update), len(existing)
+
+
+def _wanted(items, fields) -> dict:
+    """정규 표현 항목들 → {id: 필드 값 dict} (None 항목 = 삭제라 뺀다)"""
+    return {i["id"]: {f: i[f] for f in fields} for i in items if i is not None}
+
+
+def sync_project_rows(project, changed=None) -> dict:
+    """
+    project.data 내용을 Node/Link/Polygon/Floor/MediaBlobRef 테이블에 반영한다.
+
+    - Project.save() 안에서 (같은 트랜잭션으로) 호출된다.
+    - changed: delta 저장의 바뀐 항목 {"nodes": {id: 항목 또는 None}, "links": ..., "polygons": ...}
+      (maps/delta.GraphChanges.rows). 주면 Node/Link/Polygon은 그 id의 행만 읽고 고친다.
+      층/이미지 참조 행은 층 수만큼이라 항상 전체를 맞춘다.
+    - 반환값: {"nodes": (생성, 수정, 삭제), "links": ..., "polygons": ..., "floors": ...,
+               "blob_refs": ...}
+    """
+    data = project.data if isinstance(project.data, dict) else {}
+    if changed is None:
+        canonical = canonical_from_data(data)
+        graph = {kind: (canonical[kind], None) for kind in ("nodes", "links", "polygons")}
+        floors = floor_rows(data, canonical["floors"])
+    else:
+        graph = {kind: (changed[kind].values(), changed[kind].keys())
+                 for kind in ("nodes", "links", "polygons")}
+        floors = floor_rows(data, floor_indexes(data))
+
+    nodes, node_keys = graph["nodes"]
+    links, link_keys = graph["links"]
+    polygons, polygon_keys = graph["polygons"]
+    return {
+        "nodes": _sync(Node, project, "node_id", _wanted(nodes, NODE_FIELDS), NODE_FIELDS,
+                       node_keys),
+        "links": _sync(Link, project, "link_id", _wanted(links, LINK_FIELDS), LINK_FIELDS,
+                       link_keys),
+        "polygons": _sync(Polygon, project, "polygon_id", _wanted(polygons, POLYGON_FIELDS),
+                          POLYGON_FIELDS, polygon_keys),
+        "floors": _sync(Floor, project, "index", floors, FLOOR_FIELDS),
+        "blob_refs": _sync(MediaBlobRef, project, "floor", blob_refs_for(data), BLOB_REF_FIELDS),
+    }
+
+
+def canonical_from_rows(project) -> dict:
+    """테이블 행으로부터 정규 표현(canonical_from_data와 같은 모양)을 만든다."""
+    nodes = [
+        {"id": r["node_id"], **{f: r[f] for f in NODE_FIELDS}}
+        for r in Node.objects.filter(project=project).order_by("id")
+                             .values("node_id", *NODE_FIELDS)
+    ]
+    links = [
+        {"id": r["link_id"], **{f: r[f] for f in LINK_FIELDS}}
+        for r in Link.objects.filter(project=project).order_by("id")
+                             .values("link_id", *LINK_FIELDS)
+    ]
+    polygons = [
+        {"id": r["polygon_id"], **{f: r[f] for f in POLYGON_FIELDS}}
+        for r in Polygon.objects.filter(project=project).order_by("id")
+                                .values("polygon_id", *POLYGON_FIELDS)
+    ]
+    floors = list(
+        Floor.objects.filter(project=project).order_by("index")
+                     .values_list("index", flat=True)
+    )
+    return {"nodes": nodes, "links": links, "polygons": polygons, "floors": floors}
+
+
+def views_from_rows(project) -> dict:
+    """테이블 행으로부터 data와 같은 모양의 그래프 뷰를 다시 만든다. (canonical.derive_views 참고)"""
+    return derive_views(canonical_from_rows(project))
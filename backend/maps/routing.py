@@ -0,0 +1,385 @@
+# maps/routing.py
+"""
+서버 측 최단 경로(길찾기) 엔진.
+
+- Project.data 의 nodes / connections(양방향 인접 dict, 픽셀 거리)를
+  배열 기반 CSR(Compressed Sparse Row) 그래프로 한 번 컴파일해 두고,
+- 노드 x/y 좌표의 직선거리를 휴리스틱으로 사용하는 A* 로 경로를 찾는다.
+- connections 는 층(floors 버킷)을 가리지 않고 전체 노드를 잇기 때문에
+  엘리베이터/계단처럼 층을 건너는 링크도 그대로 탐색된다.
+
+컴파일 결과는 프로젝트 리비전(pk, updated_at)별로 한 번만 만들어서 재사용한다.
+"""
+from array import array
+from heapq import heappush, heappop
+from math import hypot, inf, isfinite
+
+from .cache import project_cache
+
+
+def node_floor_map(data: dict) -> dict:
+    """
+    노드 id → 층 번호 매핑을 만든다.
+
+    우선순위:
+      1) _editor.node_meta[id].floor  (에디터가 저장한 원본 값)
+      2) floors[k].nodes 버킷 소속
+      3) 둘 다 없으면 0층
+    """
+    out = {}
+
+    floors = data.get("floors")
+    if isinstance(floors, dict):
+        for key, bucket in floors.items():
+            try:
+                f = int(key)
+            except (TypeError, ValueError):
+                continue
+            nodes = bucket.get("nodes") if isinstance(bucket, dict) else None
+            if isinstance(nodes, dict):
+                for nid in nodes:
+                    out[nid] = f
+
+    editor = data.get("_editor")
+    node_meta = editor.get("node_meta") if isinstance(editor, dict) else None
+    if isinstance(node_meta, dict):
+        for nid, m in node_meta.items():
+            if isinstance(m, dict) and m.get("floor") is not None:
+                try:
+                    out[nid] = int(m["floor"])
+                except (TypeError, ValueError):
+                    pass
+    return out
+
+
+def project_scale(data: dict) -> float:
+    """data.scale(m/pixel)을 float로 돌려준다. 값이 없거나 잘못되면 0."""
+    try:
+        s = float((data or {}).get("scale") or 0)
+    except (TypeError, ValueError, AttributeError):
+        return 0.0
+    return s if isfinite(s) and s > 0 else 0.0
+
+
+class CompiledGraph:
+    """
+    CSR 형태로 압축한 길찾기용 그래프.
+
+    - ids     : 인덱스 → 노드 id ("N_12" 등)
+    - index   : 노드 id → 인덱스
+    - xs, ys  : 노드 좌표 (픽셀)
+    - floors  : 노드 층 번호
+    - offsets : i번 노드의 이웃은 targets[offsets[i]:offsets[i+1]]
+    - targets / weights : 이웃 노드 인덱스와 간선 가중치(픽셀 거리)
+    - h_scale : 휴리스틱 보정 계수 (간선 가중치 / 직선거리 의 최솟값, 최대 1)
+                저장된 거리가 좌표 거리보다 짧은 링크가 있어도 A*가
+                항상 최단 경로를 보장하도록 휴리스틱을 줄여준다.
+    - scale   : data.scale (m/pixel, 없으면 0)
+    """
+
+    __slots__ = ("ids", "index", "xs", "ys", "floors",
+                 "offsets", "targets", "weights", "h_scale", "scale")
+
+    def __init__(self, ids, index, xs, ys, floors, offsets, targets, weights,
+                 h_scale, scale=0.0):
+        self.ids = ids
+        self.index = index
+        self.xs = xs
+        self.ys = ys
+        self.floors = floors
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        self.h_scale = h_scale
+        self.scale = scale
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.targets)
+
+    @property
+    def nbytes(self) -> int:
+        """캐시 용량 계산용 대략적인 메모리 사용량 (바이트)."""
+        arrays = (self.xs, self.ys, self.floors,
+                  self.offsets, self.targets, self.weights)
+        total = sum(a.itemsize * len(a) for a in arrays)
+        # ids 리스트 + index dict (문자열 포함) 대략치
+        total += sum(len(nid) + 100 for nid in self.ids)
+        return total
+
+
+def compile_graph(data: dict) -> CompiledGraph:
+    """
+    Project.data(dict)를 CompiledGraph로 변환한다.
+
+    - nodes 에 없는(좌표를 알 수 없는) 노드를 가리키는 연결은 건너뛴다.
+    - 음수/NaN 등 잘못된 거리 값도 건너뛴다.
+    """
+    nodes = data.get("nodes") if isinstance(data, dict) else None
+    conn = data.get("connections") if isinstance(data, dict) else None
+    if not isinstance(nodes, dict):
+        nodes = {}
+    if not isinstance(conn, dict):
+        conn = {}
+
+    floor_of = node_floor_map(data)
+
+    ids = list(nodes.keys())
+    index = {nid: i for i, nid in enumerate(ids)}
+    n = len(ids)
+
+    xs = array("d", bytes(8 * n))
+    ys = array("d", bytes(8 * n))
+    floors = array("i", bytes(4 * n))
+    for i, nid in enumerate(ids):
+        v = nodes[nid] if isinstance(nodes[nid], dict) else {}
+        try:
+            xs[i] = float(v.get("x") or 0)
+            ys[i] = float(v.get("y") or 0)
+        except (TypeError, ValueError):
+            pass
+        floors[i] = floor_of.get(nid, 0)
+
+    offsets = array("l", [0])
+    targets = array("l")
+    weights = array("d")
+    h_scale = 1.0
+
+    for i, nid in enumerate(ids):
+        row = conn.get(nid)
+        if isinstance(row, dict):
+            for tid, w in row.items():
+                j = index.get(tid)
+                if j is None or j == i:
+                    continue
+                try:
+                    w = float(w)
+                except (TypeError, ValueError):
+                    continue
+                if not isfinite(w) or w < 0:
+                    continue
+                targets.append(j)
+                weights.append(w)
+
+                d = hypot(xs[i] - xs[j], ys[i] - ys[j])
+                if d > 0 and w < d * h_scale:
+                    h_scale = w / d
+        offsets.append(len(targets))
+
+    return CompiledGraph(ids, index, xs, ys, floors, offsets, targets, weights,
+                         h_scale, project_scale(data))
+
+
+def astar(graph: CompiledGraph, src: int, dst: int, landmarks=None):
+    """
+    인덱스 src → dst 최단 경로를 A*로 찾는다.
+
+    - landmarks(maps/landmarks.py의 Landmarks)가 주어지면
+      직선거리와 ALT 하한 중 큰 값을 휴리스틱으로 쓴다.
+
+    반환값: (거리(픽셀), [노드 인덱스 ...])
+            경로가 없으면 (inf, [])
+    """
+    if src == dst:
+        return 0.0, [src]
+
+    n = len(graph)
+    xs, ys = graph.xs, graph.ys
+    offsets, targets, weights = graph.offsets, graph.targets, graph.weights
+    hs = graph.h_scale
+    tx, ty = xs[dst], ys[dst]
+
+    dist = array("d", [inf]) * n
+    prev = array("l", [-1]) * n
+    closed = bytearray(n)
+
+    if landmarks is not None:
+        alt = landmarks.potential(src, dst)
+
+        def h(v):
+            e = hs * hypot(xs[v] - tx, ys[v] - ty)
+            a = alt(v)
+            return a if a > e else e
+    else:
+        def h(v):
+            return hs * hypot(xs[v] - tx, ys[v] - ty)
+
+    dist[src] = 0.0
+    heap = [(h(src), 0.0, src)]
+
+    while heap:
+        _, g, u = heappop(heap)
+        if closed[u]:
+            continue
+        if u == dst:
+            break
+        closed[u] = 1
+
+        for k in range(offsets[u], offsets[u + 1]):
+            v = targets[k]
+            if closed[v]:
+                continue
+            nd = g + weights[k]
+            if nd < dist[v]:
+                dist[v] = nd
+                prev[v] = u
+                heappush(heap, (nd + h(v), nd, v))
+
+    if dist[dst] == inf:
+        return inf, []
+
+    path = [dst]
+    while path[-1] != src:
+        path.append(prev[path[-1]])
+    path.reverse()
+    return dist[dst], path
+
+
+def dijkstra_to_targets(graph: CompiledGraph, src: int, targets) -> list:
+    """
+    src 한 점에서 targets(노드 인덱스 목록) 각각까지의 최단 거리.
+
+    - 일대다(one-to-many) Dijkstra. 목표 노드를 모두 확정하면 바로 멈춘다.
+    - 반환값: targets 순서대로 거리 목록 (도달 불가면 inf)
+    """
+    n = len(graph)
+    offsets, targets_arr, weights = graph.offsets, graph.targets, graph.weights
+
+    remaining = set(targets)
+    dist = array("d", [inf]) * n
+    closed = bytearray(n)
+    dist[src] = 0.0
+    heap = [(0.0, src)]
+
+    while heap and remaining:
+        g, u = heappop(heap)
+        if closed[u]:
+            continue
+        closed[u] = 1
+        remaining.discard(u)
+
+        for k in range(offsets[u], offsets[u + 1]):
+            v = targets_arr[k]
+            if closed[v]:
+                continue
+            nd = g + weights[k]
+            if nd < dist[v]:
+                dist[v] = nd
+                heappush(heap, (nd, v))
+
+    return [dist[t] if closed[t] else inf for t in targets]
+
+
+def shortest_distances(n, offsets, targets, weights, src, budget=inf):
+    """
+    CSR 배열(offsets/targets/weights)에서 src로부터 모든 노드까지의 최단 거리 (Dijkstra).
+
+    - budget을 넘는 거리는 탐색하지 않고 inf로 남긴다.
+    - 역방향 CSR(reverse_csr)을 넘기면 "모든 노드 → src" 거리가 된다.
+    """
+    dist = array("d", [inf]) * n
+    dist[src] = 0.0
+    heap = [(0.0, src)]
+    while heap:
+        g, u = heappop(heap)
+        if g > dist[u]:
+            continue
+        for k in range(offsets[u], offsets[u + 1]):
+            v = targets[k]
+            nd = g + weights[k]
+            if nd <= budget and nd < dist[v]:
+                dist[v] = nd
+                heappush(heap, (nd, v))
+    return dist
+
+
+def reverse_csr(graph: CompiledGraph):
+    """간선 방향을 뒤집은 CSR 배열 (offsets, targets, weights)"""
+    n = len(graph)
+    offsets, targets, weights = graph.offsets, graph.targets, graph.weights
+    counts = array("l", [0]) * (n + 1)
+    for k in range(len(targets)):
+        counts[targets[k] + 1] += 1
+    for i in range(1, n + 1):
+        counts[i] += counts[i - 1]
+    r_targets = array("l", [0]) * len(targets)
+    r_weights = array("d", [0.0]) * len(targets)
+    fill = array("l", counts)
+    for u in range(n):
+        for k in range(offsets[u], offsets[u + 1]):
+            v = targets[k]
+            r_targets[fill[v]] = u
+            r_weights[fill[v]] = weights[k]
+            fill[v] += 1
+    return counts, r_targets, r_weights
+
+
+def reachable_within(graph: CompiledGraph, sources, budget: float) -> dict:
+    """
+    sources(노드 인덱스 목록) 중 가장 가까운 곳에서 budget(픽셀 거리) 이내인 노드들.
+
+    - 다중 출발(multi-source) Dijkstra. 모든 출발 노드를 거리 0으로 넣고 시작한다.
+    - budget을 넘는 간선은 힙에 넣지 않으므로 범위 밖은 탐색하지 않는다.
+    - 반환값: {노드 인덱스: 거리} (확정된 순서 = 가까운 순)
+    """
+    n = len(graph)
+    offsets, targets, weights = graph.offsets, graph.targets, graph.weights
+
+    dist = array("d", [inf]) * n
+    out = {}
+    heap = []
+    for s in sources:
+        if dist[s] != 0.0:
+            dist[s] = 0.0
+            heap.append((0.0, s))
+
+    while heap:
+        g, u = heappop(heap)
+        if u in out:
+            continue
+        out[u] = g
+
+        for k in range(offsets[u], offsets[u + 1]):
+            v = targets[k]
+            nd = g + weights[k]
+            if nd <= budget and nd < dist[v]:
+                dist[v] = nd
+                heappush(heap, (nd, v))
+
+    return out
+
+
+def find_route(graph: CompiledGraph, from_id: str, to_id: str, landmarks=None):
+    """
+    노드 id 기준 길찾기 헬퍼. (landmarks는 astar() 참고)
+
+    - 두 노드 중 하나라도 그래프에 없으면 KeyError
+    - 경로가 없으면 None
+    - 경로가 있으면 (거리(픽셀), [노드 id ...])
+    """
+    src = graph.index[from_id]
+    dst = graph.index[to_id]
+    d, path = astar(graph, src, dst, landmarks)
+    if not path:
+        return None
+    return d, [graph.ids[i] for i in path]
+
+
+# ----- 프로젝트 리비전별 컴파일 캐시 -----
+
+def get_compiled_graph(project) -> CompiledGraph:
+    """
+    Project 인스턴스의 컴파일된 그래프를 돌려준다.
+
+    - project_cache에 (pk, updated_at, "graph") 키로 보관하므로
+      같은 리비전이면 이전에 만든 그래프를 재사용하고,
+      프로젝트가 저장되어 updated_at이 바뀌면 다시 컴파일한다.
+    """
+    return project_cache.get_or_build(
+        project,
+        "graph",
+        lambda: compile_graph(project.data if isinstance(project.data, dict) else {}),
+    )
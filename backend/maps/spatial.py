@@ -0,0 +1,433 @@
+# maps/spatial.py
+"""
+층별 공간 인덱스 (가장 가까운 노드 / 링크 찾기, 좌표가 속한 방/구역 찾기).
+
+측위 좌표를 "F층의 가장 가까운 노드/링크"에 붙이는(snap) 질의를 빠르게 처리한다.
+에디터의 findNearestNodeForPoint / distancePointToSegment 처럼 모든 노드를
+훑지 않고, 층마다 균일 격자(uniform grid)를 만들어 근처 칸만 본다.
+
+- 격자 한 칸 크기는 층의 범위와 항목 수로 정한다. (칸당 평균 ITEMS_PER_CELL개 정도)
+- 칸 → 항목 목록은 CSR 형태의 array 두 개(offsets, items)로 보관한다.
+- 질의는 질의 좌표가 있는 칸부터 바깥 고리(ring)로 넓혀 가다가,
+  다음 고리의 최소 거리가 지금까지 찾은 k번째 거리보다 크면 멈춘다.
+- 링크는 선분의 bounding box가 걸치는 모든 칸에 넣는다.
+
+노드/링크 인덱스는 컴파일된 길찾기 그래프(maps/routing.py)로부터 만들고,
+폴리곤 인덱스는 정규 표현의 폴리곤 꼭짓점(노드 id 링)으로부터 만든다.
+둘 다 프로젝트 리비전별로 project_cache에 보관한다.
+"""
+from array import array
+from heapq import heappush, heappushpop, nlargest
+from math import hypot, inf, isfinite, sqrt
+
+from .cache import project_cache
+from .canonical import canonical_from_data
+from .routing import get_compiled_graph
+
+# 격자 한 칸에 평균 몇 개의 항목이 들어가도록 할지
+ITEMS_PER_CELL = 2.0
+
+# 한 축 최대 칸 수 (아주 넓고 듬성듬성한 층에서 칸 수가 폭발하지 않도록)
+MAX_CELLS_PER_AXIS = 2048
+
+
+class GridIndex:
+    """
+    bounding box 목록에 대한 균일 격자 인덱스.
+
+    - boxes: [(minx, miny, maxx, maxy), ...]  (점이면 minx == maxx, miny == maxy)
+    - 항목 i는 자기 box가 걸치는 모든 칸에 들어간다.
+    """
+
+    __slots__ = ("x0", "y0", "cell", "nx", "ny", "offsets", "items")
+
+    def __init__(self, boxes):
+        n = len(boxes)
+        if n:
+            x0 = min(b[0] for b in boxes)
+            y0 = min(b[1] for b in boxes)
+            x1 = max(b[2] for b in boxes)
+            y1 = max(b[3] for b in boxes)
+        else:
+            x0 = y0 = x1 = y1 = 0.0
+        w, h = max(x1 - x0, 1e-9), max(y1 - y0, 1e-9)
+
+        # 칸 크기: 칸당 평균 ITEMS_PER_CELL개, 그리고 평균 항목 크기보다는 크게
+        cell = sqrt(w * h * ITEMS_PER_CELL / max(n, 1))
+        if n:
+            extent = sum(max(b[2] - b[0], b[3] - b[1]) for b in boxes) / n
+            cell = max(cell, extent)
+        cell = max(cell, w / MAX_CELLS_PER_AXIS, h / MAX_CELLS_PER_AXIS, 1e-6)
+
+        self.x0, self.y0, self.cell = x0, y0, cell
+        self.nx = min(MAX_CELLS_PER_AXIS, int(w / cell) + 1)
+        self.ny = min(MAX_CELLS_PER_AXIS, int(h / cell) + 1)
+
+        spans = [self._span(b) for b in boxes]
+
+        counts = array("l", [0]) * (self.nx * self.ny + 1)
+        for cx0, cy0, cx1, cy1 in spans:
+            for cy in range(cy0, cy1 + 1):
+                row = cy * self.nx
+                for cx in range(cx0, cx1 + 1):
+                    counts[row + cx + 1] += 1
+        for c in range(1, len(counts)):
+            counts[c] += counts[c - 1]
+
+        items = array("l", [0]) * counts[-1]
+        fill = array("l", counts)
+        for i, (cx0, cy0, cx1, cy1) in enumerate(spans):
+            for cy in range(cy0, cy1 + 1):
+                row = cy * self.nx
+                for cx in range(cx0, cx1 + 1):
+                    c = row + cx
+                    items[fill[c]] = i
+                    fill[c] += 1
+
+        self.offsets = counts
+        self.items = items
+
+    def _cx(self, x) -> int:
+        return min(self.nx - 1, max(0, int((x - self.x0) / self.cell)))
+
+    def _cy(self, y) -> int:
+        return min(self.ny - 1, max(0, int((y - self.y0) / self.cell)))
+
+    def _span(self, box):
+        return self._cx(box[0]), self._cy(box[1]), self._cx(box[2]), self._cy(box[3])
+
+    @property
+    def nbytes(self) -> int:
+        return self.offsets.itemsize * len(self.offsets) + self.items.itemsize * len(self.items)
+
+    def cell_items(self, x, y):
+        """(x, y)가 들어가는 칸의 항목들"""
+        c = self._cy(y) * self.nx + self._cx(x)
+        return self.items[self.offsets[c]:self.offsets[c + 1]]
+
+    def rings(self, x, y):
+        """
+        (x, y)가 있는 칸부터 고리 단위로 (고리 최소 거리, 항목 목록)을 내보낸다.
+
+        고리 r에 속한 칸의 항목은 (x, y)에서 최소 (r - 1) * cell 이상 떨어져 있다.
+        """
+        cx, cy = self._cx(x), self._cy(y)
+        nx, ny = self.nx, self.ny
+        offsets, items = self.offsets, self.items
+        max_r = max(cx, nx - 1 - cx, cy, ny - 1 - cy)
+        for r in range(max_r + 1):
+            found = []
+            for gy in range(cy - r, cy + r + 1):
+                if gy < 0 or gy >= ny:
+                    continue
+                # 고리의 위/아래 줄은 전부, 가운데 줄은 양 끝 칸만
+                if gy in (cy - r, cy + r):
+                    xs = range(max(0, cx - r), min(nx - 1, cx + r) + 1)
+                else:
+                    xs = [gx for gx in (cx - r, cx + r) if 0 <= gx < nx]
+                row = gy * nx
+                for gx in xs:
+                    c = row + gx
+                    found.extend(items[offsets[c]:offsets[c + 1]])
+            yield max(0.0, (r - 1) * self.cell), found
+
+
+def point_segment(px, py, ax, ay, bx, by):
+    """
+    점 P와 선분 AB 사이 최단 거리.
+
+    반환값: (거리, 선분 위 가장 가까운 점 x, y, t)  (t: A=0 ~ B=1)
+    """
+    dx, dy = bx - ax, by - ay
+    len2 = dx * dx + dy * dy
+    if len2 == 0:
+        t = 0.0
+    else:
+        t = ((px - ax) * dx + (py - ay) * dy) / len2
+        t = 0.0 if t < 0 else 1.0 if t > 1 else t
+    qx, qy = ax + t * dx, ay + t * dy
+    return hypot(px - qx, py - qy), qx, qy, t
+
+
+class FloorIndex:
+    """
+    한 층의 노드(점)와 링크(선분) 격자 인덱스.
+
+    - nodes   : 그래프 노드 인덱스 목록 (CompiledGraph 기준)
+    - segments: (a, b) 그래프 노드 인덱스 쌍 목록 (양 끝이 같은 층인 링크만)
+    """
+
+    __slots__ = ("graph", "nodes", "node_grid", "seg_a", "seg_b", "seg_grid")
+
+    def __init__(self, graph, nodes, segments):
+        xs, ys = graph.xs, graph.ys
+        self.graph = graph
+        self.nodes = array("l", nodes)
+        self.node_grid = GridIndex([(xs[i], ys[i], xs[i], ys[i]) for i in nodes])
+        self.seg_a = array("l", (a for a, _ in segments))
+        self.seg_b = array("l", (b for _, b in segments))
+        self.seg_grid = GridIndex([
+            (min(xs[a], xs[b]), min(ys[a], ys[b]), max(xs[a], xs[b]), max(ys[a], ys[b]))
+            for a, b in segments
+        ])
+
+    @property
+    def nbytes(self) -> int:
+        return (self.node_grid.nbytes + self.seg_grid.nbytes
+                + self.nodes.itemsize * (len(self.nodes) + len(self.seg_a) + len(self.seg_b)))
+
+    def nearest_nodes(self, x, y, k=1):
+        """(x, y)에서 가까운 노드 k개 → [(거리, 그래프 노드 인덱스), ...] 가까운 순"""
+        if not len(self.nodes) or k <= 0:
+            return []
+        xs, ys, nodes = self.graph.xs, self.graph.ys, self.nodes
+        heap = []  # (-거리, 노드) 최대 힙, 크기 k
+        for lower, found in self.node_grid.rings(x, y):
+            if len(heap) >= k and lower > -heap[0][0]:
+                break
+            for item in found:
+                i = nodes[item]
+                d = hypot(xs[i] - x, ys[i] - y)
+                if len(heap) < k:
+                    heappush(heap, (-d, i))
+                elif d < -heap[0][0]:
+                    heappushpop(heap, (-d, i))
+        return [(-nd, i) for nd, i in nlargest(len(heap), heap)]
+
+    def nearest_segment(self, x, y):
+        """
+        (x, y)에서 가장 가까운 링크.
+
+        반환값: (거리, a, b, 붙인 점 x, y, t) 또는 링크가 없으면 None
+        """
+        if not len(self.seg_a):
+            return None
+        xs, ys = self.graph.xs, self.graph.ys
+        seg_a, seg_b = self.seg_a, self.seg_b
+        best = None
+        best_d = inf
+        seen = set()
+        for lower, found in self.seg_grid.rings(x, y):
+            if lower > best_d:
+                break
+            for s in found:
+                if s in seen:
+                    continue
+                seen.add(s)
+                a, b = seg_a[s], seg_b[s]
+                d, qx, qy, t = point_segment(x, y, xs[a], ys[a], xs[b], ys[b])
+                if d < best_d:
+                    best_d = d
+                    best = (d, a, b, qx, qy, t)
+        return best
+
+
+class SpatialIndex:
+    """층 번호 → FloorIndex"""
+
+    __slots__ = ("graph", "floors")
+
+    def __init__(self, graph, floors):
+        self.graph = graph
+        self.floors = floors
+
+    def floor(self, f):
+        return self.floors.get(f)
+
+    @property
+    def nbytes(self) -> int:
+        # graph는 "graph" 캐시 엔트리와 공유하므로 여기서는 세지 않는다.
+        return sum(fi.nbytes for fi in self.floors.values()) + 64
+
+
+def build_spatial_index(graph) -> SpatialIndex:
+    """
+    CompiledGraph로부터 층별 인덱스를 만든다.
+
+    - 좌표가 유한한 노드만 넣는다.
+    - 링크는 양 끝이 같은 층인 것만 (엘리베이터/계단처럼 층을 건너는 링크는 제외)
+    """
+    xs, ys, floors = graph.xs, graph.ys, graph.floors
+    offsets, targets = graph.offsets, graph.targets
+
+    nodes_by_floor = {}
+    segs_by_floor = {}
+    for i in range(len(graph)):
+        if not (isfinite(xs[i]) and isfinite(ys[i])):
+            continue
+        f = floors[i]
+        nodes_by_floor.setdefault(f, []).append(i)
+        for e in range(offsets[i], offsets[i + 1]):
+            j = targets[e]
+            # 양방향 링크는 한 번만 (i < j)
+            if j > i and floors[j] == f and isfinite(xs[j]) and isfinite(ys[j]):
+                segs_by_floor.setdefault(f, []).append((i, j))
+
+    return SpatialIndex(graph, {
+        f: FloorIndex(graph, nodes, segs_by_floor.get(f, []))
+        for f, nodes in nodes_by_floor.items()
+    })
+
+
+def get_spatial_index(project) -> SpatialIndex:
+    """프로젝트 리비전별 공간 인덱스 (project_cache에 "spatial"로 보관)."""
+    return project_cache.get_or_build(
+        project,
+        "spatial",
+        lambda: build_spatial_index(get_compiled_graph(project)),
+    )
+
+
+def snap_point(index: SpatialIndex, floor, x, y, k=1) -> dict:
+    """
+    (floor, x, y) 하나에 대한 nearest 결과 dict.
+
+        {"floor", "x", "y",
+         "nodes": [{"id", "x", "y", "distance"}, ...],     # 가까운 순 k개
+         "edge":  {"a", "b", "x", "y", "t", "distance"} | null}
+    """
+    graph = index.graph
+    fi = index.floor(floor)
+    out = {"floor": floor, "x": x, "y": y, "nodes": [], "edge": None}
+    if fi is None:
+        return out
+    out["nodes"] = [
+        {"id": graph.ids[i], "x": graph.xs[i], "y": graph.ys[i], "distance": round(d, 2)}
+        for d, i in fi.nearest_nodes(x, y, k)
+    ]
+    seg = fi.nearest_segment(x, y)
+    if seg is not None:
+        d, a, b, qx, qy, t = seg
+        out["edge"] = {
+            "a": graph.ids[a],
+            "b": graph.ids[b],
+            "x": round(qx, 2),
+            "y": round(qy, 2),
+            "t": round(t, 4),
+            "distance": round(d, 2),
+        }
+    return out
+
+
+# ----- 폴리곤(방/구역) 인덱스 -----
+
+class FloorPolygons:
+    """
+    한 층의 폴리곤 인덱스.
+
+    - 꼭짓점 좌표는 모든 폴리곤을 이어 붙인 array(xs, ys)에 두고,
+      폴리곤 p의 꼭짓점은 xs[offsets[p]:offsets[p+1]]
+    - 격자는 폴리곤 bounding box로 만든다. 질의 좌표가 있는 칸의 후보만
+      bounding box → 광선 투사(ray casting) 순으로 검사한다.
+    """
+
+    __slots__ = ("ids", "names", "areas", "offsets", "xs", "ys", "bbox", "grid")
+
+    def __init__(self, polygons):
+        # polygons: [(id, name, [(x, y), ...]), ...]
+        self.ids = [p[0] for p in polygons]
+        self.names = [p[1] for p in polygons]
+        self.areas = array("d")
+        self.offsets = array("l", [0])
+        self.xs = array("d")
+        self.ys = array("d")
+        self.bbox = array("d")
+        boxes = []
+        for _, _, pts in polygons:
+            area = 0.0
+            for k in range(len(pts)):
+                (x1, y1), (x2, y2) = pts[k - 1], pts[k]
+                area += x1 * y2 - x2 * y1
+                self.xs.append(x2)
+                self.ys.append(y2)
+            self.areas.append(abs(area) / 2)
+            self.offsets.append(len(self.xs))
+            box = (min(x for x, _ in pts), min(y for _, y in pts),
+                   max(x for x, _ in pts), max(y for _, y in pts))
+            self.bbox.extend(box)
+            boxes.append(box)
+        self.grid = GridIndex(boxes)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.areas, self.offsets, self.xs, self.ys, self.bbox)
+        return (self.grid.nbytes + sum(a.itemsize * len(a) for a in arrays)
+                + sum(len(i) + len(n) + 100 for i, n in zip(self.ids, self.names)))
+
+    def contains(self, p, x, y) -> bool:
+        """폴리곤 p 안에 (x, y)가 있는지 (even-odd 광선 투사)"""
+        xs, ys = self.xs, self.ys
+        start, end = self.offsets[p], self.offsets[p + 1]
+        inside = False
+        jx, jy = xs[end - 1], ys[end - 1]
+        for k in range(start, end):
+            ix, iy = xs[k], ys[k]
+            if (iy > y) != (jy > y) and x < (jx - ix) * (y - iy) / (jy - iy) + ix:
+                inside = not inside
+            jx, jy = ix, iy
+        return inside
+
+    def locate(self, x, y) -> list:
+        """(x, y)를 포함하는 폴리곤 인덱스 목록. 면적이 작은(안쪽) 것부터."""
+        if not self.ids:
+            return []
+        bbox = self.bbox
+        hits = []
+        for p in self.grid.cell_items(x, y):
+            b = 4 * p
+            if x < bbox[b] or y < bbox[b + 1] or x > bbox[b + 2] or y > bbox[b + 3]:
+                continue
+            if self.contains(p, x, y):
+                hits.append(p)
+        if len(hits) > 1:
+            hits.sort(key=self.areas.__getitem__)
+        return hits
+
+
+class ZoneIndex:
+    """층 번호 → FloorPolygons"""
+
+    __slots__ = ("floors",)
+
+    def __init__(self, floors):
+        self.floors = floors
+
+    def floor(self, f):
+        return self.floors.get(f)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(fp.nbytes for fp in self.floors.values()) + 64
+
+
+def build_zone_index(data: dict) -> ZoneIndex:
+    """
+    data의 폴리곤으로 층별 인덱스를 만든다.
+
+    - 꼭짓점 좌표는 링의 노드 좌표를 쓴다. (_editor.shapes의 points는 반올림된 캐시라 쓰지 않음)
+    - 좌표를 알 수 있는 꼭짓점이 3개 미만인 폴리곤은 건너뛴다.
+    """
+    canonical = canonical_from_data(data)
+    coords = {n["id"]: (n["x"], n["y"]) for n in canonical["nodes"]}
+    by_floor = {}
+    for p in canonical["polygons"]:
+        pts = [coords[nid] for nid in p["nodes"] if nid in coords]
+        # 닫는 점(첫 점 반복)은 빼 둔다
+        if len(pts) > 1 and pts[0] == pts[-1]:
+            pts.pop()
+        if len(pts) < 3:
+            continue
+        by_floor.setdefault(p["floor"], []).append((p["id"], p["name"], pts))
+    return ZoneIndex({f: FloorPolygons(polys) for f, polys in by_floor.items()})
+
+
+def get_zone_index(project) -> ZoneIndex:
+    """프로젝트 리비전별 폴리곤 인덱스 (project_cache에 "zones"로 보관)."""
+    return project_cache.get_or_build(
+        project,
+        "zones",
+        lambda: build_zone_index(project.data if isinstance(project.data, dict) else {}),
+    )
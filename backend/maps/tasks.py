@@ -0,0 +1,197 @@
+# maps/tasks.py
+"""
+요청 처리와 분리해서 돌리는 백그라운드 작업.
+
+- 웹 워커 프로세스 안의 작은 스레드 풀에서 실행한다. (별도 큐 서버 없음)
+- 요청은 작업을 넣기만 하고 바로 응답한다. 결과는 파일/DB에 남는다.
+- 서버가 재시작되면 대기 중이던 작업은 사라진다.
+  (타일은 매니페스트가 없으면 다음 요청 때 다시 예약되므로 복구 가능)
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# 같은 파일에 대한 작업이 중복으로 예약되지 않도록
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = getattr(settings, "MAPS_TASK_WORKERS", 2)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="maps-task")
+        return _executor
+
+
+def submit(key, fn, *args, **kwargs):
+    """
+    fn(*args, **kwargs)를 백그라운드에서 실행한다.
+
+    - key가 같은 작업이 이미 대기/실행 중이면 다시 넣지 않고 None을 돌려준다.
+    - 예외는 로그만 남긴다.
+    """
+    with _pending_lock:
+        if key in _pending:
+            return None
+        _pending.add(key)
+
+    def _run():
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            logger.exception("background task %r failed", key)
+        finally:
+            with _pending_lock:
+                _pending.discard(key)
+            close_old_connections()
+
+    return _get_executor().submit(_run)
+
+
+def is_pending(key) -> bool:
+    with _pending_lock:
+        return key in _pending
+
+
+# ----- 층 이미지 타일 -----
+
+def _build_floor_tiles(pid, image_url: str, image_path: str):
+    from .models import Project
+    from .tiles import build_in_process
+
+    manifest = build_in_process(image_path)
+
+    # 목록 썸네일이 이 원본 이미지를 가리키고 있으면 미리보기로 바꾼다.
+    # (data/revision은 건드리지 않으므로 편집 중인 클라이언트와 충돌하지 않음)
+    if pid is not None and manifest.get("preview"):
+        Project.objects.filter(pk=pid, thumbnail=image_url).update(thumbnail=manifest["preview"])
+    return manifest
+
+
+def schedule_floor_tiles(pid, image_url: str):
+    """
+    층 이미지 URL에 대한 타일 생성을 예약한다.
+
+    반환값: 예약했으면 True, 이미 진행 중이거나 대상 파일이 없으면 False
+    """
+    from .tiles import is_tileable, media_path
+
+    if not is_tileable(image_url):
+        return False
+    path = media_path(image_url)
+    return submit(("tiles", path), _build_floor_tiles, pid, image_url, path) is not None
+
+
+# ----- 이미지 저장소 정리 -----
+
+def schedule_blob_gc(pid, blob_ids):
+    """
+    삭제된 프로젝트 pid가 쓰던 blob 중 참조가 없어진 것을 지우는 작업을 예약한다.
+    (maps/blobs.collect_garbage, 요청 안에서 파일을 지우지 않도록)
+    """
+    from .blobs import collect_garbage
+
+    blob_ids = list(blob_ids)
+    if not blob_ids:
+        return False
+    return submit(("blob_gc", pid), collect_garbage, blob_ids) is not None
+
+
+# ----- 길찾기 ALT 전처리 -----
+
+def _build_landmarks(pid):
+    from .landmarks import MIN_NODES, build_for_project
+    from .models import Project
+
+    # 만드는 동안 또 저장되었으면 최신 리비전으로 다시 만든다. (몇 번까지만)
+    for _ in range(3):
+        obj = Project.objects.defer("data").filter(pk=pid).first()
+        if obj is None or obj.node_count < MIN_NODES:
+            return None
+        build_for_project(obj)
+        latest = Project.objects.filter(pk=pid).values_list("revision", flat=True).first()
+        if latest == obj.revision:
+            break
+
+
+def schedule_landmarks(pid):
+    """프로젝트 최신 리비전의 ALT 테이블 생성을 예약한다. (maps/landmarks.py)"""
+    return submit(("landmarks", pid), _build_landmarks, pid) is not None
+
+
+# ----- 맵핑 포인트 경로 테이블 -----
+
+# pid → {revision: 그 리비전에서 바뀐 노드 id 집합}
+#  delta 저장이 기록해 두고, 테이블 작업이 이전 테이블 이후의 변경분을 모아 부분 갱신에 쓴다.
+#  (다른 프로세스에서 저장했거나 PUT처럼 기록이 없는 리비전이 끼어 있으면 전체 계산)
+_graph_changes = {}
+_graph_changes_lock = threading.Lock()
+
+# 프로젝트마다 기억해 둘 최대 리비전 수
+MAX_NOTED_REVISIONS = 50
+
+
+def note_graph_changes(pid, revision, affected):
+    """revision 저장에서 바뀐 노드 id 집합을 기록한다. (views.project_delta)"""
+    with _graph_changes_lock:
+        revs = _graph_changes.setdefault(pid, {})
+        revs[revision] = frozenset(affected)
+        for old in sorted(revs)[:-MAX_NOTED_REVISIONS]:
+            del revs[old]
+
+
+def _changes_since(pid, base, revision):
+    """base 초과 ~ revision 이하 리비전의 변경 노드 합집합. 하나라도 기록이 없으면 None."""
+    with _graph_changes_lock:
+        revs = _graph_changes.get(pid, {})
+        out = set()
+        for r in range(base + 1, revision + 1):
+            if r not in revs:
+                return None
+            out |= revs[r]
+        return out
+
+
+def _forget_changes(pid, upto):
+    with _graph_changes_lock:
+        revs = _graph_changes.get(pid)
+        if revs:
+            for r in [r for r in revs if r <= upto]:
+                del revs[r]
+            if not revs:
+                del _graph_changes[pid]
+
+
+def _build_poi_routes(pid):
+    from .models import Project
+    from .poi_routes import build_for_project, latest_table_path, load_table
+
+    for _ in range(3):
+        obj = Project.objects.defer("data").filter(pk=pid).first()
+        if obj is None:
+            return None
+        affected = None
+        path = latest_table_path(pid)
+        old = load_table(path) if path is not None else None
+        if old is not None:
+            affected = _changes_since(pid, old.revision, obj.revision)
+        build_for_project(obj, affected)
+        _forget_changes(pid, obj.revision)
+        latest = Project.objects.filter(pk=pid).values_list("revision", flat=True).first()
+        if latest == obj.revision:
+            break
+
+
+def schedule_poi_routes(pid):
+    """프로젝트 최신 리비전의 맵핑 포인트 경로 테이블 생성을 예약한다. (maps/poi_routes.py)"""
+    return submit(("poi_routes", pid), _build_poi_routes, pid) is not None
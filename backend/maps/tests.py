@@ -0,0 +1,1638 @@
+import gzip
+import hashlib
+import http.client
+import importlib.util
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import zipfile
+from copy import deepcopy
+from datetime import timedelta
+from heapq import heappop, heappush
+from math import hypot, inf
+from pathlib import Path
+from unittest import mock
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+from django.utils.http import http_date
+
+from . import delta, history
+from .blobs import blob_path, collect_garbage
+from .cache import ProjectCache, project_cache
+from .canonical import canonical_from_data, canonical_from_payload, derive_views
+from .delta import _rebuild_views, apply_graph_diff
+from .graphbin import FORMAT_VERSION, MAGIC, _HEADER, encode_graph_bin, read_graph_bin
+from .history import load_revision, prune_revisions
+from .images import set_floor_image
+from .integrity import GraphIntegrity
+from .jobs import get_export_job, run_bulk_export
+from .landmarks import build_landmarks, load_sidecar, write_sidecar
+from .media import (
+    IMMUTABLE_CACHE_CONTROL,
+    REVALIDATE_CACHE_CONTROL,
+    _byte_range,
+    _if_range_ok,
+)
+from .models import Floor, Link, MediaBlob, Node, Polygon, Project, ProjectRevision
+from .poi_routes import build_table, load_table, update_table
+from .relational import LINK_FIELDS, NODE_FIELDS, POLYGON_FIELDS, views_from_rows
+from .routing import compile_graph, find_route
+from .spatial import build_spatial_index, build_zone_index, point_segment, snap_point
+from .tiles import PREVIEW_SIZE, build_tile_pyramid, file_version, load_manifest
+from .uploads import (
+    MIN_CHUNK_SIZE,
+    UploadError,
+    chunk_length,
+    create_session,
+    delete_session,
+    finalize_blob,
+    load_session,
+    session_status,
+    write_chunk,
+)
+
+
+def _random_graph(seed, n=48, floors=2):
+    """
+    격자 근처에 노드를 흩뿌리고 무작위로 이은 data.
+
+    - 링크 거리는 좌표 거리의 0.5~1.5배 (좌표보다 짧은 링크가 있어도 최단 경로여야 한다)
+    - 층을 건너는 링크, 다른 노드와 이어지지 않은 노드도 섞인다.
+    """
+    rng = random.Random(seed)
+    nodes, meta, conn = {}, {}, {}
+    for i in range(n):
+        nid = f"N_{i}"
+        nodes[nid] = {"x": (i % 8) * 10 + rng.random(), "y": (i // 8) * 10 + rng.random()}
+        meta[nid] = {"floor": i % floors}
+    ids = list(nodes)
+    for _ in range(n * 3 // 2):
+        a, b = rng.sample(ids, 2)
+        d = hypot(nodes[a]["x"] - nodes[b]["x"], nodes[a]["y"] - nodes[b]["y"])
+        w = round(d * rng.uniform(0.5, 1.5), 2)
+        conn.setdefault(a, {})[b] = w
+        conn.setdefault(b, {})[a] = w
+    return {"nodes": nodes, "connections": conn, "_editor": {"node_meta": meta}}
+
+
+def _dijkstra(conn, src):
+    """connections 위의 단순 Dijkstra (비교 기준). 노드 id → 거리"""
+    dist = {src: 0.0}
+    heap = [(0.0, src)]
+    while heap:
+        d, u = heappop(heap)
+        if d > dist[u]:
+            continue
+        for v, w in conn.get(u, {}).items():
+            if d + w < dist.get(v, inf):
+                dist[v] = d + w
+                heappush(heap, (d + w, v))
+    return dist
+
+
+class RoutingTests(SimpleTestCase):
+    """A*가 찾은 경로가 기준 Dijkstra와 같은 거리인지 확인한다. (ALT 랜드마크 포함)"""
+
+    def assert_routes_match(self, data, route):
+        conn = data["connections"]
+        for src in list(data["nodes"])[::5]:
+            ref = _dijkstra(conn, src)
+            for dst in data["nodes"]:
+                found = route(src, dst)
+                if dst not in ref:
+                    self.assertIsNone(found, (src, dst))
+                    continue
+                d, path = found
+                self.assertAlmostEqual(d, ref[dst], places=6, msg=(src, dst))
+                self.assertEqual((path[0], path[-1]), (src, dst))
+                self.assertAlmostEqual(sum(conn[a][b] for a, b in zip(path, path[1:])), d, places=6)
+
+    def test_astar_matches_dijkstra(self):
+        for seed in range(3):
+            data = _random_graph(seed)
+            graph = compile_graph(data)
+            self.assert_routes_match(data, lambda s, t: find_route(graph, s, t))
+
+    def test_astar_with_landmarks_matches_dijkstra(self):
+        with tempfile.TemporaryDirectory() as media, self.settings(MEDIA_ROOT=Path(media)):
+            for seed in range(3):
+                data = _random_graph(seed)
+                graph = compile_graph(data)
+                write_sidecar(seed, 1, build_landmarks(graph, count=4))
+                landmarks = load_sidecar(seed, 1, len(graph))
+                self.assertIsNotNone(landmarks)
+                self.assertIsNone(load_sidecar(seed, 2, len(graph)))
+                self.assert_routes_match(data, lambda s, t: find_route(graph, s, t, landmarks))
+
+    def test_unknown_node(self):
+        graph = compile_graph(_random_graph(0))
+        with self.assertRaises(KeyError):
+            find_route(graph, "N_0", "N_999")
+
+
+class ProjectListTests(TestCase):
+    """목록 API의 키셋 페이지네이션 (updated_at|id)"""
+
+    def setUp(self):
+        self.ids = [Project.objects.create(name=f"p{i}", data={}).pk for i in range(7)]
+        # updated_at이 같은 행이 여러 개여도 id로 이어서 빠짐없이 나와야 한다.
+        same = Project.objects.get(pk=self.ids[2]).updated_at
+        Project.objects.filter(pk__in=self.ids[2:6]).update(updated_at=same)
+
+    def test_cursor_walks_every_row_once(self):
+        expected = list(Project.objects.order_by("updated_at", "id").values_list("id", flat=True))
+        seen, cursor = [], ""
+        for _ in range(10):
+            query = {"limit": 2}
+            if cursor:
+                query["cursor"] = cursor
+            resp = self.client.get(f"/api/projects/?{urlencode(query)}")
+            self.assertEqual(resp.status_code, 200)
+            rows = resp.json()
+            self.assertLessEqual(len(rows), 2)
+            seen.extend(r["id"] for r in rows)
+            cursor = resp.get("X-Next-Cursor", "")
+            if not cursor:
+                break
+        self.assertEqual(seen, expected)
+
+    def test_without_limit_returns_everything(self):
+        rows = self.client.get("/api/projects/").json()
+        self.assertEqual(sorted(r["id"] for r in rows), sorted(self.ids))
+
+    def test_invalid_cursor(self):
+        for cursor in ("nope", "2024-01-01T00:00:00|x", "|3"):
+            resp = self.client.get(f"/api/projects/?{urlencode({'limit': 2, 'cursor': cursor})}")
+            self.assertEqual(resp.status_code, 400, cursor)
+
+
+class ProjectResponseTests(TestCase):
+    """프로젝트 GET 응답의 ETag / 304 / 압축 (_revision_response)"""
+
+    def setUp(self):
+        project_cache.clear()
+        # 압축 하한(MIN_COMPRESS_BYTES)보다 큰 본문
+        self.obj = Project.objects.create(name="r", data=_random_graph(3))
+        self.url = f"/api/projects/{self.obj.pk}/"
+
+    def test_etag_304_then_200_after_save(self):
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        etag = resp["ETag"]
+        self.assertTrue(resp["Last-Modified"])
+        self.assertIn("Accept-Encoding", resp["Vary"])
+
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.content, b"")
+        self.assertEqual(resp["ETag"], etag)
+
+        data = self.obj.data
+        data["nodes"]["N_0"]["x"] = 500
+        resp = self.client.put(self.url, data, content_type="application/json")
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp["ETag"], etag)
+
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["nodes"]["N_0"]["x"], 500)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=resp["ETag"]).status_code,
+                         304)
+
+    def test_gzip_body(self):
+        plain = self.client.get(self.url)
+        self.assertNotIn("Content-Encoding", plain)
+
+        resp = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", resp["Vary"])
+        self.assertEqual(resp["ETag"], plain["ETag"])
+        self.assertLess(len(resp.content), len(plain.content))
+        self.assertEqual(json.loads(gzip.decompress(resp.content)), plain.json())
+
+        # 압축을 안 받는 클라이언트
+        resp = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip;q=0")
+        self.assertNotIn("Content-Encoding", resp)
+        self.assertEqual(resp.content, plain.content)
+
+
+class ProjectCacheTests(SimpleTestCase):
+    """ProjectCache: 메모리 예산 LRU, 카운터, (pk, updated_at, kind) 키 무효화"""
+
+    def test_lru_eviction_and_stats(self):
+        cache = ProjectCache(max_bytes=100)
+        t0 = timezone.now()
+        cache.set(1, t0, "a", b"a" * 40)
+        cache.set(1, t0, "b", b"b" * 40)
+        cache.set(2, t0, "a", b"c" * 40)
+        # 가장 오래된 (1, "a")가 빠진다.
+        self.assertIsNone(cache.get(1, t0, "a"))
+        self.assertEqual(cache.get(1, t0, "b"), b"b" * 40)
+        # 방금 읽은 (1, "b")는 남고 (2, "a")가 빠진다.
+        cache.set(3, t0, "a", b"d" * 40)
+        self.assertIsNone(cache.get(2, t0, "a"))
+        self.assertEqual(cache.get(1, t0, "b"), b"b" * 40)
+        # 같은 키를 다시 쓰면 크기만 바뀐다.
+        cache.set(3, t0, "a", b"d" * 10)
+        # 예산보다 큰 값은 저장하지 않는다.
+        cache.set(4, t0, "a", b"e" * 101)
+        self.assertIsNone(cache.get(4, t0, "a"))
+
+        stats = cache.stats()
+        self.assertEqual({k: stats[k] for k in ("entries", "projects", "bytes", "max_bytes",
+                                                 "hits", "misses", "evictions")},
+                         {"entries": 2, "projects": 2, "bytes": 50, "max_bytes": 100,
+                          "hits": 2, "misses": 3, "evictions": 2})
+        self.assertEqual(stats["hit_ratio"], 0.4)
+
+    def test_revision_keys_and_invalidate(self):
+        cache = ProjectCache(max_bytes=1000)
+        t0 = timezone.now()
+        t1 = t0 + timedelta(seconds=1)
+        project = Project(pk=1, updated_at=t0)
+        built = []
+
+        def build():
+            built.append(project.updated_at)
+            return b"x" * 10
+
+        cache.get_or_build(project, "response", build)
+        cache.get_or_build(project, "response", build)
+        self.assertEqual(built, [t0])
+        # 저장되어 updated_at이 바뀌면 다른 키라서 다시 만든다.
+        project.updated_at = t1
+        cache.get_or_build(project, "response", build)
+        self.assertEqual(built, [t0, t1])
+        self.assertIsNone(cache.get(1, t1, "graph"))
+
+        cache.set(2, t0, "response", b"y" * 10)
+        cache.invalidate(1)
+        self.assertIsNone(cache.get(1, t0, "response"))
+        self.assertIsNone(cache.get(1, t1, "response"))
+        self.assertEqual(cache.get(2, t0, "response"), b"y" * 10)
+        self.assertEqual(cache.stats()["entries"], 1)
+        self.assertEqual(cache.stats()["bytes"], 10)
+
+        cache.clear()
+        self.assertEqual((cache.stats()["entries"], cache.stats()["bytes"]), (0, 0))
+
+
+def _path_data():
+    """N_1 - N_2 - N_3 한 줄짜리 프로젝트 data"""
+    return {
+        "meta": {"projectName": "delta"},
+        "nodes": {
+            "N_1": {"x": 0, "y": 0},
+            "N_2": {"x": 30, "y": 40},
+            "N_3": {"x": 30, "y": 100},
+        },
+        "connections": {
+            "N_1": {"N_2": 50},
+            "N_2": {"N_1": 50, "N_3": 60},
+            "N_3": {"N_2": 60},
+        },
+    }
+
+
+def _canonical():
+    """정규 표현 payload (두 층, 거리를 준 링크/안 준 링크, 폴리곤 하나)"""
+    return {
+        "nodes": [
+            {"id": "N_1", "x": 0, "y": 0, "floor": 0},
+            {"id": "N_2", "x": 30, "y": 40, "floor": 0, "name": "door", "special_id": "출입구"},
+            {"id": "N_3", "x": 30, "y": 100, "floor": 1},
+        ],
+        "links": [
+            {"id": "lk_1", "a": "N_1", "b": "N_2"},
+            {"id": "lk_2", "a": "N_2", "b": "N_3", "distance": 12},
+        ],
+        "polygons": [{"id": "pg_1", "floor": 0, "name": "Room", "nodes": ["N_1", "N_2", "N_3"]}],
+        "floors": [0, 1],
+    }
+
+
+class CanonicalPayloadTests(TestCase):
+    """canonical만 보낸 POST/PUT: 서버가 만든 뷰가 derive_views()와 같은지, 좌표 검사"""
+
+    def setUp(self):
+        project_cache.clear()
+
+    def assert_views(self, pid, canonical):
+        data = Project.objects.get(pk=pid).data
+        views = derive_views(canonical_from_payload(canonical, data))
+        self.assertNotIn("canonical", data)
+        for key in ("nodes", "connections", "special_points", "floors"):
+            self.assertEqual(data[key], views[key], key)
+        for key in ("node_meta", "links", "shapes"):
+            self.assertEqual(data["_editor"][key], views["_editor"][key], key)
+        # 에디터 메타는 그대로
+        self.assertEqual(data["_editor"]["floorNames"], ["B1", "1F"])
+
+    def test_post_and_put(self):
+        canonical = _canonical()
+        resp = self.client.post("/api/projects/", {"canonical": canonical,
+                                                   "_editor": {"floorNames": ["B1", "1F"]}},
+                                content_type="application/json")
+        self.assertEqual(resp.status_code, 201)
+        pid = resp.json()["id"]
+        self.assert_views(pid, canonical)
+        self.assertEqual(Project.objects.get(pk=pid).data["connections"]["N_1"], {"N_2": 50})
+
+        canonical["nodes"][0].update(x=60, y=80)
+        canonical["links"].pop()
+        resp = self.client.put(f"/api/projects/{pid}/", {"canonical": canonical},
+                               content_type="application/json")
+        self.assertEqual(resp.status_code, 200)
+        self.assert_views(pid, canonical)
+
+    def test_non_finite_coordinates(self):
+        pid = Project.objects.create(name="c", data=_path_data()).pk
+        for x in ("NaN", "inf", "-Infinity"):
+            canonical = _canonical()
+            canonical["nodes"][1]["x"] = x
+            body = json.dumps({"canonical": canonical})
+            resp = self.client.post("/api/projects/", body, content_type="application/json")
+            self.assertEqual(resp.status_code, 400, x)
+            resp = self.client.put(f"/api/projects/{pid}/", body, content_type="application/json")
+            self.assertEqual(resp.status_code, 400, x)
+        # JSON에서 1e999는 inf로 읽힌다.
+        body = json.dumps({"canonical": _canonical()}).replace('"y": 100', '"y": 1e999')
+        self.assertEqual(self.client.post("/api/projects/", body,
+                                          content_type="application/json").status_code, 400)
+        self.assertEqual(Project.objects.count(), 1)
+        self.assertEqual(Project.objects.get(pk=pid).data["nodes"], _path_data()["nodes"])
+
+
+class FloorSplitTests(TestCase):
+    """층 단위 지연 로딩: floors/ 매니페스트와 floors/<k>/ 문서 (maps/floors.py)"""
+
+    def setUp(self):
+        project_cache.clear()
+        canonical = _canonical()
+        canonical["nodes"].append({"id": "N_4", "x": 80, "y": 100, "floor": 1})
+        canonical["links"].append({"id": "lk_3", "a": "N_3", "b": "N_4"})
+        canonical["polygons"] = [
+            {"id": "pg_1", "floor": 0, "name": "Room", "nodes": ["N_1", "N_2"]},
+            {"id": "pg_2", "floor": 1, "name": "Hall", "nodes": ["N_3", "N_4"]},
+        ]
+        data = derive_views(canonical_from_payload(canonical, {}))
+        data["_editor"]["floorNames"] = ["B1", "1F"]
+        data["images"] = ["/media/b1.png", "/media/1f.png"]
+        self.obj = Project.objects.create(name="floors", data=data)
+        self.url = f"/api/projects/{self.obj.pk}/floors/"
+
+    def test_manifest(self):
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        body = resp.json()
+        self.assertEqual(body["revision"], self.obj.revision)
+        self.assertEqual(body["editor"], {"floorNames": ["B1", "1F"]})
+        counts = [(f["floor"], f["name"], f["image"], f["nodes"], f["links"], f["polygons"],
+                   f["stubs"]) for f in body["floors"]]
+        self.assertEqual(counts, [(0, "B1", "/media/b1.png", 2, 1, 1, 1),
+                                  (1, "1F", "/media/1f.png", 2, 1, 1, 1)])
+        self.assertEqual(body["floors"][1]["url"], f"{self.url}1/")
+
+    def test_floor_bodies(self):
+        expected = {0: ({"N_1", "N_2"}, ["lk_1"], ["pg_1"]),
+                    1: ({"N_3", "N_4"}, ["lk_3"], ["pg_2"])}
+        for floor, (nodes, links, polygons) in expected.items():
+            resp = self.client.get(f"{self.url}{floor}/")
+            self.assertEqual(resp.status_code, 200)
+            doc = resp.json()
+            self.assertEqual(doc["floor"], floor)
+            self.assertEqual(set(doc["nodes"]), nodes)
+            self.assertEqual(set(doc["node_meta"]), nodes)
+            self.assertLessEqual(set(doc["connections"]), nodes)
+            self.assertEqual([link["id"] for link in doc["links"]], links)
+            self.assertEqual([shape["id"] for shape in doc["polygons"]], polygons)
+
+        # 층을 건너는 링크(lk_2)는 양쪽 층에 stub으로만 들어간다.
+        stubs = {f: self.client.get(f"{self.url}{f}/").json()["stubs"] for f in (0, 1)}
+        self.assertEqual(stubs[0], [{"link": "lk_2", "node": "N_2", "to": "N_3", "to_floor": 1,
+                                     "distance": 12}])
+        self.assertEqual(stubs[1], [{"link": "lk_2", "node": "N_3", "to": "N_2", "to_floor": 0,
+                                     "distance": 12}])
+
+        self.assertEqual(self.client.get(f"{self.url}5/").status_code, 404)
+        self.assertEqual(self.client.get(f"/api/projects/{self.obj.pk + 1000}/floors/")
+                         .status_code, 404)
+
+    def test_other_floor_save_keeps_etag(self):
+        etags = {f: self.client.get(f"{self.url}{f}/")["ETag"] for f in (0, 1)}
+        data = self.obj.data
+        data["nodes"]["N_4"]["x"] = 90
+        resp = self.client.put(f"/api/projects/{self.obj.pk}/", data,
+                               content_type="application/json")
+        self.assertEqual(resp.status_code, 200)
+        # 0층은 그대로라 304, 1층은 새 본문
+        self.assertEqual(self.client.get(f"{self.url}0/", HTTP_IF_NONE_MATCH=etags[0])
+                         .status_code, 304)
+        resp = self.client.get(f"{self.url}1/", HTTP_IF_NONE_MATCH=etags[1])
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["nodes"]["N_4"]["x"], 90)
+
+
+class RelationalViewsTests(TestCase):
+    """Node/Link/Polygon/Floor 행으로 다시 만든 뷰(from_rows)가 저장된 JSON 뷰와 같은지"""
+
+    def setUp(self):
+        project_cache.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = self.settings(MEDIA_ROOT=Path(media.name))
+        override.enable()
+        self.addCleanup(override.disable)
+        resp = self.client.post("/api/projects/", {"canonical": _canonical(),
+                                                   "images": ["/media/b1.png"]},
+                                content_type="application/json")
+        self.pid = resp.json()["id"]
+
+    def assert_rows_match(self):
+        obj = Project.objects.get(pk=self.pid)
+        self.assertEqual(obj.to_response(from_rows=True), obj.to_response())
+        views = views_from_rows(obj)
+        for key in ("nodes", "connections", "special_points", "floors"):
+            self.assertEqual(views[key], obj.data[key], key)
+        for key in ("node_meta", "links", "shapes"):
+            self.assertEqual(views["_editor"][key], obj.data["_editor"][key], key)
+        return obj
+
+    def test_put_delta_and_image_saves(self):
+        self.assert_rows_match()
+
+        canonical = _canonical()
+        canonical["nodes"][0]["x"] = 10
+        resp = self.client.put(f"/api/projects/{self.pid}/", {"canonical": canonical},
+                               content_type="application/json")
+        self.assertEqual(resp.status_code, 200)
+        obj = self.assert_rows_match()
+        self.assertEqual(obj.data["nodes"]["N_1"]["x"], 10)
+
+        resp = self.client.patch(f"/api/projects/{self.pid}/delta/", json.dumps({
+            "base": obj.revision,
+            "nodes": {"N_3": {"x": 60, "y": 100}, "N_4": {"x": 90, "y": 100, "floor": 1},
+                      "N_1": None},
+            "links": {"lk_3": {"a": "N_3", "b": "N_4"}},
+            "polygons": {"pg_2": {"floor": 1, "name": "Hall", "nodes": ["N_3", "N_4"]}},
+        }), content_type="application/json")
+        self.assertEqual(resp.status_code, 200)
+        obj = self.assert_rows_match()
+        self.assertNotIn("N_1", obj.data["nodes"])
+
+        revision, _ = set_floor_image(self.pid, 1, "/media/1f.png")
+        self.assertEqual(revision, obj.revision + 1)
+        obj = self.assert_rows_match()
+        self.assertEqual(obj.data["images"], ["/media/b1.png", "/media/1f.png"])
+
+
+class DeltaSaveTests(TestCase):
+    """PATCH /api/projects/<pid>/delta/"""
+
+    def setUp(self):
+        project_cache.clear()
+        resp = self.client.post("/api/projects/", _path_data(), content_type="application/json")
+        self.pid = resp.json()["id"]
+        self.revision = resp.json()["revision"]
+        self.url = f"/api/projects/{self.pid}/delta/"
+
+    def patch(self, body):
+        return self.client.patch(self.url, json.dumps(body), content_type="application/json")
+
+    def test_graph_diff(self):
+        resp = self.patch({"base": self.revision, "nodes": {"N_3": {"x": 30, "y": 160}}})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["revision"], self.revision + 1)
+        data = Project.objects.get(pk=self.pid).data
+        self.assertEqual(data["nodes"]["N_3"], {"x": 30, "y": 160})
+        # 움직인 노드에 걸린 링크 거리는 좌표로 다시 계산된다.
+        self.assertEqual(data["connections"]["N_2"]["N_3"], 120)
+        self.assertEqual(data["connections"]["N_3"]["N_2"], 120)
+        self.assertEqual(data["connections"]["N_1"]["N_2"], 50)
+
+    def test_node_delete_drops_links(self):
+        resp = self.patch({"base": self.revision, "nodes": {"N_2": None}})
+        self.assertEqual(resp.status_code, 200)
+        data = Project.objects.get(pk=self.pid).data
+        self.assertNotIn("N_2", data["nodes"])
+        self.assertFalse(any(data["connections"].get(nid) for nid in ("N_1", "N_3")))
+
+    def test_json_patch(self):
+        ops = [{"op": "replace", "path": "/meta/projectName", "value": "renamed"}]
+        resp = self.patch({"base": self.revision, "ops": ops})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(Project.objects.get(pk=self.pid).name, "renamed")
+
+    def test_stale_base(self):
+        self.assertEqual(self.patch({"base": self.revision, "set": {"scale": 0.5}}).status_code, 200)
+        resp = self.patch({"base": self.revision, "set": {"scale": 0.25}})
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(resp.json()["revision"], self.revision + 1)
+        self.assertEqual(Project.objects.get(pk=self.pid).data["scale"], 0.5)
+
+    def test_bad_patch(self):
+        bad = [
+            {"ops": [{"op": "remove", "path": "/nodes/N_9"}]},
+            {"ops": [{"op": "test", "path": "/scale", "value": 123}]},
+            {"ops": [{"op": "replace", "path": "", "value": []}]},
+            {"ops": "nope"},
+            {"nodes": {"N_1": 3}},
+            {"links": {"lk_9": {"a": "N_1", "b": "N_1"}}},
+            {"set": {"connections": {}}},
+        ]
+        for body in bad:
+            resp = self.patch({"base": self.revision, **body})
+            self.assertEqual(resp.status_code, 400, body)
+        # 거절된 patch는 아무것도 바꾸지 않는다.
+        obj = Project.objects.get(pk=self.pid)
+        self.assertEqual(obj.revision, self.revision)
+        self.assertEqual(set(obj.data["nodes"]), {"N_1", "N_2", "N_3"})
+
+    def test_too_long_values(self):
+        # 테이블 컬럼 길이(Node.node_id 64, name 255 …)를 넘는 값은 저장하지 않고 400
+        long_id = "N_" + "x" * 63
+        bad = [
+            {"nodes": {long_id: {"x": 0, "y": 0}}},
+            {"nodes": {"N_1": {"name": "x" * 256}}},
+            {"links": {"lk_9": {"a": "N_1", "b": "N" * 65}}},
+            {"ops": [{"op": "add", "path": "/nodes/N_1/special_id", "value": "x" * 101}]},
+        ]
+        for body in bad:
+            self.assertEqual(self.patch({"base": self.revision, **body}).status_code, 400, body)
+        nodes = {**_path_data()["nodes"], long_id: {"x": 1, "y": 1}}
+        resp = self.client.put(f"/api/projects/{self.pid}/", {"nodes": nodes},
+                               content_type="application/json")
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.post("/api/projects/", {"nodes": nodes}, content_type="application/json")
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(Project.objects.get().revision, self.revision)
+
+    def test_base_required(self):
+        self.assertEqual(self.patch({"nodes": {}}).status_code, 400)
+        self.assertEqual(self.patch({"base": "1", "nodes": {}}).status_code, 400)
+
+
+class SpatialIndexTests(SimpleTestCase):
+    """격자 인덱스의 nearest 결과가 전체를 훑은 결과와 같은지 확인한다."""
+
+    def setUp(self):
+        self.data = _random_graph(7, n=80)
+        self.graph = compile_graph(self.data)
+        self.index = build_spatial_index(self.graph)
+
+    def test_nearest_nodes(self):
+        g = self.graph
+        rng = random.Random(1)
+        for _ in range(200):
+            f, x, y = rng.randrange(2), rng.uniform(-20, 100), rng.uniform(-20, 80)
+            found = self.index.floor(f).nearest_nodes(x, y, k=3)
+            brute = sorted(hypot(g.xs[i] - x, g.ys[i] - y) for i in range(len(g)) if g.floors[i] == f)
+            self.assertEqual(len(found), 3)
+            for (d, _), ref in zip(found, brute):
+                self.assertAlmostEqual(d, ref, places=9)
+
+    def test_nearest_segment(self):
+        g = self.graph
+        segments = [(g.index[a], g.index[b]) for a, row in self.data["connections"].items() for b in row]
+        rng = random.Random(2)
+        for _ in range(200):
+            f, x, y = rng.randrange(2), rng.uniform(-20, 100), rng.uniform(-20, 80)
+            found = self.index.floor(f).nearest_segment(x, y)
+            brute = min(point_segment(x, y, g.xs[a], g.ys[a], g.xs[b], g.ys[b])[0]
+                        for a, b in segments if g.floors[a] == f == g.floors[b])
+            self.assertAlmostEqual(found[0], brute, places=9)
+
+    def test_snap_point(self):
+        out = snap_point(self.index, 0, 0.0, 0.0, k=2)
+        self.assertEqual(out["nodes"][0]["id"], "N_0")
+        self.assertEqual(len(out["nodes"]), 2)
+        self.assertIsNotNone(out["edge"])
+        self.assertEqual(snap_point(self.index, 9, 0.0, 0.0),
+                         {"floor": 9, "x": 0.0, "y": 0.0, "nodes": [], "edge": None})
+
+
+def _zone_data():
+    """
+    0층: 건물(0~100 사각형) 안에 방(10~30)과 ㄱ자 복도
+    1층: 같은 좌표의 다른 방
+    """
+    rings = {
+        "building": (0, [(0, 0), (100, 0), (100, 100), (0, 100)]),
+        "room": (0, [(10, 10), (30, 10), (30, 30), (10, 30)]),
+        "hall": (0, [(50, 50), (90, 50), (90, 90), (80, 90), (80, 60), (50, 60)]),
+        "upstairs": (1, [(0, 0), (40, 0), (40, 40), (0, 40)]),
+    }
+    nodes, meta, shapes = {}, {}, []
+    for pid, (floor, pts) in rings.items():
+        ring = []
+        for k, (x, y) in enumerate(pts):
+            nid = f"{pid}_{k}"
+            nodes[nid] = {"x": x, "y": y}
+            meta[nid] = {"floor": floor}
+            ring.append(nid)
+        shapes.append({"id": pid, "floor": floor, "name": pid.title(), "nodes": ring})
+    return {"nodes": nodes, "connections": {},
+            "_editor": {"node_meta": meta, "shapes": {"polygons": shapes}}}
+
+
+class ZoneIndexTests(SimpleTestCase):
+    """좌표가 속한 폴리곤 찾기 (안쪽 것부터)"""
+
+    def setUp(self):
+        self.index = build_zone_index(_zone_data())
+
+    def locate(self, floor, x, y):
+        fp = self.index.floor(floor)
+        return [fp.ids[p] for p in fp.locate(x, y)]
+
+    def test_nested_and_concave(self):
+        self.assertEqual(self.locate(0, 20, 20), ["room", "building"])
+        self.assertEqual(self.locate(0, 60, 55), ["hall", "building"])
+        # ㄱ자 복도의 bounding box 안이지만 폴리곤 밖
+        self.assertEqual(self.locate(0, 60, 80), ["building"])
+        self.assertEqual(self.locate(0, 150, 20), [])
+        self.assertEqual(self.locate(1, 20, 20), ["upstairs"])
+        self.assertIsNone(self.index.floor(2))
+
+    def test_names_and_areas(self):
+        fp = self.index.floor(0)
+        p = fp.locate(20, 20)[0]
+        self.assertEqual(fp.names[p], "Room")
+        self.assertEqual(fp.areas[p], 400)
+
+
+class MatrixTests(TestCase):
+    """거리 행렬 API: 결과 값, 알 수 없는 노드, 칸 수 제한"""
+
+    def setUp(self):
+        project_cache.clear()
+        self.url = f"/api/projects/{Project.objects.create(name='m', data=_path_data()).pk}/matrix/"
+
+    def post(self, body):
+        return self.client.post(self.url, json.dumps(body), content_type="application/json")
+
+    def test_rows(self):
+        resp = self.post({"sources": ["N_1", "N_3"], "targets": ["N_3", "N_2"]})
+        self.assertEqual(resp.status_code, 200)
+        body = json.loads(b"".join(resp.streaming_content))
+        self.assertEqual(body["unit"], "px")
+        self.assertEqual(body["rows"], [[110, 50], [0, 60]])
+
+    def test_unknown_nodes_are_a_bad_request(self):
+        resp = self.post({"sources": ["N_1", "N_9"]})
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.json()["nodes"], ["N_9"])
+
+    def test_limit_counts_pairs(self):
+        with mock.patch("maps.views.MAX_MATRIX_CELLS", 4):
+            self.assertEqual(self.post({"sources": ["N_1"] * 4, "targets": ["N_2"]}).status_code, 200)
+            self.assertEqual(self.post({"sources": ["N_1"] * 3, "targets": ["N_2"] * 2}).status_code, 400)
+
+
+class ReachableTests(TestCase):
+    """도달 범위 API: 거리 한도, 폴리곤 출력, 알 수 없는 출발 노드"""
+
+    def setUp(self):
+        project_cache.clear()
+        data = _path_data()
+        # N_2(30, 40)를 둘러싼 방 하나 (꼭짓점 노드는 어디에도 이어지지 않음)
+        ring = []
+        for k, (x, y) in enumerate([(20, 30), (40, 30), (40, 50), (20, 50)]):
+            data["nodes"][f"r_{k}"] = {"x": x, "y": y}
+            ring.append(f"r_{k}")
+        data["_editor"] = {"shapes": {"polygons": [
+            {"id": "lobby", "floor": 0, "name": "Lobby", "nodes": ring}]}}
+        self.url = f"/api/projects/{Project.objects.create(name='r', data=data).pk}/reachable/"
+
+    def get(self, **query):
+        return self.client.get(f"{self.url}?{urlencode(query)}")
+
+    def test_budget(self):
+        body = self.get(**{"from": "N_1", "max_m": 60}).json()
+        self.assertEqual(body["unit"], "px")
+        self.assertEqual(body["nodes"], {"N_1": 0, "N_2": 50})
+        self.assertNotIn("polygons", body)
+        # 한도는 경계를 포함하고, 그보다 짧으면 다음 노드로 넘어가지 않는다.
+        self.assertEqual(self.get(**{"from": "N_1", "max_m": 110}).json()["nodes"],
+                         {"N_1": 0, "N_2": 50, "N_3": 110})
+        self.assertEqual(self.get(**{"from": "N_1", "max_m": 49.9}).json()["nodes"], {"N_1": 0})
+        # 출발 노드가 여럿이면 가장 가까운 곳 기준
+        self.assertEqual(self.get(**{"from": "N_1,N_3", "max_m": 55}).json()["nodes"],
+                         {"N_1": 0, "N_3": 0, "N_2": 50})
+
+    def test_polygons(self):
+        body = self.get(**{"from": "N_1", "max_m": 60, "polygons": 1}).json()
+        self.assertEqual(body["polygons"], [{"id": "lobby", "name": "Lobby", "floor": 0}])
+        body = self.get(**{"from": "N_1", "max_m": 10, "polygons": 1}).json()
+        self.assertEqual(body["polygons"], [])
+
+    def test_bad_requests(self):
+        resp = self.get(**{"from": "N_1,N_9", "max_m": 10})
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.json()["nodes"], ["N_9"])
+        self.assertEqual(self.get(**{"from": "N_1", "max_m": -1}).status_code, 400)
+        self.assertEqual(self.get(max_m=10).status_code, 400)
+
+
+def _random_diff(rng, data, keep=()):
+    """노드 이동 / 추가 / 삭제, 링크 추가 / 삭제를 섞은 graph diff 하나 (keep 노드는 지우지 않음)"""
+    links = canonical_from_data(data)["links"]
+    ids = sorted(data["nodes"])
+    diff = {"nodes": {}, "links": {}}
+    for _ in range(rng.randint(1, 3)):
+        kind = rng.random()
+        if kind < 0.3 and links:
+            diff["links"][rng.choice(links)["id"]] = None
+        elif kind < 0.6:
+            a, b = rng.sample(ids, 2)
+            diff["links"][f"lk_{rng.randrange(10 ** 6)}"] = {"a": a, "b": b}
+        elif kind < 0.8:
+            diff["nodes"][rng.choice(ids)] = {"x": rng.uniform(0, 80), "y": rng.uniform(0, 80)}
+        elif kind < 0.9:
+            nid = f"N_new{rng.randrange(10 ** 6)}"
+            diff["nodes"][nid] = {"x": rng.uniform(0, 80), "y": rng.uniform(0, 80),
+                                  "floor": rng.randrange(2)}
+            diff["links"][f"lk_{nid}"] = {"a": nid, "b": rng.choice(ids)}
+        else:
+            victims = [nid for nid in ids if nid not in keep]
+            diff["nodes"][rng.choice(victims)] = None
+    return diff
+
+
+class PoiRouteTableTests(SimpleTestCase):
+    """delta 저장 뒤 부분 갱신한 경로 테이블이 새로 만든 테이블과 같은지 확인한다."""
+
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.folder = Path(folder.name)
+
+    def load(self, name, payload):
+        path = self.folder / name
+        path.write_bytes(payload)
+        return load_table(path)
+
+    def assert_same_routes(self, table, full, graph):
+        for s in full.pois:
+            for t in full.pois:
+                d, path, floors = table.lookup(s, t)
+                ref = full.lookup(s, t)[0]
+                if ref == inf:
+                    self.assertEqual((d, path), (inf, []), (s, t))
+                    continue
+                self.assertAlmostEqual(d, ref, places=6, msg=(s, t))
+                # 꺼낸 경로가 지금 그래프 위의 경로이고 길이가 거리와 같아야 한다.
+                self.assertEqual((path[0], path[-1]), (s, t))
+                length = 0.0
+                for a, b in zip(path, path[1:]):
+                    i = graph.index[a]
+                    length += min(graph.weights[k] for k in range(graph.offsets[i], graph.offsets[i + 1])
+                                  if graph.ids[graph.targets[k]] == b)
+                self.assertAlmostEqual(length, d, places=6)
+                self.assertEqual(floors, [graph.floors[graph.index[nid]] for nid in path])
+
+    def test_incremental_update_matches_full_build(self):
+        for seed in range(4):
+            rng = random.Random(seed)
+            data = _random_graph(seed, n=40)
+            pois = sorted(rng.sample(sorted(data["nodes"]), 8))
+            table = self.load(f"{seed}-0.poi", build_table(compile_graph(data), pois, 0))
+            for revision in range(1, 8):
+                affected = apply_graph_diff(data, _random_diff(rng, data, keep=pois)).affected
+                graph = compile_graph(data)
+                full = self.load(f"{seed}-{revision}.full", build_table(graph, pois, revision))
+                table = self.load(f"{seed}-{revision}.poi",
+                                  update_table(graph, pois, revision, table, affected))
+                self.assertEqual(table.revision, revision)
+                self.assert_same_routes(table, full, graph)
+
+
+class DeltaIncrementalTests(TestCase):
+    """바뀐 부분만 고친 delta 저장이 전체를 다시 만든 결과와 같은지 확인한다."""
+
+    def assert_rows_match(self, obj):
+        canonical = canonical_from_data(obj.data)
+        for model, key, kind, fields in ((Node, "node_id", "nodes", NODE_FIELDS),
+                                         (Link, "link_id", "links", LINK_FIELDS),
+                                         (Polygon, "polygon_id", "polygons", POLYGON_FIELDS)):
+            rows = {r.pop(key): r for r in model.objects.filter(project=obj).values(key, *fields)}
+            self.assertEqual(rows, {i["id"]: {f: i[f] for f in fields} for i in canonical[kind]},
+                             kind)
+
+    def test_matches_full_rebuild(self):
+        project_cache.clear()
+        rng = random.Random(7)
+        resp = self.client.post("/api/projects/", _random_graph(7, n=24),
+                                content_type="application/json")
+        pid, revision = resp.json()["id"], resp.json()["revision"]
+        for step in range(12):
+            obj = Project.objects.get(pk=pid)
+            diff = _random_diff(rng, obj.data)
+            diff["polygons"] = {f"pg_{step}": {"floor": step % 2,
+                                               "nodes": rng.sample(sorted(obj.data["nodes"]), 4)}}
+            expected = deepcopy(obj.data)
+            _rebuild_views(expected, diff)
+
+            with mock.patch.object(delta, "derive_views", wraps=delta.derive_views) as rebuild:
+                with mock.patch.object(history, "diff_json", wraps=history.diff_json) as rediff:
+                    resp = self.client.patch(f"/api/projects/{pid}/delta/",
+                                             json.dumps({"base": revision, **diff}),
+                                             content_type="application/json")
+            self.assertEqual(resp.status_code, 200)
+            revision = resp.json()["revision"]
+            # 첫 저장은 옛 형식(connections만)이라 전체를 다시 만들고, 그 뒤로는 바뀐 칸만 고친다.
+            self.assertEqual((rebuild.called, rediff.called), (step == 0, step == 0))
+
+            obj = Project.objects.get(pk=pid)
+            for key in ("nodes", "connections", "special_points", "floors"):
+                self.assertEqual(obj.data[key], expected[key], key)
+            for key in ("node_meta", "links", "shapes"):
+                self.assertEqual(obj.data["_editor"][key], expected["_editor"][key], key)
+            self.assert_rows_match(obj)
+            self.assertEqual(load_revision(obj, revision), obj.data)
+
+
+class ExportTxtTests(TestCase):
+    """GET /api/projects/<pid>/export/ 로 스트리밍한 ZIP을 열어서 다섯 파일의 행을 확인한다."""
+
+    def setUp(self):
+        data = _path_data()
+        data.update({
+            "scale": 0.5,
+            "meta": {"projectName": "ex", "projectAuthor": "me"},
+            # N_1 → N_2 방향이 동쪽(90°)
+            "north_reference": {"from_node": "N_1", "to_node": "N_2", "azimuth": 90},
+            "floors": {"0": {"polygons": [{"id": "pg_1", "name": "Room",
+                                            "nodes": ["N_1", "N_2", "N_3"]}]}},
+            "_editor": {"node_meta": {"N_3": {"floor": 1}}},
+        })
+        data["nodes"]["N_2"].update(name="door", special_id="출입구")
+        self.project = Project.objects.create(name="ex", data=data)
+
+    def files(self):
+        resp = self.client.get(f"/api/projects/{self.project.pk}/export/")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], "application/zip")
+        chunks = list(resp.streaming_content)
+        with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as zf:
+            self.assertEqual(zf.namelist(),
+                             ["node.txt", "link.txt", "arrow.txt", "polygon.txt", "core.txt"])
+            rows = {name: [line.split("\t") for line in zf.read(name).decode("utf-8").splitlines()]
+                    for name in zf.namelist()}
+        return chunks, rows
+
+    def test_rows(self):
+        chunks, rows = self.files()
+        self.assertEqual(rows["node.txt"][1:], [
+            ["N_1", "0", "0", "0", "", ""],
+            ["N_2", "0", "30", "40", "door", "출입구"],
+            ["N_3", "1", "30", "100", "", ""],
+        ])
+        # 양방향 링크는 한 줄, 거리(m) = 거리(px) × scale
+        self.assertEqual(rows["link.txt"][1:], [
+            ["L_1", "N_1", "N_2", "0", "0", "50", "25"],
+            ["L_2", "N_2", "N_3", "0", "1", "60", "30"],
+        ])
+        # 방향별 한 줄, 방위각은 north_reference 기준
+        self.assertEqual(rows["arrow.txt"][1:], [
+            ["N_1", "N_2", "50", "90"],
+            ["N_2", "N_1", "50", "270"],
+            ["N_2", "N_3", "60", "126.87"],
+            ["N_3", "N_2", "60", "306.87"],
+        ])
+        self.assertEqual(rows["polygon.txt"][1:],
+                         [["pg_1", "0", "Room", "N_1,N_2,N_3", "0 0;30 40;30 100"]])
+        self.assertEqual(dict(rows["core.txt"][1:]), {
+            "project_name": "ex", "project_author": "me", "scale_m_per_px": "0.5",
+            "floors": "1", "start_floor": "", "north_from_node": "N_1",
+            "north_to_node": "N_2", "north_azimuth": "90", "node_count": "3",
+        })
+
+    def test_streams_in_chunks(self):
+        # 한 줄마다 내보내도 이어 붙이면 같은 ZIP
+        with mock.patch("maps.export.LINES_PER_WRITE", 1), mock.patch("maps.export.CHUNK_SIZE", 1):
+            chunks, rows = self.files()
+        self.assertGreater(len(chunks), len(rows))
+        self.assertEqual(rows, self.files()[1])
+
+
+def _data():
+    # N_1은 1층이라 graph.bin에서는 0층 노드(N_2, N_3) 뒤로 간다.
+    # 좌표/거리는 float32로 정확히 표현되는 값만 쓴다.
+    return {
+        "scale": 0.5,
+        "nodes": {
+            "N_1": {"x": 100, "y": 40.25},
+            "N_2": {"x": 0, "y": 0, "name": "door", "special_id": "출입구"},
+            "N_3": {"x": 30, "y": 40},
+        },
+        "connections": {
+            "N_1": {"N_3": 70.5},
+            "N_2": {"N_3": 50},
+            "N_3": {"N_2": 50, "N_1": 70.5},
+        },
+        "_editor": {
+            "node_meta": {"N_1": {"floor": 1}, "N_2": {"floor": 0}, "N_3": {"floor": 0}},
+        },
+    }
+
+
+class GraphBinRoundTripTests(SimpleTestCase):
+    """graph.bin을 파일로 쓰고 다시 읽어서 헤더와 노드/간선 배열을 확인한다."""
+
+    def setUp(self):
+        data = _data()
+        body = encode_graph_bin(data, compile_graph(data), revision=7)
+        fd, self.path = tempfile.mkstemp(suffix=".graph.bin")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(body)
+        self.addCleanup(os.remove, self.path)
+        with open(self.path, "rb") as fh:
+            self.raw = fh.read()
+        self.gb = read_graph_bin(self.raw)
+
+    def test_header(self):
+        magic, version, _, revision, scale, count, _ = _HEADER.unpack_from(self.raw)
+        self.assertEqual(magic, MAGIC)
+        self.assertEqual(version, FORMAT_VERSION)
+        self.assertEqual(self.gb.version, FORMAT_VERSION)
+        self.assertEqual(self.gb.revision, 7)
+        self.assertEqual(self.gb.scale, 0.5)
+        self.assertEqual(count, len(self.gb.sections))
+
+    def test_node_arrays(self):
+        gb = self.gb
+        self.assertEqual([gb.string(k) for k in gb["NID_"]], ["N_2", "N_3", "N_1"])
+        self.assertEqual(list(gb["NFLR"]), [0, 0, 1])
+        self.assertEqual(list(gb["NX__"]), [0.0, 30.0, 100.0])
+        self.assertEqual(list(gb["NY__"]), [0.0, 40.0, 40.25])
+        self.assertEqual([gb.string(k) for k in gb["NNAM"]], ["door", "", ""])
+        self.assertEqual([gb.string(k) for k in gb["NSPC"]], ["출입구", "", ""])
+        self.assertEqual(list(gb["FLRS"]), [0, 1])
+        self.assertEqual(list(gb["FLRN"]), [0, 2, 3])
+
+    def test_edge_arrays(self):
+        gb = self.gb
+        # 노드 순서 N_2, N_3, N_1 기준 번호
+        self.assertEqual(list(gb["ADJO"]), [0, 1, 3, 4])
+        self.assertEqual(list(gb["ADJT"]), [1, 0, 2, 1])
+        self.assertEqual(list(gb["ADJW"]), [50.0, 50.0, 70.5, 70.5])
+        self.assertEqual(gb.to_dict()["connections"], {
+            "N_2": {"N_3": 50.0},
+            "N_3": {"N_2": 50.0, "N_1": 70.5},
+            "N_1": {"N_3": 70.5},
+        })
+
+
+class IntegrityUpdateTests(SimpleTestCase):
+    """delta마다 update()로 고친 분석 결과가 전체를 다시 분석한 결과와 같은지 확인한다."""
+
+    def assert_same(self, inc, full):
+        def parts(g):
+            return sorted(sorted(group) for group in g.members.values())
+
+        self.assertEqual(parts(inc), parts(full))
+        self.assertEqual(inc.label.keys(), full.label.keys())
+        self.assertEqual(inc.adj, full.adj)
+        self.assertEqual(inc.floor_of, full.floor_of)
+        self.assertEqual(inc.orphans, full.orphans)
+        self.assertEqual(inc.asymmetric, full.asymmetric)
+        # 주 연결 요소 선택(→ 도달 불가 맵핑 포인트)도 편집 이력과 상관없어야 한다.
+        self.assertEqual(inc.counts(), full.counts())
+        self.assertEqual(sorted(inc._unreachable_pois()), sorted(full._unreachable_pois()))
+
+    def test_update_matches_build(self):
+        for seed in range(6):
+            rng = random.Random(seed)
+            data = _random_graph(seed, n=30)
+            for nid in rng.sample(sorted(data["nodes"]), 4):
+                data["nodes"][nid]["special_id"] = "출입구"
+            apply_graph_diff(data, {})
+            inc = GraphIntegrity.build(data)
+            for revision in range(1, 40):
+                affected = apply_graph_diff(data, _random_diff(rng, data)).affected
+                inc.update(data, affected, revision)
+                self.assert_same(inc, GraphIntegrity.build(data, revision))
+
+
+class RevisionHistoryTests(TestCase):
+    """스냅샷 + delta 리비전 기록의 복원과 보관 기간 정리"""
+
+    def setUp(self):
+        project_cache.clear()
+        # delta가 스냅샷보다 충분히 작도록 잘 압축되지 않는 값을 깔아 둔다.
+        rng = random.Random(0)
+        data = {"nodes": {}, "step": 0, "static": [rng.random() for _ in range(300)]}
+        self.project = Project.objects.create(name="history", data=data)
+        self.saved = {self.project.revision: deepcopy(data)}
+
+    def edit(self, k):
+        data = deepcopy(self.project.data)
+        data["step"] = k
+        data["nodes"][f"N_{k}"] = {"x": k, "y": 2 * k}
+        if k % 3 == 0:
+            data["nodes"].pop(f"N_{k - 2}", None)
+        self.project.data = data
+        self.project.save()
+        self.saved[self.project.revision] = deepcopy(data)
+
+    def kinds(self):
+        return dict(ProjectRevision.objects.filter(project=self.project)
+                    .order_by("number").values_list("number", "kind"))
+
+    def test_checkout_across_snapshots(self):
+        with mock.patch.object(history, "MAX_CHAIN", 3):
+            for k in range(1, 12):
+                self.edit(k)
+        kinds = self.kinds()
+        self.assertEqual(list(kinds), sorted(self.saved))
+        # 스냅샷 사이 delta는 MAX_CHAIN개를 넘지 않는다.
+        runs = "".join("s" if kind == "snapshot" else "d" for kind in kinds.values()).split("s")
+        self.assertEqual(runs[0], "")
+        self.assertEqual({len(r) for r in runs[1:]} - {0, 1, 2, 3}, set())
+        self.assertGreater(len(runs), 3)
+        for number, data in self.saved.items():
+            self.assertEqual(load_revision(self.project, number), data, number)
+        self.assertIsNone(load_revision(self.project, self.project.revision + 1))
+
+    def test_revision_endpoint(self):
+        for k in range(1, 4):
+            self.edit(k)
+        resp = self.client.get(f"/api/projects/{self.project.pk}/revisions/2/")
+        self.assertEqual(resp.status_code, 200)
+        body = resp.json()
+        self.assertEqual(body["revision"], 2)
+        self.assertEqual(body["nodes"], self.saved[2]["nodes"])
+        listed = self.client.get(f"/api/projects/{self.project.pk}/revisions/").json()
+        self.assertEqual(listed["current"], 4)
+        self.assertEqual([r["revision"] for r in listed["revisions"]], [4, 3, 2, 1])
+
+    def test_prune_keeps_recent_revisions(self):
+        with self.settings(MAPS_REVISION_KEEP=4), mock.patch.object(history, "MAX_CHAIN", 3):
+            for k in range(1, 15):
+                self.edit(k)
+        current = self.project.revision
+        kinds = self.kinds()
+        self.assertLess(len(kinds), current)
+        # 남은 가장 오래된 행은 사슬이 시작되는 스냅샷이다.
+        self.assertEqual(kinds[min(kinds)], "snapshot")
+        for number in range(current - 3, current + 1):
+            self.assertEqual(load_revision(self.project, number), self.saved[number], number)
+        self.assertIsNone(load_revision(self.project, 1))
+
+        self.assertGreater(prune_revisions(self.project, keep=1), 0)
+        self.assertEqual(load_revision(self.project, current), self.saved[current])
+
+    def test_gc_keeps_blobs_of_retained_revisions(self):
+        sha = "ab" * 32
+        blob = MediaBlob.objects.create(sha256=sha, ext="png")
+        with mock.patch.object(history, "MAX_CHAIN", 0):
+            for images in ([f"{settings.MEDIA_URL}blobs/ab/{sha}.png"], []):
+                self.project.data = {**deepcopy(self.project.data), "images": images}
+                self.project.save()
+        self.assertFalse(blob.refs.exists())
+        # 이미지를 쓰던 리비전 하나만 참조를 남긴다. (payload를 풀지 않고 이 행으로 판단)
+        self.assertEqual(list(blob.revision_refs.values_list("revision__number", flat=True)),
+                         [self.project.revision - 1])
+        # 지난 리비전을 되살리면 다시 쓰일 이미지라 남겨 둔다.
+        self.assertEqual(collect_garbage(grace=timedelta(0)), 0)
+        # 그 리비전 기록이 지워진 뒤에는 지운다.
+        prune_revisions(self.project, keep=1)
+        self.assertEqual(collect_garbage(grace=timedelta(0)), 1)
+        self.assertFalse(MediaBlob.objects.filter(pk=blob.pk).exists())
+
+    def test_delete_schedules_gc(self):
+        blob = MediaBlob.objects.create(sha256="cd" * 32, ext="png")
+        self.project.data = {**self.project.data, "images": [f"{settings.MEDIA_URL}blobs/cd/{'cd' * 32}.png"]}
+        self.project.save()
+        with mock.patch("maps.views.schedule_blob_gc") as gc:
+            resp = self.client.delete(f"/api/projects/{self.project.pk}/")
+        self.assertEqual(resp.status_code, 200)
+        # 요청 안에서는 지우지 않고 백그라운드 작업으로 넘긴다.
+        gc.assert_called_once_with(self.project.pk, [blob.pk])
+        self.assertTrue(MediaBlob.objects.filter(pk=blob.pk).exists())
+        self.assertEqual(collect_garbage([blob.pk], grace=timedelta(0)), 1)
+
+
+class FloorImageTests(TestCase):
+    """층 이미지 한 칸만 바꾸는 set_floor_image와 PUT의 리비전 검사"""
+
+    def setUp(self):
+        project_cache.clear()
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = self.settings(MEDIA_ROOT=Path(media.name))
+        override.enable()
+        self.addCleanup(override.disable)
+        self.project = Project.objects.create(
+            name="images", data={"nodes": {}, "images": ["/media/a.png", "/media/b.png"]})
+        self.pid = self.project.pk
+
+    def images(self):
+        return Project.objects.get(pk=self.pid).data["images"]
+
+    def test_stale_base(self):
+        rev = self.project.revision
+        self.assertEqual(set_floor_image(self.pid, 1, "/media/c.png", base=rev - 1), (None, rev))
+        self.assertEqual(self.images(), ["/media/a.png", "/media/b.png"])
+        self.assertEqual(set_floor_image(self.pid + 1000, 0, "/media/c.png"), (None, None))
+
+    def test_floors_do_not_overwrite_each_other(self):
+        rev = self.project.revision
+        # 두 업로드가 같은 base(rev)에서 시작했어도 층이 다르면 서로의 이미지를 지우지 않는다.
+        r1, _ = set_floor_image(self.pid, 0, "/media/c.png")
+        r2, _ = set_floor_image(self.pid, 3, "/media/d.png")
+        self.assertEqual((r1, r2), (rev + 1, rev + 2))
+        self.assertEqual(self.images(), ["/media/c.png", "/media/b.png", None, "/media/d.png"])
+        obj = Project.objects.get(pk=self.pid)
+        self.assertEqual(obj.revision, r2)
+        self.assertEqual(obj.thumbnail, "/media/c.png")
+        self.assertEqual(dict(Floor.objects.filter(project_id=self.pid, index__in=(0, 3))
+                              .values_list("index", "image")),
+                         {0: "/media/c.png", 3: "/media/d.png"})
+        # 리비전 기록에도 한 칸씩 남는다.
+        self.assertEqual(load_revision(obj, r1)["images"], ["/media/c.png", "/media/b.png"])
+        self.assertEqual(load_revision(obj, r2)["images"], self.images())
+
+    def test_put_checks_revision(self):
+        url = f"/api/projects/{self.pid}/"
+        rev = self.project.revision
+        body = json.dumps({"scale": 0.5})
+        resp = self.client.put(f"{url}?base={rev - 1}", body, content_type="application/json")
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(resp.json()["revision"], rev)
+        resp = self.client.put(url, body, content_type="application/json", HTTP_IF_MATCH='"nope"')
+        self.assertEqual(resp.status_code, 412)
+        resp = self.client.put(f"{url}?base={rev}", body, content_type="application/json")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["revision"], rev + 1)
+        self.assertEqual(resp.json()["images"], ["/media/a.png", "/media/b.png"])
+
+    def test_clear_floor_image(self):
+        url = f"/api/projects/{self.pid}/floors/1/image/"
+        rev = self.project.revision
+        self.assertEqual(self.client.delete(f"{url}?base={rev - 1}").status_code, 409)
+        resp = self.client.delete(f"{url}?base={rev}")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["revision"], rev + 1)
+        self.assertEqual(self.images(), ["/media/a.png", None])
+        self.assertEqual(Floor.objects.get(project_id=self.pid, index=1).image, "")
+        self.assertEqual(self.client.delete(f"/api/projects/{self.pid + 1000}/floors/1/image/")
+                         .status_code, 404)
+
+    def test_upload_validates_before_storing(self):
+        rev = self.project.revision
+
+        def upload(**fields):
+            fields.setdefault("project", self.pid)
+            file = io.BytesIO(b"\x89PNG fake")
+            file.name = "plan.png"
+            with mock.patch("maps.views.schedule_floor_tiles"):
+                return self.client.post("/api/upload_floor_image/", {"file": file, **fields})
+
+        for floor in ("-1", "x", "1.5"):
+            self.assertEqual(upload(floor=floor).status_code, 400, floor)
+        self.assertEqual(upload(floor=0, base=rev - 1).status_code, 409)
+        self.assertEqual(upload(floor=0, project="nope").status_code, 404)
+        # 거절된 업로드는 저장소에 아무것도 남기지 않는다.
+        self.assertFalse(MediaBlob.objects.exists())
+        self.assertEqual(self.images(), ["/media/a.png", "/media/b.png"])
+
+        resp = upload(floor=1, base=rev)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["revision"], rev + 1)
+        self.assertEqual(MediaBlob.objects.count(), 1)
+        self.assertTrue(self.images()[1].startswith("/media/blobs/"))
+
+    def test_tile_version_belongs_to_project(self):
+        version = "0123456789abcdef"
+        folder = Path(settings.MEDIA_ROOT) / "blobs" / "01"
+        tile = folder / "tiles" / version / "0" / "0_0.png"
+        tile.parent.mkdir(parents=True)
+        tile.write_bytes(b"png")
+        (folder / "tiles" / "x.png.json").write_text(json.dumps({"version": version}))
+        self.project.data["images"] = ["/media/blobs/01/x.png"]
+        self.project.save()
+        other = Project.objects.create(name="other", data={"nodes": {}, "images": []})
+
+        path = f"tiles/{version}/0/0_0.png"
+        self.assertEqual(self.client.get(f"/api/projects/{self.pid}/{path}").status_code, 200)
+        # blob 폴더는 공유되므로 version만 알아도 다른 프로젝트로는 받을 수 없어야 한다.
+        self.assertEqual(self.client.get(f"/api/projects/{other.pk}/{path}").status_code, 404)
+        self.assertEqual(self.client.get(f"/api/projects/{self.pid + 1000}/{path}").status_code, 404)
+
+
+class MediaServeTests(SimpleTestCase):
+    """/media/ 서빙: Range(206/416), 304, 캐시 헤더, 내주지 않는 경로 (maps/media.py)"""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = self.settings(MEDIA_ROOT=Path(media.name), MAPS_MEDIA_ACCEL="")
+        override.enable()
+        self.addCleanup(override.disable)
+        self.root = Path(media.name)
+        self.content = bytes(range(256)) * 4
+        self.sha = hashlib.sha256(self.content).hexdigest()
+        self.rel = f"blobs/{self.sha[:2]}/{self.sha}.png"
+        path = self.root / self.rel
+        path.parent.mkdir(parents=True)
+        path.write_bytes(self.content)
+
+    def get(self, rel, **headers):
+        return self.client.get(f"/media/{rel}", **headers)
+
+    def test_full_and_conditional(self):
+        resp = self.get(self.rel)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(b"".join(resp.streaming_content), self.content)
+        self.assertEqual(resp["Accept-Ranges"], "bytes")
+        self.assertEqual(resp["Cache-Control"], IMMUTABLE_CACHE_CONTROL)
+        resp = self.get(self.rel, HTTP_IF_NONE_MATCH=resp["ETag"])
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.content, b"")
+        resp = self.get(self.rel, HTTP_IF_MODIFIED_SINCE=resp["Last-Modified"])
+        self.assertEqual(resp.status_code, 304)
+
+        (self.root / "floor_images").mkdir()
+        (self.root / "floor_images" / "a.png").write_bytes(b"png")
+        self.assertEqual(self.get("floor_images/a.png")["Cache-Control"],
+                         REVALIDATE_CACHE_CONTROL)
+
+    def test_range(self):
+        size = len(self.content)
+        resp = self.get(self.rel, HTTP_RANGE="bytes=100-199")
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(resp["Content-Range"], f"bytes 100-199/{size}")
+        self.assertEqual(resp["Content-Length"], "100")
+        self.assertEqual(b"".join(resp.streaming_content), self.content[100:200])
+
+        resp = self.get(self.rel, HTTP_RANGE="bytes=-10")
+        self.assertEqual(resp["Content-Range"], f"bytes {size - 10}-{size - 1}/{size}")
+        self.assertEqual(b"".join(resp.streaming_content), self.content[-10:])
+
+        resp = self.get(self.rel, HTTP_RANGE=f"bytes={size}-")
+        self.assertEqual(resp.status_code, 416)
+        self.assertEqual(resp["Content-Range"], f"bytes */{size}")
+
+        # If-Range가 현재 파일과 다르면 Range를 무시하고 전체를 보낸다.
+        resp = self.get(self.rel, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(resp.status_code, 200)
+        etag = resp["ETag"]
+        resp = self.get(self.rel, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=etag)
+        self.assertEqual(resp.status_code, 206)
+
+    def test_hidden_paths(self):
+        (self.root / "graph_cache").mkdir()
+        (self.root / "graph_cache" / "1.json").write_text("{}")
+        (self.root / "blobs" / ".upload-x.tmp").write_bytes(b"partial")
+        for rel in ("graph_cache/1.json", "blobs/.upload-x.tmp", "blobs/../blobs",
+                    f"blobs/{self.sha[:2]}", "nope.png"):
+            self.assertEqual(self.get(rel).status_code, 404, rel)
+
+    def test_byte_range(self):
+        self.assertIsNone(_byte_range("", 100))
+        self.assertIsNone(_byte_range("bytes=0-1,5-6", 100))
+        self.assertEqual(_byte_range("bytes=10-", 100), (10, 99))
+        self.assertEqual(_byte_range("bytes=90-500", 100), (90, 99))
+        self.assertEqual(_byte_range("bytes=-500", 100), (0, 99))
+        for header in ("bytes=100-", "bytes=5-4", "bytes=-0"):
+            with self.assertRaises(ValueError, msg=header):
+                _byte_range(header, 100)
+
+    def test_if_range(self):
+        factory = RequestFactory()
+        mtime = 1_700_000_000
+        self.assertTrue(_if_range_ok(factory.get("/"), '"a"', mtime))
+        self.assertTrue(_if_range_ok(factory.get("/", HTTP_IF_RANGE='"a"'), '"a"', mtime))
+        self.assertFalse(_if_range_ok(factory.get("/", HTTP_IF_RANGE='"b"'), '"a"', mtime))
+        self.assertTrue(_if_range_ok(factory.get("/", HTTP_IF_RANGE=http_date(mtime)),
+                                     '"a"', mtime))
+        self.assertFalse(_if_range_ok(factory.get("/", HTTP_IF_RANGE=http_date(mtime - 60)),
+                                      '"a"', mtime))
+
+
+class TilePyramidTests(SimpleTestCase):
+    """작은 이미지로 타일 피라미드를 만들고 매니페스트/타일 크기를 확인한다."""
+
+    def test_build(self):
+        from PIL import Image
+
+        with tempfile.TemporaryDirectory() as media, self.settings(MEDIA_ROOT=Path(media)):
+            path = Path(media) / "plan.png"
+            # 팔레트 이미지 → RGB로 바꿔서 자른다.
+            Image.new("RGB", (600, 300), (200, 30, 30)).convert("P").save(path)
+            with Image.open(path) as src:
+                # z=2의 2_1 타일 왼쪽 위 = 원본 (512, 256)
+                color = src.convert("RGB").getpixel((512, 256))
+            manifest = build_tile_pyramid(str(path))
+            self.assertEqual(manifest["version"], file_version(str(path)))
+            self.assertEqual((manifest["width"], manifest["height"], manifest["max_zoom"]),
+                             (600, 300, 2))
+            self.assertEqual(load_manifest(f"{settings.MEDIA_URL}plan.png"), manifest)
+
+            root = Path(media) / "tiles" / manifest["version"]
+            # 단계마다 절반: 600×300 → 300×150 → 150×75
+            for z, (cols, rows) in {2: (3, 2), 1: (2, 1), 0: (1, 1)}.items():
+                names = sorted(p.name for p in (root / str(z)).iterdir())
+                self.assertEqual(names, sorted(f"{x}_{y}.png" for x in range(cols)
+                                               for y in range(rows)), z)
+            with Image.open(root / "2" / "2_1.png") as tile:
+                self.assertEqual((tile.size, tile.mode), ((88, 44), "RGB"))
+                self.assertEqual(tile.getpixel((0, 0)), color)
+            with Image.open(root / "0" / "0_0.png") as tile:
+                self.assertEqual(tile.size, (150, 75))
+            with Image.open(root / "preview.jpg") as preview:
+                self.assertEqual(preview.size, (PREVIEW_SIZE, PREVIEW_SIZE // 2))
+            # 같은 내용이면 다시 만들지 않는다.
+            self.assertEqual(build_tile_pyramid(str(path)), manifest)
+
+
+class ChunkedUploadTests(TestCase):
+    """청크 업로드 세션: 청크 길이/범위/체크섬 검사와 finalize"""
+
+    def setUp(self):
+        project_cache.clear()
+        for name in ("MEDIA_ROOT", "MAPS_UPLOAD_DIR"):
+            folder = tempfile.TemporaryDirectory()
+            self.addCleanup(folder.cleanup)
+            override = self.settings(**{name: Path(folder.name)})
+            override.enable()
+            self.addCleanup(override.disable)
+        rng = random.Random(0)
+        # 청크 3개 (마지막 청크만 짧다)
+        self.content = bytes(rng.randrange(256) for _ in range(2 * MIN_CHUNK_SIZE + 1000))
+        self.sha = hashlib.sha256(self.content).hexdigest()
+
+    def session(self, **kwargs):
+        kwargs.setdefault("sha256", self.sha)
+        return create_session(project_id=None, floor=0, filename="plan.png",
+                              size=len(self.content), chunk_size=MIN_CHUNK_SIZE, **kwargs)
+
+    def chunk(self, n):
+        return self.content[n * MIN_CHUNK_SIZE:(n + 1) * MIN_CHUNK_SIZE]
+
+    def put(self, meta, n, body=None, sha256=None):
+        body = self.chunk(n) if body is None else body
+        return write_chunk(meta, n, io.BytesIO(body), len(body), sha256)
+
+    def assert_upload_error(self, status, fn, *args, **kwargs):
+        with self.assertRaises(UploadError) as cm:
+            fn(*args, **kwargs)
+        self.assertEqual(cm.exception.status, status)
+        return cm.exception
+
+    def test_chunk_checks(self):
+        meta = self.session()
+        self.assertEqual(meta["chunks"], 3)
+        self.assertEqual(chunk_length(meta, 2), 1000)
+        e = self.assert_upload_error(400, self.put, meta, 0, b"short")
+        self.assertEqual(e.extra["expected"], MIN_CHUNK_SIZE)
+        self.assert_upload_error(416, self.put, meta, 3, b"x")
+        self.assert_upload_error(
+            422, self.put, meta, 1, sha256=hashlib.sha256(b"other").hexdigest())
+        # 길이는 맞다고 했는데 본문이 중간에 끊긴 경우
+        self.assert_upload_error(400, write_chunk, meta, 2, io.BytesIO(b"x" * 10), 1000)
+        self.assertEqual(session_status(meta)["missing"], [0, 1, 2])
+
+    def test_finalize(self):
+        meta = self.session()
+        self.put(meta, 2)
+        e = self.assert_upload_error(409, finalize_blob, meta)
+        self.assertEqual(e.extra["missing"], [0, 1])
+        for n in (1, 0):
+            self.put(meta, n, sha256=hashlib.sha256(self.chunk(n)).hexdigest())
+        self.assertEqual(session_status(meta)["missing"], [])
+
+        blob = finalize_blob(meta)
+        self.assertEqual(blob.sha256, self.sha)
+        self.assertEqual(blob_path(blob).read_bytes(), self.content)
+        self.assertEqual(load_session(meta["id"])["blob"], self.sha)
+        # 다시 불러도 같은 blob
+        self.assertEqual(finalize_blob(load_session(meta["id"])).pk, blob.pk)
+
+        # 같은 내용의 새 세션은 청크 없이 바로 끝난다.
+        again = self.session()
+        self.assertTrue(session_status(again)["exists"])
+        self.assertEqual(finalize_blob(again).pk, blob.pk)
+
+    def test_chunk_after_finalize(self):
+        meta = self.session()
+        for n in range(3):
+            self.put(meta, n)
+        # 다른 요청이 finalize하기 전에 세션 정보를 읽어 둔 청크 요청
+        stale = deepcopy(meta)
+        finalize_blob(meta)
+        self.assert_upload_error(409, self.put, stale, 1)
+        delete_session(meta)
+        self.assert_upload_error(404, self.put, stale, 1)
+
+    def test_whole_file_checksum(self):
+        meta = self.session(sha256=hashlib.sha256(b"something else").hexdigest())
+        for n in range(3):
+            self.put(meta, n)
+        e = self.assert_upload_error(422, finalize_blob, meta)
+        self.assertEqual(e.extra["missing"], [0, 1, 2])
+        self.assertEqual(session_status(meta)["missing"], [0, 1, 2])
+
+    def test_endpoints(self):
+        project = Project.objects.create(name="upload", data={"nodes": {}, "images": []})
+        resp = self.client.post("/api/uploads/", json.dumps({
+            "project": project.pk, "floor": 1, "filename": "plan.png",
+            "size": len(self.content), "sha256": self.sha, "chunk_size": MIN_CHUNK_SIZE,
+            "base": project.revision,
+        }), content_type="application/json")
+        self.assertEqual(resp.status_code, 201)
+        upload_id = resp.json()["upload_id"]
+        for n in (2, 0, 1):
+            resp = self.client.put(f"/api/uploads/{upload_id}/chunks/{n}/", self.chunk(n),
+                                   content_type="application/octet-stream")
+            self.assertEqual(resp.status_code, 200)
+        # 타일 생성(백그라운드)은 이 테스트 대상이 아니다.
+        with mock.patch("maps.views.schedule_floor_tiles") as tiles:
+            resp = self.client.post(f"/api/uploads/{upload_id}/finalize/")
+        self.assertEqual(resp.status_code, 200)
+        tiles.assert_called_once()
+        self.assertEqual(resp.json()["revision"], project.revision + 1)
+        images = Project.objects.get(pk=project.pk).data["images"]
+        self.assertEqual(len(images), 2)
+        self.assertIn(self.sha, images[1])
+        # finalize를 다시 불러도 같은 응답
+        self.assertEqual(self.client.post(f"/api/uploads/{upload_id}/finalize/").json(), resp.json())
+
+
+class ExportJobTests(TransactionTestCase):
+    """일괄 export: 워커 프로세스가 쓴 ZIP, 작업 상태 API, 동시 실행 제한"""
+
+    def setUp(self):
+        out = tempfile.TemporaryDirectory()
+        self.addCleanup(out.cleanup)
+        self.out = Path(out.name)
+
+    def test_run_bulk_export(self):
+        # 워커는 spawn 프로세스라 커밋된 행만 보인다. (TransactionTestCase)
+        pids = [Project.objects.create(name=f"e{i}", data=_path_data()).pk for i in range(2)]
+        done = []
+        results = run_bulk_export([*pids, max(pids) + 100], dest_dir=self.out, workers=1,
+                                  progress=lambda n, total, r: done.append((n, total)))
+        self.assertEqual(done, [(1, 3), (2, 3), (3, 3)])
+        by_id = {r["id"]: r for r in results}
+        self.assertIn("DoesNotExist", by_id[max(pids) + 100]["error"])
+        for pid in pids:
+            self.assertEqual(by_id[pid]["path"], str(self.out / f"{pid}.zip"))
+            with zipfile.ZipFile(self.out / f"{pid}.zip") as zf:
+                self.assertIn("node.txt", zf.namelist())
+        # 임시 파일은 os.replace로 바뀌거나 지워지고 완성된 ZIP만 남는다.
+        self.assertEqual(sorted(p.name for p in self.out.iterdir()),
+                         sorted(f"{pid}.zip" for pid in pids))
+
+    def test_one_job_at_a_time(self):
+        release = threading.Event()
+
+        def fake_export(pids, workers=None, progress=None):
+            release.wait(5)
+            for n, pid in enumerate(pids, start=1):
+                progress(n, len(pids), {"id": pid})
+
+        pid = Project.objects.create(name="e", data=_path_data()).pk
+        with mock.patch("maps.jobs.run_bulk_export", side_effect=fake_export):
+            resp = self.client.post("/api/exports/", json.dumps({"projects": [pid]}),
+                                    content_type="application/json")
+            self.assertEqual(resp.status_code, 202)
+            job_id = resp.json()["id"]
+            self.assertEqual(resp.json()["status"], "running")
+            again = self.client.post("/api/exports/", "{}", content_type="application/json")
+            self.assertEqual(again.status_code, 409)
+            self.assertEqual(again.json()["job"], job_id)
+
+            release.set()
+            for _ in range(100):
+                if get_export_job(job_id)["status"] == "done":
+                    break
+                time.sleep(0.05)
+        status = self.client.get(f"/api/exports/{job_id}/").json()
+        self.assertEqual((status["status"], status["done"], status["failed"]), ("done", 1, 0))
+        self.assertEqual(status["results"], [{"id": pid}])
+        self.assertEqual(self.client.get("/api/exports/nope/").status_code, 404)
+
+
+def _load_frontend_serve():
+    """frontend/serve.py (패키지가 아니라서 경로로 읽는다)"""
+    path = Path(__file__).resolve().parents[2] / "frontend" / "serve.py"
+    spec = importlib.util.spec_from_file_location("frontend_serve", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FrontendServeTests(SimpleTestCase):
+    """frontend/serve.py 운영 모드: 미리 압축, Accept-Encoding 선택, 304, Content-Length"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.serve = _load_frontend_serve()
+
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.root = Path(folder.name)
+        self.content = b"".join(b"console.log(%d);\n" % i for i in range(400))
+        (self.root / "app.js").write_bytes(self.content)
+        (self.root / "small.js").write_bytes(b"1;")
+
+    def start(self, cache):
+        """cache를 쓰는 ProductionHandler 서버를 빈 포트에 띄운다."""
+        handler_cls = type("Handler", (self.serve.ProductionHandler,),
+                           {"cache": cache, "log_message": lambda *a: None})
+        root = str(self.root)
+        httpd = self.serve.PooledHTTPServer(
+            ("127.0.0.1", 0), lambda *a, **kw: handler_cls(*a, directory=root, **kw), 2)
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+
+        def stop():
+            httpd.shutdown()
+            httpd.server_close()
+            thread.join()
+
+        self.addCleanup(stop)
+        self.port = httpd.server_address[1]
+
+    def get(self, path, **headers):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=10)
+        try:
+            conn.request("GET", path, headers=headers)
+            resp = conn.getresponse()
+            return resp, resp.read()
+        finally:
+            conn.close()
+
+    def test_precompress(self):
+        written = self.serve.precompress(str(self.root))
+        suffixes = [".gz"] + ([".br"] if self.serve.brotli is not None else [])
+        self.assertEqual(written, len(suffixes))
+        self.assertEqual(gzip.decompress((self.root / "app.js.gz").read_bytes()), self.content)
+        # 작은 파일은 압축하지 않고, 최신 압축본은 다시 만들지 않는다.
+        self.assertFalse((self.root / "small.js.gz").exists())
+        self.assertEqual(self.serve.precompress(str(self.root)), 0)
+
+    def test_encoding_negotiation_and_304(self):
+        self.serve.precompress(str(self.root))
+        self.start(self.serve.AssetCache(1024 * 1024))
+
+        resp, body = self.get("/app.js")
+        self.assertEqual(resp.status, 200)
+        self.assertIsNone(resp.getheader("Content-Encoding"))
+        self.assertEqual(body, self.content)
+        self.assertEqual(resp.getheader("Vary"), "Accept-Encoding")
+        plain_etag = resp.getheader("ETag")
+
+        resp, body = self.get("/app.js", **{"Accept-Encoding": "br;q=0, gzip"})
+        self.assertEqual(resp.getheader("Content-Encoding"), "gzip")
+        self.assertEqual(int(resp.getheader("Content-Length")), len(body))
+        self.assertEqual(gzip.decompress(body), self.content)
+        gzip_etag = resp.getheader("ETag")
+        self.assertNotEqual(gzip_etag, plain_etag)
+
+        resp, body = self.get("/app.js", **{"Accept-Encoding": "gzip",
+                                            "If-None-Match": gzip_etag})
+        self.assertEqual(resp.status, 304)
+        self.assertEqual(body, b"")
+        self.assertEqual(self.get("/app.js", **{"If-None-Match": plain_etag})[0].status, 304)
+
+        # 압축본이 원본보다 오래되면 쓰지 않는다.
+        later = (self.root / "app.js.gz").stat().st_mtime_ns + 10 ** 9
+        os.utime(self.root / "app.js", ns=(later, later))
+        resp, body = self.get("/app.js", **{"Accept-Encoding": "gzip"})
+        self.assertIsNone(resp.getheader("Content-Encoding"))
+        self.assertEqual(body, self.content)
+
+        self.assertEqual(self.get("/app.js.gz")[0].status, 404)
+
+    def test_content_length_matches_body(self):
+        # stat 뒤, 내용을 읽기 직전에 파일이 바뀌는 경우 (배포 중 덮어쓰기)
+        new = self.content + b"console.log('new');\n"
+        base = self.serve.AssetCache
+
+        class RewritingCache(base):
+            def read(self, path, st):
+                Path(path).write_bytes(new)
+                return super().read(path, st)
+
+        for max_bytes in (1024 * 1024, 0):  # 메모리 캐시 / 파일에서 바로
+            with self.subTest(max_bytes=max_bytes):
+                (self.root / "app.js").write_bytes(self.content)
+                self.start(RewritingCache(max_bytes))
+                resp, body = self.get("/app.js")
+                self.assertEqual(resp.status, 200)
+                self.assertEqual(int(resp.getheader("Content-Length")), len(new))
+                self.assertEqual(body, new)
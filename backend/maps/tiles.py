@@ -0,0 +1,253 @@
+# maps/tiles.py
+"""
+층 배경 이미지 → 타일 피라미드(multi-resolution pyramid) 생성 모듈.
+
+10k×10k 같은 큰 도면을 통째로 내려받지 않고, 화면에 보이는 256px 타일만
+받아 가도록 업로드 시점에 미리 잘라 둔다.
+
+디렉터리 구조 (원본 이미지가 있는 폴더 기준)
+--------------------------------------------
+    <폴더>/<원본 파일>                         ← 업로드 원본
+    <폴더>/tiles/<원본 파일>.json              ← 매니페스트 (생성 완료 표시)
+    <폴더>/tiles/<version>/<z>/<x>_<y>.png    ← 타일
+    <폴더>/tiles/<version>/preview.jpg        ← 미리보기 (목록 썸네일)
+
+  폴더는 blob 저장소의 blobs/<sha 앞 2자리>/ (maps/blobs.py),
+  또는 예전 방식으로 올라간 이미지의 floor_images/<pid>/ 이다.
+
+- version: 원본 파일 내용의 SHA-256 앞 16자리.
+  내용이 같으면 URL도 같고, 내용이 바뀌면 URL이 바뀌므로 타일은 영구 캐시해도 된다.
+- z: 0(전체가 타일 한 장 안에 들어가는 크기) ~ max_zoom(원본 해상도)
+  한 단계 내려갈 때마다 가로/세로가 절반.
+- 오른쪽/아래쪽 가장자리 타일은 256px보다 작을 수 있다.
+
+매니페스트
+----------
+    {"version", "width", "height", "tile_size", "max_zoom", "format",
+     "preview": "<MEDIA_URL>.../tiles/<version>/preview.jpg"}
+
+타일 자체는 /api/projects/<pid>/tiles/<version>/<z>/<x>_<y>.png 로 내려준다. (views.floor_tile)
+
+Pillow가 필요하다. (requirements.txt)
+SVG처럼 Pillow가 열 수 없는 이미지는 타일을 만들지 않고 원본만 쓴다.
+
+큰 도면은 디코딩만 해도 GB 단위 메모리를 쓰므로, 웹 워커 프로세스가 아니라
+따로 띄운 프로세스에서 만든다. (build_in_process, maps/tasks.py)
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from math import ceil, log2
+
+from django.conf import settings
+
+TILE_SIZE = 256
+
+# 미리보기(목록 썸네일) 긴 변 길이
+PREVIEW_SIZE = 512
+
+# 허용할 최대 픽셀 수 (Pillow 기본값은 약 8900만 → 10k×10k 도면이 경고에 걸림)
+MAX_IMAGE_PIXELS = 400_000_000
+
+TILES_DIR_NAME = "tiles"
+
+# 원본 해시를 계산할 때 한 번에 읽을 크기
+_HASH_CHUNK = 1024 * 1024
+
+
+def media_path(url: str):
+    """
+    '/media/floor_images/1/0_a.png' 같은 상대 URL → MEDIA_ROOT 아래 실제 경로.
+    MEDIA_URL 아래가 아니거나 MEDIA_ROOT 밖을 가리키면 None.
+    """
+    if not isinstance(url, str) or not url.startswith(settings.MEDIA_URL):
+        return None
+    rel = url[len(settings.MEDIA_URL):]
+    root = os.path.realpath(settings.MEDIA_ROOT)
+    path = os.path.realpath(os.path.join(root, rel))
+    if not path.startswith(root + os.sep):
+        return None
+    return path
+
+
+def is_tileable(url: str) -> bool:
+    """MEDIA_ROOT 아래의 래스터 이미지인지. (SVG는 벡터라 타일이 필요 없다)"""
+    path = media_path(url)
+    return path is not None and not path.lower().endswith(".svg")
+
+
+def manifest_path(image_path: str) -> str:
+    """원본 이미지 경로 → 매니페스트 경로 (같은 폴더의 tiles/<파일명>.json)"""
+    folder, name = os.path.split(image_path)
+    return os.path.join(folder, TILES_DIR_NAME, name + ".json")
+
+
+def load_manifest(image_url: str):
+    """이미지 URL의 타일 매니페스트. 아직 없으면(생성 전/실패/SVG) None."""
+    path = media_path(image_url)
+    if path is None:
+        return None
+    try:
+        with open(manifest_path(path), "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def preview_url_for(image_url: str) -> str:
+    """이미지의 미리보기 URL. 타일이 아직 없으면 빈 문자열."""
+    manifest = load_manifest(image_url)
+    return (manifest or {}).get("preview") or ""
+
+
+def tile_path(pid, version: str, z: int, x: int, y: int) -> str:
+    """
+    타일 파일 경로.
+
+    - blob 저장소의 타일을 먼저 찾고 (version 앞 2자리 = blob 폴더),
+      없으면 예전 방식의 floor_images/<pid>/tiles/ 에서 찾는다.
+    """
+    root = os.path.realpath(settings.MEDIA_ROOT)
+    rel = os.path.join(TILES_DIR_NAME, version, str(z), f"{x}_{y}.png")
+    path = os.path.join(root, "blobs", version[:2], rel)
+    if os.path.exists(path):
+        return path
+    return os.path.join(root, "floor_images", str(pid), rel)
+
+
+def file_version(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(_HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()[:16]
+
+
+def _url_for(path: str) -> str:
+    rel = os.path.relpath(path, os.path.realpath(settings.MEDIA_ROOT))
+    return settings.MEDIA_URL + rel.replace(os.sep, "/")
+
+
+def _write_atomic(path: str, write):
+    """임시 파일에 쓴 뒤 os.replace (읽는 쪽이 반쯤 쓴 파일을 보지 않도록)"""
+    fd, tmp = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            write(fh)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _save_image(img, path, fmt, **params):
+    _write_atomic(path, lambda fh: img.save(fh, fmt, **params))
+
+
+def build_tile_pyramid(image_path: str) -> dict:
+    """
+    image_path 원본으로 타일 피라미드와 미리보기를 만들고 매니페스트를 돌려준다.
+
+    - 같은 version의 매니페스트가 이미 있으면 다시 만들지 않는다.
+    - 매니페스트는 모든 타일을 다 쓴 뒤 마지막에 쓴다. (있으면 완성된 것)
+    - Pillow가 열 수 없는 파일이면 PIL.UnidentifiedImageError 등이 그대로 올라간다.
+    """
+    from PIL import Image
+
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+    image_path = os.path.realpath(image_path)
+    folder = os.path.dirname(image_path)
+    version = file_version(image_path)
+
+    mpath = manifest_path(image_path)
+    try:
+        with open(mpath, "r", encoding="utf-8") as fh:
+            existing = json.load(fh)
+        if existing.get("version") == version:
+            return existing
+    except (OSError, ValueError):
+        pass
+
+    out_dir = os.path.join(folder, TILES_DIR_NAME, version)
+    os.makedirs(out_dir, exist_ok=True)
+
+    # 원본 해상도 버퍼는 디코딩한 src(또는 모드 변환 결과) 하나만 둔다. (복사본을 만들지 않음)
+    with Image.open(image_path) as src:
+        src.load()
+        img = src
+        # 팔레트/흑백 등은 축소 시 품질이 나빠지므로 RGB(A)로
+        if src.mode not in ("RGB", "RGBA"):
+            has_alpha = src.mode in ("LA", "PA") or "transparency" in src.info
+            img = src.convert("RGBA" if has_alpha else "RGB")
+            src.close()
+
+        width, height = img.size
+        max_zoom = max(0, ceil(log2(max(width, height) / TILE_SIZE)))
+
+        # 원본 해상도(max_zoom)부터 절반씩 줄여 가며 0까지
+        # 미리보기는 긴 변이 PREVIEW_SIZE 이상인 가장 작은 단계에서 만든다.
+        level = preview_src = img
+        for z in range(max_zoom, -1, -1):
+            if z != max_zoom:
+                w, h = level.size
+                level = level.resize((max(1, ceil(w / 2)), max(1, ceil(h / 2))),
+                                     Image.LANCZOS, reducing_gap=2.0)
+                if max(level.size) >= PREVIEW_SIZE:
+                    preview_src = level
+                if z == max_zoom - 1 and preview_src is not img:
+                    # 원본 해상도 버퍼는 첫 축소 뒤에는 필요 없다.
+                    img.close()
+            w, h = level.size
+            zdir = os.path.join(out_dir, str(z))
+            os.makedirs(zdir, exist_ok=True)
+            for ty in range(ceil(h / TILE_SIZE)):
+                for tx in range(ceil(w / TILE_SIZE)):
+                    box = (tx * TILE_SIZE, ty * TILE_SIZE,
+                           min(w, (tx + 1) * TILE_SIZE), min(h, (ty + 1) * TILE_SIZE))
+                    _save_image(level.crop(box), os.path.join(zdir, f"{tx}_{ty}.png"),
+                                "PNG", optimize=False, compress_level=6)
+
+        # 미리보기: 흰 바탕 JPEG (도면은 대부분 흰 바탕)
+        preview = preview_src.copy() if preview_src is img else preview_src
+        del level, preview_src
+        img.close()
+    preview.thumbnail((PREVIEW_SIZE, PREVIEW_SIZE), Image.LANCZOS)
+    if preview.mode == "RGBA":
+        bg = Image.new("RGB", preview.size, (255, 255, 255))
+        bg.paste(preview, mask=preview.getchannel("A"))
+        preview = bg
+    preview_path = os.path.join(out_dir, "preview.jpg")
+    _save_image(preview, preview_path, "JPEG", quality=82, optimize=True)
+
+    manifest = {
+        "version": version,
+        "width": width,
+        "height": height,
+        "tile_size": TILE_SIZE,
+        "max_zoom": max_zoom,
+        "format": "png",
+        "preview": _url_for(preview_path),
+    }
+    payload = json.dumps(manifest, ensure_ascii=False).encode("utf-8")
+    _write_atomic(mpath, lambda fh: fh.write(payload))
+    return manifest
+
+
+def build_in_process(image_path: str) -> dict:
+    """
+    build_tile_pyramid()를 새로 띄운 프로세스에서 실행하고 매니페스트를 돌려준다.
+
+    - 디코딩한 원본 버퍼가 웹 워커 프로세스 메모리에 남지 않고, 끝나면 프로세스째 반환된다.
+    - spawn 방식 (스레드가 도는 웹 서버 프로세스 안에서도 안전, maps/jobs.py와 같은 이유)
+      DJANGO_SETTINGS_MODULE 환경변수는 부모에게서 물려받는다.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+        return pool.submit(build_tile_pyramid, image_path).result()
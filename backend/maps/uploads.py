@@ -0,0 +1,335 @@
+# maps/uploads.py
+"""
+큰 층 이미지를 위한 청크 업로드 (이어 올리기 가능).
+
+POST /api/upload_floor_image/ 한 번으로 수백 MB 도면을 올리면 중간에 끊겼을 때
+처음부터 다시 보내야 하고, 요청 하나가 오래 붙잡힌다. 그래서
+
+  1) POST   /api/uploads/                         세션 시작 (크기, 청크 크기, 전체 SHA-256)
+  2) PUT    /api/uploads/<id>/chunks/<n>/         n번 청크 (순서 상관없음, 동시에 여러 개 가능)
+  3) POST   /api/uploads/<id>/finalize/           전체 SHA-256 확인 → blob 저장소 → data.images[floor]
+     GET    /api/uploads/<id>/                    받은/빠진 청크 목록 (끊긴 뒤 이어 올리기)
+     DELETE /api/uploads/<id>/                    세션 취소
+
+세션은 MAPS_UPLOAD_DIR(기본: MEDIA_ROOT 옆의 upload_sessions/) 아래 폴더 하나다.
+(MEDIA 아래에 두지 않으므로 다 올라가기 전 파일이 /media/로 노출되지 않는다)
+
+    <id>/meta.json    세션 정보
+    <id>/data         최종 크기로 미리 잡아 둔 파일. 청크 n은 n * chunk_size 위치에 바로 쓴다.
+    <id>/<n>.ok       n번 청크를 끝까지 받았다는 표시 (쓰다가 끊기면 생기지 않음)
+
+청크마다 파일 핸들을 따로 열어 서로 다른 위치에 쓰므로 동시 PUT끼리 잠글 필요가 없다.
+finalize는 data를 다시 복사하지 않고 blob 저장소로 옮긴다. (maps/blobs.store_file)
+오래된 세션은 새 세션을 만들 때 지운다. (SESSION_TTL)
+"""
+import hashlib
+import json
+import os
+import re
+import secrets
+import shutil
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+from .blobs import CHUNK_SIZE, find_blob, store_file
+
+# 청크 크기 기본값 / 허용 범위 (마지막 청크만 더 작을 수 있음)
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+
+# 업로드 파일 최대 크기 (settings.MAPS_UPLOAD_MAX_BYTES 로 바꿀 수 있음)
+MAX_UPLOAD_BYTES = 1024 * 1024 * 1024
+
+# 마지막으로 건드린 지 이 시간(초)이 지난 세션은 지운다.
+SESSION_TTL = 24 * 60 * 60
+
+# finalize 잠금이 이보다 오래되면 죽은 요청이 남긴 것으로 보고 무시한다.
+FINALIZE_LOCK_TTL = 10 * 60
+
+UPLOAD_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class UploadError(Exception):
+    """청크 업로드 요청 오류 (status: 돌려줄 HTTP 상태 코드)"""
+
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+
+def sessions_root() -> Path:
+    default = Path(settings.MEDIA_ROOT).parent / "upload_sessions"
+    return Path(getattr(settings, "MAPS_UPLOAD_DIR", default))
+
+
+def max_upload_bytes() -> int:
+    return int(getattr(settings, "MAPS_UPLOAD_MAX_BYTES", MAX_UPLOAD_BYTES))
+
+
+def _session_dir(upload_id: str) -> Path:
+    return sessions_root() / upload_id
+
+
+def _write_meta(meta: dict):
+    path = _session_dir(meta["id"]) / "meta.json"
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def cleanup_sessions(ttl=SESSION_TTL) -> int:
+    """ttl초 동안 아무 청크도 오지 않은 세션 폴더를 지운다. 반환값: 지운 세션 수"""
+    root = sessions_root()
+    if not root.is_dir():
+        return 0
+    cutoff = time.time() - ttl
+    removed = 0
+    for entry in os.scandir(root):
+        if not entry.is_dir() or not UPLOAD_ID_RE.match(entry.name):
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def create_session(*, project_id, floor, filename, size, sha256=None,
+                   chunk_size=None, content_type="", base=None) -> dict:
+    """
+    업로드 세션을 만든다.
+
+    - sha256: (권장) 파일 전체의 SHA-256. finalize 때 확인하고,
+              같은 내용이 이미 저장소에 있으면 청크를 받지 않고 바로 finalize할 수 있다.
+    - base: (선택) finalize 때 이 리비전일 때만 data.images에 반영 (upload_floor_image의 base와 같음)
+    """
+    if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+        raise UploadError("size must be a positive integer")
+    if size > max_upload_bytes():
+        raise UploadError("file too large", status=413, max_bytes=max_upload_bytes())
+    if chunk_size is None:
+        chunk_size = DEFAULT_CHUNK_SIZE
+    if (not isinstance(chunk_size, int) or isinstance(chunk_size, bool)
+            or not MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE):
+        raise UploadError(f"chunk_size must be {MIN_CHUNK_SIZE}..{MAX_CHUNK_SIZE}")
+    if sha256 is not None:
+        sha256 = str(sha256).lower()
+        if not SHA256_RE.match(sha256):
+            raise UploadError("invalid sha256")
+
+    cleanup_sessions()
+
+    upload_id = secrets.token_hex(16)
+    folder = _session_dir(upload_id)
+    folder.mkdir(parents=True)
+    meta = {
+        "id": upload_id,
+        "project": project_id,
+        "floor": floor,
+        "filename": os.path.basename(str(filename or ""))[:255],
+        "content_type": str(content_type or "")[:100],
+        "size": size,
+        "chunk_size": chunk_size,
+        "chunks": (size + chunk_size - 1) // chunk_size,
+        "sha256": sha256,
+        "base": base,
+        # 저장소에 들어간 내용의 sha (같은 내용이 이미 있거나 finalize에서 옮긴 뒤)
+        "blob": None,
+        "result": None,
+    }
+    if sha256 and find_blob(sha256) is not None:
+        meta["blob"] = sha256
+    else:
+        # 최종 크기로 미리 잡아 둔다. (sparse 파일이라 실제 디스크는 쓴 만큼만)
+        with open(folder / "data", "wb") as f:
+            f.truncate(size)
+    _write_meta(meta)
+    return meta
+
+
+def load_session(upload_id: str):
+    """세션 정보. 없거나(만료/취소) id 형식이 틀리면 None"""
+    if not UPLOAD_ID_RE.match(upload_id or ""):
+        return None
+    try:
+        text = (_session_dir(upload_id) / "meta.json").read_text(encoding="utf-8")
+    except OSError:
+        return None
+    return json.loads(text)
+
+
+def received_chunks(meta: dict) -> list:
+    folder = _session_dir(meta["id"])
+    out = []
+    for name in os.listdir(folder):
+        if name.endswith(".ok") and name[:-3].isdigit():
+            out.append(int(name[:-3]))
+    return sorted(out)
+
+
+def session_status(meta: dict) -> dict:
+    """GET uploads/<id>/ 및 세션 시작 응답"""
+    if meta["blob"]:
+        received, missing = list(range(meta["chunks"])), []
+    else:
+        received = received_chunks(meta)
+        have = set(received)
+        missing = [n for n in range(meta["chunks"]) if n not in have]
+    return {
+        "upload_id": meta["id"],
+        "size": meta["size"],
+        "chunk_size": meta["chunk_size"],
+        "chunks": meta["chunks"],
+        "received": received,
+        "missing": missing,
+        # true면 같은 내용이 이미 서버에 있으므로 청크 없이 finalize하면 된다.
+        "exists": bool(meta["blob"]) and meta["result"] is None,
+        "done": meta["result"] is not None,
+    }
+
+
+def chunk_length(meta: dict, n: int) -> int:
+    return min(meta["chunk_size"], meta["size"] - n * meta["chunk_size"])
+
+
+def write_chunk(meta: dict, n: int, stream, length, sha256=None):
+    """
+    stream(request 등 read(n)이 있는 객체)에서 n번 청크를 읽어 data 파일 제자리에 쓴다.
+
+    - length: 요청의 Content-Length. 청크 크기와 다르면 읽지 않고 거절한다.
+    - sha256: (선택) 청크의 SHA-256. 다르면 422 (표시 파일을 남기지 않으므로 다시 보내면 된다)
+    - 같은 청크를 다시 보내면 덮어쓴다. (재시도/이어 올리기)
+    - meta를 읽은 뒤에 다른 요청이 finalize해서 data 파일이 옮겨졌으면 409
+      (파일 오류가 나면 세션 정보를 다시 읽어서 구분한다)
+    """
+    if meta["result"] is not None or meta["blob"]:
+        raise UploadError("upload already finalized", status=409)
+    if not 0 <= n < meta["chunks"]:
+        raise UploadError("chunk index out of range", status=416)
+    expected = chunk_length(meta, n)
+    if length != expected:
+        raise UploadError(f"chunk {n} must be {expected} bytes", expected=expected)
+
+    folder = _session_dir(meta["id"])
+    h = hashlib.sha256()
+    remaining = expected
+    try:
+        # 청크마다 핸들을 따로 연다. (다른 청크와 파일 위치를 공유하지 않음)
+        with open(folder / "data", "r+b") as out:
+            out.seek(n * meta["chunk_size"])
+            while remaining:
+                piece = stream.read(min(CHUNK_SIZE, remaining))
+                if not piece:
+                    break
+                out.write(piece)
+                h.update(piece)
+                remaining -= len(piece)
+    except OSError:
+        _raise_if_closed(meta)
+        raise
+    if remaining:
+        raise UploadError(f"chunk {n} truncated", expected=expected)
+    if sha256 and h.hexdigest() != str(sha256).lower():
+        raise UploadError(f"chunk {n} checksum mismatch", status=422)
+
+    try:
+        (folder / f"{n}.ok").touch()
+        # 세션 폴더 mtime = 마지막으로 청크를 받은 시각 (cleanup_sessions 기준)
+        os.utime(folder)
+    except OSError:
+        _raise_if_closed(meta)
+        raise
+    return n
+
+
+def _raise_if_closed(meta: dict):
+    """
+    meta를 읽은 뒤 다른 요청이 finalize(data 파일을 blob 저장소로 옮김)했거나
+    세션을 지웠으면 그에 맞는 UploadError. (세션 정보를 다시 읽어서 확인)
+    """
+    current = load_session(meta["id"])
+    if current is None:
+        raise UploadError("upload not found", status=404)
+    if current["result"] is not None or current["blob"]:
+        raise UploadError("upload already finalized", status=409)
+
+
+def _file_sha256(path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for piece in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(piece)
+    return h.hexdigest()
+
+
+def _lock_finalize(folder: Path):
+    lock = folder / "finalize.lock"
+    try:
+        fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        try:
+            stale = time.time() - lock.stat().st_mtime > FINALIZE_LOCK_TTL
+        except OSError:
+            stale = True
+        if not stale:
+            raise UploadError("finalize already in progress", status=409)
+        lock.unlink(missing_ok=True)
+        fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    os.close(fd)
+    return lock
+
+
+def finalize_blob(meta: dict):
+    """
+    모든 청크가 왔는지, 전체 SHA-256이 맞는지 확인한 뒤 data 파일을 blob 저장소로 옮긴다.
+
+    반환값: MediaBlob. 이미 옮긴 세션이면 그 blob을 다시 돌려준다. (finalize 재시도)
+    """
+    if meta["blob"]:
+        blob = find_blob(meta["blob"])
+        if blob is None:
+            raise UploadError("stored file is gone, start a new upload", status=410)
+        return blob
+
+    folder = _session_dir(meta["id"])
+    lock = _lock_finalize(folder)
+    try:
+        have = set(received_chunks(meta))
+        missing = [n for n in range(meta["chunks"]) if n not in have]
+        if missing:
+            raise UploadError("missing chunks", status=409, missing=missing)
+
+        data = folder / "data"
+        sha = _file_sha256(data)
+        if meta["sha256"] and sha != meta["sha256"]:
+            # 어떤 청크가 틀렸는지 알 수 없으므로 처음부터 다시 받는다.
+            for n in have:
+                (folder / f"{n}.ok").unlink(missing_ok=True)
+            raise UploadError("checksum mismatch", status=422,
+                              missing=list(range(meta["chunks"])))
+
+        blob = store_file(data, sha, meta["filename"], meta["content_type"])
+        meta["blob"] = blob.sha256
+        _write_meta(meta)
+        for n in have:
+            (folder / f"{n}.ok").unlink(missing_ok=True)
+        return blob
+    finally:
+        lock.unlink(missing_ok=True)
+
+
+def mark_done(meta: dict, result: dict):
+    """finalize 결과를 남겨 둔다. (같은 finalize를 다시 불러도 같은 응답)"""
+    meta["result"] = result
+    _write_meta(meta)
+
+
+def delete_session(meta: dict):
+    shutil.rmtree(_session_dir(meta["id"]), ignore_errors=True)
@@ -32,6 +32,9 @@ urlpatterns = [
     # 응답: {"ok": true}        
     path('ping/', views.ping),
 
+    # 프로세스 내 프로젝트 캐시 상태 (hit/miss 카운터, 사용 용량)
+    path('cache/stats/', views.cache_stats),
+
 
     # -------------------------
     # 프로젝트 CRUD API
@@ -47,6 +50,74 @@ urlpatterns = [
     # PATCH  /projects/<id>/ → 부분 갱신
     # DELETE /projects/<id>/ → 삭제    
     path('projects/<int:pid>/', views.project_id),
+
+    # 부분 저장 (바뀐 노드/링크/폴리곤 또는 RFC 6902 JSON Patch)
+    # PATCH /projects/<id>/delta/  body: {"base": <revision>, ...}
+    path('projects/<int:pid>/delta/', views.project_delta),
+
+    # 리비전 기록 (스냅샷 + delta, maps/history.py)
+    # GET /projects/<id>/revisions/       목록
+    # GET /projects/<id>/revisions/<n>/   리비전 n 시점의 프로젝트 JSON
+    path('projects/<int:pid>/revisions/', views.project_revisions),
+    path('projects/<int:pid>/revisions/<int:number>/', views.project_revision),
+
+    # 두 노드 사이 최단 경로 (서버 측 A*)
+    # GET /projects/<id>/route/?from=N_1&to=N_42
+    path('projects/<int:pid>/route/', views.project_route),
+
+    # 여러 노드 사이 보행 거리 행렬 (m, 스트리밍)
+    # POST /projects/<id>/matrix/   body: {"sources": [...], "targets": [...]}
+    path('projects/<int:pid>/matrix/', views.project_matrix),
+
+    # 출발 노드(들)에서 보행 거리 N m 이내에 닿는 노드 / 폴리곤
+    # GET /projects/<id>/reachable/?from=N_1,N_7&max_m=50&polygons=1
+    path('projects/<int:pid>/reachable/', views.project_reachable),
+
+    # 그래프 무결성 보고서 (끊어진/비대칭 링크, 층별 연결 요소, 도달 불가 맵핑 포인트)
+    # GET /projects/<id>/integrity/
+    path('projects/<int:pid>/integrity/', views.project_integrity),
+
+    # 가장 가까운 노드 / 링크 (층별 격자 공간 인덱스)
+    # GET  /projects/<id>/nearest/?floor=0&x=120&y=340&k=3
+    # POST /projects/<id>/nearest/batch/   body: {"floor": 0, "points": [[x, y], ...]}
+    path('projects/<int:pid>/nearest/', views.project_nearest),
+    path('projects/<int:pid>/nearest/batch/', views.project_nearest_batch),
+
+    # 좌표가 속한 방/구역 (층별 폴리곤 인덱스)
+    # GET  /projects/<id>/locate/?floor=0&x=120&y=340
+    # POST /projects/<id>/locate/batch/    body: {"floor": 0, "points": [[x, y], ...]}
+    path('projects/<int:pid>/locate/', views.project_locate),
+    path('projects/<int:pid>/locate/batch/', views.project_locate_batch),
+
+    # 장치용 TXT 내보내기 (node/link/arrow/polygon/core.txt 를 담은 ZIP, 스트리밍)
+    # GET /projects/<id>/export/
+    path('projects/<int:pid>/export/', views.export_txt),
+
+    # 모바일/임베디드용 바이너리 그래프 (mmap 가능한 타입 배열, 형식은 maps/graphbin.py)
+    # GET /projects/<id>/graph.bin
+    path('projects/<int:pid>/graph.bin', views.project_graph_bin),
+
+    # 층 단위 지연 로딩 (형식은 maps/floors.py)
+    # GET /projects/<id>/floors/       → 층 목록 매니페스트 (층별 개수, ETag)
+    # GET /projects/<id>/floors/<k>/   → k층 노드/링크/폴리곤/이미지 + 다른 층으로 가는 링크 stub
+    path('projects/<int:pid>/floors/', views.project_floors),
+    path('projects/<int:pid>/floors/<int:floor>/', views.project_floor),
+
+    # 층 배경 이미지 지우기 (data.images[floor] 한 칸만, 업로드와 같은 경로로 반영)
+    # DELETE /projects/<id>/floors/<floor>/image/?base=<revision>
+    path('projects/<int:pid>/floors/<int:floor>/image/', views.floor_image),
+
+    # 층 이미지 타일 (업로드 시 백그라운드에서 256px 타일 피라미드 생성)
+    # GET /projects/<id>/floors/<floor>/tiles/                 → 매니페스트 (크기, 줌 단계, 타일 URL 템플릿)
+    # GET /projects/<id>/tiles/<version>/<z>/<x>_<y>.png       → 타일 (immutable 캐시)
+    path('projects/<int:pid>/floors/<int:floor>/tiles/', views.floor_tiles),
+    path('projects/<int:pid>/tiles/<str:version>/<int:z>/<int:x>_<int:y>.png', views.floor_tile),
+
+    # 여러 프로젝트 일괄 export (프로세스 풀, 비동기 작업)
+    # POST /exports/           → 작업 시작
+    # GET  /exports/<job_id>/  → 진행률 / 프로젝트별 소요 시간 / 결과 URL
+    path('exports/', views.export_jobs),
+    path('exports/<str:job_id>/', views.export_job_status),
     
     # -------------------------
     # slug 기반 프로젝트 조회
@@ -77,4 +148,15 @@ urlpatterns = [
     #     - floor  : 층 번호(int)
 
     # 업로드 후 Project.data.images[floor]에 URL이 자동 반영된다.
+
+    # 큰 이미지용 청크 업로드 (이어 올리기 가능, 형식은 maps/uploads.py)
+    # POST   /uploads/                       → 세션 시작
+    # GET    /uploads/<id>/                  → 받은/빠진 청크 목록
+    # PUT    /uploads/<id>/chunks/<n>/       → n번 청크 (동시에 여러 개 가능)
+    # POST   /uploads/<id>/finalize/         → 확인 후 data.images[floor] 반영
+    # DELETE /uploads/<id>/                  → 취소
+    path("uploads/", views.upload_sessions),
+    path("uploads/<str:upload_id>/", views.upload_session),
+    path("uploads/<str:upload_id>/chunks/<int:n>/", views.upload_chunk),
+    path("uploads/<str:upload_id>/finalize/", views.upload_finalize),
 ]
\ No newline at end of file
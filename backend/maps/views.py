@@ -8,18 +8,68 @@
 3) 층별 배경 이미지 업로드 API
 """
 from django.shortcuts import render
-from django.http import JsonResponse, HttpResponseNotAllowed, HttpResponseNotFound
+from django.http import (
+    JsonResponse, HttpResponse, HttpResponseNotAllowed, HttpResponseNotFound,
+    StreamingHttpResponse,
+)
 from django.views.decorators.csrf import csrf_exempt
 
-from django.core.files.storage import FileSystemStorage
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
 
-from .models import Project
+from .models import Project, Floor
+from .blobs import blob_url, store_upload
+from .cache import project_cache
+from .canonical import (
+    apply_views, canonical_from_data, canonical_from_payload, check_lengths, derive_views,
+)
+from .delta import PatchError, apply_json_patch, apply_graph_diff, diff_json, outside_graph
+from .encoding import compress, pick_encoding
+from .export import export_project_to_txt
+from .floors import floor_manifest, get_floor_split
+from .graphbin import CONTENT_TYPE as GRAPH_BIN_TYPE, get_graph_bin, graph_bin_etag
+from .history import list_revisions, load_revision
+from .images import set_floor_image
+from .integrity import GraphIntegrity
+from .jobs import ExportJobRunning, start_export_job, get_export_job
+from .landmarks import get_landmarks, remove_sidecars
+from .media import serve_file
+from .poi_routes import get_poi_table
+from .routing import get_compiled_graph, find_route, dijkstra_to_targets, reachable_within
+from .spatial import get_spatial_index, get_zone_index, snap_point
+from .tasks import note_graph_changes, schedule_blob_gc, schedule_floor_tiles
+from .tiles import is_tileable, load_manifest, tile_path
+from .uploads import (
+    UploadError, create_session as create_upload, delete_session as delete_upload,
+    finalize_blob, load_session as load_upload, mark_done, session_status, write_chunk,
+)
 
 import json
+import re
 from copy import deepcopy
 import shutil
+from urllib.parse import urlparse
+
+# 목록 API 한 페이지 최대 개수
+MAX_LIST_LIMIT = 500
+
+# nearest 질의에서 k 최대값 / batch 한 번에 받을 최대 좌표 수
+MAX_NEAREST_K = 50
+MAX_BATCH_POINTS = 20000
+
+# 거리 행렬 요청의 최대 칸 수 (출발지 수 × 도착지 수)
+MAX_MATRIX_CELLS = 250_000
+
+# 도달 범위 질의의 출발 노드 최대 개수
+MAX_REACH_SEEDS = 1000
+
+# 타일 version (원본 SHA-256 앞 16자리)
+TILE_VERSION_RE = re.compile(r"^[0-9a-f]{16}$")
 
 # ----- 페이지 렌더링 -----
 @csrf_exempt
@@ -54,20 +104,123 @@ def ping(request):
     return JsonResponse({"ok": True})
 
 
+def cache_stats(request):
+    """
+    프로세스 내 프로젝트 캐시(project_cache) 상태 확인용 API.
+
+    - hit/miss/eviction 카운터, 엔트리 수, 사용 중인 바이트 수를 돌려준다.
+    - 워커 프로세스마다 캐시가 따로 있으므로 값도 워커별이다.
+    """
+    return JsonResponse(project_cache.stats())
+
+
 # ----- 내부 헬퍼 함수 -----
+def _revision_response(request, obj, body_for, content_type, etag=None, status=200):
+    """
+    프로젝트 리비전 단위로 캐시되는 응답 공용 처리.
+
+    - body_for(coding): 리비전별로 캐시된 본문 bytes ("identity" / "gzip" / "br")
+    - ETag / Last-Modified를 붙이고, GET의 If-None-Match / If-Modified-Since가
+      현재 리비전과 같으면 본문 없이 304를 돌려준다. (키오스크 폴링용)
+    - Accept-Encoding에 따라 br(설치된 경우) / gzip으로 압축한 본문을 보낸다.
+    """
+    etag = etag or obj.etag
+    last_modified = int(obj.updated_at.timestamp()) if obj.updated_at else None
+    if status == 200 and request.method in ("GET", "HEAD"):
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            not_modified["ETag"] = etag
+            not_modified["Cache-Control"] = "no-cache"
+            return not_modified
+
+    body = body_for("identity")
+    coding = pick_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""), len(body))
+    if coding != "identity":
+        body = body_for(coding)
+
+    resp = HttpResponse(body, status=status, content_type=content_type)
+    resp["ETag"] = etag
+    if last_modified is not None:
+        resp["Last-Modified"] = http_date(last_modified)
+    # 캐시해 두되 쓰기 전에는 항상 ETag로 다시 확인
+    resp["Cache-Control"] = "no-cache"
+    patch_vary_headers(resp, ("Accept-Encoding",))
+    if coding != "identity":
+        resp["Content-Encoding"] = coding
+    return resp
+
+
+def _project_json_response(request, obj, status=200):
+    """
+    Project 응답을 캐시된 JSON bytes로 바로 돌려준다.
+
+    - 같은 리비전이면 to_response() + json 인코딩(+ 압축)을 다시 하지 않는다.
+    - ETag / 304 / 압축은 _revision_response() 참고
+    """
+    return _revision_response(request, obj, obj.to_response_bytes, "application/json",
+                              status=status)
+
+
+def _absolute_media_url(request, url: str) -> str:
+    """
+    저장된 이미지 URL을 현재 요청 호스트 기준의 절대 URL로 바꾼다.
+
+    - 빈 문자열이면 빈 문자열 반환
+    - 상대 경로(/media/...)면 scheme://host 를 붙인다.
+    - 127.0.0.1 / localhost 를 가리키는 절대 URL은 현재 호스트로 교체
+      (사설망에서 다른 컴퓨터가 접근할 때도 올바른 주소가 되도록)
+    - 그 외 절대 URL은 그대로 사용
+    """
+    if not url:
+        return ""
+    scheme = 'https' if request.is_secure() else 'http'
+    host = request.get_host()
+
+    if not (url.startswith("http://") or url.startswith("https://")):
+        return f"{scheme}://{host}{url}"
+
+    if "127.0.0.1" not in url and "localhost" not in url:
+        return url
+
+    # URL에서 경로 부분만 추출
+    try:
+        parsed = urlparse(url)
+    except ValueError:
+        # 파싱 실패 시 원본 사용
+        return url
+    out = f"{scheme}://{host}{parsed.path}"
+    if parsed.query:
+        out += f"?{parsed.query}"
+    return out
+
 @csrf_exempt
-def _normalize_data(payload: dict) -> dict:
+def _normalize_data(payload: dict, copy=True) -> dict:
     """
     프론트에서 전달한 payload를 저장하기 전에 정리(normalize)하는 함수.
 
+    - copy=False 이면 payload를 복사하지 않고 제자리에서 정리한다.
+      (이미 이 요청 전용으로 만든 dict일 때, 수 MB짜리 deepcopy를 피하기 위함)
+
     - meta 기본값 채우기 (projectName, projectAuthor)
     - scale을 float로 강제 변환
     - nodes / connections 존재 여부 및 타입 보정
     - special_points, north_reference 구조 정리
     - images: list/dict 외 타입이면 비우기
     - id 필드는 DB 저장용이 아니므로 제거
+    - canonical({"nodes", "links", "polygons", "floors"} 목록)이 있으면 그것만 믿고
+      nodes / connections(거리 포함) / special_points / floors 버킷 / _editor의
+      node_meta·links·shapes 를 서버에서 만든다. (클라이언트는 중복 뷰를 보내지 않아도 됨)
+      canonical 노드 좌표가 NaN / inf 이면 ValueError → 호출하는 쪽에서 400
     """
-    data = deepcopy(payload) if isinstance(payload, dict) else {}
+    if not isinstance(payload, dict):
+        data = {}
+    else:
+        data = deepcopy(payload) if copy else payload
+
+    # ----- 정규 표현 → 파생 뷰 -----
+    if "canonical" in data:
+        canonical = canonical_from_payload(data.pop("canonical"), data)
+        apply_views(data, derive_views(canonical))
 
     # ----- meta 처리 -----
     meta = data.get("meta") or {}
@@ -120,10 +273,36 @@ def _normalize_data(payload: dict) -> dict:
 
     # ----- id 정리 -----
     # id는 DB의 PK와 중복되므로 data 안에서는 제거
+    # (slug / revision도 DB 컬럼 값이 기준이므로 제거)
     data.pop("id", None)
+    data.pop("slug", None)
+    data.pop("revision", None)
     return data
 
 
+def _length_error(data: dict):
+    """
+    data의 노드/링크/폴리곤 id·이름이 테이블 컬럼 길이를 넘으면 400 응답, 아니면 None.
+    (넘는 값을 그대로 저장하면 행 동기화에서 DataError → 500)
+    """
+    try:
+        check_lengths(canonical_from_data(data))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return None
+
+
+def _sync_name_from_meta(obj, data: dict):
+    """
+    data.meta.projectName 이 바뀌었으면 obj.name을 갱신하고
+    slug를 비워서 save()에서 다시 만들어지게 한다.
+    """
+    new_name = (data.get("meta") or {}).get("projectName") or obj.name
+    if new_name != obj.name:
+        obj.name = new_name
+        obj.slug = None
+
+
 
 # ----- 프로젝트 목록 & 생성 -----
 
@@ -133,76 +312,70 @@ def projects(request):
     /api/projects/ 엔드포인트.
 
     - GET  : 프로젝트 목록 조회
-             -> [{id, name, slug, updated_at, thumbnail}, ...]
+             -> [{id, name, slug, updated_at, thumbnail,
+                  node_count, link_count, floor_count}, ...]
+             ?q=검색어, ?limit=&cursor= (키셋 페이지네이션) 지원
+             (cursor는 X-Next-Cursor 응답 헤더 값을 URL 인코딩해서 그대로 보낸다)
     - POST : 새 프로젝트 생성
              -> 프론트에서 보낸 JSON payload를 normalize 후 DB에 저장
                 저장된 데이터 + id/slug를 합쳐서 반환
     """
     if request.method == "GET":
+        # data(JSON)는 읽지 않고, save()에서 채워 둔 비정규화 컬럼만 조회한다.
+        qs = Project.objects.order_by("updated_at", "id")
+
+        # ----- 검색 (api.js의 apiListProjects가 ?q= 로 보냄) -----
+        q = (request.GET.get("q") or "").strip()
+        if q:
+            qs = qs.filter(name__icontains=q)
+
+        # ----- 키셋 페이지네이션 -----
+        # ?limit=50&cursor=<updated_at>|<id>
+        #  - limit이 없으면 기존처럼 전체 목록을 돌려준다.
+        #  - 다음 페이지가 있으면 X-Next-Cursor 헤더로 다음 cursor를 알려준다.
+        #  - cursor의 updated_at(isoformat)에는 '+09:00' 같은 '+'가 들어갈 수 있으므로 (USE_TZ)
+        #    쿼리스트링에 넣을 때 반드시 URL 인코딩해야 한다. (안 하면 '+'가 공백이 됨)
+        cursor = request.GET.get("cursor") or ""
+        if cursor:
+            ts_raw, _, id_raw = cursor.rpartition("|")
+            ts = parse_datetime(ts_raw) if ts_raw else None
+            if ts is None or not id_raw.isdigit():
+                return JsonResponse({"error": "invalid cursor"}, status=400)
+            qs = qs.filter(Q(updated_at__gt=ts) | Q(updated_at=ts, id__gt=int(id_raw)))
+
+        limit = None
+        if request.GET.get("limit"):
+            try:
+                limit = min(max(int(request.GET["limit"]), 1), MAX_LIST_LIMIT)
+            except ValueError:
+                return JsonResponse({"error": "invalid limit"}, status=400)
+
+        rows = qs.values("id", "name", "slug", "updated_at", "thumbnail",
+                         "node_count", "link_count", "floor_count",
+                         "component_count", "orphan_link_count", "asymmetric_link_count",
+                         "unreachable_poi_count")
+        if limit is not None:
+            rows = rows[:limit + 1]
+        rows = list(rows)
+
+        next_cursor = ""
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = f"{last['updated_at'].isoformat()}|{last['id']}"
+
         out = []
-        
-        # 최근 수정된 순으로 정렬하고 싶다면 '-updated_at'을 사용할 수 있지만,
-        # 현재 코드는 updated_at 오름차순으로 정렬        
-        for p in Project.objects.all().order_by("updated_at"):
-            thumb_url = ""
-
-            # data 안에서 images 정보를 꺼내서 썸네일 URL 추출            
-            if isinstance(p.data, dict):
-                images = p.data.get("images") or {}
-                
-                # dict 지원 (예: {"1": "/media/.../1.png", "2": "..."} 형태)
-                if isinstance(images, dict) and images:
-                    # 키를 문자열 기준으로 정렬해서 가장 앞의 값을 사용
-                    first_key = sorted(images.keys(), key=str)[0]
-                    thumb_url = images[first_key] or ""
-                
-                # list 지원 (예: ["/media/.../1f.png", "/media/.../2f.png", ...])
-                elif isinstance(images, list) and any(images):
-                    # None이 아닌 첫 번째 URL 사용
-                    for u in images:
-                        if u:
-                            thumb_url = u
-                            break
-
-            # 절대 URL로 변환해서 프론트에 넘겨준다.
-            # thumb_url이 빈 문자열이면 빈 문자열 반환, 아니면 절대 URL로 변환
-            if thumb_url:
-                # 이미 절대 URL인 경우 (http:// 또는 https://로 시작)
-                if thumb_url.startswith("http://") or thumb_url.startswith("https://"):
-                    # 127.0.0.1이나 localhost를 포함하는 경우 현재 호스트로 교체
-                    if "127.0.0.1" in thumb_url or "localhost" in thumb_url:
-                        scheme = 'https' if request.is_secure() else 'http'
-                        host = request.get_host()
-                        # URL에서 경로 부분만 추출
-                        try:
-                            from urllib.parse import urlparse
-                            parsed = urlparse(thumb_url)
-                            thumbnail = f"{scheme}://{host}{parsed.path}"
-                            if parsed.query:
-                                thumbnail += f"?{parsed.query}"
-                        except Exception:
-                            # 파싱 실패 시 원본 사용
-                            thumbnail = thumb_url
-                    else:
-                        # 이미 올바른 호스트를 사용하는 경우 그대로 사용
-                        thumbnail = thumb_url
-                else:
-                    # 상대 경로인 경우 절대 URL로 변환
-                    scheme = 'https' if request.is_secure() else 'http'
-                    host = request.get_host()
-                    thumbnail = f"{scheme}://{host}{thumb_url}"
-            else:
-                thumbnail = ""
-            
-            out.append({"id": p.id, 
-                        "name": p.name,
-                        "slug": p.slug,
-                        "updated_at": p.updated_at.isoformat(),
-                    "thumbnail": thumbnail,
-                        })
-        
+        for row in rows:
+            row["updated_at"] = row["updated_at"].isoformat()
+            # 썸네일은 절대 URL로 변환해서 프론트에 넘겨준다.
+            row["thumbnail"] = _absolute_media_url(request, row["thumbnail"])
+            out.append(row)
+
         # safe=False: 리스트 형태도 그대로 반환 가능
-        return JsonResponse(out, safe=False)
+        resp = JsonResponse(out, safe=False)
+        if next_cursor:
+            resp["X-Next-Cursor"] = next_cursor
+        return resp
 
     if request.method == "POST":
         # 새 프로젝트 생성
@@ -210,7 +383,13 @@ def projects(request):
             payload = json.loads(request.body.decode("utf-8") or "{}")
         except Exception:
             payload = {}
-        data = _normalize_data(payload)
+        try:
+            data = _normalize_data(payload)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        error = _length_error(data)
+        if error is not None:
+            return error
         
         # meta.projectName이 있으면 그걸 name으로 사용, 없으면 '새 프로젝트'
         name = (data.get("meta") or {}).get("projectName") or "새 프로젝트"
@@ -219,7 +398,7 @@ def projects(request):
         obj = Project.objects.create(name=name, data=data)
         
         # 프론트에서 쓰기 편하도록 data + id/slug를 합친 형태로 반환
-        return JsonResponse(obj.to_response(), status=201)
+        return _project_json_response(request, obj, status=201)
 
     # 허용되지 않은 메서드일 경우
     return HttpResponseNotAllowed(["GET", "POST"])
@@ -235,17 +414,20 @@ def project_id(request, pid: int):
 
     - GET    : 단일 프로젝트 조회
     - PUT    : 전체 업데이트 (payload와 기존 data를 병합 후 normalize)
+               If-Match(ETag) 또는 ?base=<revision>을 주면 현재 리비전과 같을 때만 저장
     - PATCH  : 부분 업데이트 (PUT와 동일 처리)
-    - DELETE : 프로젝트 삭제 + 관련 floor_images 폴더 삭제
+    - DELETE : 프로젝트 삭제 + 참조가 없어진 이미지 정리 + 관련 floor_images 폴더 삭제
     """
     try:
-        obj = Project.objects.get(pk=pid)
+        # data(JSON)는 실제로 필요할 때만 읽는다.
+        # (GET에서 캐시 hit이면 data를 아예 읽지 않음)
+        obj = Project.objects.defer("data").get(pk=pid)
     except Project.DoesNotExist:
         return JsonResponse({"error": "not found"}, status=404)
 
     if request.method == "GET":
         # 단일 프로젝트 JSON 반환
-        return JsonResponse(obj.to_response())
+        return _project_json_response(request, obj)
 
     if request.method in ["PUT", "PATCH"]:
         # 업데이트 요청
@@ -253,36 +435,79 @@ def project_id(request, pid: int):
             payload = json.loads(request.body.decode("utf-8") or "{}")
         except Exception:
             payload = {}
-        
-        # 기존 data 복사 후, 들어온 payload로 얕은 병합
-        merged = {}
-        if isinstance(obj.data, dict):
-            merged.update(obj.data)
-        if isinstance(payload, dict):
-            merged.update(payload)
-            
-        # 병합 결과를 normalize
-        data = _normalize_data(merged)
-        obj.data = data
-        
-        # 이름 변경 여부 체크 (meta.projectName 기준)
-        new_name = (data.get("meta") or {}).get("projectName") or obj.name
-        
-        # 이름이 바뀌었으면 name 갱신 + slug를 비워서 save()에서 재생성되게 처리
-        if new_name != obj.name:
-                obj.name = new_name
-                obj.slug = None
-                
-        # data, name, slug, updated_at 필드만 업데이트
-        obj.save(update_fields=["data", "name", "slug", "updated_at"])
-        
-        return JsonResponse(obj.to_response())
+
+        # 낙관적 동시성 검사 (선택)
+        #  - If-Match: <ETag>  → 다르면 412
+        #  - ?base=<revision> → 다르면 409 (delta/ 와 같은 규칙)
+        base = request.GET.get("base")
+        if base is not None:
+            try:
+                base = int(base)
+            except ValueError:
+                return JsonResponse({"error": "invalid base"}, status=400)
+        if_match = request.META.get("HTTP_IF_MATCH")
+
+        with transaction.atomic():
+            # 읽고 병합해서 쓰는 사이에 다른 저장(이미지 업로드 등)이 끼어들지 않도록 행 잠금
+            obj = Project.objects.select_for_update().filter(pk=pid).first()
+            if obj is None:
+                return JsonResponse({"error": "not found"}, status=404)
+            if if_match and if_match.strip() != "*" and obj.etag not in (
+                    t.strip() for t in if_match.split(",")):
+                resp = JsonResponse({"error": "precondition failed", "revision": obj.revision},
+                                    status=412)
+                resp["ETag"] = obj.etag
+                return resp
+            if base is not None and obj.revision != base:
+                return JsonResponse(
+                    {"error": "stale base revision", "revision": obj.revision},
+                    status=409,
+                )
+
+            # 기존 data 복사 후, 들어온 payload로 얕은 병합
+            merged = {}
+            if isinstance(obj.data, dict):
+                merged.update(obj.data)
+            if isinstance(payload, dict):
+                merged.update(payload)
+
+            # 병합 결과를 normalize
+            # merged는 이 요청에서 새로 만든 dict → 복사 없이 제자리에서 정리
+            try:
+                data = _normalize_data(merged, copy=False)
+            except ValueError as e:
+                return JsonResponse({"error": str(e)}, status=400)
+            error = _length_error(data)
+            if error is not None:
+                return error
+            obj.data = data
+
+            # 이름 변경 여부 체크 (meta.projectName 기준)
+            # 이름이 바뀌었으면 name 갱신 + slug를 비워서 save()에서 재생성되게 처리
+            _sync_name_from_meta(obj, data)
+
+            # data, name, slug, updated_at 필드만 업데이트
+            obj.save(update_fields=["data", "name", "slug", "updated_at"])
+
+        return _project_json_response(request, obj)
 
     if request.method == "DELETE":
-        # 프로젝트 삭제
+        # 이 프로젝트가 쓰던 이미지(blob) 목록은 지우기 전에 기록
+        blob_ids = list(obj.blob_refs.values_list("blob_id", flat=True))
+
+        # 프로젝트 삭제 (MediaBlobRef도 CASCADE로 함께 삭제)
         obj.delete()
+        project_cache.invalidate(pid)
+
+        # 다른 프로젝트/남은 리비전이 더 이상 참조하지 않는 이미지만 백그라운드에서 삭제
+        # (놓친 것은 manage.py gc_media_blobs가 정리한다)
+        schedule_blob_gc(pid, blob_ids)
 
-        # 프로젝트 폴더 제거: media/floor_images/<project_id>
+        # 길찾기 전처리 파일 제거: media/graph_cache/<project_id>
+        remove_sidecars(pid)
+
+        # 예전 방식으로 올라간 이미지 폴더 제거: media/floor_images/<project_id>
+        # (blob 저장소와 분리되어 있어서 다른 프로젝트 파일을 지울 일이 없다)
         proj_dir = settings.MEDIA_ROOT / "floor_images" / str(pid)
         try:
             if proj_dir.exists() and proj_dir.is_dir():
@@ -296,6 +521,92 @@ def project_id(request, pid: int):
     return HttpResponseNotAllowed(["GET", "PUT", "PATCH", "DELETE"])
 
 
+@csrf_exempt
+def project_delta(request, pid: int):
+    """
+    /api/projects/<pid>/delta/ 엔드포인트 (PATCH 전용).
+
+    전체 문서를 다시 보내는 PUT 대신, 바뀐 부분만 보내는 부분 저장.
+    body 형식은 maps/delta.py 참고:
+      - {"base": <revision>, "ops": [RFC 6902 ops...]}
+      - {"base": <revision>, "nodes": {...}, "links": {...}, "polygons": {...},
+         "set": {...}, "editor": {...}}
+
+    - base가 현재 revision과 다르면 409 (그 사이 다른 저장이 있었음)
+    - 적용할 수 없는 patch면 400
+    - 성공하면 {"ok": true, "id", "revision", "updated_at"} 만 돌려준다.
+      (전체 문서를 다시 내려보내지 않음)
+    """
+    if request.method != "PATCH":
+        return HttpResponseNotAllowed(["PATCH"])
+
+    try:
+        body = json.loads(request.body.decode("utf-8") or "{}")
+    except Exception:
+        return JsonResponse({"error": "invalid json"}, status=400)
+    if not isinstance(body, dict):
+        return JsonResponse({"error": "invalid body"}, status=400)
+
+    base = body.get("base")
+    if not isinstance(base, int) or isinstance(base, bool):
+        return JsonResponse({"error": "base revision is required"}, status=400)
+
+    with transaction.atomic():
+        # 같은 프로젝트에 대한 동시 저장은 행 잠금으로 직렬화
+        try:
+            obj = Project.objects.select_for_update().get(pk=pid)
+        except Project.DoesNotExist:
+            return JsonResponse({"error": "not found"}, status=404)
+
+        if obj.revision != base:
+            return JsonResponse(
+                {"error": "stale base revision", "revision": obj.revision},
+                status=409,
+            )
+
+        # obj.data는 이 요청에서 방금 읽은 dict이므로 복사 없이 제자리에서 수정
+        data = obj.data if isinstance(obj.data, dict) else {}
+        changes = None
+        try:
+            if "ops" in body:
+                data = apply_json_patch(data, body["ops"])
+                if not isinstance(data, dict):
+                    raise PatchError("document root must stay an object")
+            else:
+                before = outside_graph(data)
+                changes = apply_graph_diff(data, body)
+        except PatchError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        try:
+            data = _normalize_data(data, copy=False)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        if changes is None:
+            # graph diff는 delta.py에서 필드별로 검사했고, JSON Patch는 무엇이든 바꿀 수 있다.
+            error = _length_error(data)
+            if error is not None:
+                return error
+        elif changes.ops is not None:
+            # 리비전 기록용 patch = 그래프 변경 ops + set / editor / normalize가 바꾼 나머지
+            changes.ops.extend(diff_json(before, outside_graph(data)))
+        obj.data = data
+        _sync_name_from_meta(obj, data)
+        # 무결성 분석 / 테이블 행 / 리비전 기록 모두 바뀐 부분만
+        # (JSON Patch는 범위를 모르므로 전체)
+        obj.save(update_fields=["data", "name", "slug", "updated_at"], changes=changes)
+        if changes is not None:
+            # 맵핑 포인트 경로 테이블을 바뀐 노드에 걸린 쌍만 다시 계산할 수 있도록
+            note_graph_changes(obj.pk, obj.revision, changes.affected)
+
+    return JsonResponse({
+        "ok": True,
+        "id": obj.id,
+        "revision": obj.revision,
+        "updated_at": obj.updated_at.isoformat(),
+    })
+
+
 # ----- 층 이미지 업로드 -----
 
 @csrf_exempt
@@ -306,33 +617,69 @@ def upload_floor_image(request):
     - POST /api/upload-floor-image/
     - form-data:
         - file   : 업로드할 이미지 파일
-        - project: 프로젝트 식별자 (id 또는 slug 또는 name)
-        - floor  : 층 번호 (정수, 0 기반/1 기반은 프론트 규칙에 맞게)
-    - 저장 경로:
-        MEDIA_ROOT / "floor_images" / <project_id> / "<floor>_<원본파일명>"
+        - project: 프로젝트 식별자 (id 또는 slug 또는 name). 주었는데 없으면 404
+        - floor  : 층 번호 (0 이상 정수, 0 기반/1 기반은 프론트 규칙에 맞게). 아니면 400
+        - base   : (선택) 리비전 번호. 주면 현재 리비전이 같을 때만 반영하고 아니면 409
+    - 404 / 409 / 400은 파일을 저장소에 쓰기 전에 돌려준다.
+    - 저장 경로 (내용 주소 저장소, maps/blobs.py):
+        MEDIA_ROOT / "blobs" / <sha256 앞 2자리> / "<sha256>.<확장자>"
+      같은 내용의 파일은 프로젝트/층이 달라도 한 번만 저장된다.
     - 저장 후:
         - Project.data.images[floor] 에 상대 URL(/media/...)을 반영
-        - 응답으로 절대 URL을 돌려준다.
+          (data 전체를 다시 쓰지 않고 images만 갱신, maps/images.py)
+        - 응답으로 절대 URL과 새 revision을 돌려준다.
     """    
     if request.method != "POST":
         return JsonResponse({"error": "POST only"}, status=405)
 
     file = request.FILES.get("file")
     project_raw = request.POST.get("project") or ""
-    floor_raw = request.POST.get("floor") or "0"
     if not file:
         return JsonResponse({"error": "no file"}, status=400)
 
-    # floor 정수화 (서버 파일명 용도 — 1/0 기반 어떤 걸 쓰든 상관없음)
+    # floor 정수화 (data.images 인덱스 — 1/0 기반 어떤 걸 쓰든 상관없음)
+    floor = _upload_floor(request.POST.get("floor"))
+    if floor is None:
+        return JsonResponse({"error": "floor must be a non-negative integer"}, status=400)
+
+    base = None
+    if request.POST.get("base"):
+        try:
+            base = int(request.POST["base"])
+        except ValueError:
+            return JsonResponse({"error": "invalid base"}, status=400)
+
+    # 프로젝트 / base 검사는 파일을 저장하기 전에 (409/404로 끝날 업로드가 blob을 남기지 않게)
+    obj = _find_upload_project(project_raw)
+    if project_raw and obj is None:
+        return JsonResponse({"error": "project not found"}, status=404)
+    if obj is not None and base is not None and obj.revision != base:
+        return JsonResponse({"error": "stale base revision", "revision": obj.revision},
+                            status=409)
+
+    # 내용 해시(SHA-256) 기반 저장소에 저장 (같은 파일은 한 번만 저장됨)
+    # 저장 경로: MEDIA_ROOT / blobs / <sha 앞 2자리> / <sha>.<확장자>
+    blob = store_upload(file)
+    return _attach_floor_image(request, obj.id if obj else None, floor, blob_url(blob), base)
+
+
+def _upload_floor(raw):
+    """업로드의 floor 값 → 0 이상 정수 (없으면 0, 정수가 아니거나 음수면 None)"""
+    if raw is None or raw == "":
+        return 0
+    if isinstance(raw, bool) or (isinstance(raw, float) and not raw.is_integer()):
+        return None
     try:
-        floor = int(floor_raw)
-    except Exception:
-        floor = 0
+        floor = int(raw)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    return floor if floor >= 0 else None
 
-    # ----- 프로젝트 찾기 -----
-    # 우선순위: id -> slug -> name
+
+def _find_upload_project(project_raw: str):
+    """업로드 대상 프로젝트. 우선순위: id -> slug -> name (없으면 None)"""
     obj = None
-    
+
     # 숫자만으로 구성되어 있으면 pk로 간주
     if project_raw.isdigit():
         obj = Project.objects.filter(pk=int(project_raw)).first()
@@ -342,24 +689,14 @@ def upload_floor_image(request):
     if obj is None and project_raw:
         # name 기준으로 최신 수정 프로젝트 한 개 선택
         obj = Project.objects.filter(name=project_raw).order_by("-updated_at").first()
+    return obj
 
-    # 프로젝트 id를 폴더명으로 사용 (없으면 misc)
-    proj_id = obj.id if obj else "misc"
-
-    # 저장 디렉터리: MEDIA_ROOT / floor_images / <project_id>
-    proj_dir = settings.MEDIA_ROOT / "floor_images" / str(proj_id)
-    proj_dir.mkdir(parents=True, exist_ok=True)
 
-    # 저장 파일명: <floor>_<원본파일명>
-    safe_name = file.name.replace("/", "_").replace("\\", "_")
-    save_name = f"{floor}_{safe_name}"
-
-    fs = FileSystemStorage(location=proj_dir)
-    saved_name = fs.save(save_name, file)
-
-    # URL 구성: /media/floor_images/<project_id>/<saved_name>
-    # MEDIA_URL이 이미 /media/로 끝나므로 바로 floor_images를 붙임
-    rel_url = f"{settings.MEDIA_URL}floor_images/{proj_id}/{saved_name}"
+def _attach_floor_image(request, pid, floor: int, rel_url: str, base=None):
+    """
+    저장소에 들어간 이미지(rel_url)를 프로젝트 pid의 floor층에 반영하고 업로드 응답을 만든다.
+    (upload_floor_image / 청크 업로드 finalize 공용)
+    """
     # 상대 경로를 절대 URL로 변환
     # request.get_host()를 사용하여 현재 요청의 호스트를 가져옴
     # 사설망에서 다른 컴퓨터가 접근할 때도 올바른 IP를 사용하도록 함
@@ -367,25 +704,317 @@ def upload_floor_image(request):
     host = request.get_host()
     abs_url = f"{scheme}://{host}{rel_url}"
 
-    
     # ----- 서버의 Project.data.images에 바로 반영 -----
-    # 서버에 바로 DB에 반영
-    if obj:
-        data = obj.data or {}
-        images = data.get("images") or []
-        
-        # floor 인덱스까지 리스트 길이를 확장
-        if floor >= len(images):
-            images.extend([None] * (floor + 1 - len(images)))
-            
-        # 해당 층의 이미지 URL을 저장 (상대/절대 중 하나로 통일해서 쓰면 좋음)
-        images[floor] = rel_url
-        data["images"] = images
-        obj.data = data
-        obj.save(update_fields=["data", "updated_at"])
+    # data 전체가 아니라 images 키만 갱신 (동시에 여러 층을 올려도 서로 덮어쓰지 않음)
+    revision = None
+    if pid:
+        revision, current = set_floor_image(pid, floor, rel_url, base=base)
+        if revision is None and current is not None:
+            return JsonResponse(
+                {"error": "stale base revision", "revision": current, "url": abs_url},
+                status=409,
+            )
+
+        # 타일 피라미드 + 미리보기는 백그라운드에서 생성
+        # (완료 전까지는 GET .../floors/<floor>/tiles/ 가 "pending"을 돌려준다)
+        schedule_floor_tiles(pid, rel_url)
 
     # 업로드 완료 응답 (프론트는 abs_url을 바로 <img src>로 사용할 수 있다)
-    return JsonResponse({"ok": True, "url": abs_url})
+    return JsonResponse({"ok": True, "url": abs_url, "revision": revision})
+
+
+@csrf_exempt
+def floor_image(request, pid: int, floor: int):
+    """
+    층 배경 이미지 지우기.
+
+    - DELETE /api/projects/<pid>/floors/<floor>/image/?base=<revision>
+    - 업로드와 같이 data.images[floor] 한 칸만 바꾼다. (set_floor_image, 다른 층과 겹치지 않음)
+    - base: (선택) 주면 현재 리비전이 같을 때만 지우고 아니면 409
+    - 응답: {"ok": true, "revision"}
+    """
+    if request.method != "DELETE":
+        return HttpResponseNotAllowed(["DELETE"])
+    base = request.GET.get("base")
+    if base is not None:
+        try:
+            base = int(base)
+        except ValueError:
+            return JsonResponse({"error": "invalid base"}, status=400)
+
+    revision, current = set_floor_image(pid, floor, None, base=base)
+    if revision is None:
+        if current is None:
+            return JsonResponse({"error": "not found"}, status=404)
+        return JsonResponse({"error": "stale base revision", "revision": current}, status=409)
+    return JsonResponse({"ok": True, "revision": revision})
+
+
+def _upload_error(e: UploadError):
+    return JsonResponse({"error": str(e), **e.extra}, status=e.status)
+
+
+@csrf_exempt
+def upload_sessions(request):
+    """
+    청크 업로드 세션 시작 (형식은 maps/uploads.py)
+
+    - POST /api/uploads/
+    - body(JSON): {"project", "floor", "filename", "size",
+                   "sha256"(권장), "chunk_size"(선택), "content_type", "base"(선택)}
+      project / floor / base 는 upload_floor_image 와 같은 뜻
+    - 201: {"upload_id", "chunk_size", "chunks", "missing", "exists", ...}
+      exists가 true면 같은 파일이 이미 서버에 있으므로 청크 없이 바로 finalize
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "POST only"}, status=405)
+    try:
+        body = json.loads(request.body or b"{}")
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "invalid JSON"}, status=400)
+    if not isinstance(body, dict):
+        return JsonResponse({"error": "JSON object required"}, status=400)
+
+    floor = _upload_floor(body.get("floor"))
+    if floor is None:
+        return JsonResponse({"error": "floor must be a non-negative integer"}, status=400)
+    base = body.get("base")
+    if base is not None and (not isinstance(base, int) or isinstance(base, bool)):
+        return JsonResponse({"error": "invalid base"}, status=400)
+
+    obj = _find_upload_project(str(body.get("project") or ""))
+    try:
+        meta = create_upload(
+            project_id=obj.id if obj else None,
+            floor=floor,
+            filename=body.get("filename") or "",
+            size=body.get("size"),
+            sha256=body.get("sha256") or None,
+            chunk_size=body.get("chunk_size"),
+            content_type=body.get("content_type") or "",
+            base=base,
+        )
+    except UploadError as e:
+        return _upload_error(e)
+    return JsonResponse(session_status(meta), status=201)
+
+
+@csrf_exempt
+def upload_session(request, upload_id):
+    """
+    GET    /api/uploads/<id>/  → 받은/빠진 청크 (끊긴 업로드를 이어 올릴 때)
+    DELETE /api/uploads/<id>/  → 세션 취소 (받은 청크 삭제)
+    """
+    meta = load_upload(upload_id)
+    if meta is None:
+        return JsonResponse({"error": "upload not found"}, status=404)
+    if request.method == "GET":
+        return JsonResponse(session_status(meta))
+    if request.method == "DELETE":
+        delete_upload(meta)
+        return JsonResponse({"ok": True})
+    return HttpResponseNotAllowed(["GET", "DELETE"])
+
+
+@csrf_exempt
+def upload_chunk(request, upload_id, n):
+    """
+    PUT /api/uploads/<id>/chunks/<n>/
+
+    - 본문: 청크 바이트 그대로 (application/octet-stream)
+      길이는 chunk_size (마지막 청크만 나머지 크기)
+    - X-Chunk-SHA256: (선택) 청크 SHA-256 → 다르면 422
+    - 순서 상관없이, 동시에 여러 청크를 보내도 된다. 같은 청크를 다시 보내면 덮어쓴다.
+    """
+    if request.method != "PUT":
+        return JsonResponse({"error": "PUT only"}, status=405)
+    meta = load_upload(upload_id)
+    if meta is None:
+        return JsonResponse({"error": "upload not found"}, status=404)
+    try:
+        length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        length = -1
+    try:
+        # request.body 대신 스트림에서 바로 읽어 파일에 쓴다. (청크를 메모리에 올리지 않음)
+        write_chunk(meta, n, request, length, request.headers.get("X-Chunk-SHA256"))
+    except UploadError as e:
+        return _upload_error(e)
+    return JsonResponse({"ok": True, "chunk": n})
+
+
+@csrf_exempt
+def upload_finalize(request, upload_id):
+    """
+    POST /api/uploads/<id>/finalize/
+
+    - 모든 청크가 왔으면 전체 SHA-256을 확인하고 blob 저장소로 옮긴 뒤 data.images[floor]에 반영
+    - 응답: upload_floor_image 와 같음 {"ok", "url", "revision"}
+    - 409: 빠진 청크 {"missing": [...]} 또는 리비전 충돌(base)
+      422: 전체 SHA-256 불일치 (청크를 다시 보내야 함)
+    - 이미 끝난 세션에 다시 부르면 같은 응답을 돌려준다.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "POST only"}, status=405)
+    meta = load_upload(upload_id)
+    if meta is None:
+        return JsonResponse({"error": "upload not found"}, status=404)
+    if meta["result"] is not None:
+        return JsonResponse(meta["result"])
+    try:
+        blob = finalize_blob(meta)
+    except UploadError as e:
+        return _upload_error(e)
+
+    res = _attach_floor_image(request, meta["project"], meta["floor"], blob_url(blob), meta["base"])
+    if res.status_code == 200:
+        mark_done(meta, json.loads(res.content))
+    return res
+
+
+def _floor_image_url(pid: int, floor: int):
+    """층 이미지 URL. Floor 행에서 먼저 찾고, 없으면 data.images에서. 프로젝트가 없으면 None."""
+    url = Floor.objects.filter(project_id=pid, index=floor).values_list("image", flat=True).first()
+    if url:
+        return url
+    obj = Project.objects.filter(pk=pid).only("data").first()
+    if obj is None:
+        return None
+    images = (obj.data or {}).get("images") if isinstance(obj.data, dict) else None
+    if isinstance(images, list):
+        return (images[floor] if 0 <= floor < len(images) else None) or ""
+    if isinstance(images, dict):
+        return images.get(str(floor)) or ""
+    return ""
+
+
+def _floor_image_urls(pid: int):
+    """프로젝트의 현재 층 이미지 URL들. (Floor 행 + data.images) 프로젝트가 없으면 None."""
+    obj = Project.objects.filter(pk=pid).only("data").first()
+    if obj is None:
+        return None
+    urls = set(Floor.objects.filter(project_id=pid).exclude(image="")
+               .values_list("image", flat=True))
+    images = obj.data.get("images") if isinstance(obj.data, dict) else None
+    if isinstance(images, dict):
+        images = list(images.values())
+    if isinstance(images, list):
+        urls.update(u for u in images if isinstance(u, str) and u)
+    return urls
+
+
+def project_floors(request, pid: int):
+    """
+    /api/projects/<pid>/floors/ 엔드포인트. 층 목록 매니페스트 (층별 개수, 크기, ETag)
+
+    - 에디터/뷰어는 이걸 먼저 받고 보여 줄 층만 floors/<k>/ 로 받는다.
+    - 형식은 maps/floors.py 참고. ETag / 304 / 압축은 _revision_response()와 같다.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    obj = _load_for_query(pid)
+    if obj is None:
+        return JsonResponse({"error": "not found"}, status=404)
+
+    def body_for(coding):
+        body = project_cache.get_or_build(
+            obj, "floors.json",
+            lambda: json.dumps(floor_manifest(obj), ensure_ascii=False).encode("utf-8"),
+        )
+        if coding == "identity":
+            return body
+        return project_cache.get_or_build(obj, f"floors.json.{coding}",
+                                          lambda: compress(body, coding))
+
+    return _revision_response(request, obj, body_for, "application/json",
+                              etag=f'{obj.etag[:-1]}-m"')
+
+
+def project_floor(request, pid: int, floor: int):
+    """
+    /api/projects/<pid>/floors/<floor>/ 엔드포인트. 한 층의 노드/링크/폴리곤/이미지와
+    다른 층으로 이어지는 링크 stub
+
+    - ETag는 층 내용 해시 (다른 층만 바뀐 저장 뒤에는 If-None-Match로 304)
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    obj = _load_for_query(pid)
+    if obj is None:
+        return JsonResponse({"error": "not found"}, status=404)
+    split = get_floor_split(obj)
+    if floor not in split.bodies:
+        return JsonResponse({"error": "floor not found"}, status=404)
+
+    def body_for(coding):
+        body = split.bodies[floor]
+        if coding == "identity":
+            return body
+        return project_cache.get_or_build(obj, ("floor", floor, coding),
+                                          lambda: compress(body, coding))
+
+    return _revision_response(request, obj, body_for, "application/json",
+                              etag=split.etags[floor])
+
+
+def floor_tiles(request, pid: int, floor: int):
+    """
+    /api/projects/<pid>/floors/<floor>/tiles/ 엔드포인트. 층 이미지 타일 매니페스트.
+
+    - 응답(200):
+        {"status": "ready", "image", "version", "width", "height", "tile_size",
+         "max_zoom", "format", "preview",
+         "tiles": "/api/projects/<pid>/tiles/<version>/{z}/{x}_{y}.png"}
+    - 타일이 아직 만들어지는 중이면 202 {"status": "pending", "image"}
+      (생성 작업이 없으면 다시 예약한다)
+    - 타일로 만들 수 없는 이미지(SVG 등)면 200 {"status": "none", "image"}
+      → 클라이언트는 원본 image를 그대로 쓴다.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+
+    image = _floor_image_url(pid, floor)
+    if image is None:
+        return JsonResponse({"error": "not found"}, status=404)
+    if not image:
+        return JsonResponse({"error": "no image for this floor"}, status=404)
+
+    manifest = load_manifest(image)
+    if manifest is None:
+        if is_tileable(image):
+            schedule_floor_tiles(pid, image)
+            resp = JsonResponse({"status": "pending", "image": image}, status=202)
+        else:
+            resp = JsonResponse({"status": "none", "image": image})
+        resp["Cache-Control"] = "no-cache"
+        return resp
+
+    resp = JsonResponse({
+        "status": "ready",
+        "image": image,
+        **manifest,
+        "tiles": f"/api/projects/{pid}/tiles/{manifest['version']}/{{z}}/{{x}}_{{y}}.png",
+    })
+    # 층 이미지가 바뀌면 내용이 바뀌므로 매번 재검증
+    resp["Cache-Control"] = "no-cache"
+    return resp
+
+
+def floor_tile(request, pid: int, version: str, z: int, x: int, y: int):
+    """
+    /api/projects/<pid>/tiles/<version>/<z>/<x>_<y>.png 엔드포인트. 타일 이미지 한 장.
+
+    - version은 원본 내용의 해시라서 같은 URL의 내용은 절대 바뀌지 않는다.
+      → 1년짜리 immutable 캐시 헤더
+    - version이 이 프로젝트의 현재 층 이미지 매니페스트에 없으면 404
+      (blob 폴더는 프로젝트끼리 공유하므로 다른 프로젝트의 타일을 pid만 바꿔 받지 못하게)
+    """
+    if not TILE_VERSION_RE.match(version):
+        return HttpResponseNotFound()
+    urls = _floor_image_urls(pid)
+    if not urls or not any((load_manifest(u) or {}).get("version") == version for u in urls):
+        return HttpResponseNotFound()
+    return serve_file(request, tile_path(pid, version, z, x, y), "image/png", immutable=True)
 
 
 # ----- 보조 조회 API -----
@@ -397,10 +1026,10 @@ def project_by_name(request, name: str):
     - 같은 이름의 프로젝트가 여러 개 있을 수 있으므로
       updated_at 기준으로 가장 최근 것을 돌려준다.
     """    
-    obj = Project.objects.filter(name=name).order_by("-updated_at").first()
+    obj = Project.objects.defer("data").filter(name=name).order_by("-updated_at").first()
     if not obj:
         return JsonResponse({"error": "not found"}, status=404)
-    return JsonResponse(obj.to_response())
+    return _project_json_response(request, obj)
 
 def project_by_slug(request, slug: str):
     """
@@ -410,18 +1039,613 @@ def project_by_slug(request, slug: str):
     - GET 이외 메서드는 허용하지 않는다.
     """    
     try:
-        p = Project.objects.get(slug=slug)
+        p = Project.objects.defer("data").get(slug=slug)
     except Project.DoesNotExist:
         return HttpResponseNotFound()
     if request.method == "GET":
-        return JsonResponse(p.to_response())
+        return _project_json_response(request, p)
     return HttpResponseNotAllowed(["GET"])
 
+@csrf_exempt
+def export_jobs(request):
+    """
+    /api/exports/ 엔드포인트. 여러 프로젝트 일괄 export 작업 시작.
+
+    - POST body(JSON, 생략 가능): {"projects": [1, 2, 3], "workers": 4}
+        projects가 없으면 전체 프로젝트
+    - 응답(202): 작업 상태 {"id", "status", "total", "done", ...}
+      → GET /api/exports/<job_id>/ 로 진행률/결과 확인
+    - 이미 작업이 실행 중이면 409 {"error", "job": <실행 중인 job_id>} (한 번에 하나만)
+    - 결과 ZIP: MEDIA_URL/exports/<project_id>.zip
+    """
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    try:
+        body = json.loads(request.body.decode("utf-8") or "{}")
+    except Exception:
+        body = {}
+    if not isinstance(body, dict):
+        body = {}
+
+    qs = Project.objects.order_by("id")
+    if isinstance(body.get("projects"), list):
+        qs = qs.filter(pk__in=[p for p in body["projects"] if isinstance(p, int)])
+    pids = list(qs.values_list("id", flat=True))
+
+    workers = body.get("workers") if isinstance(body.get("workers"), int) else None
+    try:
+        job = start_export_job(pids, workers=workers)
+    except ExportJobRunning as e:
+        return JsonResponse({"error": str(e), "job": e.job_id}, status=409)
+    return JsonResponse(job, status=202)
+
+
+def export_job_status(request, job_id: str):
+    """
+    /api/exports/<job_id>/ 엔드포인트. 일괄 export 작업 진행 상황.
+
+    - 작업 상태는 작업을 시작한 서버 프로세스 메모리에만 있다.
+    """
+    job = get_export_job(job_id)
+    if job is None:
+        return JsonResponse({"error": "not found"}, status=404)
+    return JsonResponse(job)
+
+
+# ----- 질의 API 공용 헬퍼 -----
+
+def _finite_float(v):
+    """숫자(또는 숫자 문자열) → float. 변환할 수 없거나 NaN/inf면 None."""
+    if isinstance(v, bool):
+        return None
+    try:
+        f = float(v)
+    except (TypeError, ValueError):
+        return None
+    return f if f == f and f not in (float("inf"), float("-inf")) else None
+
+
+def _json_body(request):
+    """요청 body(JSON object) 파싱. 잘못되면 (None, 400 응답)."""
+    try:
+        body = json.loads(request.body.decode("utf-8") or "{}")
+    except Exception:
+        return None, JsonResponse({"error": "invalid json"}, status=400)
+    if not isinstance(body, dict):
+        return None, JsonResponse({"error": "body must be an object"}, status=400)
+    return body, None
+
+
+def _parse_points(raw, default_floor):
+    """
+    batch body의 points → [(floor, x, y), ...]
+
+    - [[x, y], [x, y, floor], {"x", "y", "floor"}, ...] 를 모두 받는다.
+    - 형식이 잘못된 좌표가 있으면 ValueError (몇 번째인지 포함)
+    """
+    if not isinstance(raw, list):
+        raise ValueError("points must be a list")
+    if len(raw) > MAX_BATCH_POINTS:
+        raise ValueError(f"too many points (max {MAX_BATCH_POINTS})")
+    out = []
+    for n, p in enumerate(raw):
+        if isinstance(p, dict):
+            x, y, f = p.get("x"), p.get("y"), p.get("floor", default_floor)
+        elif isinstance(p, (list, tuple)) and len(p) in (2, 3):
+            x, y = p[0], p[1]
+            f = p[2] if len(p) == 3 else default_floor
+        else:
+            raise ValueError(f"invalid point at {n}")
+        x, y, f = _finite_float(x), _finite_float(y), _finite_float(f)
+        if x is None or y is None or f is None:
+            raise ValueError(f"invalid point at {n}")
+        out.append((int(f), x, y))
+    return out
+
+
+def _load_for_query(pid: int):
+    """공간/그래프 질의용 프로젝트 로드 (data는 캐시 miss일 때만 읽힘)"""
+    return Project.objects.defer("data").filter(pk=pid).first()
+
+
+# ----- 길찾기 API -----
+
+def project_route(request, pid: int):
+    """
+    /api/projects/<pid>/route/?from=N_1&to=N_42 엔드포인트.
+
+    - 서버에서 최단 경로를 계산해서 경로만 돌려준다.
+      (클라이언트가 프로젝트 전체를 내려받아 Dijkstra를 돌릴 필요가 없음)
+    - 두 노드가 모두 맵핑 포인트(special_points)이고 현재 리비전의 경로 테이블이
+      만들어져 있으면 계산 없이 테이블에서 꺼낸다. (maps/poi_routes.py)
+    - 응답:
+        {
+          "from": "N_1", "to": "N_42",
+          "path": ["N_1", ..., "N_42"],
+          "floors": [0, ..., 2],        # path 각 노드의 층
+          "distance": 1234.5,           # 픽셀 거리
+          "distance_m": 409.4           # scale(m/pixel)이 있을 때만, 없으면 null
+        }
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+
+    src = (request.GET.get("from") or "").strip()
+    dst = (request.GET.get("to") or "").strip()
+    if not src or not dst:
+        return JsonResponse({"error": "from and to are required"}, status=400)
+
+    try:
+        obj = Project.objects.defer("data").get(pk=pid)
+    except Project.DoesNotExist:
+        return JsonResponse({"error": "not found"}, status=404)
+
+    # 맵핑 포인트 ↔ 맵핑 포인트는 미리 계산한 테이블에서 바로 꺼낸다. (그래프 컴파일 없음)
+    table = get_poi_table(obj)
+    hit = table.lookup(src, dst) if table is not None else None
+    if hit is not None:
+        dist, path, floors = hit
+        scale = table.scale
+        if not path:
+            return JsonResponse({"error": "no route"}, status=404)
+    else:
+        graph = get_compiled_graph(obj)
+        try:
+            # 전처리된 ALT 테이블이 있으면 같이 사용 (없으면 직선거리 A*)
+            found = find_route(graph, src, dst, get_landmarks(obj, graph))
+        except KeyError as e:
+            return JsonResponse({"error": f"unknown node: {e.args[0]}"}, status=404)
+        if found is None:
+            return JsonResponse({"error": "no route"}, status=404)
+        dist, path = found
+        floors = [graph.floors[graph.index[nid]] for nid in path]
+        scale = graph.scale
+
+    return JsonResponse({
+        "from": src,
+        "to": dst,
+        "path": path,
+        "floors": floors,
+        "distance": round(dist, 2),
+        "distance_m": round(dist * scale, 2) if scale else None,
+    })
+
+
+@csrf_exempt
+def project_matrix(request, pid: int):
+    """
+    /api/projects/<pid>/matrix/ 엔드포인트. 여러 노드 사이의 보행 거리 행렬.
+
+    - POST body: {"sources": ["N_1", "N_7", ...], "targets": ["N_3", ...]}
+        targets를 생략하면 sources와 같다. 출발지 수 × 도착지 수는 최대 MAX_MATRIX_CELLS.
+    - 그래프에 없는 노드 id가 있으면 400 {"error": "unknown nodes", "nodes": [...]}
+    - 출발지마다 일대다 Dijkstra를 한 번씩 돌린다. (목표를 모두 찾으면 조기 종료)
+    - 응답 (행 단위로 만들어지는 대로 스트리밍):
+        {
+          "sources": [...], "targets": [...],
+          "unit": "m",                 # data.scale이 없으면 "px"
+          "rows": [[0, 12.5, null, ...], ...]   # rows[i][j] = sources[i] → targets[j], 도달 불가면 null
+        }
+    """
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    body, error = _json_body(request)
+    if error is not None:
+        return error
+
+    sources = body.get("sources")
+    targets = body.get("targets", sources)
+    for name, ids in (("sources", sources), ("targets", targets)):
+        if not isinstance(ids, list) or not ids or not all(isinstance(i, str) for i in ids):
+            return JsonResponse({"error": f"{name} must be a non-empty list of node ids"}, status=400)
+    if len(sources) * len(targets) > MAX_MATRIX_CELLS:
+        return JsonResponse({"error": f"too many source × target pairs (max {MAX_MATRIX_CELLS})"},
+                            status=400)
+
+    obj = _load_for_query(pid)
+    if obj is None:
+        return JsonResponse({"error": "not found"}, status=404)
+
+    graph = get_compiled_graph(obj)
+    unknown = [nid for nid in dict.fromkeys(sources + targets) if nid not in graph.index]
+    if unknown:
+        return JsonResponse({"error": "unknown nodes", "nodes": unknown[:100]}, status=400)
+
+    src_idx = [graph.index[nid] for nid in sources]
+    dst_idx = [graph.index[nid] for nid in targets]
+    scale = graph.scale
+    factor = scale or 1.0
+
+    def _rows():
+        yield json.dumps({"sources": sources, "targets": targets,
+                          "unit": "m" if scale else "px"})[:-1].encode("utf-8")
+        yield b', "rows": ['
+        for n, s in enumerate(src_idx):
+            row = [round(d * factor, 2) if d != float("inf") else None
+                   for d in dijkstra_to_targets(graph, s, dst_idx)]
+            yield ((", " if n else "") + json.dumps(row)).encode("utf-8")
+        yield b"]}"
+
+    return StreamingHttpResponse(_rows(), content_type="application/json")
+
+
+def project_reachable(request, pid: int):
+    """
+    /api/projects/<pid>/reachable/?from=N_1,N_7&max_m=50&polygons=1 엔드포인트.
+
+    - from 노드들(쉼표로 구분하거나 from을 여러 번) 중 가장 가까운 곳에서
+      보행 거리 max_m 이내에 닿는 노드를 돌려준다. (대피 계획, "가장 가까운 출구" 등)
+    - data.scale(m/pixel)이 없으면 max_m을 픽셀 거리로 보고 unit은 "px"
+    - polygons=1 이면 도달 노드를 하나라도 포함하는 폴리곤(방/구역)도 같이 돌려준다.
+    - 같은 리비전의 같은 질의(출발 노드 집합, 거리, polygons)는 응답 bytes를 캐시해서 재사용한다.
+    - 그래프에 없는 출발 노드가 있으면 400 {"error": "unknown nodes", "nodes": [...]} (matrix/와 같음)
+    - 응답:
+        {
+          "from": ["N_1", "N_7"], "max_m": 50.0, "unit": "m",
+          "nodes": {"N_1": 0, "N_2": 3.5, ...},        # 노드 id → 거리 (가까운 순)
+          "polygons": [{"id": "pg_3", "name": "회의실", "floor": 0}, ...]   # polygons=1 일 때만
+        }
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+
+    seeds = []
+    for raw in request.GET.getlist("from"):
+        seeds.extend(nid.strip() for nid in raw.split(",") if nid.strip())
+    seeds = sorted(set(seeds))
+    if not seeds:
+        return JsonResponse({"error": "from is required"}, status=400)
+    if len(seeds) > MAX_REACH_SEEDS:
+        return JsonResponse({"error": f"too many from nodes (max {MAX_REACH_SEEDS})"}, status=400)
+    budget = _finite_float(request.GET.get("max_m"))
+    if budget is None or budget < 0:
+        return JsonResponse({"error": "max_m must be a non-negative number"}, status=400)
+    with_polygons = request.GET.get("polygons") in ("1", "true")
+
+    obj = _load_for_query(pid)
+    if obj is None:
+        return JsonResponse({"error": "not found"}, status=404)
+
+    kind = ("reachable", tuple(seeds), budget, with_polygons)
+    cached = project_cache.get(obj.pk, obj.updated_at, kind)
+    if cached is not None:
+        return HttpResponse(cached, content_type="application/json")
+
+    graph = get_compiled_graph(obj)
+    unknown = [nid for nid in seeds if nid not in graph.index]
+    if unknown:
+        return JsonResponse({"error": "unknown nodes", "nodes": unknown[:100]}, status=400)
+
+    scale = graph.scale
+    factor = scale or 1.0
+    reached = reachable_within(graph, [graph.index[nid] for nid in seeds], budget / factor)
+
+    out = {
+        "from": seeds,
+        "max_m": budget,
+        "unit": "m" if scale else "px",
+        "nodes": {graph.ids[i]: round(d * factor, 2) for i, d in reached.items()},
+    }
+    if with_polygons:
+        zones = get_zone_index(obj)
+        covered = {}
+        for i in reached:
+            fp = zones.floor(graph.floors[i])
+            if fp is None:
+                continue
+            for p in fp.locate(graph.xs[i], graph.ys[i]):
+                covered.setdefault(fp.ids[p], {"id": fp.ids[p], "name": fp.names[p],
+                                                "floor": graph.floors[i]})
+        out["polygons"] = list(covered.values())
+
+    payload = json.dumps(out, ensure_ascii=False).encode("utf-8")
+    project_cache.set(obj.pk, obj.updated_at, kind, payload)
+    return HttpResponse(payload, content_type="application/json")
+
+
+def project_integrity(request, pid: int):
+    """
+    /api/projects/<pid>/integrity/ 엔드포인트.
+
+    - 현재 리비전 그래프의 무결성 보고서 (maps/integrity.py)
+        {
+          "revision": 12, "ok": false,
+          "counts": {"nodes", "links", "components", "isolated_nodes",
+                     "orphan_links", "asymmetric_links", "unreachable_pois"},
+          "floors": {"0": {"nodes": 120, "components": 2}, ...},
+          "components": [{"size", "main", "floors", "example"}, ...],   # 큰 것부터
+          "orphan_links": [["N_1", "N_99"], ...],
+          "asymmetric_links": [{"a", "b", "ab", "ba"}, ...],
+          "unreachable_pois": [{"id", "special_id", "floor"}, ...]
+        }
+    - 분석 결과는 저장할 때 만들어 둔 것을 쓰고, 없으면(다른 프로세스에서 저장 등) 여기서 만든다.
+    - ETag / 304 / 압축은 _revision_response() 참고
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+
+    obj = _load_for_query(pid)
+    if obj is None:
+        return JsonResponse({"error": "not found"}, status=404)
+
+    def body_for(coding):
+        body = project_cache.get_or_build(obj, "integrity.json", lambda: json.dumps(
+            project_cache.get_or_build(
+                obj,
+                "integrity",
+                lambda: GraphIntegrity.build(
+                    obj.data if isinstance(obj.data, dict) else {}, obj.revision
+                ),
+            ).report(),
+            ensure_ascii=False,
+        ).encode("utf-8"))
+        if coding == "identity":
+            return body
+        return project_cache.get_or_build(obj, f"integrity.json.{coding}",
+                                          lambda: compress(body, coding))
+
+    return _revision_response(request, obj, body_for, "application/json",
+                              etag=f'{obj.etag[:-1]}-i"')
+
+
 def export_txt(request, pid: int):
     """
-    (미구현) node.txt 등 텍스트 포맷으로 내보내기 기능용 엔드포인트.
+    /api/projects/<pid>/export/ 엔드포인트.
+
+    - node.txt, link.txt, arrow.txt, polygon.txt, core.txt 를 담은 ZIP을 내려준다.
+    - ZIP은 미리 만들어 두지 않고 StreamingHttpResponse로 만들어지는 대로 전송한다.
+      (파일 형식은 maps/export.py 참고)
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    try:
+        obj = Project.objects.get(pk=pid)
+    except Project.DoesNotExist:
+        return JsonResponse({"error": "not found"}, status=404)
+
+    data = obj.data if isinstance(obj.data, dict) else {}
+    resp = StreamingHttpResponse(export_project_to_txt(data), content_type="application/zip")
+    resp["Content-Disposition"] = f'attachment; filename="{obj.slug or obj.pk}_txt.zip"'
+    return resp
+
+
+def project_graph_bin(request, pid: int):
+    """
+    /api/projects/<pid>/graph.bin 엔드포인트. 모바일/임베디드용 바이너리 그래프.
+
+    - 형식은 maps/graphbin.py 참고 (mmap 후 그대로 쓸 수 있는 타입 배열 섹션들)
+    - 리비전별로 한 번만 만들어서 캐시하고, ETag/304와 압축은 프로젝트 JSON과 같다.
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    obj = _load_for_query(pid)
+    if obj is None:
+        return JsonResponse({"error": "not found"}, status=404)
+
+    resp = _revision_response(request, obj, lambda coding: get_graph_bin(obj, coding),
+                              GRAPH_BIN_TYPE, etag=graph_bin_etag(obj))
+    if resp.status_code == 200:
+        resp["Content-Disposition"] = f'attachment; filename="{obj.slug or obj.pk}.graph.bin"'
+    return resp
+
+
+# ----- 리비전 기록 API -----
+
+def project_revisions(request, pid: int):
+    """
+    /api/projects/<pid>/revisions/ 엔드포인트. 복원할 수 있는 리비전 목록 (최신순)
+
+        {"current": 42, "revisions": [{"revision": 42, "kind": "delta", "size": 310,
+                                       "created_at": "..."}, ...]}
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    obj = _load_for_query(pid)
+    if obj is None:
+        return JsonResponse({"error": "not found"}, status=404)
+    return JsonResponse({"current": obj.revision, "revisions": list_revisions(obj)})
+
+
+def project_revision(request, pid: int, number: int):
+    """
+    /api/projects/<pid>/revisions/<n>/ 엔드포인트. 리비전 n 시점의 프로젝트 JSON
+
+    - 응답 모양은 GET /api/projects/<pid>/ 와 같고 revision만 n이다.
+      (되돌리려면 이 응답을 그대로 PUT 하면 된다)
+    - 지난 리비전 내용은 바뀌지 않으므로 ETag는 리비전 번호로 만들고 오래 캐시해도 된다.
+    - 보관 기간이 지났거나 기록이 없으면 404
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    obj = _load_for_query(pid)
+    if obj is None:
+        return JsonResponse({"error": "not found"}, status=404)
+    if number == obj.revision:
+        return _project_json_response(request, obj)
+    if number > obj.revision:
+        return JsonResponse({"error": "revision not found"}, status=404)
+
+    etag = f'"{obj.pk}-r{number}"'
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        not_modified["ETag"] = etag
+        return not_modified
+
+    body = project_cache.get(obj.pk, obj.updated_at, ("revision", number))
+    if body is None:
+        data = load_revision(obj, number)
+        if data is None:
+            return JsonResponse({"error": "revision not found"}, status=404)
+        data["id"] = obj.pk
+        data["slug"] = obj.slug
+        data["revision"] = number
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        project_cache.set(obj.pk, obj.updated_at, ("revision", number), body)
+
+    resp = HttpResponse(body, content_type="application/json")
+    resp["ETag"] = etag
+    resp["Cache-Control"] = "private, max-age=31536000, immutable"
+    return resp
+
+
+# ----- 공간 질의 API (가장 가까운 노드/링크) -----
+
+def project_nearest(request, pid: int):
+    """
+    /api/projects/<pid>/nearest/?floor=0&x=120&y=340&k=3 엔드포인트.
+
+    - floor 층에서 (x, y)에 가장 가까운 노드 k개(기본 1, 최대 50)와
+      가장 가까운 링크(같은 층 링크만) 위의 점을 돌려준다.
+    - 응답:
+        {
+          "floor": 0, "x": 120, "y": 340,
+          "nodes": [{"id": "N_3", "x": 118, "y": 338, "distance": 2.83}, ...],
+          "edge":  {"a": "N_3", "b": "N_4", "x": 120, "y": 338, "t": 0.12, "distance": 2.0}
+        }
+      해당 층에 노드/링크가 없으면 nodes=[] / edge=null
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+
+    x = _finite_float(request.GET.get("x"))
+    y = _finite_float(request.GET.get("y"))
+    floor = _finite_float(request.GET.get("floor", 0))
+    if x is None or y is None or floor is None:
+        return JsonResponse({"error": "floor, x and y must be numbers"}, status=400)
+    try:
+        k = int(request.GET.get("k") or 1)
+    except ValueError:
+        return JsonResponse({"error": "k must be an integer"}, status=400)
+    k = max(1, min(k, MAX_NEAREST_K))
+
+    obj = _load_for_query(pid)
+    if obj is None:
+        return JsonResponse({"error": "not found"}, status=404)
+
+    index = get_spatial_index(obj)
+    return JsonResponse(snap_point(index, int(floor), x, y, k))
+
+
+@csrf_exempt
+def project_nearest_batch(request, pid: int):
+    """
+    /api/projects/<pid>/nearest/batch/ 엔드포인트. (궤적 map-matching 용)
+
+    - POST body:
+        {"floor": 0, "k": 1, "points": [[x, y], [x, y, floor], {"x":..,"y":..,"floor":..}, ...]}
+        floor는 좌표별로 줄 수도 있고, 없으면 body의 floor(기본 0)를 쓴다.
+        한 번에 최대 MAX_BATCH_POINTS개.
+    - 응답: {"results": [project_nearest 응답과 같은 모양, ...]}  (points 순서 그대로)
+    """
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    body, error = _json_body(request)
+    if error is not None:
+        return error
+
+    default_floor = _finite_float(body.get("floor", 0))
+    if default_floor is None:
+        return JsonResponse({"error": "floor must be a number"}, status=400)
+    k = body.get("k", 1)
+    if not isinstance(k, int) or isinstance(k, bool):
+        return JsonResponse({"error": "k must be an integer"}, status=400)
+    k = max(1, min(k, MAX_NEAREST_K))
+    try:
+        points = _parse_points(body.get("points"), default_floor)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    obj = _load_for_query(pid)
+    if obj is None:
+        return JsonResponse({"error": "not found"}, status=404)
+
+    index = get_spatial_index(obj)
+    return JsonResponse({"results": [snap_point(index, f, x, y, k) for f, x, y in points]})
+
+
+# ----- 공간 질의 API (좌표가 속한 방/구역) -----
+
+def project_locate(request, pid: int):
+    """
+    /api/projects/<pid>/locate/?floor=0&x=120&y=340 엔드포인트.
 
-    - 현재는 501 Not Implemented 를 반환한다.
-    - 나중에 필요하면 여기서 실제 export 로직을 작성하면 된다.
+    - floor 층에서 (x, y)를 포함하는 폴리곤(방/구역)을 돌려준다.
+    - 겹친 폴리곤(건물 안의 방 등)이 있으면 모두, 면적이 작은(안쪽) 것부터.
+    - 응답:
+        {"floor": 0, "x": 120, "y": 340,
+         "polygons": [{"id": "pg_3", "name": "회의실", "area": 1520.0}, ...]}
     """
-    return JsonResponse({"detail": "Not Implemented"}, status=501)
\ No newline at end of file
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+
+    x = _finite_float(request.GET.get("x"))
+    y = _finite_float(request.GET.get("y"))
+    floor = _finite_float(request.GET.get("floor", 0))
+    if x is None or y is None or floor is None:
+        return JsonResponse({"error": "floor, x and y must be numbers"}, status=400)
+
+    obj = _load_for_query(pid)
+    if obj is None:
+        return JsonResponse({"error": "not found"}, status=404)
+
+    floor = int(floor)
+    fp = get_zone_index(obj).floor(floor)
+    hits = fp.locate(x, y) if fp is not None else []
+    return JsonResponse({
+        "floor": floor,
+        "x": x,
+        "y": y,
+        "polygons": [
+            {"id": fp.ids[p], "name": fp.names[p], "area": round(fp.areas[p], 2)}
+            for p in hits
+        ],
+    })
+
+
+@csrf_exempt
+def project_locate_batch(request, pid: int):
+    """
+    /api/projects/<pid>/locate/batch/ 엔드포인트. (여러 기기 위치 지오펜싱)
+
+    - POST body: {"floor": 0, "points": [[x, y], [x, y, floor], {"x", "y", "floor"}, ...]}
+      (points 형식은 nearest/batch/ 와 같다)
+    - 응답:
+        {
+          "results": [["pg_3", "pg_1"], [], ...],     # 좌표별 폴리곤 id (안쪽 것부터)
+          "polygons": {"pg_3": {"name": "회의실", "floor": 0}, ...}   # 결과에 나온 폴리곤 정보
+        }
+    """
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    body, error = _json_body(request)
+    if error is not None:
+        return error
+
+    default_floor = _finite_float(body.get("floor", 0))
+    if default_floor is None:
+        return JsonResponse({"error": "floor must be a number"}, status=400)
+    try:
+        points = _parse_points(body.get("points"), default_floor)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    obj = _load_for_query(pid)
+    if obj is None:
+        return JsonResponse({"error": "not found"}, status=404)
+
+    index = get_zone_index(obj)
+    results = []
+    seen = {}
+    for f, x, y in points:
+        fp = index.floor(f)
+        if fp is None:
+            results.append([])
+            continue
+        ids = []
+        for p in fp.locate(x, y):
+            pid_ = fp.ids[p]
+            ids.append(pid_)
+            if pid_ not in seen:
+                seen[pid_] = {"name": fp.names[p], "floor": f}
+        results.append(ids)
+    return JsonResponse({"results": results, "polygons": seen})
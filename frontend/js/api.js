@@ -33,13 +33,22 @@ export const API_ORIGIN = API_BASE.replace(/\/api$/, "");
 
 // -----------------------------------------------------------------------------
 // 프로젝트 리스트 조회
-// GET /api/projects/?q=검색어
+// GET /api/projects/?q=검색어&limit=50&cursor=...
 // q: 검색어 (프로젝트 이름 등 필터링에 사용)
+// limit: (선택) 한 페이지 개수. 없으면 전체 목록
+// cursor: (선택) 이전 응답의 nextCursor. updated_at에 '+'가 있을 수 있으므로 URL 인코딩해서 보낸다.
+// 반환: 프로젝트 배열. 다음 페이지가 있으면 배열의 nextCursor에 X-Next-Cursor 값이 들어 있다.
 // -----------------------------------------------------------------------------
-async function apiListProjects(q = "") {
-  const r = await fetch(`${API_BASE}/projects/?q=${encodeURIComponent(q)}` );
+async function apiListProjects(q = "", { limit = null, cursor = null } = {}) {
+  const params = new URLSearchParams({ q });
+  if (limit != null) params.set("limit", String(limit));
+  if (cursor) params.set("cursor", cursor);
+  const r = await fetch(`${API_BASE}/projects/?${params}`);
   if (!r.ok) throw new Error("list failed");
-  return r.json();
+  const list = await r.json();
+  // 다른 오리진이면 CORS_EXPOSE_HEADERS에 X-Next-Cursor가 있어야 읽을 수 있다.
+  list.nextCursor = r.headers.get("X-Next-Cursor") || null;
+  return list;
 }
 
 // -----------------------------------------------------------------------------
@@ -53,6 +62,40 @@ async function apiGetProject(id) {
   return r.json();
 }
 
+// -----------------------------------------------------------------------------
+// 층 단위 지연 로딩
+// GET /api/projects/:id/floors/      → 층 목록 매니페스트 (층별 개수, etag, url)
+// GET /api/projects/:id/floors/:k/   → k층 nodes / connections / polygons / image + 다른 층 링크 stubs
+// - 받은 층 문서는 최근 MAX_CACHED_FLOORS개만 메모리에 두고 (큰 건물에서도 메모리 일정)
+//   다시 요청할 때는 If-None-Match로 확인해서 304면 가지고 있던 것을 쓴다.
+// -----------------------------------------------------------------------------
+const MAX_CACHED_FLOORS = 4;
+const floorCache = new Map(); // "id:k" → { etag, doc }  (Map 삽입 순서 = LRU 순서)
+
+async function apiGetFloorManifest(id) {
+  const r = await fetch(`${API_BASE}/projects/${id}/floors/`);
+  if (!r.ok) throw new Error("floor manifest failed");
+  return r.json();
+}
+
+async function apiGetFloor(id, floor) {
+  const key = `${id}:${floor}`;
+  const hit = floorCache.get(key);
+  const headers = hit ? { "If-None-Match": hit.etag } : {};
+  const r = await fetch(`${API_BASE}/projects/${id}/floors/${floor}/`, { headers });
+  let entry = hit;
+  if (r.status !== 304) {
+    if (!r.ok) throw new Error("get floor failed");
+    entry = { etag: r.headers.get("ETag"), doc: await r.json() };
+  }
+  floorCache.delete(key);
+  floorCache.set(key, entry);
+  while (floorCache.size > MAX_CACHED_FLOORS) {
+    floorCache.delete(floorCache.keys().next().value);
+  }
+  return entry.doc;
+}
+
 // -----------------------------------------------------------------------------
 // 프로젝트 생성
 // POST /api/projects/
@@ -73,14 +116,44 @@ async function apiCreateProject(payload) {
 // 프로젝트 전체 업데이트
 // PUT /api/projects/:id/
 // payload: 전체 데이터를 덮어쓸 JSON
+// options.base: (선택) 이 revision일 때만 저장 → 아니면 409 (err.status로 구분)
+// options.etag: (선택) If-Match로 보낼 ETag → 다르면 412
 // -----------------------------------------------------------------------------
-async function apiUpdateProject(id, payload) {
-  const r = await fetch(`${API_BASE}/projects/${id}/`, {
+async function apiUpdateProject(id, payload, { base = null, etag = null } = {}) {
+  const headers = { "Content-Type": "application/json" };
+  if (etag) headers["If-Match"] = etag;
+  const query = base != null ? `?base=${encodeURIComponent(base)}` : "";
+  const r = await fetch(`${API_BASE}/projects/${id}/${query}`, {
     method: "PUT",
-    headers: { "Content-Type": "application/json" },
+    headers,
     body: JSON.stringify(payload),
   });
-  if (!r.ok) throw new Error("update failed");
+  if (!r.ok) {
+    const err = new Error("update failed");
+    err.status = r.status;
+    throw err;
+  }
+  return r.json();
+}
+
+// -----------------------------------------------------------------------------
+// 프로젝트 부분 저장 (delta)
+// PATCH /api/projects/:id/delta/
+// delta: { base: <revision>, nodes: {...}, links: {...}, polygons: {...}, set, editor }
+// - 서버 revision이 base와 다르면 409 → err.status 로 구분 가능
+// 응답: { ok, id, revision, updated_at }
+// -----------------------------------------------------------------------------
+async function apiPatchProjectDelta(id, delta) {
+  const r = await fetch(`${API_BASE}/projects/${id}/delta/`, {
+    method: "PATCH",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(delta),
+  });
+  if (!r.ok) {
+    const err = new Error("delta update failed");
+    err.status = r.status;
+    throw err;
+  }
   return r.json();
 }
 
@@ -101,9 +174,14 @@ async function apiDeleteProject(id) {
 // - file: 실제 이미지 파일 (File 객체)
 // - project: 프로젝트 식별자 (id, slug, name 등 서버 구현에 맞게)
 // - floor: 층 인덱스 (0 기반 또는 서버 약속에 맞게 사용)
-// 응답: { ok:true, url:"/media/..." } 형태 (url은 절대/상대 둘 다 가능)
+// 응답: { ok:true, url:"/media/...", revision } 형태 (url은 절대/상대 둘 다 가능)
+// - 서버는 data.images[floor]만 바꾸므로 여러 층을 동시에 올려도 서로 덮어쓰지 않는다.
+// - CHUNKED_UPLOAD_THRESHOLD보다 큰 파일은 청크 업로드로 보낸다. (응답 형식은 같음)
 // -----------------------------------------------------------------------------
 async function apiUploadFloorImage({ file, project, floor }) {
+  if (file.size > CHUNKED_UPLOAD_THRESHOLD) {
+    return uploadChunked({ file, project, floor });
+  }
   const fd = new FormData();
   fd.append("file", file);
   fd.append("project", project); // id(권장) 또는 slug/name
@@ -118,12 +196,128 @@ async function apiUploadFloorImage({ file, project, floor }) {
   return await res.json();
 }
 
+// -----------------------------------------------------------------------------
+// 층별 배경 이미지 지우기
+// DELETE /api/projects/:id/floors/:floor/image/
+// - 업로드와 같이 서버가 data.images[floor]만 비운다. (다른 층 이미지는 그대로)
+// 응답: { ok:true, revision }
+// -----------------------------------------------------------------------------
+async function apiClearFloorImage(id, floor) {
+  const r = await fetch(`${API_BASE}/projects/${id}/floors/${floor}/image/`, {
+    method: "DELETE",
+  });
+  if (!r.ok) throw new Error("clear image failed");
+  return r.json();
+}
+
+// -----------------------------------------------------------------------------
+// 청크 업로드 (큰 도면 이미지)
+// POST /api/uploads/ → PUT /api/uploads/:id/chunks/:n/ (동시에 여러 개) → POST .../finalize/
+// - 끊기면 같은 파일을 다시 올릴 때 localStorage에 남긴 upload_id로 빠진 청크만 보낸다.
+// - crypto.subtle이 있으면(HTTPS/localhost) 청크마다 SHA-256을 보내 서버가 확인하게 하고,
+//   CHUNKED_HASH_LIMIT 이하 파일은 전체 SHA-256도 보낸다. (이미 서버에 있는 파일이면 전송 생략)
+// -----------------------------------------------------------------------------
+const CHUNKED_UPLOAD_THRESHOLD = 16 * 1024 * 1024;
+const CHUNK_SIZE = 8 * 1024 * 1024;
+const CHUNK_WORKERS = 4;
+const CHUNK_RETRIES = 3;
+const CHUNKED_HASH_LIMIT = 256 * 1024 * 1024;
+
+async function sha256Hex(blob) {
+  if (!globalThis.crypto?.subtle) return null;
+  const digest = await crypto.subtle.digest("SHA-256", await blob.arrayBuffer());
+  return Array.from(new Uint8Array(digest), (b) => b.toString(16).padStart(2, "0")).join("");
+}
+
+async function uploadJson(url, options) {
+  const r = await fetch(url, options);
+  const body = await r.json().catch(() => ({}));
+  if (!r.ok) {
+    const err = new Error(body.error || "upload failed");
+    err.status = r.status;
+    err.body = body;
+    throw err;
+  }
+  return body;
+}
+
+async function resumeUpload(key) {
+  const id = localStorage.getItem(key);
+  if (!id) return null;
+  try {
+    return await uploadJson(`${API_BASE}/uploads/${id}/`);
+  } catch (e) {
+    localStorage.removeItem(key); // 만료/취소된 세션
+    return null;
+  }
+}
+
+async function uploadChunked({ file, project, floor }) {
+  const key = `upload:${project}:${floor}:${file.name}:${file.size}:${file.lastModified}`;
+  let session = await resumeUpload(key);
+  if (!session) {
+    const sha256 = file.size <= CHUNKED_HASH_LIMIT ? await sha256Hex(file) : null;
+    session = await uploadJson(`${API_BASE}/uploads/`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({
+        project: String(project),
+        floor,
+        filename: file.name,
+        size: file.size,
+        sha256,
+        chunk_size: CHUNK_SIZE,
+        content_type: file.type,
+      }),
+    });
+    localStorage.setItem(key, session.upload_id);
+  }
+  const base = `${API_BASE}/uploads/${session.upload_id}`;
+
+  // 빠진 청크를 CHUNK_WORKERS개씩 동시에 보낸다.
+  const queue = [...session.missing];
+  const sendChunk = async (n) => {
+    const part = file.slice(n * session.chunk_size, (n + 1) * session.chunk_size);
+    const headers = { "Content-Type": "application/octet-stream" };
+    const hash = await sha256Hex(part);
+    if (hash) headers["X-Chunk-SHA256"] = hash;
+    for (let attempt = 1; ; attempt++) {
+      try {
+        return await uploadJson(`${base}/chunks/${n}/`, { method: "PUT", headers, body: part });
+      } catch (e) {
+        // 4xx(422 제외)는 다시 보내도 같으므로 바로 실패
+        const retryable = !e.status || e.status >= 500 || e.status === 422;
+        if (!retryable || attempt >= CHUNK_RETRIES) throw e;
+        await new Promise((ok) => setTimeout(ok, 500 * attempt));
+      }
+    }
+  };
+  const worker = async () => {
+    while (queue.length) await sendChunk(queue.shift());
+  };
+  await Promise.all(Array.from({ length: CHUNK_WORKERS }, worker));
+
+  try {
+    const json = await uploadJson(`${base}/finalize/`, { method: "POST" });
+    localStorage.removeItem(key);
+    return json;
+  } catch (e) {
+    // 전체 SHA-256이 틀렸으면 서버가 청크를 모두 버렸으므로 세션을 새로 시작해야 한다.
+    if (e.status === 422) localStorage.removeItem(key);
+    throw e;
+  }
+}
+
 // 모듈 외부에서 사용할 함수/상수들 export
 export {
   apiListProjects,
   apiGetProject,
+  apiGetFloorManifest,
+  apiGetFloor,
   apiCreateProject,
   apiUpdateProject,
+  apiPatchProjectDelta,
   apiDeleteProject,
   apiUploadFloorImage,
+  apiClearFloorImage,
 };
\ No newline at end of file
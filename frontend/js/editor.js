@@ -40,8 +40,10 @@
 import {
   apiGetProject,
   apiUpdateProject,
+  apiPatchProjectDelta,
   apiCreateProject,
   apiUploadFloorImage,
+  apiClearFloorImage,
   API_ORIGIN,
 } from "./api.js";
 
@@ -122,6 +124,10 @@ const state = {
   // 백엔드 Project PK
   projectId: null,
 
+  // 서버에 마지막으로 저장된 리비전 / 그래프 (부분 저장(delta)용)
+  projectRevision: null,
+  savedGraphIndex: null,
+
   // 메타 정보
   projectName: "새 프로젝트",
   projectAuthor: "",
@@ -3397,6 +3403,8 @@ els.modalOk.addEventListener("click", async () => {
 
     // 4) 전역 상태/UI 반영
     state.projectId = saved.id; // DB id 보관 (이후 PUT에 사용)
+    state.projectRevision = saved.revision ?? null;
+    state.savedGraphIndex = graphIndexForDelta();
     state.projectName = projectName;
     state.projectAuthor = projectAuthor;
     state.floors = floors;
@@ -3419,11 +3427,14 @@ els.modalOk.addEventListener("click", async () => {
     els.projState.style.color = "#27ae60";
 
     // 서버에 이밎 생성(POST /api/projects/)
+    // - 업로드마다 서버가 data.images[floor]만 바꾸므로(동시 업로드 안전)
+    //   끝난 뒤 images 배열을 다시 PUT 할 필요가 없다.
+    // - 방금 만든 프로젝트라 다른 저장이 없으므로 가장 큰 revision이 최신
     const inputs = document.querySelectorAll(".floor-file");
-    await Promise.all(
+    const revisions = await Promise.all(
       [...inputs].map((inp) => {
         const file = inp.files?.[0];
-        if (!file) return Promise.resolve();
+        if (!file) return Promise.resolve(null);
         const floor = Number(inp.dataset.floor) || 0; // ← 0-기반 인덱스
         // api.js 쪽의 apiUploadFloorImage를 사용 (절대 URL 보장)
         return apiUploadFloorImage({
@@ -3431,20 +3442,16 @@ els.modalOk.addEventListener("click", async () => {
           floor,
           file,
         }).then((json) => {
-          if (!json?.url) return;
+          if (!json?.url) return null;
           const abs = normalizeImageUrl(json.url);
           const fileName = file?.name || state.imageLabels?.[floor] || "";
           setFloorImage(floor, abs, fileName, file);
+          return json.revision ?? null;
         });
       })
     );
-
-    // 3) 업로드한 URL 배열을 DB에 반영 (재오픈 시 그대로 뜨게)
-    try {
-      await apiUpdateProject(state.projectId, { images: state.images });
-    } catch (e) {
-      console.warn("images 업데이트 실패(무시 가능):", e);
-    }
+    const uploaded = revisions.filter((r) => r != null);
+    if (uploaded.length) state.projectRevision = Math.max(...uploaded);
 
     // 5) 에디터 초기화 (네가 쓰는 함수명으로 대체 가능)
     populateFloorSelect?.();
@@ -3485,12 +3492,16 @@ els.btnLoadBg.addEventListener("click", () => {
     setFloorImage(floor, tempUrl, file.name, file);
     els.status.textContent = "배경 이미지 업로드 중...";
     try {
+      const base = state.projectRevision;
       const json = await apiUploadFloorImage({
         project: state.projectId,
         floor,
         file,
       });
       if (!json?.url) throw new Error("no url");
+      // 이 업로드 말고 다른 저장이 없었을 때만 revision을 따라간다.
+      // (아니면 다음 부분 저장이 409 → 전체 저장으로 넘어가도록 그대로 둔다)
+      if (base != null && json.revision === base + 1) state.projectRevision = json.revision;
       const normalized = normalizeImageUrl(json.url);
       setFloorImage(floor, normalized, file.name, file);
       els.status.textContent = `${getFloorName(floor)} 이미지 업로드 완료`;
@@ -3514,7 +3525,11 @@ els.btnClearBg.addEventListener("click", async () => {
   els.status.textContent = `${getFloorName(floor)} 이미지가 제거되었습니다.`;
   if (state.projectId) {
     try {
-      await apiUpdateProject(state.projectId, { images: state.images });
+      // 업로드와 같이 서버가 이 층 이미지만 비운다. (images 배열 전체를 PUT 하지 않음)
+      const base = state.projectRevision;
+      const res = await apiClearFloorImage(state.projectId, floor);
+      // 이 요청 말고 다른 저장이 없었을 때만 revision을 따라간다. (업로드와 같은 규칙)
+      if (base != null && res.revision === base + 1) state.projectRevision = res.revision;
       els.status.textContent = `${getFloorName(
         floor
       )} 이미지 삭제가 서버에 반영되었습니다.`;
@@ -4098,7 +4113,16 @@ async function saveProjectToDirectory() {
   }, 2000);
 
 
-  const saved = await apiUpdateProject(state.projectId, json);
+  // 서버 저장도 마지막으로 받은 리비전 기준으로 (그 사이 다른 저장이 있으면 409 → 덮어쓰지 않음)
+  let saved;
+  try {
+    saved = await apiUpdateProject(state.projectId, json, { base: state.projectRevision });
+  } catch (e) {
+    if (handleSaveConflict(e)) return;
+    throw e;
+  }
+  state.projectRevision = saved.revision ?? null;
+  state.savedGraphIndex = graphIndexForDelta();
   state.modified = false;
 
   els.projState.textContent = "상태: 저장됨";
@@ -4150,11 +4174,12 @@ function serializeToDataFormat() {
   }
 
   // 2) connections: 링크 → 양방향 adjacency + 거리(픽셀 단위)
+  const nodeById = new Map(state.graph.nodes.map((n) => [n.id, n]));
   const conn = {};
   const ensure = (a) => (conn[a] ||= {});
   for (const l of state.graph.links) {
-    const A = state.graph.nodes.find((x) => x.id === l.a);
-    const B = state.graph.nodes.find((x) => x.id === l.b);
+    const A = nodeById.get(l.a);
+    const B = nodeById.get(l.b);
     if (!A || !B) continue;
     const d = Math.hypot(A.x - B.x, A.y - B.y); // 픽셀 거리
     const dist = +d.toFixed(2);
@@ -4243,7 +4268,7 @@ function serializeToDataFormat() {
     nodes: Array.isArray(p.nodes) ? [...p.nodes] : [],
     // 옵션: 디버깅용으로 좌표도 함께 남길 수 있음
     points: (Array.isArray(p.nodes) ? p.nodes : [])
-      .map((nid) => getNodeById(nid))
+      .map((nid) => nodeById.get(nid))
       .filter(Boolean)
       .map((n) => [Math.round(n.x), Math.round(n.y)]),
   }));
@@ -4251,6 +4276,67 @@ function serializeToDataFormat() {
   return out;
 }
 
+// 서버 저장용 직렬화 (전체 저장 PUT)
+// - 그래프는 중복 없는 정규 표현(노드/링크/폴리곤 목록)만 보낸다.
+//   nodes / connections(거리) / special_points / floors 버킷 / _editor.node_meta·links·shapes 는
+//   서버(maps/canonical.py)가 만들어서 저장하므로 serializeToDataFormat()의 절반 정도 크기.
+// - 내보내기(ZIP/JSON)는 파일 형식 그대로여야 하므로 serializeToDataFormat()을 쓴다.
+function serializeForServer() {
+  const floorNames = sanitizeFloorNames(state.floorNames, state.floors);
+  state.floorNames = floorNames;
+
+  const canonical = {
+    nodes: (state.graph.nodes || []).map((n) => ({
+      id: n.id,
+      x: +n.x,
+      y: +n.y,
+      floor: Number(n.floor ?? 0),
+      name: n.name || "",
+      special_id: n.type && n.type !== "일반" ? n.type : "",
+      nseq: Number(n.nseq ?? 0),
+    })),
+    links: (state.graph.links || []).map((l) => ({
+      id: l.id,
+      a: l.a,
+      b: l.b,
+      floor: Number(l.floor ?? 0),
+      lseq: Number(l.lseq ?? 0),
+    })),
+    polygons: (state.graph.polygons || []).map((p) => ({
+      id: p.id,
+      floor: Number(p.floor ?? 0),
+      name: p.name || "",
+      pseq: Number(p.pseq ?? 0) || 0,
+      nodes: Array.isArray(p.nodes) ? [...p.nodes] : [],
+    })),
+    floors: Array.from({ length: state.floors }, (_, i) => i),
+  };
+
+  return {
+    scale: Number(state.scale) || 0,
+    north_reference: {
+      from_node: state.northRef.from_node,
+      to_node: state.northRef.to_node,
+      azimuth: state.northRef.azimuth,
+    },
+    canonical,
+    _editor: {
+      floors: state.floors,
+      startFloor: state.startFloor,
+      currentFloor: state.currentFloor,
+      bgOpacity: state.bgOpacity ?? 1,
+      floorNames,
+      imageSizes: (state.imageSizes || []).map((sz) => {
+        if (!sz || !sz.width || !sz.height) return null;
+        return {
+          width: Number(sz.width) || 0,
+          height: Number(sz.height) || 0,
+        };
+      }),
+    },
+  };
+}
+
 // loading the saved files
 async function openProjectFromDirectory() {
   if (!window.showDirectoryPicker)
@@ -4592,6 +4678,97 @@ function applyFromDataFormat(json) {
   renderFloor?.();
 }
 
+// ---------------- 부분 저장(delta) 헬퍼 ----------------
+// 노드/링크/폴리곤을 id → 비교용 값 으로 정리한다.
+// (서버 maps/delta.py 의 노드/링크/폴리곤 diff 형식과 같은 필드)
+function graphIndexForDelta() {
+  const idx = { nodes: {}, links: {}, polygons: {} };
+  for (const n of state.graph.nodes || []) {
+    idx.nodes[n.id] = {
+      x: +n.x,
+      y: +n.y,
+      floor: Number(n.floor ?? 0),
+      name: n.name || "",
+      special_id: n.type && n.type !== "일반" ? n.type : "",
+      nseq: Number(n.nseq ?? 0),
+    };
+  }
+  for (const l of state.graph.links || []) {
+    idx.links[l.id] = {
+      a: l.a,
+      b: l.b,
+      floor: Number(l.floor ?? 0),
+      lseq: Number(l.lseq ?? 0),
+    };
+  }
+  for (const p of state.graph.polygons || []) {
+    idx.polygons[p.id] = {
+      floor: Number(p.floor ?? 0),
+      name: p.name || "",
+      pseq: Number(p.pseq ?? 0) || 0,
+      nodes: Array.isArray(p.nodes) ? [...p.nodes] : [],
+    };
+  }
+  return idx;
+}
+
+// 마지막 저장본(prev)과 현재(next)를 비교해서 바뀐 항목만 담은 diff를 만든다.
+// - 추가/수정: id → 값, 삭제: id → null
+function diffGraphIndex(prev, next) {
+  const out = {};
+  for (const kind of ["nodes", "links", "polygons"]) {
+    const before = prev[kind] || {};
+    const after = next[kind] || {};
+    const d = {};
+    for (const [id, v] of Object.entries(after)) {
+      if (JSON.stringify(before[id]) !== JSON.stringify(v)) d[id] = v;
+    }
+    for (const id of Object.keys(before)) {
+      if (!(id in after)) d[id] = null;
+    }
+    if (Object.keys(d).length) out[kind] = d;
+  }
+  return out;
+}
+
+// 저장 충돌(409/412: 다른 곳에서 먼저 저장됨)이면 알리고, 원하면 서버의 최신본을 다시 불러온다.
+// 충돌이 아니면 false
+function handleSaveConflict(e) {
+  if (e?.status !== 409 && e?.status !== 412) return false;
+  els.status.textContent = "저장 충돌: 다른 곳에서 먼저 저장됨";
+  if (confirm("다른 곳에서 먼저 저장되어 저장하지 못했습니다.\n서버의 최신 내용을 다시 불러올까요? (지금 고친 내용은 사라집니다)")) {
+    location.reload();
+  }
+  return true;
+}
+
+// 부분 저장 시도. 보낼 수 없으면(기준 리비전 없음) 또는 서버가 400으로 거절하면 null
+// (409 충돌 등 그 밖의 실패는 그대로 throw → 전체 저장으로 덮어쓰지 않음)
+async function trySaveDelta(data, graphIdx) {
+  if (state.projectRevision == null || !state.savedGraphIndex) return null;
+
+  const delta = diffGraphIndex(state.savedGraphIndex, graphIdx);
+  delta.base = state.projectRevision;
+  // 그래프 외 값은 작으므로 매번 같이 보낸다.
+  delta.set = {
+    meta: data.meta,
+    scale: data.scale,
+    startFloor: data.startFloor,
+    north_reference: data.north_reference,
+  };
+  const { node_meta, links, shapes, ...editorMeta } = data._editor || {};
+  delta.editor = editorMeta;
+
+  try {
+    return await apiPatchProjectDelta(state.projectId, delta);
+  } catch (e) {
+    if (e.status !== 400) throw e;
+    // 서버가 diff를 적용할 수 없음 → 전체 저장으로 대체
+    console.warn("부분 저장 실패, 전체 저장으로 대체:", e);
+    return null;
+  }
+}
+
 // connect function and save button
 // 저장(DB)
 async function saveToServer() {
@@ -4601,8 +4778,8 @@ async function saveToServer() {
   }
 
   try {
-    // 에디터 상태 → data 포맷
-    const data = serializeToDataFormat();
+    // 에디터 상태 → 서버 저장 포맷 (그래프는 정규 표현만)
+    const data = serializeForServer();
 
     // DB에 메타/스케일/시작층도 함께 보관
     data.meta = {
@@ -4620,7 +4797,14 @@ async function saveToServer() {
     data.scale = Number(state.scale) || 0;
     data.startFloor = state.startFloor ?? 1;
 
-    const saved = await apiUpdateProject(state.projectId, data);
+    // 바뀐 노드/링크/폴리곤만 보내는 부분 저장을 먼저 시도하고,
+    // 안 되면 전체 문서를 PUT 한다. (PUT도 같은 기준 리비전으로 → 그 사이 저장이 있으면 409)
+    const graphIdx = graphIndexForDelta();
+    const saved =
+      (await trySaveDelta(data, graphIdx)) ||
+      (await apiUpdateProject(state.projectId, data, { base: state.projectRevision }));
+    state.projectRevision = saved.revision ?? null;
+    state.savedGraphIndex = graphIdx;
 
     state.modified = false;
     els.projState.textContent = "상태: 저장됨";
@@ -4633,6 +4817,7 @@ async function saveToServer() {
     return true;
   } catch (e) {
     console.error(e);
+    if (handleSaveConflict(e)) return false;
     els.status.textContent = "DB 저장 실패";
     alert("DB 저장에 실패했습니다. 콘솔을 확인해 주세요.");
     return false;
@@ -4703,6 +4888,15 @@ els.btnOpen.addEventListener("click", async () => {
     state.projectId = data.id;
     applyFromDataFormat(data); // 복원 함수
 
+    // 부분 저장 기준 리비전/그래프
+    // _editor.links 가 없는 옛 데이터는 링크 id가 서버와 다를 수 있으므로
+    // 첫 저장은 전체 저장으로 하고, 그 다음부터 부분 저장을 사용한다.
+    state.projectRevision = data.revision ?? null;
+    const hasLinkIds =
+      Array.isArray(data?._editor?.links) ||
+      !Object.keys(data?.connections || {}).length;
+    state.savedGraphIndex = hasLinkIds ? graphIndexForDelta() : null;
+
     // 헤더 상태 갱신
     if (els.projName)
       els.projName.textContent =
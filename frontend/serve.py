@@ -1,18 +1,67 @@
+import argparse
+import gzip
 import http.server
-from http.server import HTTPServer, BaseHTTPRequestHandler
+import io
+import os
+import re
+import signal
 import socketserver
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate, parsedate_to_datetime
+
+try:
+    import brotli
+except ImportError:  # 선택 의존성 (없으면 .br은 만들지 않고, 이미 있는 .br만 내보낸다)
+    brotli = None
 
 # ---------------------------------------------------------------------------
-# 간단한 개발용 정적 웹 서버 스크립트
+# 프론트엔드 정적 웹 서버 스크립트
 #
 # - python serve.py 로 실행하면
-#   현재 폴더(그리고 하위 폴더)의 정적 파일들을  http://localhost:5151  에서 서비스
+#   현재 폴더(그리고 하위 폴더)의 정적 파일들을  http://localhost:5050  에서 서비스
 # - index.html, editor.html, js, css, 이미지 등 프론트 파일 테스트 용도
+#
+# - python serve.py --prod 로 실행하면 사무실 LAN에서 여러 명이 쓰는 운영 모드
+#   - 워커 스레드 풀로 동시에 처리 (느린 클라이언트 하나가 다른 요청을 막지 않음)
+#   - 시작할 때 js/css/html의 .gz/.br 파일을 미리 만들어 두고
+#     Accept-Encoding에 맞춰 압축본을 그대로 내보낸다. (editor.js 같은 큰 파일)
+#   - ETag / Last-Modified → 바뀌지 않은 파일은 304
+#   - 이름에 해시가 들어간 파일(app.3f2a9c1d.js)이나 ?v=... 로 요청한 파일은 1년 캐시,
+#     나머지는 매번 재검증 (no-cache, 바뀌지 않았으면 304라 본문은 다시 받지 않음)
+#   - 작은 파일은 메모리에 캐시 (--cache-mb)
+#   - Ctrl+C / SIGTERM 이면 새 연결을 받지 않고, 처리 중인 요청을 끝낸 뒤 종료
+#
+#   예) python serve.py --prod --port 5050 --workers 32 --cache-mb 64
 # ---------------------------------------------------------------------------
 
-# 사용할 포트 번호 (필요하면 5500, 5501 등으로 변경해서 사용)
+# 사용할 포트 번호 (필요하면 5500, 5501 등으로 변경해서 사용, --port 로도 지정 가능)
 PORT = 5050
 
+# 운영 모드 기본 워커 스레드 수
+DEFAULT_WORKERS = 32
+
+# 운영 모드 기본 메모리 캐시 크기 (MB, 0이면 끔)
+DEFAULT_CACHE_MB = 64
+
+# 이보다 큰 파일은 메모리에 캐시하지 않는다. (디스크에서 바로 보냄)
+MAX_CACHED_FILE = 4 * 1024 * 1024
+
+# keep-alive 연결이 다음 요청 없이 이 시간(초) 지나면 닫는다. (워커를 오래 붙잡지 않도록)
+KEEPALIVE_TIMEOUT = 5
+
+# 미리 압축할 확장자 / 최소 크기 (작은 파일은 압축 이득이 없음)
+COMPRESSIBLE = (".html", ".js", ".css", ".svg", ".json", ".manifest", ".txt")
+MIN_COMPRESS_BYTES = 1024
+
+# 이름에 내용 해시가 들어간 파일 (예: editor.3f2a9c1d.js) → 내용이 바뀌면 이름이 바뀐다.
+HASHED_NAME_RE = re.compile(r"\.[0-9a-f]{8,}\.[A-Za-z0-9]+$")
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
 # 기본 SimpleHTTPRequestHandler 사용
 # - GET /index.html, GET /js/editor.js 같은 정적 파일을 자동으로 서빙
 Handler = http.server.SimpleHTTPRequestHandler
@@ -31,10 +80,278 @@ Handler.extensions_map = {
     "": "application/octet-stream",  # 기본값 (알 수 없는 확장자)
 }
 
-# TCP 서버 생성: ('', PORT) → 모든 인터페이스에서 PORT 수신
-httpd = socketserver.TCPServer(("", PORT), Handler)
 
-print("serving at port", PORT)
+# ----- 미리 압축 -----
+
+def precompress(root):
+    """
+    root 아래 js/css/html 등의 압축본(.gz, brotli가 있으면 .br)을 만든다.
+    원본보다 오래된 압축본만 다시 만든다. 반환값: 새로 쓴 파일 수
+    """
+    written = 0
+    for folder, _, names in os.walk(root):
+        for name in names:
+            if not name.endswith(COMPRESSIBLE):
+                continue
+            src = os.path.join(folder, name)
+            st = os.stat(src)
+            if st.st_size < MIN_COMPRESS_BYTES:
+                continue
+            targets = [(".gz", lambda b: gzip.compress(b, 9, mtime=0))]
+            if brotli is not None:
+                targets.append((".br", lambda b: brotli.compress(b, quality=11)))
+            body = None
+            for suffix, compress in targets:
+                dst = src + suffix
+                try:
+                    if os.stat(dst).st_mtime_ns >= st.st_mtime_ns:
+                        continue
+                except OSError:
+                    pass
+                if body is None:
+                    with open(src, "rb") as fh:
+                        body = fh.read()
+                tmp = dst + ".tmp"
+                with open(tmp, "wb") as fh:
+                    fh.write(compress(body))
+                os.replace(tmp, dst)
+                written += 1
+    return written
+
+
+# ----- 파일 조회 + 메모리 캐시 -----
+
+class AssetCache:
+    """
+    작은 파일 내용을 메모리에 둔다. (가장 오래 안 쓴 것부터 버림)
+    요청마다 stat으로 mtime/크기를 확인하므로 파일을 고치면 바로 반영된다.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.items = OrderedDict()  # 경로 → (mtime_ns, size, bytes)
+        self.lock = threading.Lock()
+
+    def read(self, path, st):
+        """path 내용. 캐시하지 않는 파일이면 None (호출하는 쪽이 직접 연다)"""
+        if self.max_bytes <= 0 or st.st_size > min(MAX_CACHED_FILE, self.max_bytes):
+            return None
+        key = (st.st_mtime_ns, st.st_size)
+        with self.lock:
+            item = self.items.get(path)
+            if item is not None and item[:2] == key:
+                self.items.move_to_end(path)
+                return item[2]
+        with open(path, "rb") as fh:
+            body = fh.read()
+        with self.lock:
+            old = self.items.pop(path, None)
+            if old is not None:
+                self.used -= len(old[2])
+            self.items[path] = (*key, body)
+            self.used += len(body)
+            while self.used > self.max_bytes:
+                _, dropped = self.items.popitem(last=False)
+                self.used -= len(dropped[2])
+        return body
+
+
+def _accepted_encodings(header):
+    """Accept-Encoding 헤더 → 받을 수 있는(q > 0) 코딩 집합"""
+    out = set()
+    for part in (header or "").split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        for p in params.split(";"):
+            k, _, v = p.strip().partition("=")
+            if k.strip() == "q":
+                try:
+                    q = float(v)
+                except ValueError:
+                    q = 0.0
+        if token.strip() and q > 0:
+            out.add(token.strip().lower())
+    return out
+
+
+class ProductionHandler(http.server.SimpleHTTPRequestHandler):
+    """운영 모드 요청 처리 (압축본 / ETag, 304 / 캐시 헤더 / 메모리 캐시)"""
+
+    protocol_version = "HTTP/1.1"
+    timeout = KEEPALIVE_TIMEOUT
+    cache = AssetCache(0)
+
+    def send_head(self):
+        url_path, _, query = self.path.partition("?")
+        url_path = url_path.split("#", 1)[0]
+        path = self.translate_path(self.path)
+
+        if os.path.isdir(path):
+            if not url_path.endswith("/"):
+                self.send_response(301)
+                self.send_header("Location", url_path + "/" + ("?" + query if query else ""))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return None
+            # 운영 모드에서는 폴더 목록을 보여 주지 않는다.
+            path = os.path.join(path, "index.html")
+        if path.endswith((".gz", ".br", ".tmp")) or os.path.basename(path).startswith("."):
+            self.send_error(404, "File not found")
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.send_error(404, "File not found")
+            return None
+        if not os.path.isfile(path):
+            self.send_error(404, "File not found")
+            return None
+
+        # 압축본 선택 (원본보다 오래된 압축본은 무시)
+        send_path, send_st, encoding = path, st, None
+        compressible = path.endswith(COMPRESSIBLE)
+        if compressible:
+            accepted = _accepted_encodings(self.headers.get("Accept-Encoding"))
+            for coding, suffix in (("br", ".br"), ("gzip", ".gz")):
+                if coding not in accepted:
+                    continue
+                try:
+                    cst = os.stat(path + suffix)
+                except OSError:
+                    continue
+                if cst.st_mtime_ns >= st.st_mtime_ns:
+                    send_path, send_st, encoding = path + suffix, cst, coding
+                    break
+
+        etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}{"-" + encoding if encoding else ""}"'
+        hashed = bool(HASHED_NAME_RE.search(path)) or re.search(r"(^|&)v=", query) is not None
+
+        def common_headers():
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", formatdate(st.st_mtime, usegmt=True))
+            self.send_header("Cache-Control",
+                             IMMUTABLE_CACHE_CONTROL if hashed else REVALIDATE_CACHE_CONTROL)
+            if compressible:
+                self.send_header("Vary", "Accept-Encoding")
+
+        if self._not_modified(etag, st.st_mtime):
+            self.send_response(304)
+            common_headers()
+            self.end_headers()
+            return None
+
+        # Content-Length는 실제로 보낼 내용의 길이로 (위의 stat 뒤에 파일이 바뀌었을 수 있다)
+        body = self.cache.read(send_path, send_st)
+        if body is not None:
+            fh, length = io.BytesIO(body), len(body)
+        else:
+            fh = open(send_path, "rb")
+            length = os.fstat(fh.fileno()).st_size
+        self.send_response(200)
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("Content-Length", str(length))
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        common_headers()
+        self.end_headers()
+        return fh
+
+    def _not_modified(self, etag, mtime):
+        inm = self.headers.get("If-None-Match")
+        if inm:
+            tags = [t.strip() for t in inm.split(",")]
+            return "*" in tags or etag in tags or ("W/" + etag) in tags
+        ims = self.headers.get("If-Modified-Since")
+        if ims:
+            try:
+                return int(mtime) <= parsedate_to_datetime(ims).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+
+class PooledHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """
+    정해진 수의 워커 스레드로 요청을 처리하는 서버.
+    (ThreadingHTTPServer는 연결마다 스레드를 새로 만든다)
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, handler, workers):
+        super().__init__(address, handler)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="serve")
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        # 처리 중인 요청이 끝날 때까지 기다린다.
+        self.pool.shutdown(wait=True)
+
+
+def run_production(args):
+    root = os.path.abspath(args.dir)
+    if args.precompress:
+        written = precompress(root)
+        print(f"precompressed {written} file(s)" + ("" if brotli else " (gzip only, brotli not installed)"))
+
+    ProductionHandler.cache = AssetCache(args.cache_mb * 1024 * 1024)
+    handler = lambda *a, **kw: ProductionHandler(*a, directory=root, **kw)  # noqa: E731
+    httpd = PooledHTTPServer((args.bind, args.port), handler, args.workers)
+
+    # 시그널 핸들러 안에서 바로 shutdown()을 부르면 serve_forever()와 같은 스레드라 멈춘다.
+    def stop(signum, frame):
+        print("shutting down...")
+        threading.Thread(target=httpd.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    print(f"serving {root} at port {args.port} (production, {args.workers} workers)")
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MapEditor frontend static server")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--bind", default="", help="listen address (default: all interfaces)")
+    parser.add_argument("--dir", default=".", help="directory to serve (default: current directory)")
+    parser.add_argument("--prod", action="store_true", help="production mode (threaded, compressed, cached)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"worker threads in production mode (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--cache-mb", type=int, default=DEFAULT_CACHE_MB,
+                        help=f"in-memory file cache size in MB, 0 to disable (default: {DEFAULT_CACHE_MB})")
+    parser.add_argument("--precompress", action=argparse.BooleanOptionalAction, default=True,
+                        help="write .gz/.br siblings at startup in production mode (default: on)")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    if args.prod:
+        run_production(args)
+        return
+
+    # TCP 서버 생성: ('', PORT) → 모든 인터페이스에서 PORT 수신
+    os.chdir(args.dir)
+    httpd = socketserver.TCPServer((args.bind, args.port), Handler)
+
+    print("serving at port", args.port)
+
+    # Ctrl+C 로 중단할 때까지 무한 루프
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+
 
-# Ctrl+C 로 중단할 때까지 무한 루프
-httpd.serve_forever()
+if __name__ == "__main__":
+    sys.exit(main())